@@ -59,8 +59,8 @@ document.addEventListener('DOMContentLoaded', async () => {
         // Inicializar abas (carrega aba de consultas por padrão)
         tabsUI.initializeTabs();
         
-        // Configurar polling da fila
-        filaUI.setupFilaPolling();
+        // Atualizações da fila (eventos do servidor)
+        filaUI.setupFilaEventos();
         
         // Inicializar módulo de agendamento
         agendamentoUI.initAgendamento();
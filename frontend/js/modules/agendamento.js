@@ -3,6 +3,13 @@ import { appState } from './state.js';
 import * as api from './api.js';
 import * as utils from './utils.js';
 
+// Empresas exibidas por busca no seletor (typeahead em /api/empresas/options)
+const EMPRESAS_POR_BUSCA = 50;
+
+// Seleção mantida entre buscas (ids)
+const empresasSelecionadas = new Set();
+let buscaEmpresasTimeout = null;
+
 export function initAgendamento() {
     // Configurar data mínima (5 minutos a partir de agora)
     const now = new Date();
@@ -32,6 +39,10 @@ function setupEventListeners() {
     // Seleção de empresas
     document.getElementById('selectAllEmpresasBtn').addEventListener('click', selectAllEmpresas);
     document.getElementById('clearSelectionBtn').addEventListener('click', clearEmpresaSelection);
+    document.getElementById('empresasBuscaAgendamento').addEventListener('input', (event) => {
+        clearTimeout(buscaEmpresasTimeout);
+        buscaEmpresasTimeout = setTimeout(() => loadEmpresasParaAgendamento(event.target.value.trim()), 250);
+    });
     
     // Refresh de agendamentos
     document.getElementById('refreshAgendamentosBtn').addEventListener('click', loadAgendamentos);
@@ -72,9 +83,9 @@ function hideAgendamentoForm() {
     clearEmpresaSelection();
 }
 
-async function loadEmpresasParaAgendamento() {
+async function loadEmpresasParaAgendamento(busca = '') {
     try {
-        const empresas = await api.fetchEmpresas(1000, 0); // Buscar muitas empresas
+        const empresas = await api.fetchEmpresaOptions(busca, EMPRESAS_POR_BUSCA);
         renderEmpresasList(empresas);
     } catch (error) {
         console.error('Erro ao carregar empresas:', error);
@@ -95,34 +106,44 @@ function renderEmpresasList(empresas) {
             <input type="checkbox" 
                    id="empresa_${empresa.id}" 
                    value="${empresa.id}"
+                   ${empresasSelecionadas.has(empresa.id) ? 'checked' : ''}
                    class="empresa-checkbox h-4 w-4 text-blue-600 border-gray-300 rounded focus:ring-blue-500">
             <label for="empresa_${empresa.id}" class="ml-3 flex-1 cursor-pointer">
                 <div class="text-sm font-medium text-gray-900">${empresa.nome_empresa}</div>
-                <div class="text-xs text-gray-500">
-                    CNPJ: ${utils.formatCNPJ(empresa.cnpj)} | IE: ${empresa.inscricao_estadual}
-                </div>
+                <div class="text-xs text-gray-500">IE: ${empresa.inscricao_estadual}</div>
             </label>
         </div>
     `).join('');
     
-    // Adicionar event listeners para contagem
+    // Manter a seleção entre buscas e atualizar a contagem
     const checkboxes = container.querySelectorAll('.empresa-checkbox');
     checkboxes.forEach(checkbox => {
-        checkbox.addEventListener('change', updateSelectedCount);
+        checkbox.addEventListener('change', () => {
+            const id = parseInt(checkbox.value);
+            if (checkbox.checked) {
+                empresasSelecionadas.add(id);
+            } else {
+                empresasSelecionadas.delete(id);
+            }
+            updateSelectedCount();
+        });
     });
     
     updateSelectedCount();
 }
 
 function selectAllEmpresas() {
+    // Seleciona as empresas exibidas (resultado da busca atual)
     const checkboxes = document.querySelectorAll('.empresa-checkbox');
     checkboxes.forEach(checkbox => {
         checkbox.checked = true;
+        empresasSelecionadas.add(parseInt(checkbox.value));
     });
     updateSelectedCount();
 }
 
 function clearEmpresaSelection() {
+    empresasSelecionadas.clear();
     const checkboxes = document.querySelectorAll('.empresa-checkbox');
     checkboxes.forEach(checkbox => {
         checkbox.checked = false;
@@ -131,8 +152,7 @@ function clearEmpresaSelection() {
 }
 
 function updateSelectedCount() {
-    const checkboxes = document.querySelectorAll('.empresa-checkbox:checked');
-    const count = checkboxes.length;
+    const count = empresasSelecionadas.size;
     document.getElementById('selectedCountAgendamento').textContent = 
         `${count} empresa${count !== 1 ? 's' : ''} selecionada${count !== 1 ? 's' : ''}`;
 }
@@ -141,8 +161,7 @@ async function handleCreateAgendamento(event) {
     event.preventDefault();
     
     const formData = new FormData(event.target);
-    const selectedEmpresas = Array.from(document.querySelectorAll('.empresa-checkbox:checked'))
-        .map(checkbox => parseInt(checkbox.value));
+    const selectedEmpresas = Array.from(empresasSelecionadas);
     
     if (selectedEmpresas.length === 0) {
         utils.showNotification('Selecione pelo menos uma empresa', 'error');
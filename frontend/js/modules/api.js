@@ -1,11 +1,46 @@
 // Módulo de API - Requisições HTTP
 const API_BASE_URL = '/api';
 
+// Header com o cursor da próxima página (paginação por chave)
+const NEXT_CURSOR_HEADER = 'X-Next-Cursor';
+
+// Busca uma página de uma listagem e devolve os itens, o total (quando
+// solicitado com include_total=true) e o cursor da próxima página
+export async function fetchPage(url) {
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const data = await response.json();
+    const isPage = !Array.isArray(data);
+    return {
+        items: isPage ? data.items : data,
+        total: isPage ? data.total : null,
+        nextCursor: response.headers.get(NEXT_CURSOR_HEADER)
+    };
+}
+
 export async function fetchEstatatisticas() {
     const response = await fetch(`${API_BASE_URL}/estatisticas`);
     return await response.json();
 }
 
+export async function fetchConsultasPage(limit, offset, filters = {}, cursor = null) {
+    const params = new URLSearchParams({
+        limit: limit.toString(),
+        offset: offset.toString(),
+        include_total: 'true'
+    });
+    
+    if (cursor) params.append('cursor', cursor);
+    if (filters.search) params.append('search', filters.search);
+    if (filters.status) params.append('status', filters.status);
+    if (filters.tem_tvi) params.append('tem_tvi', filters.tem_tvi);
+    if (filters.tem_divida) params.append('tem_divida', filters.tem_divida);
+    
+    return await fetchPage(`${API_BASE_URL}/consultas?${params}`);
+}
+
 export async function fetchConsultas(limit, offset, filters = {}) {
     const params = new URLSearchParams({
         limit: limit.toString(),
@@ -32,6 +67,15 @@ export async function fetchConsultasCount(filters = {}) {
     return await response.json();
 }
 
+export function exportUrl(recurso, filters = {}, formato = 'csv') {
+    // Download em streaming: o navegador baixa direto da URL
+    const params = new URLSearchParams({ formato });
+    Object.entries(filters).forEach(([key, value]) => {
+        if (value !== '' && value !== null && value !== undefined) params.append(key, value);
+    });
+    return `${API_BASE_URL}/${recurso}/exportar?${params}`;
+}
+
 export async function deleteConsulta(consultaId) {
     const response = await fetch(`${API_BASE_URL}/consultas/${consultaId}`, {
         method: 'DELETE'
@@ -51,6 +95,26 @@ export async function fetchEmpresas(limit, offset, filters = {}) {
     return await response.json();
 }
 
+export async function fetchEmpresasPage(limit, offset, filters = {}) {
+    const params = new URLSearchParams({
+        limit: limit.toString(),
+        offset: offset.toString(),
+        include_total: 'true'
+    });
+    
+    if (filters.search) params.append('search', filters.search);
+    
+    return await fetchPage(`${API_BASE_URL}/empresas?${params}`);
+}
+
+export async function fetchEmpresaOptions(q = '', limit = 20) {
+    const params = new URLSearchParams({ limit: limit.toString() });
+    if (q) params.append('q', q);
+    
+    const response = await fetch(`${API_BASE_URL}/empresas/options?${params}`);
+    return await response.json();
+}
+
 export async function fetchEmpresasCount(filters = {}) {
     const params = new URLSearchParams();
     if (filters.search) params.append('search', filters.search);
@@ -123,6 +187,55 @@ export async function importarEmpresasCSV(empresas) {
     return await response.json();
 }
 
+// Envia o arquivo (CSV/XLSX) como corpo da requisição e acompanha o
+// progresso: a resposta é NDJSON, um evento por bloco e o resumo no final
+export async function importarEmpresasArquivo(file, { dryRun = false, atualizar = false } = {}, onProgress = null) {
+    const params = new URLSearchParams({ dry_run: dryRun, atualizar });
+    const response = await fetch(`${API_BASE_URL}/empresas/importar?${params}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': file.type || 'text/csv',
+            'X-Filename': encodeURIComponent(file.name)
+        },
+        body: file
+    });
+    
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Erro ao importar empresas');
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let resumo = null;
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        const linhas = buffer.split('\n');
+        buffer = linhas.pop();
+        for (const linha of linhas) {
+            if (!linha.trim()) continue;
+            const evento = JSON.parse(linha);
+            if (evento.tipo === 'erro') {
+                throw new Error(evento.detail);
+            } else if (evento.tipo === 'resumo') {
+                resumo = evento;
+            } else if (onProgress) {
+                onProgress(evento);
+            }
+        }
+    }
+    
+    if (!resumo) {
+        throw new Error('Importação interrompida');
+    }
+    return resumo;
+}
+
 export async function adicionarEmpresasNaFila(empresaIds, prioridade = 0) {
     const response = await fetch(`${API_BASE_URL}/fila/adicionar`, {
         method: 'POST',
@@ -143,9 +256,21 @@ export async function adicionarEmpresasNaFila(empresaIds, prioridade = 0) {
     return await response.json();
 }
 
+export async function fetchFilaJobsPage(limit = 50, offset = 0, filters = {}, cursor = null) {
+    const params = new URLSearchParams({
+        limit: limit.toString(),
+        offset: offset.toString()
+    });
+    
+    if (cursor) params.append('cursor', cursor);
+    if (filters.status) params.append('status', filters.status);
+    
+    return await fetchPage(`${API_BASE_URL}/fila?${params}`);
+}
+
 export async function fetchFilaJobs(limit = 50, offset = 0) {
-    const response = await fetch(`${API_BASE_URL}/fila?limit=${limit}&offset=${offset}`);
-    return await response.json();
+    const page = await fetchFilaJobsPage(limit, offset);
+    return page.items;
 }
 
 export async function fetchFilaStats() {
@@ -153,6 +278,25 @@ export async function fetchFilaStats() {
     return await response.json();
 }
 
+export async function fetchJobTimeline(jobId) {
+    const response = await fetch(`${API_BASE_URL}/fila/${jobId}/timeline`);
+    if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Erro ao carregar linha do tempo');
+    }
+    return await response.json();
+}
+
+// p50/p95 por etapa dos jobs processados no período (padrão: últimos 7 dias)
+export async function fetchEtapasStats(dataInicio = null, dataFim = null) {
+    const params = new URLSearchParams();
+    if (dataInicio) params.append('data_inicio', dataInicio);
+    if (dataFim) params.append('data_fim', dataFim);
+    const query = params.toString();
+    const response = await fetch(`${API_BASE_URL}/fila/etapas${query ? `?${query}` : ''}`);
+    return await response.json();
+}
+
 export async function fetchStatus() {
     const response = await fetch(`${API_BASE_URL}/status`);
     return await response.json();
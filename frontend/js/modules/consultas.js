@@ -5,14 +5,21 @@ import * as utils from './utils.js';
 
 export async function loadConsultas() {
     try {
-        const consultas = await api.fetchConsultas(
+        // Página anterior já visitada: continuar pelo cursor (sem OFFSET)
+        const pageIndex = appState.currentPage - 1;
+        const cursor = appState.consultasCursors[pageIndex] || null;
+        const page = await api.fetchConsultasPage(
             appState.itemsPerPage,
-            (appState.currentPage - 1) * appState.itemsPerPage,
-            appState.currentFilters
+            cursor ? 0 : pageIndex * appState.itemsPerPage,
+            appState.currentFilters,
+            cursor
         );
+        const consultas = page.items;
+        appState.consultasCursors.length = appState.currentPage;
+        appState.consultasCursors.push(page.nextCursor);
         
-        const countData = await api.fetchConsultasCount(appState.currentFilters);
-        appState.totalItems = countData.total;
+        // Total vem na mesma resposta (include_total)
+        appState.totalItems = page.total;
         appState.consultasData = consultas;
         
         updateConsultasTable(consultas);
@@ -57,14 +64,14 @@ function updateConsultasTable(consultas) {
                     ${utils.getStatusBadge(consulta.status_ie)}
                 </td>
                 <td class="px-3 py-3 whitespace-nowrap">
-                    ${utils.getTVIBadge(consulta.tem_tvi)}
+                    ${utils.getTVIBadge(consulta)}
                 </td>
                 <td class="px-3 py-3 whitespace-nowrap">
-                    ${utils.getDividasBadge(consulta.tem_divida_pendente)}
+                    ${utils.getFlagBadge(consulta.flag_divida_pendente)}
                 </td>
                 <td class="px-3 py-3 whitespace-nowrap">
                     <div class="text-sm text-gray-900">
-                        ${utils.formatCurrency(consulta.valor_debitos)}
+                        ${utils.formatCurrency((consulta.debitos_centavos || 0) / 100)}
                     </div>
                 </td>
                 <td class="px-3 py-3 whitespace-nowrap">
@@ -149,6 +156,10 @@ export function applyFilters() {
     }
 }
 
+export function exportConsultas(formato = 'csv') {
+    window.location.href = api.exportUrl('consultas', appState.currentFilters, formato);
+}
+
 export function clearFilters() {
     const elements = {
         search: document.getElementById('searchFilter'),
@@ -219,28 +230,28 @@ export function showDetails(consultaId) {
             <div class="grid grid-cols-3 gap-4">
                 <div>
                     <label class="block text-sm font-medium text-gray-700">TVIs</label>
-                    <div class="mt-1">${utils.getTVIBadge(consulta.tem_tvi)}</div>
+                    <div class="mt-1">${utils.getTVIBadge(consulta)}</div>
                 </div>
                 <div>
                     <label class="block text-sm font-medium text-gray-700">Dívida Pendente</label>
-                    <div class="mt-1">${utils.getDividasBadge(consulta.tem_divida_pendente)}</div>
+                    <div class="mt-1">${utils.getFlagBadge(consulta.flag_divida_pendente)}</div>
                 </div>
                 <div>
                     <label class="block text-sm font-medium text-gray-700">Omisso Declaração</label>
-                    <div class="mt-1">${utils.getDividasBadge(consulta.omisso_declaracao)}</div>
+                    <div class="mt-1">${utils.getFlagBadge(consulta.flag_omisso_declaracao)}</div>
                 </div>
             </div>
             
             <div>
                 <label class="block text-sm font-medium text-gray-700">Valor das Dívidas</label>
                 <p class="mt-1 text-lg font-semibold text-gray-900">
-                    ${utils.formatCurrency(consulta.valor_debitos)}
+                    ${utils.formatCurrency((consulta.debitos_centavos || 0) / 100)}
                 </p>
             </div>
             
             <div>
                 <label class="block text-sm font-medium text-gray-700">Inscrito em Cadastro Restritivo</label>
-                <div class="mt-1">${utils.getDividasBadge(consulta.inscrito_restritivo)}</div>
+                <div class="mt-1">${utils.getFlagBadge(consulta.flag_inscrito_restritivo)}</div>
             </div>
             
             <div>
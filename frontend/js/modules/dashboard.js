@@ -1,5 +1,6 @@
 // Módulo de Dashboard - Atualização de estatísticas e métricas
 import * as api from './api.js';
+import * as eventos from './eventos.js';
 
 // Cache para evitar requisições desnecessárias
 let dashboardCache = {
@@ -195,12 +196,34 @@ export function initDashboard() {
     // Atualização inicial
     updateDashboard();
     
-    // Atualização periódica a cada 60 segundos
-    setInterval(updateDashboard, 60000);
+    if (eventos.conectarEventos()) {
+        // Servidor envia as estatísticas recalculadas após novas consultas
+        eventos.onEvento('snapshot', (dados) => receberEstatisticas(dados.estatisticas));
+        eventos.onEvento('estatisticas', receberEstatisticas);
+        eventos.onEvento('resync', triggerDashboardUpdate);
+        eventos.onEvento('desconectado', iniciarPollingDashboard);
+    } else {
+        iniciarPollingDashboard();
+    }
     
     console.log('✅ Dashboard inicializado');
 }
 
+let dashboardPollingTimer = null;
+
+// Atualização periódica a cada 60 segundos (sem EventSource ou com a conexão encerrada)
+function iniciarPollingDashboard() {
+    if (dashboardPollingTimer) return;
+    dashboardPollingTimer = setInterval(updateDashboard, 60000);
+}
+
+function receberEstatisticas(stats) {
+    if (!stats) return;
+    dashboardCache.data = stats;
+    dashboardCache.lastUpdate = Date.now();
+    renderDashboard(stats);
+}
+
 // Auto-atualização quando dados mudam
 export function triggerDashboardUpdate() {
     clearDashboardCache();
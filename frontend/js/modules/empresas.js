@@ -43,14 +43,14 @@ const isExtensionAvailable = async () => {
 
 export async function loadEmpresas() {
     try {
-        const empresas = await api.fetchEmpresas(
+        // Itens e total na mesma resposta (include_total)
+        const page = await api.fetchEmpresasPage(
             appState.empresasItemsPerPage,
             (appState.empresasCurrentPage - 1) * appState.empresasItemsPerPage,
             appState.empresasFilters
         );
-        
-        const countData = await api.fetchEmpresasCount(appState.empresasFilters);
-        appState.empresasTotalItems = countData.total;
+        const empresas = page.items;
+        appState.empresasTotalItems = page.total;
         appState.empresasData = empresas;
         
         updateEmpresasTable(empresas);
@@ -403,10 +403,12 @@ export function changeEmpresasItemsPerPage(itemsPerPage) {
 // ================================
 
 let csvData = null;
+let csvFile = null;
 let csvListenersInitialized = false;
 
 function resetCSVImport() {
     csvData = null;
+    csvFile = null;
     
     const csvFileName = document.getElementById('csvFileName');
     const csvPreview = document.getElementById('csvPreview');
@@ -493,6 +495,19 @@ function handleCSVFileSelect(event) {
         fileName.classList.remove('hidden');
     }
     
+    // O arquivo original é enviado ao servidor; o parse local serve só para o preview
+    csvFile = file;
+    
+    // Planilhas XLSX são lidas apenas no servidor (sem preview)
+    if (file.name.toLowerCase().endsWith('.xlsx')) {
+        csvData = null;
+        const preview = document.getElementById('csvPreview');
+        if (preview) preview.classList.add('hidden');
+        const importBtn = document.getElementById('importarCsvBtn');
+        if (importBtn) importBtn.disabled = false;
+        return;
+    }
+    
     // Função para detectar e limpar caracteres corrompidos
     const fixEncoding = (text) => {
         // Se encontrar caracteres corrompidos típicos de Windows-1252 lido como UTF-8
@@ -674,11 +689,6 @@ function parseCSV(text) {
             // CORREÇÃO: Aplicar conversão de notação científica apenas para campos específicos
             value = convertScientificNotationForNumericFields(value, header);
             
-            // Log específico para senha para debug
-            if (header === 'senha') {
-                console.log(`Linha ${i+1} - Senha processada: "${values[index]}" -> "${value}"`);
-            }
-            
             row[header] = value;
         });
         
@@ -716,7 +726,6 @@ function parseCSV(text) {
     showCSVPreview(csvData, headers);
     
     console.log('CSV parseado com sucesso:', csvData.length, 'linhas');
-    console.log('Primeira linha:', csvData[0]);
     
     const importBtn = document.getElementById('importarCsvBtn');
     if (importBtn) {
@@ -755,24 +764,31 @@ function showCSVPreview(data, headers) {
 }
 
 export async function importarCSV() {
-    if (!csvData || csvData.length === 0) {
+    if (!csvFile || (csvData && csvData.length === 0)) {
         utils.showNotification('Nenhum dado para importar', 'error');
         return;
     }
     
-    console.log('Iniciando importação de', csvData.length, 'empresas');
-    console.log('Dados a enviar:', csvData);
+    const dryRun = document.getElementById('importDryRun')?.checked || false;
+    const atualizar = document.getElementById('importAtualizar')?.checked || false;
+    
+    console.log('Iniciando importação de', csvFile.name, dryRun ? '(simulação)' : '');
     
     const importBtn = document.getElementById('importarCsvBtn');
     const resultDiv = document.getElementById('importResult');
+    const acao = dryRun ? 'Simulando' : 'Importando';
     
     if (importBtn) {
         importBtn.disabled = true;
-        importBtn.innerHTML = '<i data-lucide="loader" class="h-4 w-4 mr-2 animate-spin"></i> Importando...';
+        importBtn.innerHTML = `<i data-lucide="loader" class="h-4 w-4 mr-2 animate-spin"></i> ${acao}...`;
     }
     
     try {
-        const result = await api.importarEmpresasCSV(csvData);
+        const result = await api.importarEmpresasArquivo(csvFile, { dryRun, atualizar }, (progresso) => {
+            if (importBtn) {
+                importBtn.innerHTML = `<i data-lucide="loader" class="h-4 w-4 mr-2 animate-spin"></i> ${acao}... ${progresso.processadas} linhas`;
+            }
+        });
         
         if (resultDiv) {
             // Determinar a cor e ícone baseado no resultado
@@ -785,7 +801,9 @@ export async function importarCSV() {
             const iconColor = allFailed ? 'text-red-600' : hasSuccess ? 'text-green-600' : 'text-yellow-600';
             const iconName = allFailed ? 'x-circle' : hasSuccess ? 'check-circle' : 'alert-circle';
             const titleColor = allFailed ? 'text-red-900' : hasSuccess ? 'text-green-900' : 'text-yellow-900';
-            const titleText = allFailed ? 'Nenhuma empresa importada!' : hasSuccess && !hasErrors ? 'Importação concluída!' : 'Importação concluída com avisos';
+            const titleText = result.dry_run
+                ? 'Simulação concluída (nenhuma alteração gravada)'
+                : allFailed ? 'Nenhuma empresa importada!' : hasSuccess && !hasErrors ? 'Importação concluída!' : 'Importação concluída com avisos';
             
             resultDiv.innerHTML = `
                 <div class="${bgColor} border ${borderColor} rounded-lg p-4">
@@ -795,7 +813,9 @@ export async function importarCSV() {
                             <h4 class="text-sm font-medium ${titleColor}">${titleText}</h4>
                             <div class="mt-2 text-sm">
                                 ${result.sucesso > 0 ? `<p class="text-green-700">✓ ${result.sucesso} empresa${result.sucesso !== 1 ? 's' : ''} importada${result.sucesso !== 1 ? 's' : ''} com sucesso</p>` : ''}
-                                ${result.erros > 0 ? `<p class="text-red-700">✗ ${result.erros} ${allFailed ? 'empresa' : 'erro'}${result.erros !== 1 ? 's' : ''} ${allFailed ? 'não foi importada (já existe no sistema)' : ''}</p>` : ''}
+                                ${result.atualizadas > 0 ? `<p class="text-green-700">↻ ${result.atualizadas} já cadastrada${result.atualizadas !== 1 ? 's' : ''} (atualizada${result.atualizadas !== 1 ? 's' : ''})</p>` : ''}
+                                ${result.existentes > 0 ? `<p class="text-red-700">✗ ${result.existentes} já existente${result.existentes !== 1 ? 's' : ''} no sistema</p>` : ''}
+                                ${result.invalidas > 0 ? `<p class="text-red-700">✗ ${result.invalidas} linha${result.invalidas !== 1 ? 's' : ''} inválida${result.invalidas !== 1 ? 's' : ''}</p>` : ''}
                             </div>
                             ${result.detalhes && result.detalhes.length > 0 ? `
                                 <details class="mt-3" ${allFailed ? 'open' : ''}>
@@ -816,9 +836,15 @@ export async function importarCSV() {
         }
         
         // Notificação baseada no resultado
-        if (result.sucesso === 0 && result.erros > 0) {
+        if (result.dry_run) {
+            utils.showNotification(
+                `🔎 Simulação: ${result.sucesso} empresa${result.sucesso !== 1 ? 's' : ''} seria${result.sucesso !== 1 ? 'm' : ''} importada${result.sucesso !== 1 ? 's' : ''}, ${result.erros} com problema${result.erros !== 1 ? 's' : ''}`,
+                result.erros > 0 ? 'error' : 'success'
+            );
+            return;
+        } else if (result.sucesso === 0 && result.erros > 0) {
             utils.showNotification(
-                `❌ Nenhuma empresa foi importada. ${result.erros} empresa${result.erros !== 1 ? 's' : ''} já existe${result.erros === 1 ? '' : 'm'} no sistema.`,
+                `❌ Nenhuma empresa foi importada. ${result.erros} empresa${result.erros !== 1 ? 's' : ''} com problema${result.erros !== 1 ? 's' : ''}.`,
                 'error'
             );
         } else if (result.sucesso > 0 && result.erros === 0) {
@@ -828,7 +854,7 @@ export async function importarCSV() {
             );
         } else if (result.sucesso > 0 && result.erros > 0) {
             utils.showNotification(
-                `⚠️ Importação parcial: ${result.sucesso} importada${result.sucesso !== 1 ? 's' : ''}, ${result.erros} já existente${result.erros !== 1 ? 's' : ''}`,
+                `⚠️ Importação parcial: ${result.sucesso} importada${result.sucesso !== 1 ? 's' : ''}, ${result.erros} com problema${result.erros !== 1 ? 's' : ''}`,
                 'error'
             );
         }
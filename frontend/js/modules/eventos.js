@@ -0,0 +1,71 @@
+// Módulo de Eventos - mudanças da fila e das estatísticas enviadas pelo servidor (SSE)
+//
+// Uma única conexão EventSource com /api/eventos é compartilhada pelos
+// módulos, que registram handlers por tipo de evento em vez de fazer polling.
+// O navegador reconecta sozinho e o servidor envia um "snapshot" a cada conexão.
+// Se o navegador desistir (ex.: resposta de erro do servidor), os módulos
+// recebem o evento local "desconectado" e voltam ao polling.
+
+const EVENTOS_URL = '/api/eventos';
+const DESCONECTADO = 'desconectado';
+
+let source = null;
+const handlers = {};
+
+function emitir(tipo, dados) {
+    (handlers[tipo] || []).forEach(handler => {
+        try {
+            handler(dados);
+        } catch (error) {
+            console.error(`❌ Erro ao tratar evento ${tipo}:`, error);
+        }
+    });
+}
+
+function registrarNoSource(tipo) {
+    if (tipo === DESCONECTADO) return;
+    source.addEventListener(tipo, (event) => {
+        let dados = {};
+        try {
+            dados = event.data ? JSON.parse(event.data) : {};
+        } catch (error) {
+            console.error(`❌ Evento ${tipo} inválido:`, error);
+            return;
+        }
+        emitir(tipo, dados);
+    });
+}
+
+// Abre a conexão (uma vez); retorna false se o navegador não suporta SSE
+export function conectarEventos() {
+    if (source) return true;
+    if (!window.EventSource) return false;
+
+    source = new EventSource(EVENTOS_URL);
+    Object.keys(handlers).forEach(registrarNoSource);
+
+    source.addEventListener('open', () => console.log('📡 Conectado aos eventos do servidor'));
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) {
+            // O navegador não tenta de novo após uma resposta de erro
+            console.warn('⚠️ Conexão de eventos encerrada, voltando ao polling');
+            emitir(DESCONECTADO, {});
+            return;
+        }
+        console.warn('⚠️ Conexão de eventos perdida, reconectando...');
+    });
+    return true;
+}
+
+// Registra um handler para um tipo de evento (job, fila, fila_stats, ...)
+export function onEvento(tipo, handler) {
+    if (!handlers[tipo]) {
+        handlers[tipo] = [];
+        if (source) registrarNoSource(tipo);
+    }
+    handlers[tipo].push(handler);
+}
+
+export function eventosConectados() {
+    return source !== null && source.readyState === EventSource.OPEN;
+}
@@ -2,14 +2,15 @@
 import { appState } from './state.js';
 import * as api from './api.js';
 import * as utils from './utils.js';
+import * as eventos from './eventos.js';
 
 // Funções de filtro por status
 let filaStatusFilter = null;
 
 export async function loadFila() {
     try {
-        // Usar applyFilaFilters para respeitar o filtro ativo
-        await applyFilaFilters();
+        // Recarregar a página atual respeitando o filtro ativo
+        await loadFilaPage();
     } catch (error) {
         console.error('Erro ao buscar fila:', error);
         utils.showNotification('Erro ao carregar fila', 'error');
@@ -29,12 +30,8 @@ function updateFilaTable() {
     if (emptyState) emptyState.classList.add('hidden');
     
     if (tbody) {
-        // Calcular índices de paginação
-        const startIndex = (appState.filaCurrentPage - 1) * appState.filaItemsPerPage;
-        const endIndex = startIndex + appState.filaItemsPerPage;
-        const jobsPaginados = appState.filaData.slice(startIndex, endIndex);
-        
-        tbody.innerHTML = jobsPaginados.map(job => `
+        // filaData já contém apenas a página atual (paginação no servidor)
+        tbody.innerHTML = appState.filaData.map(job => `
             <tr>
                 <td class="px-6 py-4">
                     <div class="text-sm font-medium text-gray-900">${job.nome_empresa || 'N/A'}</div>
@@ -100,6 +97,13 @@ function updateFilaTable() {
                             <i data-lucide="x-circle" class="h-4 w-4"></i>
                         </button>
                     ` : ''}
+                    ${job.status !== 'pending' ? `
+                        <button onclick="window.filaUI.showTimeline(${job.id})" 
+                                class="text-gray-600 hover:text-gray-900 mr-2"
+                                title="Linha do Tempo">
+                            <i data-lucide="activity" class="h-4 w-4"></i>
+                        </button>
+                    ` : ''}
                     ${job.status === 'failed' ? `
                         <button onclick="window.filaUI.reprocessJob(${job.id})" 
                                 class="text-green-600 hover:text-green-900"
@@ -115,29 +119,121 @@ function updateFilaTable() {
     }
 }
 
+// Últimas estatísticas recebidas (requisição ou evento fila_stats)
+let filaStats = null;
+
 export async function loadFilaStats() {
     try {
         const stats = await api.fetchFilaStats();
+        renderFilaStats(stats);
+        return stats;
+    } catch (error) {
+        console.error('Erro ao buscar estatísticas da fila:', error);
+        return null;
+    }
+}
+
+function renderFilaStats(stats) {
+    filaStats = stats;
+    
+    const elements = {
+        totalFila: document.getElementById('totalFila'),
+        pendentes: document.getElementById('filaPendentes'),
+        processando: document.getElementById('filaProcessando'),
+        concluidos: document.getElementById('filaConcluidos'),
+        falhas: document.getElementById('filaFalhas')
+    };
+    
+    if (elements.totalFila) elements.totalFila.textContent = stats.total;
+    if (elements.pendentes) elements.pendentes.textContent = stats.pendente || 0;
+    if (elements.processando) elements.processando.textContent = stats.processando || 0;
+    if (elements.concluidos) elements.concluidos.textContent = stats.concluido || 0;
+    if (elements.falhas) elements.falhas.textContent = stats.erro || 0;
+}
+
+// Linha do tempo das etapas de um job, comparada ao p95 da etapa (últimos 7 dias)
+const ETAPA_NOMES = {
+    navegador: 'Navegador',
+    login: 'Login',
+    menu: 'Menu',
+    navegacao: 'Navegação (árvore)',
+    formulario_ie: 'Formulário IE',
+    extracao: 'Conta Corrente',
+    tvis: 'TVIs',
+    dividas: 'Dívidas',
+    mensagem: 'Mensagens (ciência)',
+    logout: 'Logout'
+};
+
+function formatMs(ms) {
+    return ms >= 1000 ? `${(ms / 1000).toFixed(1)} s` : `${ms} ms`;
+}
+
+function formatBytes(bytes) {
+    if (!bytes) return '-';
+    return bytes >= 1024 * 1024 ? `${(bytes / 1024 / 1024).toFixed(1)} MB` : `${Math.ceil(bytes / 1024)} KB`;
+}
+
+export async function showTimeline(jobId) {
+    try {
+        const [timeline, stats] = await Promise.all([
+            api.fetchJobTimeline(jobId),
+            api.fetchEtapasStats().catch(() => null)
+        ]);
+        const p95 = {};
+        (stats?.etapas || []).forEach(e => { p95[e.etapa] = e.p95_ms; });
         
-        const elements = {
-            totalFila: document.getElementById('totalFila'),
-            pendentes: document.getElementById('filaPendentes'),
-            processando: document.getElementById('filaProcessando'),
-            concluidos: document.getElementById('filaConcluidos'),
-            falhas: document.getElementById('filaFalhas')
-        };
+        document.getElementById('timelineModalTitle').textContent =
+            `Linha do Tempo — Job #${jobId} (${formatMs(timeline.duracao_ms)})`;
+        const content = document.getElementById('timelineContent');
         
-        if (elements.totalFila) elements.totalFila.textContent = stats.total;
-        if (elements.pendentes) elements.pendentes.textContent = stats.pendente || 0;
-        if (elements.processando) elements.processando.textContent = stats.processando || 0;
-        if (elements.concluidos) elements.concluidos.textContent = stats.concluido || 0;
-        if (elements.falhas) elements.falhas.textContent = stats.erro || 0;
+        if (timeline.etapas.length === 0) {
+            content.innerHTML = '<p class="text-sm text-gray-500">Nenhuma etapa registrada para este job.</p>';
+        } else {
+            const total = Math.max(timeline.duracao_ms, 1);
+            content.innerHTML = timeline.etapas.map(e => {
+                const esquerda = (e.inicio_ms / total) * 100;
+                const largura = Math.max((e.duracao_ms / total) * 100, 0.5);
+                const atraso = e.duracao_ms ? (e.atraso_ms / e.duracao_ms) * 100 : 0;
+                const lenta = p95[e.etapa] && e.duracao_ms > p95[e.etapa];
+                return `
+                    <div class="text-xs">
+                        <div class="flex justify-between text-gray-700">
+                            <span class="font-medium">${ETAPA_NOMES[e.etapa] || e.etapa}
+                                ${e.resultado === 'erro' ? '<span class="text-red-600">(erro)</span>' : ''}</span>
+                            <span class="${lenta ? 'text-orange-600 font-medium' : ''}">
+                                ${formatMs(e.duracao_ms)}${p95[e.etapa] ? ` · p95 ${formatMs(p95[e.etapa])}` : ''}
+                            </span>
+                        </div>
+                        <div class="relative h-3 bg-gray-100 rounded">
+                            <div class="absolute h-3 rounded overflow-hidden ${e.resultado === 'erro' ? 'bg-red-400' : 'bg-blue-500'}"
+                                 style="left: ${esquerda}%; width: ${largura}%">
+                                <div class="h-3 bg-yellow-300" style="width: ${atraso}%" title="Atraso artificial"></div>
+                            </div>
+                        </div>
+                        <div class="flex justify-between text-gray-500">
+                            <span class="truncate" title="${e.url || ''}">${e.url || '-'}</span>
+                            <span class="whitespace-nowrap ml-2">
+                                espera ${formatMs(e.espera_ms)} · atraso ${formatMs(e.atraso_ms)} · ${formatBytes(e.bytes)}
+                            </span>
+                        </div>
+                    </div>
+                `;
+            }).join('');
+        }
         
+        document.getElementById('timelineModal').classList.remove('hidden');
+        utils.initLucideIcons();
     } catch (error) {
-        console.error('Erro ao buscar estatísticas da fila:', error);
+        console.error('Erro ao carregar linha do tempo:', error);
+        utils.showNotification(error.message || 'Erro ao carregar linha do tempo', 'error');
     }
 }
 
+export function closeTimelineModal() {
+    document.getElementById('timelineModal').classList.add('hidden');
+}
+
 export async function removeFromQueue(jobId) {
     if (!confirm('Tem certeza que deseja remover este item da fila?')) {
         return;
@@ -277,34 +373,7 @@ export async function stopProcessing() {
 export async function checkProcessingStatus() {
     try {
         const status = await api.fetchStatusProcessamento();
-        
-        const startBtn = document.getElementById('startProcessingBtn');
-        const stopBtn = document.getElementById('stopProcessingBtn');
-        const statusIndicator = document.getElementById('processingStatusIndicator');
-        const statusText = document.getElementById('processingStatusText');
-        
-        if (status.processando) {
-            if (startBtn) startBtn.disabled = true;
-            if (stopBtn) stopBtn.disabled = false;
-            if (statusIndicator) {
-                statusIndicator.className = 'h-3 w-3 bg-green-500 rounded-full animate-pulse';
-            }
-            if (statusText) {
-                statusText.textContent = 'Processando';
-                statusText.className = 'text-sm font-medium text-green-600';
-            }
-        } else {
-            if (startBtn) startBtn.disabled = false;
-            if (stopBtn) stopBtn.disabled = true;
-            if (statusIndicator) {
-                statusIndicator.className = 'h-3 w-3 bg-gray-400 rounded-full';
-            }
-            if (statusText) {
-                statusText.textContent = 'Pausado';
-                statusText.className = 'text-sm font-medium text-gray-600';
-            }
-        }
-        
+        renderProcessingStatus(status.processando);
         return status.processando;
         
     } catch (error) {
@@ -313,12 +382,52 @@ export async function checkProcessingStatus() {
     }
 }
 
-export function setupFilaPolling() {
-    // Carregar fila imediatamente ao iniciar (sem await para não bloquear)
-    loadFila().catch(err => console.error('Erro ao carregar fila inicial:', err));
+function renderProcessingStatus(processando) {
+    const startBtn = document.getElementById('startProcessingBtn');
+    const stopBtn = document.getElementById('stopProcessingBtn');
+    const statusIndicator = document.getElementById('processingStatusIndicator');
+    const statusText = document.getElementById('processingStatusText');
     
-    // Atualizar fila a cada 3 segundos (sempre, não apenas quando na aba fila)
-    setInterval(async () => {
+    if (processando) {
+        if (startBtn) startBtn.disabled = true;
+        if (stopBtn) stopBtn.disabled = false;
+        if (statusIndicator) {
+            statusIndicator.className = 'h-3 w-3 bg-green-500 rounded-full animate-pulse';
+        }
+        if (statusText) {
+            statusText.textContent = 'Processando';
+            statusText.className = 'text-sm font-medium text-green-600';
+        }
+    } else {
+        if (startBtn) startBtn.disabled = false;
+        if (stopBtn) stopBtn.disabled = true;
+        if (statusIndicator) {
+            statusIndicator.className = 'h-3 w-3 bg-gray-400 rounded-full';
+        }
+        if (statusText) {
+            statusText.textContent = 'Pausado';
+            statusText.className = 'text-sm font-medium text-gray-600';
+        }
+    }
+}
+
+// Agrupa eventos em rajada (job + fila + fila_stats) em uma única recarga
+const FILA_RECARGA_DELAY = 300;
+let filaRecargaTimer = null;
+
+function agendarRecargaFila() {
+    clearTimeout(filaRecargaTimer);
+    filaRecargaTimer = setTimeout(() => {
+        loadFila().catch(err => console.error('Erro ao recarregar fila:', err));
+    }, FILA_RECARGA_DELAY);
+}
+
+let filaPollingTimer = null;
+
+// Atualiza a fila a cada 3 segundos (sem EventSource ou com a conexão encerrada)
+function iniciarPollingFila() {
+    if (filaPollingTimer) return;
+    filaPollingTimer = setInterval(async () => {
         try {
             await loadFila();
             // Só atualiza status se estiver na aba fila (para não fazer requisições desnecessárias)
@@ -331,6 +440,33 @@ export function setupFilaPolling() {
     }, 3000);
 }
 
+export function setupFilaEventos() {
+    // Carregar fila imediatamente ao iniciar (sem await para não bloquear)
+    loadFila().catch(err => console.error('Erro ao carregar fila inicial:', err));
+    
+    if (eventos.conectarEventos()) {
+        // Servidor avisa quando a fila muda: sem polling
+        eventos.onEvento('snapshot', (dados) => {
+            // Seções que falharam no servidor não vêm no snapshot
+            if (dados.fila_stats) renderFilaStats(dados.fila_stats);
+            renderProcessingStatus(dados.processando);
+            agendarRecargaFila();
+        });
+        eventos.onEvento('fila_stats', renderFilaStats);
+        eventos.onEvento('fila', agendarRecargaFila);
+        eventos.onEvento('job', agendarRecargaFila);
+        eventos.onEvento('processamento', (dados) => renderProcessingStatus(dados.processando));
+        eventos.onEvento('resync', () => {
+            agendarRecargaFila();
+            checkProcessingStatus();
+        });
+        eventos.onEvento('desconectado', iniciarPollingFila);
+        return;
+    }
+    
+    iniciarPollingFila();
+}
+
 // Funções de Paginação
 function updateFilaPagination() {
     const totalPages = Math.ceil(appState.filaTotalItems / appState.filaItemsPerPage);
@@ -355,9 +491,11 @@ function updateFilaPagination() {
     }
     
     if (nextBtn) {
-        nextBtn.disabled = currentPage >= totalPages;
-        nextBtn.classList.toggle('opacity-50', currentPage >= totalPages);
-        nextBtn.classList.toggle('cursor-not-allowed', currentPage >= totalPages);
+        // Há próxima página quando o servidor devolveu um cursor
+        const isLastPage = !appState.filaCursors[currentPage];
+        nextBtn.disabled = isLastPage;
+        nextBtn.classList.toggle('opacity-50', isLastPage);
+        nextBtn.classList.toggle('cursor-not-allowed', isLastPage);
     }
     
     // Atualizar número da página
@@ -367,28 +505,29 @@ function updateFilaPagination() {
     }
 }
 
-export function nextFilaPage() {
-    const totalPages = Math.ceil(appState.filaTotalItems / appState.filaItemsPerPage);
-    if (appState.filaCurrentPage < totalPages) {
+export async function nextFilaPage() {
+    if (appState.filaCursors[appState.filaCurrentPage]) {
         appState.filaCurrentPage++;
-        updateFilaTable();
-        updateFilaPagination();
+        await loadFila();
     }
 }
 
-export function prevFilaPage() {
+export async function prevFilaPage() {
     if (appState.filaCurrentPage > 1) {
         appState.filaCurrentPage--;
-        updateFilaTable();
-        updateFilaPagination();
+        await loadFila();
     }
 }
 
-export function changeFilaItemsPerPage(itemsPerPage) {
+export async function changeFilaItemsPerPage(itemsPerPage) {
     appState.filaItemsPerPage = parseInt(itemsPerPage);
+    resetFilaPagination();
+    await loadFila();
+}
+
+function resetFilaPagination() {
     appState.filaCurrentPage = 1;
-    updateFilaTable();
-    updateFilaPagination();
+    appState.filaCursors = [null];
 }
 
 // Funções de filtro por status
@@ -465,29 +604,45 @@ function updateFilterIndicators() {
 
 async function applyFilaFilters() {
     try {
-        const jobs = await api.fetchFilaJobs();
-        
-        // Ordenar por data_adicao decrescente (mais recentes primeiro)
-        let jobsOrdenados = [...jobs].sort((a, b) => {
-            const dateA = new Date(a.data_adicao);
-            const dateB = new Date(b.data_adicao);
-            return dateB - dateA;
-        });
-        
-        // Aplicar filtro de status se houver
-        if (filaStatusFilter) {
-            jobsOrdenados = jobsOrdenados.filter(job => job.status === filaStatusFilter);
-        }
-        
-        appState.filaData = jobsOrdenados;
-        appState.filaTotalItems = jobsOrdenados.length;
-        appState.filaCurrentPage = 1; // Voltar para primeira página
-        
-        updateFilaTable();
-        updateFilaPagination();
-        await loadFilaStats(); // Adicionar carregamento das estatísticas
+        resetFilaPagination(); // Voltar para primeira página
+        await loadFilaPage();
     } catch (error) {
         console.error('Erro ao aplicar filtros:', error);
         utils.showNotification('Erro ao filtrar fila', 'error');
     }
 }
+
+// Total por status (chaves de /api/fila/stats) para o texto da paginação
+const FILA_STATS_KEYS = {
+    'pending': 'pendente',
+    'running': 'processando',
+    'completed': 'concluido',
+    'failed': 'erro'
+};
+
+async function loadFilaPage() {
+    // Página já visitada: continuar pelo cursor (ordenação e filtro feitos no servidor)
+    const pageIndex = appState.filaCurrentPage - 1;
+    const cursor = appState.filaCursors[pageIndex] || null;
+    const page = await api.fetchFilaJobsPage(
+        appState.filaItemsPerPage,
+        cursor ? 0 : pageIndex * appState.filaItemsPerPage,
+        { status: filaStatusFilter },
+        cursor
+    );
+    
+    appState.filaData = page.items;
+    appState.filaCursors.length = appState.filaCurrentPage;
+    appState.filaCursors.push(page.nextCursor);
+    
+    // Com eventos conectados as estatísticas chegam por fila_stats
+    const stats = (eventos.eventosConectados() && filaStats) || await loadFilaStats();
+    if (stats) {
+        appState.filaTotalItems = filaStatusFilter
+            ? (stats[FILA_STATS_KEYS[filaStatusFilter]] || 0)
+            : stats.total;
+    }
+    
+    updateFilaTable();
+    updateFilaPagination();
+}
@@ -5,6 +5,7 @@ class MensagensUI {
     constructor() {
         this.currentPage = 0;
         this.pageSize = 20;
+        this.cursors = [null]; // cursors[n] = cursor da página n (paginação por chave)
         this.filters = {
             empresa: '',
             assunto: '',
@@ -12,6 +13,7 @@ class MensagensUI {
             data_final: ''
         };
         this.totalMensagens = 0;
+        this.totalFiltrado = 0;
         this.empresas = [];
     }
 
@@ -41,6 +43,16 @@ class MensagensUI {
             }
         });
         
+        // Busca de empresas: recarrega as opções do select (typeahead na API)
+        const buscaEmpresa = document.getElementById('filter-empresa-busca');
+        if (buscaEmpresa) {
+            let timeout = null;
+            buscaEmpresa.addEventListener('input', () => {
+                clearTimeout(timeout);
+                timeout = setTimeout(() => this.loadEmpresas(buscaEmpresa.value.trim()), 250);
+            });
+        }
+        
         // Change nos selects e dates aplica os filtros automaticamente
         ['filter-empresa', 'filter-data-inicial', 'filter-data-final'].forEach(id => {
             const element = document.getElementById(id);
@@ -68,11 +80,17 @@ class MensagensUI {
             `;
             lucide.createIcons();
 
-            // Construir query params
+            // Construir query params (páginas já visitadas continuam pelo cursor)
+            const cursor = this.cursors[this.currentPage] || null;
             const params = new URLSearchParams({
                 limit: this.pageSize,
-                offset: this.currentPage * this.pageSize
+                offset: cursor ? 0 : this.currentPage * this.pageSize,
+                include_total: 'true',
+                resumo: 'true' // Conteúdo completo é carregado ao abrir a mensagem
             });
+            if (cursor) {
+                params.append('cursor', cursor);
+            }
 
             if (this.filters.empresa) {
                 params.append('inscricao_estadual', this.filters.empresa);
@@ -85,7 +103,11 @@ class MensagensUI {
             
             console.log('📡 URL da requisição:', `/api/mensagens?${params.toString()}`);
 
-            let mensagens = await api.get(`/api/mensagens?${params.toString()}`);
+            const page = await api.fetchPage(`/api/mensagens?${params.toString()}`);
+            let mensagens = page.items;
+            this.cursors.length = this.currentPage + 1;
+            this.cursors.push(page.nextCursor);
+            this.totalFiltrado = page.total;
             
             // Aplicar filtros de data no frontend
             if (mensagens && (this.filters.data_inicial || this.filters.data_final)) {
@@ -273,27 +295,31 @@ class MensagensUI {
     }
 
     /**
-     * Carrega lista de empresas para o dropdown
+     * Carrega lista de empresas para o dropdown (as que casam com a busca)
      */
-    async loadEmpresas() {
+    async loadEmpresas(busca = '') {
         try {
-            const empresas = await api.get('/api/empresas?limit=1000');
+            // Apenas id, nome e IE, já ordenadas por nome pela API
+            const empresas = await api.fetchEmpresaOptions(busca, 100);
             this.empresas = empresas || [];
             
             const select = document.getElementById('filter-empresa');
             if (select) {
-                // Limpar opções existentes (exceto "Todas")
+                // Limpar opções existentes (exceto "Todas"), mantendo a empresa filtrada
+                const selecionada = select.value;
                 select.innerHTML = '<option value="">Todas as empresas</option>';
                 
-                // Adicionar empresas ao select, ordenadas por nome
-                this.empresas
-                    .sort((a, b) => a.nome_empresa.localeCompare(b.nome_empresa))
-                    .forEach(empresa => {
-                        const option = document.createElement('option');
-                        option.value = empresa.inscricao_estadual || '';
-                        option.textContent = `${empresa.nome_empresa} - IE: ${empresa.inscricao_estadual}`;
-                        select.appendChild(option);
-                    });
+                // Adicionar empresas ao select
+                this.empresas.forEach(empresa => {
+                    const option = document.createElement('option');
+                    option.value = empresa.inscricao_estadual || '';
+                    option.textContent = `${empresa.nome_empresa} - IE: ${empresa.inscricao_estadual}`;
+                    select.appendChild(option);
+                });
+                
+                if (selecionada && Array.from(select.options).some(option => option.value === selecionada)) {
+                    select.value = selecionada;
+                }
                 
                 console.log(`✅ Carregadas ${this.empresas.length} empresas da tabela 'empresas'`);
             }
@@ -314,7 +340,7 @@ class MensagensUI {
             document.getElementById('total-mensagens').textContent = total;
 
             // Para calcular pendentes e lidas, buscar todas as mensagens
-            const allMensagens = await api.get(`/api/mensagens?limit=${total}`);
+            const allMensagens = await api.get(`/api/mensagens?limit=${total}&resumo=true`);
             
             const pendentes = allMensagens.filter(m => !m.data_ciencia || m.data_ciencia === 'N/A').length;
             const lidas = allMensagens.filter(m => m.data_ciencia && m.data_ciencia !== 'N/A').length;
@@ -332,17 +358,8 @@ class MensagensUI {
      */
     async updatePagination(currentCount) {
         try {
-            // Obter total com filtros aplicados
-            const params = new URLSearchParams();
-            if (this.filters.empresa) {
-                params.append('inscricao_estadual', this.filters.empresa);
-            }
-            if (this.filters.assunto) {
-                params.append('assunto', this.filters.assunto);
-            }
-
-            const countResponse = await api.get(`/api/mensagens/count?${params.toString()}`);
-            let total = countResponse.total || 0;
+            // Total com filtros aplicados (retornado junto com a página)
+            let total = this.totalFiltrado || 0;
             
             // Se há filtros de data, precisamos considerar a filtragem no frontend
             if (this.filters.data_inicial || this.filters.data_final) {
@@ -444,6 +461,11 @@ class MensagensUI {
      * Limpa os filtros
      */
     async clearFilters() {
+        const buscaEmpresa = document.getElementById('filter-empresa-busca');
+        if (buscaEmpresa && buscaEmpresa.value) {
+            buscaEmpresa.value = '';
+            await this.loadEmpresas();
+        }
         document.getElementById('filter-empresa').value = '';
         document.getElementById('filter-assunto').value = '';
         document.getElementById('filter-data-inicial').value = '';
@@ -9,6 +9,7 @@ export const appState = {
     currentPage: 1,
     itemsPerPage: 10,
     totalItems: 0,
+    consultasCursors: [null], // consultasCursors[n] = cursor da página n + 1
     currentFilters: {
         search: '',
         status: '',
@@ -31,6 +32,7 @@ export const appState = {
     filaCurrentPage: 1,
     filaItemsPerPage: 10,
     filaTotalItems: 0,
+    filaCursors: [null], // filaCursors[n] = cursor da página n + 1
     
     // Abas
     currentTab: 'consultas'
@@ -51,28 +51,29 @@ export function getStatusBadge(status) {
     }
 }
 
-export function getTVIBadge(tem_tvi) {
-    if (!tem_tvi) return '<span class="badge-info">N/A</span>';
-    
-    if (tem_tvi === 'SIM') {
-        return '<span class="badge-warning">Sim</span>';
-    } else if (tem_tvi === 'NÃO') {
-        return '<span class="badge-success">Não</span>';
-    } else {
-        return `<span class="badge-info">${tem_tvi}</span>`;
+export function getTVIBadge(consulta) {
+    // Colunas tipadas: tvi_status (enum) e tvi_saldo_centavos
+    switch (consulta.tvi_status) {
+        case 'com_tvi':
+            return consulta.tvi_saldo_centavos
+                ? `<span class="badge-warning">${formatCurrency(consulta.tvi_saldo_centavos / 100)}</span>`
+                : '<span class="badge-warning">Sim</span>';
+        case 'sem_tvi':
+            return '<span class="badge-success">Não</span>';
+        case 'erro':
+            return '<span class="badge-danger">Erro</span>';
+        case 'nao_verificado':
+            return '<span class="badge-info">Não verificado</span>';
+        default:
+            return '<span class="badge-info">N/A</span>';
     }
 }
 
-export function getDividasBadge(tem_divida) {
-    if (!tem_divida) return '<span class="badge-info">N/A</span>';
-    
-    if (tem_divida === 'SIM') {
-        return '<span class="badge-danger">Sim</span>';
-    } else if (tem_divida === 'NÃO') {
-        return '<span class="badge-success">Não</span>';
-    } else {
-        return `<span class="badge-info">${tem_divida}</span>`;
-    }
+export function getFlagBadge(flag) {
+    // Flags tipadas: true, false ou null (não verificado)
+    if (flag === true) return '<span class="badge-danger">Sim</span>';
+    if (flag === false) return '<span class="badge-success">Não</span>';
+    return '<span class="badge-info">N/A</span>';
 }
 
 export function getJobStatusBadge(status) {
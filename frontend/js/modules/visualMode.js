@@ -3,6 +3,7 @@ import * as api from './api.js';
 import { loadConsultas } from './consultas.js';
 import { updateDashboard } from './dashboard.js';
 import * as utils from './utils.js';
+import * as eventos from './eventos.js';
 
 // Configuração da extensão Chrome
 let EXTENSION_ID = localStorage.getItem('chrome_extension_id') || 'your-extension-id-here';
@@ -11,6 +12,36 @@ let EXTENSION_ID = localStorage.getItem('chrome_extension_id') || 'your-extensio
 let extensionAvailable = false;
 let visualModeEnabled = false;
 
+// Consulta headless em andamento (job_id devolvido pela API) e rótulos das etapas do bot
+let consultaJobId = null;
+const ETAPAS_CONSULTA = {
+    login: 'Fazendo login...',
+    menu: 'Abrindo menu Sistemas...',
+    formulario_ie: 'Preenchendo inscrição estadual...',
+    extracao: 'Extraindo dados da conta corrente...',
+    tvis: 'Verificando TVIs...',
+    dividas: 'Verificando dívidas pendentes...',
+    logout: 'Finalizando sessão...'
+};
+
+function atualizarProgressoConsulta(execucao) {
+    if (!consultaJobId || execucao.job_id !== consultaJobId) return;
+    const progressText = document.getElementById('consultaProgressText');
+    if (!progressText) return;
+    
+    if (execucao.status === 'running') {
+        progressText.textContent = ETAPAS_CONSULTA[execucao.etapa] || 'Executando consulta...';
+    } else {
+        progressText.textContent = execucao.status === 'completed' ? 'Consulta concluída!' : 'Erro na consulta';
+        consultaJobId = null;
+        loadConsultas();
+        setTimeout(() => {
+            const progressDiv = document.getElementById('consultaProgress');
+            if (progressDiv && !consultaJobId) progressDiv.classList.add('hidden');
+        }, 2000);
+    }
+}
+
 // Função para configurar o ID da extensão
 export function setExtensionId(id) {
     console.log('🔧 Configurando novo ID da extensão:', id);
@@ -563,10 +594,12 @@ async function executarConsulta(dados) {
             // Modo headless tradicional
             if (progressText) progressText.textContent = 'Executando consulta...';
             response = await api.executeConsulta(dados);
+            // Etapas chegam pelo evento "progresso" enquanto o bot executa
+            consultaJobId = eventos.eventosConectados() ? (response?.data?.job_id || null) : null;
         }
         
         // Sucesso
-        if (progressText) progressText.textContent = 'Consulta concluída!';
+        if (progressText && !consultaJobId) progressText.textContent = 'Consulta concluída!';
         
         // Limpar formulário
         document.getElementById('consultaForm').reset();
@@ -585,7 +618,8 @@ async function executarConsulta(dados) {
     } finally {
         // Ocultar progresso
         setTimeout(() => {
-            if (progressDiv) progressDiv.classList.add('hidden');
+            // Com job em andamento o progresso some ao receber a etapa final
+            if (progressDiv && !consultaJobId) progressDiv.classList.add('hidden');
             if (submitBtn) {
                 submitBtn.disabled = false;
                 submitBtn.innerHTML = '<i data-lucide="play" class="h-4 w-4 mr-2"></i>Executar';
@@ -670,6 +704,10 @@ export async function initVisualMode() {
     updateExtensionStatus();
     setupVisualModeEvents();
     
+    if (eventos.conectarEventos()) {
+        eventos.onEvento('progresso', atualizarProgressoConsulta);
+    }
+    
     // Verificar extensão periodicamente (reduzido para 30s para evitar sobrecarga)
     setInterval(async () => {
         const wasAvailable = extensionAvailable;
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Aplica as políticas de retenção ao banco (ver src/database/retention.py).
+
+Consultas e jobs antigos são movidos para bancos de arquivo anuais e o
+espaço liberado é devolvido com incremental_vacuum. Os parâmetros vêm do
+ambiente (RETENCAO_*) e podem ser sobrescritos pela linha de comando.
+
+Uso:
+    python scripts/aplicar_retencao.py --db sefaz_consulta.db --dry-run
+    python scripts/aplicar_retencao.py --consultas-por-ie 6 --dias-jobs 15
+    python scripts/aplicar_retencao.py --converter-vacuum   # uma vez, em bancos antigos
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.retention import PoliticaRetencao, aplicar_retencao, converter_vacuum_incremental
+
+
+def main():
+    politica = PoliticaRetencao.do_ambiente()
+
+    parser = argparse.ArgumentParser(description="Move dados antigos para os bancos de arquivo")
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'sefaz_consulta.db'), help="Banco SQLite")
+    parser.add_argument('--consultas-por-ie', type=int, default=politica.consultas_por_ie,
+                        help="Últimas consultas mantidas por IE (<= 0 desativa)")
+    parser.add_argument('--meses-snapshot', type=int, default=politica.meses_snapshot,
+                        help="Meses com a última consulta do mês mantida")
+    parser.add_argument('--dias-jobs', type=int, default=politica.dias_jobs,
+                        help="Dias até arquivar jobs concluídos (<= 0 desativa)")
+    parser.add_argument('--dias-html-mensagens', type=int, default=politica.dias_html_mensagens,
+                        help="Dias até comprimir o HTML das mensagens (<= 0 desativa)")
+    parser.add_argument('--dir', default=politica.diretorio, help="Diretório dos bancos de arquivo")
+    parser.add_argument('--dry-run', action='store_true', help="Apenas mostra as quantidades")
+    parser.add_argument('--converter-vacuum', action='store_true',
+                        help="Ativa auto_vacuum=INCREMENTAL com um VACUUM completo e sai")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ Banco não encontrado: {args.db}")
+        sys.exit(1)
+
+    if args.converter_vacuum:
+        print(f"🔧 Convertendo {args.db} para vacuum incremental (VACUUM completo)...")
+        converter_vacuum_incremental(args.db)
+        print("✅ Conversão concluída")
+        return
+
+    politica = PoliticaRetencao(
+        consultas_por_ie=args.consultas_por_ie,
+        meses_snapshot=args.meses_snapshot,
+        dias_jobs=args.dias_jobs,
+        dias_html_mensagens=args.dias_html_mensagens,
+        diretorio=args.dir,
+        lote=politica.lote,
+        paginas_vacuum=politica.paginas_vacuum,
+    )
+
+    print(f"📦 Aplicando retenção em {args.db} (arquivo: {politica.diretorio_arquivo(args.db)})")
+    if args.dry_run:
+        print("🔎 Modo dry-run: nenhuma alteração será gravada")
+
+    resumo = aplicar_retencao(args.db, politica, dry_run=args.dry_run)
+    for chave, valor in resumo.items():
+        print(f"   {chave}: {valor}")
+    print("✅ Concluído")
+
+
+if __name__ == '__main__':
+    main()
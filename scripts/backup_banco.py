@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Backup online do banco (API de backup do SQLite, ver src/database/backup.py).
+
+Os snapshots podem ser criados com a API e os bots em execução; a
+restauração exige tudo parado (o banco atual é salvo antes).
+
+Uso:
+    python scripts/backup_banco.py criar
+    python scripts/backup_banco.py listar
+    python scripts/backup_banco.py verificar backups/sefaz_consulta_20250101_120000_000000.db
+    python scripts/backup_banco.py restaurar backups/sefaz_consulta_20250101_120000_000000.db
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.backup import (
+    BackupError,
+    PoliticaBackup,
+    criar_backup,
+    listar_backups,
+    restaurar_backup,
+    verificar_backup,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup online do banco SQLite")
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'sefaz_consulta.db'), help="Banco SQLite")
+    parser.add_argument('--dir', default=None, help="Diretório dos snapshots (padrão: BACKUP_DIR ou <pasta do banco>/backups)")
+    parser.add_argument('--manter', type=int, default=None, help="Snapshots mantidos na rotação")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('criar', help="Cria um snapshot")
+    sub.add_parser('listar', help="Lista os snapshots")
+    verificar = sub.add_parser('verificar', help="Verifica a integridade de um snapshot")
+    verificar.add_argument('arquivo')
+    restaurar = sub.add_parser('restaurar', help="Restaura um snapshot (pare a API e os bots antes)")
+    restaurar.add_argument('arquivo')
+    restaurar.add_argument('--sim', action='store_true', help="Não pedir confirmação")
+    args = parser.parse_args()
+
+    politica = PoliticaBackup.do_ambiente()
+    if args.dir:
+        politica.diretorio = args.dir
+    if args.manter:
+        politica.manter = max(1, args.manter)
+
+    try:
+        if args.comando == 'criar':
+            if not os.path.exists(args.db):
+                print(f"❌ Banco não encontrado: {args.db}")
+                sys.exit(1)
+            resumo = criar_backup(args.db, politica)
+            print(f"✅ Backup criado: {resumo['caminho']} ({resumo['tamanho']} bytes em {resumo['duracao']}s)")
+            for removido in resumo['removidos']:
+                print(f"   🗑️ Removido pela rotação: {removido}")
+
+        elif args.comando == 'listar':
+            snapshots = listar_backups(args.db, politica)
+            if not snapshots:
+                print(f"ℹ️  Nenhum backup em {politica.diretorio_backup(args.db)}")
+            for snapshot in snapshots:
+                print(f"   {snapshot['data']}  {snapshot['tamanho']:>12} bytes  {snapshot['caminho']}")
+
+        elif args.comando == 'verificar':
+            problemas = verificar_backup(args.arquivo)
+            if problemas:
+                print(f"❌ {args.arquivo} inválido:")
+                for problema in problemas[:20]:
+                    print(f"   - {problema}")
+                sys.exit(1)
+            print(f"✅ {args.arquivo} íntegro")
+
+        elif args.comando == 'restaurar':
+            if not args.sim:
+                resposta = input(f"⚠️ Sobrescrever {args.db} com {args.arquivo}? A API e os bots devem estar parados. [s/N] ")
+                if resposta.strip().lower() not in ('s', 'sim'):
+                    print("Cancelado")
+                    return
+            resultado = restaurar_backup(args.arquivo, args.db, politica)
+            print(f"✅ Banco restaurado de {resultado['restaurado']}")
+            if resultado['backup_anterior']:
+                print(f"   💾 Banco anterior salvo em {resultado['backup_anterior']}")
+
+    except BackupError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
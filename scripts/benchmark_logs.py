@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark do custo de logar por chamada com vários workers simultâneos.
+
+Compara, com 1, 8 e 32 threads logando ao mesmo tempo (mensagens INFO com
+contexto de job) numa saída lenta (``--latencia-us`` por escrita, como um
+terminal ou o pipe de logs do container sob carga):
+- caminho antigo: ``StreamHandler`` síncrono (cada chamada disputa o lock
+  do handler e espera a escrita)
+- pipeline: ``configurar_logs`` (src/bot/utils/logs.py) — o chamador só
+  formata, redige e enfileira; a escrita fica na thread do listener e,
+  com a fila cheia, o registro é descartado e contado
+
+O tempo reportado é o custo agregado por chamada (µs): tempo total dos
+workers dividido pelo número de chamadas. No caminho síncrono ele fica preso
+à latência da saída; no pipeline, só ao custo de CPU de formatar e enfileirar.
+
+Uso:
+    python scripts/benchmark_logs.py
+    python scripts/benchmark_logs.py --mensagens 2000 --workers 1 8 32 --latencia-us 100
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.bot.utils.logs import configurar_logs, contexto_log, encerrar_logs, hash_cpf
+from src.bot.utils.metricas import metricas
+
+
+class _SaidaLenta:
+    """Arquivo em que cada escrita demora ``latencia`` segundos"""
+
+    def __init__(self, caminho: str, latencia: float):
+        self.arquivo = open(caminho, 'w', encoding='utf-8')
+        self.latencia = latencia
+
+    def write(self, texto: str) -> int:
+        time.sleep(self.latencia)
+        return self.arquivo.write(texto)
+
+    def flush(self) -> None:
+        self.arquivo.flush()
+
+    def close(self) -> None:
+        self.arquivo.close()
+
+
+def _rodar(workers: int, mensagens: int) -> float:
+    """µs por chamada de logger.info (tempo total / chamadas de todos os workers)"""
+    logger = logging.getLogger('benchmark')
+    barreira = threading.Barrier(workers)
+    tempos: List[float] = []
+
+    def worker(indice: int) -> None:
+        with contexto_log(job_id=indice, cpf_hash=hash_cpf(f"{indice:011d}"), etapa='extracao'):
+            barreira.wait()
+            inicio = time.perf_counter()
+            for i in range(mensagens):
+                logger.info(f"📊 Campo {i} extraído: valor={i * 3}")
+            tempos.append(time.perf_counter() - inicio)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return max(tempos) / (workers * mensagens) * 1e6
+
+
+def _configurar_sincrono(saida: _SaidaLenta) -> None:
+    encerrar_logs()
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    handler = logging.StreamHandler(saida)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    raiz.addHandler(handler)
+    raiz.setLevel(logging.INFO)
+
+
+def _descartados() -> float:
+    contador = metricas.contador('sefaz_logs_descartados_total', 'Registros de log descartados (fila cheia)')
+    return sum(contador._valores.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de logs")
+    parser.add_argument('--mensagens', type=int, default=2000, help="mensagens por worker")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--latencia-us', type=float, default=50, help="latência de cada escrita na saída")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='benchmark_logs_')
+    latencia = args.latencia_us / 1e6
+    stderr = sys.stderr
+    print(f"\n📊 {args.mensagens} mensagens por worker, {args.latencia_us:g} µs por escrita, arquivos em {pasta}\n")
+    print(f"   {'workers':>7} | {'síncrono (µs)':>13} | {'pipeline (µs)':>13} | {'descartados':>11}")
+
+    for workers in args.workers:
+        saida = _SaidaLenta(os.path.join(pasta, f"sincrono_{workers}.log"), latencia)
+        _configurar_sincrono(saida)
+        sincrono = _rodar(workers, args.mensagens)
+        logging.getLogger().handlers.clear()
+        saida.close()
+
+        # O pipeline escreve no stderr: aponta-o para a mesma saída lenta
+        saida = _SaidaLenta(os.path.join(pasta, f"pipeline_{workers}.log"), latencia)
+        sys.stderr = saida
+        descartados = _descartados()
+        try:
+            configurar_logs(formato='json', nivel='INFO', niveis_modulos={}, arquivo='', forcar=True)
+            pipeline = _rodar(workers, args.mensagens)
+            encerrar_logs()
+        finally:
+            sys.stderr = stderr
+            saida.close()
+        descartados = _descartados() - descartados
+
+        print(f"   {workers:>7} | {sincrono:>13.1f} | {pipeline:>13.1f} | {descartados:>11.0f}")
+
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark da serialização e da compressão das listagens (10k linhas).
+
+Compara, para consultas e mensagens (com ``conteudo_html``):
+- caminho antigo: validação de um modelo Pydantic por linha + ``json``
+  (o que o FastAPI faz com ``response_model``)
+- caminho rápido: dicionários direto de ``sqlite3.Row`` + ``RespostaJSON``
+  (orjson quando instalado, ver src/api/respostas.py)
+
+e o tamanho do corpo sem compressão, com gzip e com brotli (se instalado).
+
+Uso:
+    python scripts/benchmark_respostas.py
+    python scripts/benchmark_respostas.py --linhas 10000 --repeticoes 5
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+
+from src.api.compressao import CompressaoMiddleware, _Compressor, brotli
+from src.api.main import CONSULTA_CAMPOS, CONSULTA_FLAGS, ConsultaResponse, MensagemResponse
+from src.api.respostas import RespostaJSON, linhas_para_dicts, orjson
+
+MENSAGEM_CAMPOS = tuple(MensagemResponse.model_fields)
+
+
+def _criar_banco(linhas: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"CREATE TABLE consultas (id INTEGER PRIMARY KEY, {', '.join(c for c in CONSULTA_CAMPOS if c != 'id')})")
+    conn.execute(f"CREATE TABLE mensagens (id INTEGER PRIMARY KEY, {', '.join(c for c in MENSAGEM_CAMPOS if c != 'id')})")
+
+    rnd = random.Random(42)
+    consultas, mensagens = [], []
+    for i in range(1, linhas + 1):
+        ie = f"{rnd.randrange(10**8, 10**9)}"
+        debitos = rnd.choice([None, 0, rnd.randrange(1, 10**7)])
+        consultas.append((
+            i, f"EMPRESA {i} LTDA", f"{rnd.randrange(10**13, 10**14)}", ie, f"{rnd.randrange(10**10, 10**11)}",
+            None, rnd.choice(['ATIVO', 'SUSPENSO']), rnd.choice(['SIM', 'NÃO']),
+            debitos / 100 if debitos else debitos, rnd.choice(['SIM', 'NÃO']), 'NÃO', 'NÃO',
+            f"2025-0{rnd.randrange(1, 10)}-1{rnd.randrange(0, 10)} 10:00:00",
+            rnd.choice(['com_tvi', 'sem_tvi']), None, debitos, rnd.randint(0, 1), 0, 0,
+        ))
+        corpo = f"Prezado contribuinte, a mensagem {i} trata da DIEF de {ie}. " * 6
+        html = (
+            "<table class='tabela'><tr><th>Enviada por:</th><td>SEFAZ</td></tr>"
+            f"<tr><th>Assunto:</th><td>Mensagem {i}</td></tr></table>"
+            f"<div class='conteudo'><p>{corpo}</p></div>"
+        )
+        mensagens.append((
+            i, ie, f"EMPRESA {i} LTDA", 'SEFAZ/MA', '2025-01-10', f"Aviso {i}", 'Informativo', 'ICMS',
+            'DIEF', f"{i:08d}", None, '01/2025', 'ENTREGUE', None, None, '2025-01-11', None,
+            corpo, html, None, None,
+        ))
+
+    conn.executemany(f"INSERT INTO consultas VALUES ({', '.join('?' * len(CONSULTA_CAMPOS))})", consultas)
+    conn.executemany(f"INSERT INTO mensagens VALUES ({', '.join('?' * len(MENSAGEM_CAMPOS))})", mensagens)
+    return conn
+
+
+def _caminho_antigo(modelo, rows: List[sqlite3.Row], campos) -> bytes:
+    """Modelo por linha + validação do response_model + json (como o FastAPI)"""
+    adaptador = TypeAdapter(List[modelo])
+    objetos = adaptador.validate_python([{c: row[c] for c in campos} for row in rows])
+    dados = adaptador.dump_python(objetos, mode='json')
+    return json.dumps(dados, ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode('utf-8')
+
+
+def _caminho_rapido(rows: List[sqlite3.Row], campos, booleanos=()) -> bytes:
+    return RespostaJSON(linhas_para_dicts(rows, campos, booleanos)).body
+
+
+def _cronometrar(funcao, repeticoes: int) -> float:
+    """Menor tempo de CPU (ms) entre as repetições"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.process_time()
+        funcao()
+        melhor = min(melhor, time.process_time() - inicio)
+    return melhor * 1000
+
+
+def _tamanhos(corpo: bytes) -> str:
+    partes = [f"bruto {len(corpo) / 1024:,.0f} KiB"]
+    for codificacao in ('gzip', 'br'):
+        if codificacao == 'br' and brotli is None:
+            continue
+        inicio = time.process_time()
+        comprimido = _Compressor(codificacao, 6, 4).comprimir_tudo(corpo)
+        ms = (time.process_time() - inicio) * 1000
+        partes.append(f"{codificacao} {len(comprimido) / 1024:,.0f} KiB ({len(comprimido) / len(corpo):.0%}, {ms:.0f} ms)")
+    return " | ".join(partes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da serialização/compressão das listagens")
+    parser.add_argument('--linhas', type=int, default=10000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    conn = _criar_banco(args.linhas)
+    print(f"\n📊 {args.linhas} linhas, melhor de {args.repeticoes} (tempo de CPU)")
+    print(f"   JSON rápido: {'orjson' if orjson is not None else 'json (orjson não instalado)'}")
+    print(f"   Compressão: gzip{' + brotli' if brotli is not None else ' (brotli não instalado)'}, "
+          f"limite {CompressaoMiddleware(None).minimo_bytes} bytes\n")
+
+    casos = [
+        ('consultas', "SELECT * FROM consultas", ConsultaResponse, CONSULTA_CAMPOS, CONSULTA_FLAGS),
+        ('mensagens', "SELECT * FROM mensagens", MensagemResponse, MENSAGEM_CAMPOS, ()),
+    ]
+    for nome, sql, modelo, campos, booleanos in casos:
+        rows = conn.execute(sql).fetchall()
+        antigo = _cronometrar(lambda: _caminho_antigo(modelo, rows, campos), args.repeticoes)
+        rapido = _cronometrar(lambda: _caminho_rapido(rows, campos, booleanos), args.repeticoes)
+        corpo = _caminho_rapido(rows, campos, booleanos)
+        assert json.loads(corpo) == json.loads(_caminho_antigo(modelo, rows, campos)), "Respostas diferentes"
+
+        print(f"🔹 {nome}")
+        print(f"   serialização: modelo por linha {antigo:,.0f} ms -> rápido {rapido:,.0f} ms ({antigo / rapido:.1f}x)")
+        print(f"   tamanho: {_tamanhos(corpo)}\n")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Re-extrai as colunas derivadas a partir do arquivo de páginas SEFAZ.
+
+Aplica as regras atuais de src/bot/utils/extraction_rules.py sobre as
+páginas arquivadas (paginas_arquivadas) e atualiza, sem abrir navegador:
+
+- consultas.tem_tvi            (página de TVIs, e tvi_status/tvi_saldo_centavos)
+- consultas.valor_debitos      (página de Dívidas Pendentes, e debitos_centavos)
+- mensagens_sefaz.*_dief       (texto da mensagem)
+- mensagens_sefaz.link_recibo  (HTML arquivado da mensagem)
+
+A descompressão e o parsing rodam em um pool de processos; o processo
+principal é o único que escreve no banco, em lotes.
+
+Uso:
+    python scripts/reextrair_paginas.py --db sefaz_consulta.db --tipo todos --workers 4
+    python scripts/reextrair_paginas.py --tipo mensagens --dry-run
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.bot.utils.extraction_rules import (
+    extrair_saldo_tvi,
+    extrair_valor_dividas,
+    extrair_dados_dief,
+    extrair_link_recibo,
+)
+from src.database.consulta_tipos import centavos, tipar_tvi
+from src.database.page_archive import ARCHIVE_TABLE, descomprimir
+
+CAMPOS_DIEF = ('competencia_dief', 'status_dief', 'chave_dief', 'protocolo_dief')
+
+
+def _html(pagina):
+    """Descomprime uma página (codec, blob) recebida do processo principal"""
+    if not pagina:
+        return None
+    codec, conteudo = pagina
+    return descomprimir(conteudo, codec).decode('utf-8')
+
+
+def reextrair_consulta(tarefa):
+    """Worker: aplica as regras de TVI e dívidas às páginas de uma consulta"""
+    consulta_id, pagina_tvi, pagina_dividas = tarefa
+    campos = {}
+
+    html_tvi = _html(pagina_tvi)
+    if html_tvi is not None:
+        campos['tem_tvi'] = extrair_saldo_tvi(html_tvi)
+        campos['tvi_status'], campos['tvi_saldo_centavos'] = tipar_tvi(campos['tem_tvi'])
+
+    html_dividas = _html(pagina_dividas)
+    if html_dividas is not None:
+        campos['valor_debitos'] = extrair_valor_dividas(html_dividas)
+        campos['debitos_centavos'] = centavos(campos['valor_debitos'])
+
+    return consulta_id, campos
+
+
+def reextrair_mensagem(tarefa):
+    """Worker: aplica as regras de DIEF e recibo a uma mensagem"""
+    mensagem_id, conteudo_texto, pagina, conteudo_html = tarefa
+    campos = dict(extrair_dados_dief(conteudo_texto))
+
+    html = _html(pagina) or conteudo_html
+    link = extrair_link_recibo(html)
+    if link:
+        campos['link_recibo'] = link
+
+    return mensagem_id, campos
+
+
+def _colunas(conn, tabela):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+def _carregar_blobs(conn, hashes):
+    """Busca (codec, conteudo) das páginas de um lote"""
+    hashes = [h for h in set(hashes) if h]
+    if not hashes:
+        return {}
+    placeholders = ', '.join('?' for _ in hashes)
+    rows = conn.execute(
+        f"SELECT hash, codec, conteudo FROM {ARCHIVE_TABLE} WHERE hash IN ({placeholders})",
+        hashes
+    )
+    return {h: (codec, bytes(conteudo)) for h, codec, conteudo in rows}
+
+
+def _aplicar(conn, tabela, atuais, resultados, dry_run):
+    """Grava apenas os campos que mudaram; retorna a quantidade de linhas alteradas"""
+    alteradas = 0
+    for registro_id, campos in resultados:
+        mudancas = {
+            campo: valor for campo, valor in campos.items()
+            if campo in atuais[registro_id] and atuais[registro_id][campo] != valor
+        }
+        if not mudancas:
+            continue
+
+        alteradas += 1
+        if dry_run:
+            print(f"   🔎 {tabela} ID {registro_id}: {mudancas}")
+            continue
+
+        sets = ', '.join(f"{campo} = ?" for campo in mudancas)
+        conn.execute(
+            f"UPDATE {tabela} SET {sets} WHERE id = ?",
+            [*mudancas.values(), registro_id]
+        )
+    return alteradas
+
+
+def _processar(conn, pool, tabela, sql, colunas_hash, montar_tarefa, worker, lote, dry_run):
+    """Lê a tabela em lotes, distribui ao pool e grava os resultados"""
+    leitura = conn.cursor()
+    leitura.execute(sql)
+
+    total = alteradas = 0
+    while True:
+        rows = leitura.fetchmany(lote)
+        if not rows:
+            break
+
+        blobs = _carregar_blobs(conn, [row[coluna] for row in rows for coluna in colunas_hash])
+        atuais = {row['id']: dict(row) for row in rows}
+        tarefas = [montar_tarefa(row, blobs) for row in rows]
+
+        resultados = list(pool.map(worker, tarefas, chunksize=max(1, len(tarefas) // 16)))
+        alteradas += _aplicar(conn, tabela, atuais, resultados, dry_run)
+        total += len(rows)
+
+        if not dry_run:
+            conn.commit()
+        print(f"   ⏳ {tabela}: {total} processadas, {alteradas} alteradas")
+
+    return total, alteradas
+
+
+def reextrair_consultas(conn, pool, lote, dry_run):
+    colunas = _colunas(conn, 'consultas')
+    if 'pagina_tvi_hash' not in colunas:
+        print("ℹ️  consultas sem colunas de páginas arquivadas - nada a fazer")
+        return 0, 0
+
+    tipadas = [c for c in ('tvi_status', 'tvi_saldo_centavos', 'debitos_centavos') if c in colunas]
+    sql = f"""
+        SELECT id, tem_tvi, valor_debitos, pagina_tvi_hash, pagina_dividas_hash
+               {''.join(f', {c}' for c in tipadas)}
+        FROM consultas
+        WHERE pagina_tvi_hash IS NOT NULL OR pagina_dividas_hash IS NOT NULL
+        ORDER BY id
+    """
+
+    def montar(row, blobs):
+        return (row['id'], blobs.get(row['pagina_tvi_hash']), blobs.get(row['pagina_dividas_hash']))
+
+    return _processar(conn, pool, 'consultas', sql, ('pagina_tvi_hash', 'pagina_dividas_hash'), montar, reextrair_consulta, lote, dry_run)
+
+
+def reextrair_mensagens(conn, pool, lote, dry_run):
+    colunas = _colunas(conn, 'mensagens_sefaz')
+    if not colunas:
+        print("ℹ️  Tabela mensagens_sefaz não encontrada - nada a fazer")
+        return 0, 0
+
+    extras = [c for c in (*CAMPOS_DIEF, 'link_recibo', 'conteudo_html') if c in colunas]
+    hash_expr = 'pagina_hash' if 'pagina_hash' in colunas else 'NULL'
+    sql = f"""
+        SELECT id, conteudo_mensagem, {hash_expr} AS pagina_hash
+               {''.join(f', {c}' for c in extras)}
+        FROM mensagens_sefaz
+        WHERE {hash_expr} IS NOT NULL OR conteudo_mensagem IS NOT NULL
+        ORDER BY id
+    """
+
+    def montar(row, blobs):
+        conteudo_html = row['conteudo_html'] if 'conteudo_html' in extras else None
+        return (row['id'], row['conteudo_mensagem'], blobs.get(row['pagina_hash']), conteudo_html)
+
+    return _processar(conn, pool, 'mensagens_sefaz', sql, ('pagina_hash',), montar, reextrair_mensagem, lote, dry_run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-extrai colunas derivadas a partir das páginas arquivadas")
+    parser.add_argument('--db', default='sefaz_consulta.db', help="Banco SQLite (padrão: sefaz_consulta.db)")
+    parser.add_argument('--tipo', choices=['consultas', 'mensagens', 'todos'], default='todos')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processos do pool")
+    parser.add_argument('--lote', type=int, default=500, help="Linhas lidas e gravadas por lote")
+    parser.add_argument('--dry-run', action='store_true', help="Apenas mostra as alterações")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ Banco não encontrado: {args.db}")
+        sys.exit(1)
+
+    print(f"🔄 Re-extraindo páginas de {args.db} ({args.workers} processo(s), lote {args.lote})")
+    if args.dry_run:
+        print("🔎 Modo dry-run: nenhuma alteração será gravada")
+
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    inicio = time.time()
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            if args.tipo in ('consultas', 'todos'):
+                total, alteradas = reextrair_consultas(conn, pool, args.lote, args.dry_run)
+                print(f"✅ Consultas: {alteradas} de {total} atualizadas")
+
+            if args.tipo in ('mensagens', 'todos'):
+                total, alteradas = reextrair_mensagens(conn, pool, args.lote, args.dry_run)
+                print(f"✅ Mensagens: {alteradas} de {total} atualizadas")
+    finally:
+        conn.close()
+
+    print(f"⏱️  Concluído em {time.time() - inicio:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
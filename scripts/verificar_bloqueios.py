@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Verifica se os endpoints de leitura bloqueiam o event loop da API.
+
+Sobe a API em processo (TestClient) com um banco temporário populado,
+liga o monitor do loop (src/api/monitor_loop.py) com amostragem curta e
+chama as listagens, contagens e estatísticas. Falha (código de saída 1)
+se o loop ficar parado por mais de ``--limite-ms`` em alguma delas,
+mostrando o local e a pilha de cada bloqueio.
+
+Uso:
+    python scripts/verificar_bloqueios.py
+    python scripts/verificar_bloqueios.py --limite-ms 50 --linhas 20000
+
+Também roda como teste automatizado (tests/unit/test_bloqueios.py).
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ENDPOINTS = (
+    '/api/empresas?limit=100',
+    '/api/empresas/count',
+    '/api/empresas?search=EMPRESA 1&limit=100',
+    '/api/consultas?limit=100',
+    '/api/consultas/count',
+    '/api/mensagens?limit=50',
+    '/api/mensagens/count',
+    '/api/mensagens?search=DIEF&limit=50',
+    '/api/fila',
+    '/api/fila/stats',
+    '/api/estatisticas',
+    '/readyz',
+)
+
+
+def popular_banco(db_path: str, linhas: int) -> None:
+    """Empresas, consultas e mensagens sintéticas (schema do bot + startup da API)"""
+    rnd = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    empresas, consultas, mensagens = [], [], []
+    for i in range(1, linhas + 1):
+        ie = f"{100000000 + i}"
+        empresas.append((f"EMPRESA {i} LTDA", f"{10**13 + i}", ie, f"{10**10 + i}", 'senha'))
+        consultas.append((
+            f"EMPRESA {i} LTDA", f"{10**13 + i}", ie, f"{10**10 + i}", rnd.choice(['ATIVO', 'SUSPENSO']),
+            rnd.choice(['SIM', 'NÃO']), rnd.randrange(0, 10**6) / 100, 'NÃO', 'NÃO', 'NÃO',
+            f"2025-0{rnd.randrange(1, 10)}-1{rnd.randrange(0, 10)} 10:00:00",
+        ))
+        mensagens.append((ie, 'SEFAZ/MA', '2025-01-10', f"Aviso {i}", f"Mensagem {i} sobre a DIEF de {ie}. " * 5))
+    conn.executemany(
+        "INSERT INTO empresas (nome_empresa, cnpj, inscricao_estadual, cpf_socio, senha) VALUES (?, ?, ?, ?, ?)",
+        empresas
+    )
+    conn.executemany("""
+        INSERT INTO consultas (nome_empresa, cnpj, inscricao_estadual, cpf_socio, status_ie, tem_tvi,
+                               valor_debitos, tem_divida_pendente, omisso_declaracao, inscrito_restritivo, data_consulta)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, consultas)
+    conn.executemany("""
+        INSERT INTO mensagens_sefaz (inscricao_estadual, enviada_por, data_envio, assunto, conteudo_mensagem)
+        VALUES (?, ?, ?, ?, ?)
+    """, mensagens)
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica bloqueios do event loop nos endpoints")
+    parser.add_argument('--limite-ms', type=float, default=100.0,
+                        help="Tempo máximo com o loop parado (padrão: 100 ms)")
+    parser.add_argument('--linhas', type=int, default=5000,
+                        help="Empresas/consultas/mensagens no banco de teste (padrão: 5000)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='verificar_bloqueios_') as pasta:
+        os.environ['DB_PATH'] = os.path.join(pasta, 'api.db')
+        os.environ['CACHE_HTTP_TTL'] = '0'
+        os.environ['LOOP_AMOSTRAGEM_MS'] = '5'
+        os.environ['LOOP_BLOQUEIO_MS'] = str(args.limite_ms)
+        os.environ.setdefault('LOG_NIVEL', 'WARNING')
+        os.chdir(RAIZ)  # arquivos estáticos montados com caminho relativo
+
+        from fastapi.testclient import TestClient
+        from src.api.main import app, monitor_loop, notify_write
+        from src.bot.sefaz_bot import SEFAZBot
+
+        # Tabelas de consultas/mensagens no formato gravado pelo bot
+        SEFAZBot(db_path=os.environ['DB_PATH'])
+
+        falhas = []
+        with TestClient(app) as cliente:
+            popular_banco(os.environ['DB_PATH'], args.linhas)
+            notify_write('empresas', 'consultas', 'mensagens_sefaz')
+
+            for endpoint in ENDPOINTS:
+                antes = len(monitor_loop.bloqueios)
+                resposta = cliente.get(endpoint)
+                time.sleep(0.05)  # a amostragem seguinte registra a duração do bloqueio
+                novos = monitor_loop.bloqueios[antes:]
+                maior = max((b['duracao_ms'] or 0 for b in novos), default=0)
+                print(f"{'❌' if novos else '✅'} {endpoint}: HTTP {resposta.status_code}"
+                      + (f", loop bloqueado {maior} ms" if novos else ""))
+                for bloqueio in novos:
+                    falhas.append(f"{endpoint}: {bloqueio['duracao_ms']} ms em {bloqueio['local']}\n{bloqueio['pilha']}")
+
+            resumo = monitor_loop.resumo()
+
+    print(f"\n⏱️  atraso máximo do loop: {resumo['atraso_maximo_ms']:.0f} ms "
+          f"(limite {args.limite_ms:.0f} ms, {args.linhas} linhas)")
+    if falhas:
+        for falha in falhas:
+            print(f"\n❌ {falha}")
+        sys.exit(1)
+
+    print("✅ Nenhum endpoint bloqueou o event loop")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Verifica o tempo de importação da API (orçamento de inicialização).
+
+Importa ``src.api.main`` em um processo novo com ``python -X importtime``
+e falha (código de saída 1) se:
+- o custo próprio da API (importação de ``src.api.main`` menos a do
+  ``fastapi``, que inclui pydantic e starlette) passar do limite. A maior
+  parte dele é o FastAPI montando os schemas das rotas e modelos;
+- o tempo total passar do teto (folgado: a importação do framework varia
+  bastante com a máquina e a carga);
+- algum módulo pesado for carregado na importação (Playwright, bots,
+  cryptography), que devem ser importados só no primeiro job;
+- a importação criar o arquivo do banco (o schema é criado no startup).
+
+Uso:
+    python scripts/verificar_importacao.py
+    python scripts/verificar_importacao.py --limite-proprio-ms 400 --execucoes 5
+
+Também roda como teste automatizado (tests/unit/test_importacao.py).
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+MODULO_API = 'src.api.main'
+MODULO_FRAMEWORK = 'fastapi'
+
+# Carregados apenas quando o primeiro job/consulta executa
+MODULOS_PROIBIDOS = (
+    'playwright',
+    'src.bot.sefaz_bot',
+    'src.bot.message_bot',
+    'cryptography',
+)
+
+
+def medir_importacao(db_path: str):
+    """
+    Importa a API em um subprocesso
+
+    Returns:
+        (tempo total em ms, tempo do framework em ms, conjunto de módulos carregados)
+    """
+    env = dict(os.environ, DB_PATH=db_path, PYTHONDONTWRITEBYTECODE='1')
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {MODULO_API}'],
+        cwd=RAIZ, env=env, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {MODULO_API}:\n{processo.stderr[-2000:]}")
+
+    tempos = {}
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, nome = linha[len('import time:'):].split('|')
+        tempos[nome.strip()] = int(acumulado) / 1000
+    return tempos[MODULO_API], tempos.get(MODULO_FRAMEWORK, 0.0), set(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica o tempo de importação da API")
+    parser.add_argument('--limite-proprio-ms', type=float, default=500.0,
+                        help="Tempo máximo de importação sem o framework (padrão: 500 ms)")
+    parser.add_argument('--limite-ms', type=float, default=2000.0,
+                        help="Teto do tempo total de importação (padrão: 2000 ms)")
+    parser.add_argument('--execucoes', type=int, default=3,
+                        help="Importações medidas; vale a mais rápida (padrão: 3)")
+    args = parser.parse_args()
+
+    falhas = []
+    with tempfile.TemporaryDirectory(prefix='verificar_importacao_') as pasta:
+        db_path = os.path.join(pasta, 'api.db')
+        medicoes = []
+        for _ in range(max(1, args.execucoes)):
+            total, framework, modulos = medir_importacao(db_path)
+            medicoes.append((total - framework, total))
+
+        proprio = min(proprio for proprio, _ in medicoes)
+        total = min(total for _, total in medicoes)
+        print(f"⏱️  import {MODULO_API}: {proprio:.0f} ms sem o {MODULO_FRAMEWORK} "
+              f"(limite {args.limite_proprio_ms:.0f} ms), {total:.0f} ms no total "
+              f"(teto {args.limite_ms:.0f} ms; medições: {', '.join(f'{p:.0f}/{t:.0f}' for p, t in medicoes)})")
+        if proprio > args.limite_proprio_ms:
+            falhas.append(f"importação sem o framework levou {proprio:.0f} ms (limite {args.limite_proprio_ms:.0f} ms)")
+        if total > args.limite_ms:
+            falhas.append(f"importação levou {total:.0f} ms (teto {args.limite_ms:.0f} ms)")
+
+        carregados = sorted(
+            nome for nome in MODULOS_PROIBIDOS
+            if nome in modulos or any(m.startswith(nome + '.') for m in modulos)
+        )
+        if carregados:
+            falhas.append(f"módulos carregados na importação: {', '.join(carregados)}")
+
+        if os.path.exists(db_path):
+            falhas.append("a importação criou o banco de dados")
+
+    if falhas:
+        for falha in falhas:
+            print(f"❌ {falha}")
+        sys.exit(1)
+
+    print("✅ Importação da API dentro do orçamento")
+
+
+if __name__ == '__main__':
+    main()
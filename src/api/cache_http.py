@@ -0,0 +1,167 @@
+"""
+Cache HTTP das leituras da API (ETag / Last-Modified + cache em memória).
+
+As listagens e estatísticas do dashboard são recalculadas a cada
+atualização de aba, mesmo sem nenhuma escrita desde a última vez. Este
+middleware ASGI usa os contadores de versão por tabela do ``QueryCache``
+(incrementados por ``notify_write``) para:
+
+- calcular um ETag fraco por URL a partir das versões das tabelas da rota
+  e responder ``If-None-Match`` com 304 sem chamar o endpoint (nenhum
+  acesso ao SQLite);
+- guardar as respostas 200 já prontas (inclusive comprimidas) num cache
+  LRU com validade curta, servindo consultas idênticas (mesma URL e
+  filtros) enquanto nenhuma tabela da rota mudar.
+
+O ETag inclui um identificador do processo (as versões recomeçam do zero
+a cada reinício) e a janela de ``max_age`` do ``QueryCache``, de modo que
+escritas feitas fora do processo (scripts que não chamam
+``notify_write``) aparecem no máximo após esse intervalo.
+
+``Last-Modified`` é enviado apenas como informação: com precisão de
+segundos ele não distingue uma escrita feita no mesmo segundo da resposta
+anterior, por isso ``If-Modified-Since`` sozinho nunca gera 304.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Mapping, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.api.compressao import escolher_codificacao
+from src.database.cache import QueryCache
+
+# Validade (segundos) das respostas guardadas em memória
+TTL_PADRAO = 60.0
+MAX_ENTRADAS_PADRAO = 256
+# Respostas maiores não são guardadas (ex.: páginas grandes de mensagens)
+MAX_BYTES_ENTRADA_PADRAO = 2 * 1024 * 1024
+
+# Muda a cada início do processo
+_PROCESSO = os.urandom(4).hex()
+
+
+def _etag_casa(if_none_match: str, etag: str) -> bool:
+    """Comparação fraca do If-None-Match (lista de ETags ou '*')"""
+    alvo = etag[2:] if etag.startswith('W/') else etag
+    for candidato in if_none_match.split(','):
+        candidato = candidato.strip()
+        if candidato == '*':
+            return True
+        if candidato.startswith('W/'):
+            candidato = candidato[2:]
+        if candidato == alvo:
+            return True
+    return False
+
+
+class CacheHTTPMiddleware:
+    """Validação condicional (304) e cache em memória das rotas de leitura"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rotas: Mapping[str, Tuple[str, ...]],
+        cache: QueryCache,
+        ttl: float = TTL_PADRAO,
+        max_entradas: int = MAX_ENTRADAS_PADRAO,
+        max_bytes_entrada: int = MAX_BYTES_ENTRADA_PADRAO
+    ):
+        """
+        Args:
+            app: Aplicação ASGI
+            rotas: Caminho exato -> tabelas das quais a resposta depende
+            cache: QueryCache com as versões das tabelas
+            ttl: Validade das respostas em memória (0 desativa o cache,
+                 mantendo os 304)
+            max_entradas: Quantidade máxima de respostas guardadas (LRU)
+            max_bytes_entrada: Tamanho máximo de um corpo guardado
+        """
+        self.app = app
+        self.rotas = dict(rotas)
+        self.cache = cache
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.max_bytes_entrada = max_bytes_entrada
+        # Acessado apenas pelo event loop: sem lock
+        self._entradas: "OrderedDict[tuple, Tuple[str, float, Message, bytes]]" = OrderedDict()
+
+    def _etag(self, caminho: str, query: bytes, versoes: Tuple[int, ...]) -> str:
+        janela = int(time.time() // self.cache.max_age)
+        base = f"{caminho}?{query.decode('latin-1')}|{versoes}|{janela}".encode()
+        return f'W/"{_PROCESSO}-{hashlib.blake2b(base, digest_size=8).hexdigest()}"'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        tabelas = self.rotas.get(scope.get("path")) if scope["type"] == "http" else None
+        if tabelas is None or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        cabecalhos = Headers(scope=scope)
+        query = scope.get("query_string", b"")
+        etag = self._etag(scope["path"], query, self.cache.version(*tabelas))
+        modificado_em = self.cache.modified_at(*tabelas)
+        validadores = [
+            (b"etag", etag.encode()),
+            (b"last-modified", formatdate(modificado_em, usegmt=True).encode()),
+            (b"cache-control", b"no-cache"),
+        ]
+
+        if_none_match = cabecalhos.get("if-none-match")
+        if if_none_match is not None and _etag_casa(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": validadores})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        chave = (
+            scope["path"],
+            query,
+            escolher_codificacao(cabecalhos.get("accept-encoding", "")),
+            cabecalhos.get("origin"),
+        )
+        if self.ttl > 0:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                etag_entrada, criado_em, inicio_entrada, corpo = entrada
+                if etag_entrada == etag and (time.monotonic() - criado_em) < self.ttl:
+                    self._entradas.move_to_end(chave)
+                    await send(inicio_entrada)
+                    await send({"type": "http.response.body", "body": corpo})
+                    return
+                del self._entradas[chave]
+
+        inicio: Optional[Message] = None
+        guardar = self.ttl > 0
+
+        async def enviar(message: Message) -> None:
+            nonlocal inicio, guardar
+
+            if message["type"] == "http.response.start":
+                guardar = guardar and message["status"] == 200
+                if message["status"] == 200:
+                    message["headers"] = list(message.get("headers", []))
+                    MutableHeaders(raw=message["headers"]).update(
+                        {nome.decode(): valor.decode() for nome, valor in validadores}
+                    )
+                inicio = message
+            elif message["type"] == "http.response.body" and guardar:
+                corpo = message.get("body", b"")
+                # Só respostas de corpo único (streaming/exportações não)
+                if not message.get("more_body", False) and len(corpo) <= self.max_bytes_entrada:
+                    self._guardar(chave, etag, inicio, corpo)
+                guardar = False
+            await send(message)
+
+        await self.app(scope, receive, enviar)
+
+    def _guardar(self, chave: tuple, etag: str, inicio: Message, corpo: bytes) -> None:
+        self._entradas[chave] = (etag, time.monotonic(), inicio, corpo)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.max_entradas:
+            self._entradas.popitem(last=False)
+
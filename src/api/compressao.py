@@ -0,0 +1,174 @@
+"""
+Compressão das respostas HTTP (brotli ou gzip).
+
+Middleware ASGI que comprime a resposta conforme o ``Accept-Encoding``
+do cliente: brotli quando o pacote ``brotli`` está instalado e o cliente
+aceita ``br``, gzip caso contrário. Respostas menores que o limite são
+enviadas sem compressão (o custo não compensa), assim como fluxos SSE
+(``text/event-stream``, que precisam chegar evento a evento) e conteúdos
+já comprimidos (imagens, XLSX, ZIP).
+
+Respostas em streaming (exportações NDJSON/CSV) são comprimidas bloco a
+bloco, com flush a cada bloco, sem acumular o corpo em memória.
+"""
+
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Dependência opcional
+    brotli = None
+
+# Corpos menores que isso (bytes) não são comprimidos
+MINIMO_BYTES_PADRAO = 1024
+
+NIVEL_GZIP_PADRAO = 6
+# Qualidade 4-5 do brotli: melhor taxa que gzip 6 com custo de CPU semelhante
+QUALIDADE_BROTLI_PADRAO = 4
+
+TIPOS_NAO_COMPRIMIVEIS = (
+    'text/event-stream',
+    'image/',
+    'audio/',
+    'video/',
+    'application/zip',
+    'application/gzip',
+    'application/vnd.openxmlformats',
+    'font/woff',
+)
+
+
+def escolher_codificacao(accept_encoding: str) -> Optional[str]:
+    """'br', 'gzip' ou None conforme o Accept-Encoding (respeita q=0)"""
+    aceitas = set()
+    for parte in accept_encoding.lower().split(','):
+        nome, _, parametros = parte.strip().partition(';')
+        chave, _, valor = parametros.strip().partition('=')
+        if chave.strip() == 'q':
+            try:
+                if float(valor) <= 0:
+                    continue
+            except ValueError:
+                continue
+        aceitas.add(nome.strip())
+    if brotli is not None and 'br' in aceitas:
+        return 'br'
+    if 'gzip' in aceitas or '*' in aceitas:
+        return 'gzip'
+    return None
+
+
+class _Compressor:
+    """Compressor incremental com flush por bloco"""
+
+    def __init__(self, codificacao: str, nivel_gzip: int, qualidade_brotli: int):
+        self.codificacao = codificacao
+        if codificacao == 'br':
+            self._brotli = brotli.Compressor(quality=qualidade_brotli)
+        else:
+            # wbits=31: formato gzip (cabeçalho + CRC)
+            self._zlib = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 31)
+
+    def comprimir(self, dados: bytes) -> bytes:
+        if self.codificacao == 'br':
+            return self._brotli.process(dados) + self._brotli.flush()
+        return self._zlib.compress(dados) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finalizar(self) -> bytes:
+        if self.codificacao == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+    def comprimir_tudo(self, dados: bytes) -> bytes:
+        if self.codificacao == 'br':
+            return self._brotli.process(dados) + self._brotli.finish()
+        return self._zlib.compress(dados) + self._zlib.flush()
+
+
+class CompressaoMiddleware:
+    """Comprime as respostas HTTP acima de ``minimo_bytes``"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimo_bytes: int = MINIMO_BYTES_PADRAO,
+        nivel_gzip: int = NIVEL_GZIP_PADRAO,
+        qualidade_brotli: int = QUALIDADE_BROTLI_PADRAO
+    ):
+        self.app = app
+        self.minimo_bytes = minimo_bytes
+        self.nivel_gzip = nivel_gzip
+        self.qualidade_brotli = qualidade_brotli
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codificacao = escolher_codificacao(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacao is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        sem_compressao = False
+
+        async def enviar(message: Message) -> None:
+            nonlocal inicio, compressor, sem_compressao
+
+            if message["type"] == "http.response.start":
+                # Retido até o primeiro bloco do corpo decidir a compressão
+                inicio = message
+                return
+            if message["type"] != "http.response.body" or sem_compressao:
+                await send(message)
+                return
+
+            corpo = message.get("body", b"")
+            mais = message.get("more_body", False)
+
+            if compressor is None:
+                inicio["headers"] = list(inicio.get("headers", []))
+                cabecalhos = MutableHeaders(raw=inicio["headers"])
+                if not self._comprimivel(cabecalhos) or (not mais and len(corpo) < self.minimo_bytes):
+                    sem_compressao = True
+                    await send(inicio)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(codificacao, self.nivel_gzip, self.qualidade_brotli)
+                cabecalhos["Content-Encoding"] = codificacao
+                cabecalhos.add_vary_header("Accept-Encoding")
+                if "content-length" in cabecalhos:
+                    del cabecalhos["content-length"]
+
+                if not mais:
+                    dados = compressor.comprimir_tudo(corpo)
+                    cabecalhos["Content-Length"] = str(len(dados))
+                    await send(inicio)
+                    await send({"type": "http.response.body", "body": dados})
+                    return
+
+                await send(inicio)
+                await send({"type": "http.response.body", "body": compressor.comprimir(corpo), "more_body": True})
+                return
+
+            dados = compressor.comprimir(corpo) if corpo else b""
+            if not mais:
+                dados += compressor.finalizar()
+            await send({"type": "http.response.body", "body": dados, "more_body": mais})
+
+        await self.app(scope, receive, enviar)
+
+    @staticmethod
+    def _comprimivel(cabecalhos: MutableHeaders) -> bool:
+        # Já comprimido ou resposta parcial (Range) de arquivo estático
+        if "content-encoding" in cabecalhos or "content-range" in cabecalhos:
+            return False
+        tipo = cabecalhos.get("content-type", "").lower()
+        return not tipo.startswith(TIPOS_NAO_COMPRIMIVEIS)
@@ -0,0 +1,160 @@
+"""
+Eventos da fila e das consultas em tempo real (Server-Sent Events).
+
+O frontend consultava ``/api/fila``, ``/api/fila/stats`` e ``/api/status``
+a cada poucos segundos, mesmo sem nenhuma mudança. O ``BarramentoEventos``
+mantém uma fila por cliente conectado em ``/api/eventos`` e distribui:
+
+- ``job``: transições de estado de um job (pending, running, completed, failed)
+- ``fila``: a tabela queue_jobs mudou (a listagem deve ser recarregada)
+- ``fila_stats``: contagem por status, enviada só quando muda
+- ``estatisticas``: estatísticas do dashboard após escritas em consultas
+- ``progresso``: etapa atual de cada execução (ver ``progresso.py``)
+- ``processamento``: início/parada do processamento da fila
+
+Os eventos são numerados; um cliente que reconecta com ``Last-Event-ID``
+recebe o que perdeu, se ainda estiver no histórico, ou um ``resync``
+pedindo para recarregar os dados pela API REST.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Eventos guardados para clientes que reconectam (Last-Event-ID)
+HISTORICO_PADRAO = 200
+
+# Eventos pendentes por cliente antes de ser considerado lento
+FILA_CLIENTE_PADRAO = 100
+
+# Intervalo (s) dos comentários que mantêm a conexão aberta em proxies
+HEARTBEAT_SEGUNDOS = 15.0
+
+
+def formatar_sse(evento: Dict[str, Any]) -> str:
+    """Serializa um evento no formato text/event-stream"""
+    dados = json.dumps(evento['dados'], ensure_ascii=False, default=str)
+    linhas = []
+    if evento.get('id') is not None:
+        linhas.append(f"id: {evento['id']}")
+    linhas.append(f"event: {evento['tipo']}")
+    linhas.append(f"data: {dados}")
+    return "\n".join(linhas) + "\n\n"
+
+
+class BarramentoEventos:
+    """Distribui eventos para os clientes SSE conectados"""
+
+    def __init__(self, historico: int = HISTORICO_PADRAO, fila_cliente: int = FILA_CLIENTE_PADRAO):
+        self.fila_cliente = fila_cliente
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._ultimo_id = 0
+        self._historico: Deque[Dict[str, Any]] = deque(maxlen=historico)
+        self._clientes: Set[asyncio.Queue] = set()
+
+    @property
+    def clientes(self) -> int:
+        return len(self._clientes)
+
+    @property
+    def ultimo_id(self) -> int:
+        return self._ultimo_id
+
+    def vincular(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Define o event loop que entrega os eventos (chamado no startup)"""
+        self._loop = loop
+
+    def publicar(self, tipo: str, dados: Any) -> None:
+        """
+        Publica um evento para todos os clientes
+
+        Pode ser chamado de qualquer thread; a entrega acontece no event loop.
+        Sem loop vinculado (ex.: scripts) o evento é descartado.
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+
+        with self._lock:
+            self._ultimo_id += 1
+            evento = {'id': self._ultimo_id, 'tipo': tipo, 'dados': dados}
+
+        self.agendar(self._distribuir, evento)
+
+    def agendar(self, callback: Callable[..., Any], *args: Any) -> None:
+        """Executa ``callback(*args)`` no event loop, a partir de qualquer thread"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            no_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            no_loop = False
+
+        if no_loop:
+            callback(*args)
+            return
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Loop encerrado entre a verificação e o agendamento
+            pass
+
+    def _distribuir(self, evento: Dict[str, Any]) -> None:
+        self._historico.append(evento)
+        for fila in list(self._clientes):
+            try:
+                fila.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Cliente lento: descarta o atrasado e pede recarga completa
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait({'id': evento['id'], 'tipo': 'resync', 'dados': {}})
+
+    def _perdidos(self, ultimo_id: Optional[int]) -> list:
+        """Eventos posteriores a ``ultimo_id``; [resync] se já saíram do histórico"""
+        if ultimo_id is None or ultimo_id >= self._ultimo_id:
+            return []
+        if not self._historico or self._historico[0]['id'] > ultimo_id + 1:
+            return [{'id': self._ultimo_id, 'tipo': 'resync', 'dados': {}}]
+        return [evento for evento in self._historico if evento['id'] > ultimo_id]
+
+    async def assinar(
+        self,
+        inicial: Optional[Dict[str, Any]] = None,
+        ultimo_id: Optional[int] = None,
+        heartbeat: float = HEARTBEAT_SEGUNDOS
+    ) -> AsyncIterator[str]:
+        """
+        Gera o fluxo SSE de um cliente até a desconexão
+
+        Args:
+            inicial: Estado atual enviado como evento ``snapshot`` na conexão
+            ultimo_id: Valor do cabeçalho Last-Event-ID (reconexão)
+            heartbeat: Intervalo dos comentários de keep-alive
+        """
+        fila: asyncio.Queue = asyncio.Queue(maxsize=self.fila_cliente)
+        self._clientes.add(fila)
+        logger.info(f"📡 Cliente de eventos conectado ({self.clientes} ativo(s))")
+        try:
+            yield "retry: 3000\n\n"
+            if inicial is not None:
+                yield formatar_sse({'id': self._ultimo_id, 'tipo': 'snapshot', 'dados': inicial})
+            for evento in self._perdidos(ultimo_id):
+                yield formatar_sse(evento)
+
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield formatar_sse(evento)
+        finally:
+            self._clientes.discard(fila)
+            logger.info(f"📡 Cliente de eventos desconectado ({self.clientes} ativo(s))")
@@ -0,0 +1,174 @@
+"""
+Exportação em streaming das listagens (CSV, NDJSON e XLSX).
+
+As linhas são lidas do banco em blocos (``fetchmany``) e serializadas à
+medida que o cliente consome a resposta, de modo que exportar todo o
+histórico usa memória constante. A leitura e a serialização rodam em
+threads do executor, um bloco por vez, sem bloquear o event loop.
+
+A consulta fica aberta durante toda a resposta; o banco em WAL
+(``ensure_wal`` no init_database) permite que as gravações sigam
+enquanto isso.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import sqlite3
+import tempfile
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+FORMATOS_EXPORTACAO = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Linhas lidas do banco por vez
+LINHAS_POR_BLOCO = 1000
+
+# Blocos do arquivo XLSX gerado (enviado após a geração)
+XLSX_CHUNK_BYTES = 64 * 1024
+
+Transformacao = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class ExportacaoError(ValueError):
+    """Formato de exportação inválido ou indisponível"""
+    pass
+
+
+def validar_formato(formato: str) -> str:
+    """Normaliza o formato pedido, levantando ExportacaoError se não suportado"""
+    formato = (formato or '').lower()
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ExportacaoError(
+            f"Formato '{formato}' não suportado. Use: {', '.join(FORMATOS_EXPORTACAO)}"
+        )
+    if formato == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError as e:  # Dependência opcional
+            raise ExportacaoError("Exportação em XLSX requer o pacote 'openpyxl'") from e
+    return formato
+
+
+def nome_arquivo(prefixo: str, formato: str) -> str:
+    """Ex.: consultas_20250101_120000.csv"""
+    return f"{prefixo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+
+
+def colunas_select(conn: sqlite3.Connection, tabela: str, colunas: Sequence[str], alias: str) -> str:
+    """SELECT das colunas pedidas; as ausentes no banco saem como NULL"""
+    existentes = {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+    return ', '.join(
+        f"{alias}.{col}" if col in existentes else f"NULL AS {col}"
+        for col in colunas
+    )
+
+
+def _linhas(
+    conn: sqlite3.Connection,
+    sql: str,
+    params: Sequence[Any],
+    transformar: Optional[Transformacao]
+) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+    """
+    Executa a consulta e produz (colunas, bloco de linhas como dicts)
+
+    Sem resultados, produz um único bloco vazio (o cabeçalho ainda é gerado).
+    ``transformar`` deve preservar as chaves das linhas.
+    """
+    conn.row_factory = sqlite3.Row
+    cursor = conn.execute(sql, params)
+    colunas = [d[0] for d in cursor.description]
+    vazio = True
+    while True:
+        rows = cursor.fetchmany(LINHAS_POR_BLOCO)
+        if not rows:
+            break
+        vazio = False
+        linhas = [dict(row) for row in rows]
+        if transformar:
+            linhas = [transformar(linha) for linha in linhas]
+        yield colunas, linhas
+    if vazio:
+        yield colunas, []
+
+
+def _csv(blocos) -> Iterator[bytes]:
+    primeiro = True
+    for colunas, linhas in blocos:
+        saida = io.StringIO()
+        writer = csv.DictWriter(saida, fieldnames=colunas)
+        if primeiro:
+            saida.write('\ufeff')  # BOM: acentos corretos ao abrir no Excel
+            writer.writeheader()
+            primeiro = False
+        writer.writerows(linhas)
+        yield saida.getvalue().encode('utf-8')
+
+
+def _ndjson(blocos) -> Iterator[bytes]:
+    for _, linhas in blocos:
+        if linhas:
+            yield ''.join(
+                json.dumps(linha, ensure_ascii=False, default=str) + '\n' for linha in linhas
+            ).encode('utf-8')
+
+
+def _xlsx(blocos) -> Iterator[bytes]:
+    """Planilha em modo write-only (linhas gravadas em disco, não em memória)"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet()
+    primeiro = True
+    for colunas, linhas in blocos:
+        if primeiro:
+            planilha.append(colunas)
+            primeiro = False
+        for linha in linhas:
+            planilha.append([linha[coluna] for coluna in colunas])
+
+    with tempfile.TemporaryFile() as arquivo:
+        workbook.save(arquivo)
+        arquivo.seek(0)
+        while chunk := arquivo.read(XLSX_CHUNK_BYTES):
+            yield chunk
+
+
+_SERIALIZADORES = {'csv': _csv, 'ndjson': _ndjson, 'xlsx': _xlsx}
+
+
+async def exportar(
+    db_path: str,
+    sql: str,
+    params: Sequence[Any],
+    formato: str,
+    transformar: Optional[Transformacao] = None
+) -> AsyncIterator[bytes]:
+    """
+    Gera o conteúdo do arquivo exportado em blocos
+
+    Args:
+        db_path: Caminho do banco
+        sql: Consulta com os filtros já aplicados (sem LIMIT)
+        params: Parâmetros da consulta
+        formato: 'csv', 'ndjson' ou 'xlsx' (já validado)
+        transformar: Função opcional aplicada a cada linha (dict)
+    """
+    # A conexão é usada por uma thread de cada vez, mas não sempre a mesma
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    gerador = _SERIALIZADORES[formato](_linhas(conn, sql, params, transformar))
+    try:
+        while (chunk := await asyncio.to_thread(next, gerador, None)) is not None:
+            yield chunk
+    finally:
+        try:
+            gerador.close()
+        except ValueError:
+            pass  # Cliente desconectou com um bloco ainda em leitura na thread
+        conn.close()
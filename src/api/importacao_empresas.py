@@ -0,0 +1,562 @@
+"""
+Importação em massa de empresas (CSV/XLSX).
+
+O arquivo é lido de forma incremental e processado em blocos: cada bloco
+é validado (CPF/IE/CNPJ/senha via SEFAZValidator), classificado com uma
+única consulta ao banco pelas chaves canônicas de CNPJ/IE (novas, já
+existentes, conflito de IE) e gravado em uma transação. O progresso de cada bloco
+é devolvido ao chamador, que o repassa ao navegador (NDJSON).
+
+Senhas nunca são incluídas nos detalhes nem nos logs.
+"""
+
+import codecs
+import csv
+import io
+import re
+import sqlite3
+from collections import deque
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import python_multipart as multipart  # python-multipart >= 0.0.13
+except ImportError:
+    try:
+        import multipart
+    except ImportError:  # Dependência opcional (só para uploads multipart/form-data)
+        multipart = None
+
+from src.bot.utils.validators import SEFAZValidator
+from src.database.chaves import chaves_canonicas, vincular_empresas
+
+# Colunas do modelo (empresas_template.csv)
+COLUNAS_OBRIGATORIAS = ('nome_empresa', 'cnpj', 'inscricao_estadual', 'cpf_socio', 'senha')
+COLUNAS_IMPORTACAO = COLUNAS_OBRIGATORIAS + ('observacoes',)
+
+# Colunas numéricas que planilhas costumam converter para notação científica
+COLUNAS_NUMERICAS = ('cnpj', 'inscricao_estadual', 'cpf_socio')
+
+# Linhas por bloco (uma transação e um evento de progresso por bloco)
+TAMANHO_BLOCO = 500
+
+_NOTACAO_CIENTIFICA = re.compile(r'^\d+(?:[.,]\d+)?[eE][+-]?\d+$')
+
+
+class ImportacaoError(ValueError):
+    """Arquivo de importação inválido (cabeçalho, formato ou codificação)"""
+    pass
+
+
+def normalizar_cabecalho(coluna: Any) -> str:
+    """'Nome Empresa' -> 'nome_empresa'"""
+    return re.sub(r'\s+', '_', str(coluna or '').strip().strip('"\'').lower())
+
+
+def _valor_celula(valor: Any, coluna: str) -> str:
+    """Converte o valor de uma célula em texto, desfazendo notação científica"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    texto = str(valor).strip().strip('"\'').strip()
+    if coluna in COLUNAS_NUMERICAS and _NOTACAO_CIENTIFICA.match(texto):
+        try:
+            texto = f"{float(texto.replace(',', '.')):.0f}"
+        except ValueError:
+            pass
+    return texto
+
+
+def _validar_cabecalho(cabecalho: List[str]) -> None:
+    faltando = [c for c in COLUNAS_IMPORTACAO if c not in cabecalho]
+    if faltando:
+        raise ImportacaoError(
+            f"Arquivo com colunas faltando: {', '.join(faltando)}. "
+            f"Colunas encontradas: {', '.join(cabecalho)}"
+        )
+
+
+def _montar_linha(cabecalho: List[str], valores: List[Any]) -> Optional[Dict[str, str]]:
+    """Monta o dict da linha (None para linhas vazias)"""
+    if not any(str(v).strip() for v in valores if v is not None):
+        return None
+    linha = {}
+    for indice, coluna in enumerate(cabecalho):
+        if coluna in COLUNAS_IMPORTACAO:
+            valor = valores[indice] if indice < len(valores) else None
+            linha[coluna] = _valor_celula(valor, coluna)
+    return linha
+
+
+# ================================
+# LEITURA INCREMENTAL
+# ================================
+
+def _detectar_delimitador(linha_cabecalho: str) -> str:
+    """Delimitador mais frequente no cabeçalho (vírgula, ponto e vírgula ou TAB)"""
+    contagens = {d: linha_cabecalho.count(d) for d in (',', ';', '\t')}
+    return max(contagens, key=contagens.get)
+
+
+def _fim_registro_completo(texto: str) -> int:
+    """
+    Posição logo após a última quebra de linha fora de aspas (0 se nenhuma)
+
+    Campos entre aspas podem conter quebras de linha, então o buffer só é
+    entregue ao parser até o último registro completo.
+    """
+    em_aspas = False
+    fim = 0
+    for posicao, caractere in enumerate(texto):
+        if caractere == '"':
+            em_aspas = not em_aspas
+        elif caractere == '\n' and not em_aspas:
+            fim = posicao + 1
+    return fim
+
+
+async def linhas_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+    """
+    Lê um CSV a partir de blocos de bytes, sem carregar o arquivo inteiro
+
+    Aceita UTF-8 (com ou sem BOM) e Windows-1252 (CSV salvo pelo Excel).
+    O delimitador é detectado no cabeçalho, como no preview do navegador.
+
+    Yields:
+        (número da linha no arquivo, {coluna: valor})
+
+    Raises:
+        ImportacaoError: Arquivo vazio ou cabeçalho incompleto
+    """
+    decoder = None
+    buffer = ''
+    cabecalho: Optional[List[str]] = None
+    delimitador = ','
+    numero_linha = 1
+
+    def _registros(texto: str):
+        nonlocal cabecalho, delimitador, numero_linha
+        if cabecalho is None:
+            primeira, _, texto = texto.partition('\n')
+            delimitador = _detectar_delimitador(primeira)
+            cabecalho = [normalizar_cabecalho(c) for c in next(csv.reader([primeira], delimiter=delimitador))]
+            _validar_cabecalho(cabecalho)
+        for valores in csv.reader(io.StringIO(texto), delimiter=delimitador):
+            numero_linha += 1
+            linha = _montar_linha(cabecalho, valores)
+            if linha is not None:
+                yield numero_linha, linha
+
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        pendente = decoder.getstate()[0]
+        try:
+            texto = decoder.decode(chunk)
+        except UnicodeDecodeError:
+            # Não é UTF-8: o restante do arquivo é lido como Windows-1252
+            # (o que já foi decodificado era ASCII/UTF-8 válido)
+            decoder = codecs.getincrementaldecoder('cp1252')()
+            texto = decoder.decode(pendente + chunk)
+        buffer += texto.replace('\r\n', '\n').replace('\r', '\n')
+
+        # Entrega ao parser apenas registros completos
+        fim = _fim_registro_completo(buffer)
+        if fim:
+            texto, buffer = buffer[:fim], buffer[fim:]
+            for registro in _registros(texto):
+                yield registro
+
+    if decoder is not None:
+        buffer += decoder.decode(b'', final=True)
+    if buffer.strip():
+        for registro in _registros(buffer):
+            yield registro
+    if cabecalho is None:
+        raise ImportacaoError("Arquivo vazio")
+
+
+async def arquivo_multipart(
+    corpo: AsyncIterator[bytes],
+    content_type: str,
+    campo: str = 'arquivo'
+) -> Tuple[str, str, AsyncIterator[bytes]]:
+    """
+    Lê um campo de arquivo de um corpo multipart/form-data à medida que chega
+
+    Ao contrário de ``request.form()``, que grava o upload inteiro antes de
+    devolver o formulário, o corpo é consumido apenas até os cabeçalhos do
+    campo; o conteúdo é entregue em blocos conforme o parser os produz.
+
+    Args:
+        corpo: Blocos do corpo da requisição (``request.stream()``)
+        content_type: Header Content-Type (com o boundary)
+        campo: Nome do campo do arquivo
+
+    Returns:
+        (nome do arquivo, Content-Type do campo, blocos de bytes do conteúdo)
+
+    Raises:
+        ImportacaoError: Corpo inválido ou campo ausente
+    """
+    if multipart is None:
+        raise ImportacaoError("Upload multipart/form-data requer o pacote 'python-multipart'")
+    parse_options_header = multipart.multipart.parse_options_header
+
+    _, opcoes = parse_options_header(content_type)
+    if b'boundary' not in opcoes:
+        raise ImportacaoError("Corpo multipart sem boundary")
+
+    eventos: deque = deque()
+    cabecalhos: Dict[bytes, bytes] = {}
+    nome, valor = bytearray(), bytearray()
+
+    def _fim_cabecalho():
+        cabecalhos[bytes(nome).lower()] = bytes(valor)
+        nome.clear()
+        valor.clear()
+
+    parser = multipart.MultipartParser(opcoes[b'boundary'], {
+        'on_part_begin': cabecalhos.clear,
+        'on_header_field': lambda dados, inicio, fim: nome.extend(dados[inicio:fim]),
+        'on_header_value': lambda dados, inicio, fim: valor.extend(dados[inicio:fim]),
+        'on_header_end': _fim_cabecalho,
+        'on_headers_finished': lambda: eventos.append(('parte', dict(cabecalhos))),
+        'on_part_data': lambda dados, inicio, fim: eventos.append(('dados', bytes(dados[inicio:fim]))),
+        'on_part_end': lambda: eventos.append(('fim', None)),
+    })
+
+    async def _eventos():
+        async for chunk in corpo:
+            try:
+                parser.write(chunk)
+            except Exception as e:
+                raise ImportacaoError(f"Corpo multipart inválido: {e}") from e
+            while eventos:
+                yield eventos.popleft()
+        parser.finalize()
+        while eventos:
+            yield eventos.popleft()
+
+    pendentes = _eventos()
+    async for tipo, dados in pendentes:
+        if tipo != 'parte':
+            continue
+        _, disposicao = parse_options_header(dados.get(b'content-disposition', b''))
+        if disposicao.get(b'name') == campo.encode():
+            break
+    else:
+        raise ImportacaoError(f"Campo '{campo}' não enviado")
+
+    async def _conteudo():
+        async for tipo, bloco in pendentes:
+            if tipo == 'dados':
+                yield bloco
+            elif tipo == 'fim':
+                break
+
+    return (
+        disposicao.get(b'filename', b'').decode('utf-8', 'replace'),
+        dados.get(b'content-type', b'').decode('latin-1'),
+        _conteudo(),
+    )
+
+
+def linhas_xlsx(arquivo: Union[str, BinaryIO]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Lê a primeira planilha de um XLSX em modo somente leitura (linha a linha)
+
+    Args:
+        arquivo: Caminho ou arquivo binário aberto (com seek)
+
+    Yields:
+        (número da linha na planilha, {coluna: valor})
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:  # Dependência opcional
+        raise ImportacaoError("Importação de XLSX requer o pacote 'openpyxl'") from e
+
+    try:
+        workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportacaoError(f"Arquivo XLSX inválido: {e}") from e
+
+    try:
+        linhas = workbook.worksheets[0].iter_rows(values_only=True)
+        primeira = next(linhas, None)
+        if primeira is None:
+            raise ImportacaoError("Arquivo vazio")
+        cabecalho = [normalizar_cabecalho(c) for c in primeira]
+        _validar_cabecalho(cabecalho)
+
+        for numero_linha, valores in enumerate(linhas, start=2):
+            linha = _montar_linha(cabecalho, list(valores))
+            if linha is not None:
+                yield numero_linha, linha
+    finally:
+        workbook.close()
+
+
+# ================================
+# VALIDAÇÃO E GRAVAÇÃO
+# ================================
+
+def validar_linha(linha: Dict[str, str]) -> List[str]:
+    """Valida os campos de uma linha; retorna a lista de erros (vazia se válida)"""
+    faltando = [c for c in COLUNAS_OBRIGATORIAS if not linha.get(c)]
+    if faltando:
+        return [f"campos obrigatórios faltando: {', '.join(faltando)}"]
+
+    erros = []
+    for rotulo, validador, valor in (
+        ('CNPJ', SEFAZValidator.validate_cnpj, linha['cnpj']),
+        ('IE', SEFAZValidator.validate_ie, linha['inscricao_estadual']),
+        ('CPF', SEFAZValidator.validate_cpf, linha['cpf_socio']),
+        ('Senha', SEFAZValidator.validate_senha, linha['senha']),
+    ):
+        valido, mensagem = validador(valor)
+        if not valido:
+            erros.append(f"{rotulo}: {mensagem}")
+    return erros
+
+
+def _rotulo(linha: Dict[str, str]) -> str:
+    return linha.get('nome_empresa') or linha.get('cnpj') or 'N/A'
+
+
+class ResultadoImportacao:
+    """
+    Contadores e detalhes acumulados ao longo dos blocos
+
+    Cada bloco é classificado em um resultado próprio (``gravar_bloco``),
+    somado ao total com ``mesclar`` só depois que a gravação do bloco é
+    confirmada: se o SAVEPOINT do bloco for desfeito, o resumo não conta
+    linhas que não foram gravadas.
+    """
+
+    def __init__(self):
+        self.processadas = 0
+        self.inseridas = 0
+        self.atualizadas = 0
+        self.existentes = 0
+        self.invalidas = 0
+        self.detalhes: List[str] = []
+        # Chaves já vistas no arquivo (duplicatas entre blocos)
+        self.cnpjs_vistos: Dict[str, int] = {}
+        self.ies_vistas: Dict[str, int] = {}
+
+    @property
+    def sucesso(self) -> int:
+        return self.inseridas + self.atualizadas
+
+    @property
+    def erros(self) -> int:
+        return self.existentes + self.invalidas
+
+    def mesclar(self, bloco: 'ResultadoImportacao') -> None:
+        """Soma ao total o resultado de um bloco já gravado"""
+        self.processadas += bloco.processadas
+        self.inseridas += bloco.inseridas
+        self.atualizadas += bloco.atualizadas
+        self.existentes += bloco.existentes
+        self.invalidas += bloco.invalidas
+        self.detalhes.extend(bloco.detalhes)
+        self.cnpjs_vistos.update(bloco.cnpjs_vistos)
+        self.ies_vistas.update(bloco.ies_vistas)
+
+    def progresso(self) -> Dict[str, Any]:
+        return {
+            "tipo": "progresso",
+            "processadas": self.processadas,
+            "inseridas": self.inseridas,
+            "atualizadas": self.atualizadas,
+            "existentes": self.existentes,
+            "invalidas": self.invalidas,
+        }
+
+    def resumo(self, dry_run: bool) -> Dict[str, Any]:
+        return {
+            "tipo": "resumo",
+            "dry_run": dry_run,
+            "sucesso": self.sucesso,
+            "erros": self.erros,
+            "total": self.processadas,
+            **{k: v for k, v in self.progresso().items() if k != "tipo"},
+            "detalhes": self.detalhes,
+        }
+
+
+def _classificar_bloco(
+    conn: sqlite3.Connection,
+    bloco: List[Tuple[int, Dict[str, str]]],
+    anteriores: ResultadoImportacao,
+    resultado: ResultadoImportacao,
+    atualizar: bool
+) -> List[Tuple[Dict[str, Any], Optional[int]]]:
+    """
+    Valida o bloco e o confronta com o banco em uma única consulta
+
+    CNPJ e IE são comparados pelas chaves canônicas (só dígitos), então
+    "12538398-3" no arquivo e "125383983" no banco são a mesma IE.
+
+    Args:
+        anteriores: Total dos blocos já gravados (apenas lido: duplicatas no arquivo)
+        resultado: Resultado do bloco
+
+    Returns:
+        [(linha com as chaves, id da empresa existente ou None)] a gravar
+        (novas e, com ``atualizar``, existentes pelo CNPJ)
+    """
+    validas = []
+    for numero_linha, linha in bloco:
+        resultado.processadas += 1
+        erros = validar_linha(linha)
+        if erros:
+            resultado.invalidas += 1
+            resultado.detalhes.append(f"❌ Linha {numero_linha} ({_rotulo(linha)}): {'; '.join(erros)}")
+            continue
+
+        linha = {**linha, **chaves_canonicas('empresas', linha)}
+        cnpj, ie = linha['cnpj_chave'], linha['ie_chave']
+        anterior = (
+            anteriores.cnpjs_vistos.get(cnpj) or resultado.cnpjs_vistos.get(cnpj)
+            or anteriores.ies_vistas.get(ie) or resultado.ies_vistas.get(ie)
+        )
+        if anterior:
+            resultado.invalidas += 1
+            resultado.detalhes.append(
+                f"❌ Linha {numero_linha} ({_rotulo(linha)}): duplicada no arquivo (linha {anterior})"
+            )
+            continue
+        resultado.cnpjs_vistos[cnpj] = numero_linha
+        resultado.ies_vistas[ie] = numero_linha
+        validas.append((numero_linha, linha))
+
+    if not validas:
+        return []
+
+    cnpjs = [linha['cnpj_chave'] for _, linha in validas]
+    ies = [linha['ie_chave'] for _, linha in validas]
+    marcadores_cnpj = ', '.join('?' for _ in cnpjs)
+    marcadores_ie = ', '.join('?' for _ in ies)
+    existentes = conn.execute(f"""
+        SELECT cnpj_chave, ie_chave, nome_empresa, id FROM empresas
+        WHERE cnpj_chave IN ({marcadores_cnpj}) OR ie_chave IN ({marcadores_ie})
+    """, cnpjs + ies).fetchall()
+    por_cnpj = {row[0]: row for row in existentes}
+    por_ie = {row[1]: row for row in existentes}
+
+    gravar = []
+    for numero_linha, linha in validas:
+        cnpj, ie = linha['cnpj_chave'], linha['ie_chave']
+        mesmo_cnpj = por_cnpj.get(cnpj)
+        mesma_ie = por_ie.get(ie)
+
+        if mesma_ie is not None and mesma_ie[0] != cnpj:
+            resultado.existentes += 1
+            resultado.detalhes.append(
+                f"⚠️ {_rotulo(linha)} (IE: {linha['inscricao_estadual']}): já existe no sistema como '{mesma_ie[2]}'"
+            )
+        elif mesmo_cnpj is not None and not atualizar:
+            resultado.existentes += 1
+            resultado.detalhes.append(
+                f"⚠️ {_rotulo(linha)} (CNPJ: {linha['cnpj']}): já existe no sistema como '{mesmo_cnpj[2]}'"
+            )
+        elif mesmo_cnpj is not None:
+            resultado.atualizadas += 1
+            resultado.detalhes.append(f"✓ {_rotulo(linha)}: atualizada")
+            gravar.append((linha, mesmo_cnpj[3]))
+        else:
+            resultado.inseridas += 1
+            resultado.detalhes.append(f"✓ {_rotulo(linha)}: importada com sucesso")
+            gravar.append((linha, None))
+
+    return gravar
+
+
+def gravar_bloco(
+    conn: sqlite3.Connection,
+    bloco: List[Tuple[int, Dict[str, str]]],
+    anteriores: ResultadoImportacao,
+    atualizar: bool = False,
+    dry_run: bool = False
+) -> ResultadoImportacao:
+    """
+    Classifica e grava um bloco de linhas (sem commit)
+
+    Args:
+        conn: Conexão com o banco (o commit fica a cargo do chamador)
+        bloco: [(número da linha, {coluna: valor})]
+        anteriores: Total dos blocos já gravados (não é alterado)
+        atualizar: Atualiza empresas já cadastradas com o mesmo CNPJ
+        dry_run: Apenas classifica, sem gravar
+
+    Returns:
+        Resultado do bloco, a somar ao total (``mesclar``) após o commit
+    """
+    resultado = ResultadoImportacao()
+    gravar = _classificar_bloco(conn, bloco, anteriores, resultado, atualizar)
+    if dry_run or not gravar:
+        return resultado
+
+    novas = [l for l, empresa_id in gravar if empresa_id is None]
+    if novas:
+        conn.executemany("""
+            INSERT INTO empresas (nome_empresa, cnpj, inscricao_estadual, cpf_socio, senha, observacoes, ativo,
+                                  cnpj_chave, ie_chave, cpf_chave, nome_busca)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?)
+            ON CONFLICT(cnpj) DO NOTHING
+        """, [
+            (l['nome_empresa'], l['cnpj'], l['inscricao_estadual'], l['cpf_socio'], l['senha'],
+             l.get('observacoes', ''), l['cnpj_chave'], l['ie_chave'], l['cpf_chave'], l['nome_busca'])
+            for l in novas
+        ])
+        for l in novas:
+            vincular_empresas(conn, l['ie_chave'])
+
+    # Existentes pelo CNPJ canônico: atualizadas pelo id (o CNPJ gravado pode ter outra formatação)
+    existentes = [(l, empresa_id) for l, empresa_id in gravar if empresa_id is not None]
+    if existentes:
+        conn.executemany("""
+            UPDATE empresas SET
+                nome_empresa = ?,
+                nome_busca = ?,
+                cpf_socio = ?,
+                cpf_chave = ?,
+                senha = ?,
+                observacoes = ?,
+                data_atualizacao = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, [
+            (l['nome_empresa'], l['nome_busca'], l['cpf_socio'], l['cpf_chave'], l['senha'], l.get('observacoes', ''), empresa_id)
+            for l, empresa_id in existentes
+        ])
+
+    return resultado
+
+
+def em_blocos(linhas: Iterable, tamanho: int = TAMANHO_BLOCO) -> Iterator[List]:
+    """Agrupa um iterável síncrono em listas de até ``tamanho`` itens"""
+    bloco = []
+    for item in linhas:
+        bloco.append(item)
+        if len(bloco) >= tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+async def em_blocos_async(linhas: AsyncIterator, tamanho: int = TAMANHO_BLOCO) -> AsyncIterator[List]:
+    """Agrupa um iterável assíncrono em listas de até ``tamanho`` itens"""
+    bloco = []
+    async for item in linhas:
+        bloco.append(item)
+        if len(bloco) >= tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
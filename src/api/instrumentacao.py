@@ -0,0 +1,38 @@
+"""
+Latência do SQLite por endpoint da API.
+
+Middleware ASGI que abre uma medição (``medir_sqlite``) em cada
+requisição: as conexões criadas com ``conectar_sqlite`` somam o tempo de
+``execute``/``fetch*`` nela (inclusive nas threads de ``asyncio.to_thread``,
+que herdam o contexto). Ao final, o total vai para o histograma
+``sefaz_sqlite_duracao_segundos`` com o caminho da rota como rótulo
+(``/api/empresas/{empresa_id}``, não a URL), mantendo a cardinalidade
+limitada ao número de rotas.
+"""
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.bot.utils.metricas import SQLITE_DURACAO, SQLITE_QUERIES, medir_sqlite
+
+
+class InstrumentacaoMiddleware:
+    """Soma o tempo das queries SQLite de cada requisição HTTP"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with medir_sqlite() as medicao:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                segundos, queries = medicao
+                if queries:
+                    # O roteador do Starlette grava a rota encontrada no scope
+                    endpoint = getattr(scope.get("route"), "path", "outros")
+                    SQLITE_DURACAO.observar(segundos, endpoint=endpoint)
+                    SQLITE_QUERIES.inc(queries, endpoint=endpoint)
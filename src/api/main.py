@@ -8,22 +8,52 @@ if sys.platform == 'win32' and sys.version_info >= (3, 8):
     except AttributeError:
         pass
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, validator
 import sqlite3
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Union
 import json
+import logging
 import os
 import hashlib
-from src.bot.sefaz_bot import SEFAZBot
-from src.bot.message_bot import MessageBot
-from cryptography.fernet import Fernet
-import base64
+import itertools
+import time
+import tempfile
 from src.bot.exceptions.error_messages import get_user_friendly_error_message, get_error_category
+from src.bot.utils.logs import configurar_logs, contexto_log, encerrar_logs, hash_cpf
+from src.bot.utils.metricas import conectar_sqlite, metricas
+from src.database import query_cache, notify_write, registrar_ouvinte
+from src.database.fts import FTS_TABLE, ensure_mensagens_fts, fts_ativo, build_match_query
+from src.database.linha_do_tempo import LinhaDoTempo, ensure_linha_do_tempo, expandir, percentis_por_etapa
+from src.database.page_archive import ensure_page_archive, carregar_pagina, carregar_paginas
+from src.database.busca_empresas import condicao_busca, ensure_empresas_busca
+from src.database.chaves import chave_cpf, chave_ie, chaves_canonicas, ensure_chaves, migrar_chaves, vincular_empresas
+from src.database.consulta_tipos import FLAGS, TVI_COM, TVI_SEM, ensure_colunas_tipadas, migrar_consultas, tipar_flag
+from src.database.backup import BackupError, PoliticaBackup, criar_backup, listar_backups
+from src.database.retention import PoliticaRetencao, aplicar_retencao, ensure_incremental_vacuum
+from src.database.pagination import NEXT_CURSOR_HEADER, InvalidCursorError, keyset_condition, next_cursor
+from src.database.storage import Storage, criar_storage, ensure_wal
+from src.database.write_queue import WriteQueue, persistir
+from src.api.cache_http import CacheHTTPMiddleware
+from src.api.compressao import CompressaoMiddleware
+from src.api.eventos import BarramentoEventos
+from src.api.instrumentacao import InstrumentacaoMiddleware
+from src.api.monitor_loop import MonitorLoop
+from src.api.progresso import RegistroProgresso
+from src.api.respostas import linhas_para_dicts, resposta_json
+from src.api.exportacao import FORMATOS_EXPORTACAO, ExportacaoError, colunas_select, exportar, nome_arquivo, validar_formato
+from src.api.importacao_empresas import (
+    ImportacaoError, ResultadoImportacao, arquivo_multipart, gravar_bloco, linhas_csv, linhas_xlsx, em_blocos, em_blocos_async
+)
+
+# Logs em JSON lines por uma fila (ver src/bot/utils/logs.py); configurado já
+# na importação para não perder as mensagens de inicialização
+configurar_logs()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="SEFAZ Bot API", description="API para consultas SEFAZ", version="1.0.0")
 
@@ -52,7 +82,7 @@ def get_database_path():
         db_dir = os.path.dirname(db_path)
         if db_dir:
             os.makedirs(db_dir, exist_ok=True)
-        print(f"📂 Usando DB_PATH do ambiente: {db_path}")
+        logger.info(f"📂 Usando DB_PATH do ambiente: {db_path}")
         return db_path
     
     # Verificar se está em produção
@@ -68,28 +98,14 @@ def get_database_path():
 DB_PATH = get_database_path()
 DB_MENSAGENS = DB_PATH  # Mesmo banco para mensagens
 
-print(f"📂 Banco de dados configurado em: {DB_PATH}")
+logger.info(f"📂 Banco de dados configurado em: {DB_PATH}")
 
 # Controle de processamento da fila
 processing_task = None
 processing_active = False
-
-# Configuração da criptografia de senhas - REMOVIDA
-def get_encryption_key():
-    """Função mantida por compatibilidade - não será mais usada"""
-    key_file = "encryption_key.txt"
-    if os.path.exists(key_file):
-        with open(key_file, 'rb') as f:
-            return f.read()
-    else:
-        key = Fernet.generate_key()
-        with open(key_file, 'wb') as f:
-            f.write(key)
-        return key
-
-# Inicializar cipher - REMOVIDO
-ENCRYPTION_KEY = get_encryption_key()
-cipher = Fernet(ENCRYPTION_KEY)
+# Laço da fila em execução e instante (monotonic) da última volta, para /readyz
+_fila_laco_ativo = False
+_fila_batimento = None
 
 def encrypt_password(password: str) -> str:
     """Retorna a senha sem criptografia"""
@@ -99,12 +115,27 @@ def decrypt_password(encrypted_password: str) -> str:
     """Retorna a senha sem descriptografia"""
     return encrypted_password
 
+# Colunas de agendamento da fila (mesmos tipos de SEFAZBot.init_database)
+COLUNAS_AGENDAMENTO = {
+    'data_agendada': 'TIMESTAMP',
+    'tipo_execucao': "TEXT DEFAULT 'imediata'",
+    'recorrencia': 'TEXT',
+    'ativo_agendamento': 'BOOLEAN DEFAULT 1',
+    'criado_por': "TEXT DEFAULT 'manual'",
+}
+
 # Inicializar banco de dados
 def init_database():
     """Inicializa as tabelas do banco de dados se não existirem"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = conectar_sqlite(DB_PATH)
     cursor = conn.cursor()
     
+    # Bancos novos já nascem com vacuum incremental (espaço devolvido pela retenção)
+    ensure_incremental_vacuum(conn)
+    
+    # Leituras longas (exportações) não bloqueiam as gravações
+    ensure_wal(conn)
+    
     # Tabela de consultas
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS consultas (
@@ -186,16 +217,202 @@ def init_database():
             erro TEXT,
             erro_detalhes TEXT,
             resultado TEXT,
+            data_agendada TIMESTAMP,
+            tipo_execucao TEXT DEFAULT 'imediata',
+            recorrencia TEXT,
+            ativo_agendamento BOOLEAN DEFAULT 1,
+            criado_por TEXT DEFAULT 'manual',
             FOREIGN KEY (empresa_id) REFERENCES empresas (id)
         )
     """)
     
+    # Colunas de agendamento em filas criadas antes delas (usadas por /readyz e processar_fila)
+    colunas_fila = {row[1] for row in cursor.execute("PRAGMA table_info(queue_jobs)")}
+    for coluna, tipo in COLUNAS_AGENDAMENTO.items():
+        if coluna not in colunas_fila:
+            cursor.execute(f"ALTER TABLE queue_jobs ADD COLUMN {coluna} {tipo}")
+    
+    # Índice de busca textual das mensagens (FTS5)
+    ensure_mensagens_fts(conn)
+    
+    # Linha do tempo das etapas dos jobs da fila
+    ensure_linha_do_tempo(conn)
+    
+    # Arquivo comprimido das páginas capturadas pelos bots
+    ensure_page_archive(conn)
+    
+    # Colunas tipadas dos resultados (TVI, débitos em centavos, flags)
+    if ensure_colunas_tipadas(conn):
+        migrar_consultas(conn)
+    
+    # Chaves canônicas de CNPJ/IE/CPF (só dígitos) e vínculo consulta -> empresa
+    ensure_chaves(conn)
+    migrar_chaves(conn)
+    vincular_empresas(conn)
+    
+    # Busca de empresas por trecho do nome/CNPJ/IE (FTS5 trigram)
+    ensure_empresas_busca(conn)
+    
+    # Índice para a busca da última consulta de cada empresa (dashboard e listagem)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_consultas_ie_data
+        ON consultas (inscricao_estadual, data_consulta)
+    """)
+
+    # Índices das chaves de ordenação usadas na paginação por cursor
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_consultas_data ON consultas (data_consulta)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_empresas_data_criacao ON empresas (data_criacao)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_queue_jobs_data_adicao ON queue_jobs (data_adicao)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_mensagens_data_envio
+        ON mensagens_sefaz (COALESCE(data_envio, ''))
+    """)
+    colunas_fila = {row[1] for row in cursor.execute("PRAGMA table_info(queue_jobs)")}
+    if 'data_agendada' in colunas_fila:
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_queue_jobs_data_agendada
+            ON queue_jobs (COALESCE(data_agendada, ''))
+        """)
+
     conn.commit()
     conn.close()
-    print("✅ Banco de dados inicializado com sucesso")
+    logger.info("✅ Banco de dados inicializado com sucesso")
+
+_banco_inicializado = False
+
+# Schema criado/migrado no startup, uma vez por processo: importar o módulo
+# (reload, ferramentas, scripts) não toca no banco. Registrado antes dos
+# demais hooks de startup, que dependem das tabelas.
+@app.on_event("startup")
+async def iniciar_logs():
+    # Idempotente; reinstala o pipeline se um shutdown anterior o encerrou
+    configurar_logs()
+
+@app.on_event("shutdown")
+async def finalizar_logs():
+    """Escreve os logs pendentes da fila antes de encerrar"""
+    encerrar_logs()
+
+@app.on_event("startup")
+async def inicializar_banco():
+    global _banco_inicializado
+    if not _banco_inicializado:
+        await asyncio.to_thread(init_database)
+        _banco_inicializado = True
+
+# Fila de escrita: resultados dos bots e status dos jobs gravados em lote
+# por um único escritor (ver src/database/write_queue.py)
+write_queue = WriteQueue(DB_PATH)
+
+# Backend da fila de jobs e das gravações dos bots (ver src/database/storage.py)
+storage = criar_storage(DB_PATH)
+
+# Eventos em tempo real para o frontend (GET /api/eventos, ver src/api/eventos.py)
+eventos = BarramentoEventos()
+
+# Espera (s) para agrupar escritas em rajada antes de publicar fila/estatísticas
+EVENTOS_AGRUPAMENTO_SEGUNDOS = 0.5
+
+_tabelas_alteradas = set()
+_sinal_escrita = None  # asyncio.Event criado no startup (no loop da aplicação)
+
+def _marcar_escrita(tabelas):
+    _tabelas_alteradas.update(tabelas)
+    if _sinal_escrita is not None:
+        _sinal_escrita.set()
+
+def _ao_escrever(tabelas):
+    """Ouvinte de notify_write (qualquer thread): só agenda a publicação"""
+    if 'queue_jobs' in tabelas or 'consultas' in tabelas:
+        eventos.agendar(_marcar_escrita, tabelas)
+
+registrar_ouvinte(_ao_escrever)
+
+async def _publicar_mudancas():
+    """Publica fila/estatísticas uma vez por rajada de escritas, se houver clientes"""
+    ultimas_stats = None
+    while True:
+        await _sinal_escrita.wait()
+        await asyncio.sleep(EVENTOS_AGRUPAMENTO_SEGUNDOS)
+        _sinal_escrita.clear()
+        tabelas = set(_tabelas_alteradas)
+        _tabelas_alteradas.clear()
+        if not eventos.clientes:
+            continue
+        try:
+            if 'queue_jobs' in tabelas:
+                eventos.publicar('fila', {})
+                stats = await asyncio.to_thread(_fila_stats)
+                if stats != ultimas_stats:
+                    eventos.publicar('fila_stats', stats)
+                    ultimas_stats = stats
+            if 'consultas' in tabelas:
+                eventos.publicar('estatisticas', await asyncio.to_thread(_estatisticas))
+        except Exception as e:
+            logger.error(f"❌ Erro ao publicar eventos: {e}")
+
+# Atraso do event loop e pilha das chamadas que o bloqueiam (ver src/api/monitor_loop.py)
+monitor_loop = MonitorLoop()
+
+@app.on_event("startup")
+async def iniciar_monitor_loop():
+    monitor_loop.iniciar()
+
+@app.on_event("shutdown")
+async def parar_monitor_loop():
+    await monitor_loop.parar()
+
+@app.on_event("startup")
+async def iniciar_eventos():
+    global _sinal_escrita
+    _sinal_escrita = asyncio.Event()
+    eventos.vincular(asyncio.get_running_loop())
+    app.state.tarefa_eventos = asyncio.create_task(_publicar_mudancas())
+
+@app.on_event("startup")
+async def iniciar_fila_escrita():
+    await write_queue.start()
+
+@app.on_event("shutdown")
+async def encerrar_fila_escrita():
+    """Grava as operações pendentes antes de encerrar"""
+    await write_queue.stop()
+
+# Retenção automática: move dados antigos para os bancos de arquivo
+# (ver src/database/retention.py); desativada com RETENCAO_INTERVALO_HORAS=0
+RETENCAO_INTERVALO_HORAS = float(os.getenv('RETENCAO_INTERVALO_HORAS', '0') or 0)
+
+async def _executar_retencao_periodica():
+    while True:
+        await asyncio.sleep(RETENCAO_INTERVALO_HORAS * 3600)
+        try:
+            resumo = await asyncio.to_thread(aplicar_retencao, DB_PATH, PoliticaRetencao.do_ambiente())
+            logger.info(f"📦 Retenção aplicada: {resumo}")
+        except Exception as e:
+            logger.error(f"❌ Erro ao aplicar retenção: {e}")
+
+@app.on_event("startup")
+async def agendar_retencao():
+    if RETENCAO_INTERVALO_HORAS > 0:
+        app.state.tarefa_retencao = asyncio.create_task(_executar_retencao_periodica())
+
+# Backup online periódico (API de backup do SQLite, ver src/database/backup.py);
+# desativado com BACKUP_INTERVALO_HORAS=0
+BACKUP_INTERVALO_HORAS = float(os.getenv('BACKUP_INTERVALO_HORAS', '0') or 0)
+
+async def _executar_backup_periodico():
+    while True:
+        await asyncio.sleep(BACKUP_INTERVALO_HORAS * 3600)
+        try:
+            resumo = await asyncio.to_thread(criar_backup, DB_PATH, PoliticaBackup.do_ambiente())
+            logger.info(f"💾 Backup criado: {resumo['caminho']} ({resumo['duracao']}s)")
+        except Exception as e:
+            logger.error(f"❌ Erro ao criar backup: {e}")
 
-# Inicializar banco na inicialização da aplicação
-init_database()
+@app.on_event("startup")
+async def agendar_backup():
+    if BACKUP_INTERVALO_HORAS > 0:
+        app.state.tarefa_backup = asyncio.create_task(_executar_backup_periodico())
 
 # Configurar CORS
 app.add_middleware(
@@ -204,6 +421,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
+)
+
+# Tempo das queries SQLite por rota (ver src/api/instrumentacao.py); por
+# dentro do cache HTTP, então respostas servidas do cache não contam
+app.add_middleware(InstrumentacaoMiddleware)
+
+# Compressão brotli/gzip das respostas acima do limite (ver src/api/compressao.py)
+app.add_middleware(
+    CompressaoMiddleware,
+    minimo_bytes=int(os.getenv('COMPRESSAO_MINIMO_BYTES', '1024') or 1024),
+)
+
+# Rotas de leitura servidas com ETag/304 e cache em memória (ver src/api/cache_http.py),
+# com as tabelas de que cada resposta depende. Ficam de fora as que dependem
+# do relógio (agendamentos, estatísticas de mensagens) ou do estado em memória
+# (status, progresso).
+ROTAS_CACHE_HTTP = {
+    "/api/empresas": ("empresas",),
+    "/api/empresas/count": ("empresas",),
+    "/api/empresas/options": ("empresas",),
+    "/api/consultas": ("consultas",),
+    "/api/consultas/count": ("consultas",),
+    "/api/estatisticas": ("consultas",),
+    "/api/mensagens": ("mensagens_sefaz",),
+    "/api/mensagens/count": ("mensagens_sefaz",),
+    "/api/mensagens/empresas": ("mensagens_sefaz",),
+    "/api/fila": ("queue_jobs", "empresas"),
+    "/api/fila/stats": ("queue_jobs",),
+}
+
+# Por fora da compressão: as respostas guardadas já estão comprimidas
+app.add_middleware(
+    CacheHTTPMiddleware,
+    rotas=ROTAS_CACHE_HTTP,
+    cache=query_cache,
+    ttl=float(os.getenv('CACHE_HTTP_TTL', '60') or 60),
 )
 
 # Modelos Pydantic
@@ -236,6 +490,20 @@ class ConsultaResponse(BaseModel):
     omisso_declaracao: Optional[str]
     inscrito_restritivo: Optional[str]
     data_consulta: str
+    # Colunas tipadas (formatação feita pelo cliente)
+    tvi_status: Optional[str] = None
+    tvi_saldo_centavos: Optional[int] = None
+    debitos_centavos: Optional[int] = None
+    flag_divida_pendente: Optional[bool] = None
+    flag_omisso_declaracao: Optional[bool] = None
+    flag_inscrito_restritivo: Optional[bool] = None
+
+CONSULTA_CAMPOS = tuple(ConsultaResponse.model_fields)
+CONSULTA_FLAGS = tuple(FLAGS.values())
+
+class ConsultaPageResponse(BaseModel):
+    items: List[ConsultaResponse]
+    total: int
 
 class EmpresaRequest(BaseModel):
     nome_empresa: str
@@ -257,6 +525,17 @@ class EmpresaResponse(BaseModel):
     ativo: bool
     observacoes: Optional[str]
 
+EMPRESA_CAMPOS = tuple(EmpresaResponse.model_fields)
+
+class EmpresaPageResponse(BaseModel):
+    items: List[EmpresaResponse]
+    total: int
+
+class EmpresaOptionResponse(BaseModel):
+    id: int
+    nome_empresa: str
+    inscricao_estadual: str
+
 class QueueJobRequest(BaseModel):
     empresa_ids: List[int]
     prioridade: Optional[int] = 0
@@ -323,14 +602,6 @@ class ProcessarMensagensResponse(BaseModel):
     detalhes: dict
     tempo_execucao: Optional[str] = None
 
-# Status global da consulta
-consulta_status = {
-    "running": False,
-    "message": "Aguardando consulta",
-    "progress": 0,
-    "current_step": ""
-}
-
 # ================================
 # ENDPOINTS PARA EMPRESAS
 # ================================
@@ -343,37 +614,47 @@ async def criar_empresa(empresa: EmpresaRequest):
         if not empresa.senha or not empresa.senha.strip():
             raise HTTPException(status_code=400, detail="Senha é obrigatória para criar empresa")
             
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         # Senha agora é armazenada em texto plano
         senha_texto_plano = empresa.senha
         
+        # Chaves canônicas: "12538398-3" e "125383983" são a mesma IE
+        chaves_empresa = chaves_canonicas('empresas', empresa.dict())
+        
         # Verificar se CNPJ já existe
-        cursor.execute("SELECT id FROM empresas WHERE cnpj = ?", (empresa.cnpj,))
+        cursor.execute("SELECT id FROM empresas WHERE cnpj_chave = ?", (chaves_empresa['cnpj_chave'],))
         if cursor.fetchone():
             raise HTTPException(status_code=400, detail="CNPJ já cadastrado")
         
         # Verificar se IE já existe
-        cursor.execute("SELECT id FROM empresas WHERE inscricao_estadual = ?", (empresa.inscricao_estadual,))
+        cursor.execute("SELECT id FROM empresas WHERE ie_chave = ?", (chaves_empresa['ie_chave'],))
         if cursor.fetchone():
             raise HTTPException(status_code=400, detail="Inscrição Estadual já cadastrada")
         
         # Inserir empresa
         cursor.execute("""
-            INSERT INTO empresas (nome_empresa, cnpj, inscricao_estadual, cpf_socio, senha, observacoes, ativo)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO empresas (nome_empresa, cnpj, inscricao_estadual, cpf_socio, senha, observacoes, ativo,
+                                  cnpj_chave, ie_chave, cpf_chave, nome_busca)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (empresa.nome_empresa, empresa.cnpj, empresa.inscricao_estadual,
-              empresa.cpf_socio, senha_texto_plano, empresa.observacoes, empresa.ativo))
+              empresa.cpf_socio, senha_texto_plano, empresa.observacoes, empresa.ativo,
+              chaves_empresa['cnpj_chave'], chaves_empresa['ie_chave'], chaves_empresa['cpf_chave'],
+              chaves_empresa['nome_busca']))
         
         empresa_id = cursor.lastrowid
         
+        # Consultas já gravadas para essa IE passam a apontar para a empresa
+        vincular_empresas(conn, chaves_empresa['ie_chave'])
+        
         # Buscar empresa criada
         cursor.execute("SELECT * FROM empresas WHERE id = ?", (empresa_id,))
         row = cursor.fetchone()
         
         conn.commit()
+        notify_write('empresas')
         conn.close()
         
         return EmpresaResponse(
@@ -393,64 +674,106 @@ async def criar_empresa(empresa: EmpresaRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao criar empresa: {str(e)}")
 
-@app.get("/api/empresas", response_model=List[EmpresaResponse])
+def _filtros_empresas(conn, search: Optional[str], ativo: Optional[bool]):
+    """
+    Monta as condições WHERE e os parâmetros dos filtros de empresas
+    
+    A busca livre usa o índice trigram (trecho do nome sem acentos, CNPJ ou
+    IE com ou sem pontuação), ver src/database/busca_empresas.py.
+    """
+    where_conditions = []
+    params = []
+    
+    if search:
+        condicao, busca_params = condicao_busca(conn, search)
+        if condicao:
+            where_conditions.append(condicao)
+            params.extend(busca_params)
+    
+    if ativo is not None:
+        where_conditions.append("ativo = ?")
+        params.append(ativo)
+    
+    return where_conditions, params
+
+def _contar_empresas(search: Optional[str], ativo: Optional[bool]) -> int:
+    """Total de empresas com os filtros (em cache até a próxima escrita em empresas)"""
+    def _contar():
+        conn = conectar_sqlite(DB_PATH)
+        where_conditions, params = _filtros_empresas(conn, search, ativo)
+        where_clause = ""
+        if where_conditions:
+            where_clause = "WHERE " + " AND ".join(where_conditions)
+        
+        total = conn.execute(f"SELECT COUNT(*) FROM empresas {where_clause}", params).fetchone()[0]
+        conn.close()
+        return total
+    
+    return query_cache.get_or_compute(("empresas_total", search, ativo), ("empresas",), _contar)
+
+@app.get("/api/empresas", response_model=Union[List[EmpresaResponse], EmpresaPageResponse])
 async def listar_empresas(
+    response: Response,
     limit: int = 50,
     offset: int = 0,
     search: Optional[str] = None,
-    ativo: Optional[bool] = None
+    ativo: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False
 ):
-    """Listar empresas com filtros e paginação"""
+    """
+    Listar empresas com filtros e paginação
+    
+    Use o cursor do header X-Next-Cursor para buscar a próxima página
+    (paginação por chave, sem OFFSET); offset é ignorado quando há cursor.
+    Com include_total=true a resposta é {items, total}, dispensando /count.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
         
         # Construir query com filtros
-        where_conditions = []
-        params = []
-        
-        if search:
-            where_conditions.append("(nome_empresa LIKE ? OR cnpj LIKE ? OR inscricao_estadual LIKE ?)")
-            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
+        where_conditions, params = _filtros_empresas(conn, search, ativo)
         
-        if ativo is not None:
-            where_conditions.append("ativo = ?")
-            params.append(ativo)
+        keyset, keyset_params = keyset_condition(("data_criacao", "id"), cursor)
+        if keyset:
+            where_conditions.append(keyset)
+            params.extend(keyset_params)
+            offset = 0
         
         where_clause = ""
         if where_conditions:
             where_clause = "WHERE " + " AND ".join(where_conditions)
         
         query = f"""
-            SELECT * FROM empresas 
+            SELECT {', '.join(EMPRESA_CAMPOS)} FROM empresas 
             {where_clause}
-            ORDER BY data_criacao DESC 
+            ORDER BY data_criacao DESC, id DESC 
             LIMIT ? OFFSET ?
         """
-        params.extend([limit, offset])
+        params.extend([limit + 1, offset])
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
         
         conn.close()
         
-        empresas = []
-        for row in rows:
-            empresas.append(EmpresaResponse(
-                id=row["id"],
-                nome_empresa=row["nome_empresa"],
-                cnpj=row["cnpj"],
-                inscricao_estadual=row["inscricao_estadual"],
-                cpf_socio=row["cpf_socio"],
-                data_criacao=row["data_criacao"],
-                data_atualizacao=row["data_atualizacao"],
-                ativo=bool(row["ativo"]),
-                observacoes=row["observacoes"]
-            ))
+        proximo = next_cursor(rows, limit, "data_criacao", "id")
+        if proximo:
+            response.headers[NEXT_CURSOR_HEADER] = proximo
+        rows = rows[:limit]
         
-        return empresas
+        # Dicionários direto das linhas, sem validar um EmpresaResponse por linha
+        empresas = linhas_para_dicts(rows, EMPRESA_CAMPOS, booleanos=("ativo",))
+        
+        if include_total:
+            return resposta_json({"items": empresas, "total": _contar_empresas(search, ativo)}, response)
         
+        return resposta_json(empresas, response)
+        
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar empresas: {str(e)}")
 
@@ -461,35 +784,47 @@ async def contar_empresas(
 ):
     """Contar total de empresas com filtros"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        return {"total": _contar_empresas(search, ativo)}
         
-        # Construir query com filtros
-        where_conditions = []
-        params = []
-        
-        if search:
-            where_conditions.append("(nome_empresa LIKE ? OR cnpj LIKE ? OR inscricao_estadual LIKE ?)")
-            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
-        
-        if ativo is not None:
-            where_conditions.append("ativo = ?")
-            params.append(ativo)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao contar empresas: {str(e)}")
+
+@app.get("/api/empresas/options", response_model=List[EmpresaOptionResponse])
+async def opcoes_empresas(
+    q: Optional[str] = None,
+    limit: int = 20,
+    ativo: Optional[bool] = True
+):
+    """
+    Typeahead de empresas para seletores (apenas id, nome e IE)
+    
+    ``q`` casa com qualquer trecho do nome (sem acentos), do CNPJ ou da IE
+    (com ou sem pontuação); sem ``q`` retorna as primeiras por nome.
+    """
+    try:
+        limit = max(1, min(limit, 200))
         
+        conn = conectar_sqlite(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        where_conditions, params = _filtros_empresas(conn, q.strip() if q else None, ativo)
         where_clause = ""
         if where_conditions:
             where_clause = "WHERE " + " AND ".join(where_conditions)
         
-        query = f"SELECT COUNT(*) FROM empresas {where_clause}"
-        cursor.execute(query, params)
-        total = cursor.fetchone()[0]
-        
+        # Sem cache: cada tecla é uma consulta nova, resolvida pelo índice;
+        # ORDER BY nome_busca percorre idx_empresas_nome_busca
+        rows = conn.execute(f"""
+            SELECT id, nome_empresa, inscricao_estadual FROM empresas
+            {where_clause}
+            ORDER BY nome_busca, id
+            LIMIT ?
+        """, params + [limit]).fetchall()
         conn.close()
         
-        return {"total": total}
+        return [dict(row) for row in rows]
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao contar empresas: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar empresas: {str(e)}")
 
 @app.get("/api/empresas/template-csv", response_class=FileResponse)
 def download_template_csv():
@@ -512,7 +847,7 @@ def download_template_csv():
 async def obter_empresa(empresa_id: int):
     """Obter empresa por ID"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -545,7 +880,7 @@ async def obter_empresa(empresa_id: int):
 async def atualizar_empresa(empresa_id: int, empresa: EmpresaRequest):
     """Atualizar empresa"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -554,12 +889,14 @@ async def atualizar_empresa(empresa_id: int, empresa: EmpresaRequest):
         if not cursor.fetchone():
             raise HTTPException(status_code=404, detail="Empresa não encontrada")
         
+        chaves_empresa = chaves_canonicas('empresas', empresa.dict())
+        
         # Verificar duplicatas (exceto a própria empresa)
-        cursor.execute("SELECT id FROM empresas WHERE cnpj = ? AND id != ?", (empresa.cnpj, empresa_id))
+        cursor.execute("SELECT id FROM empresas WHERE cnpj_chave = ? AND id != ?", (chaves_empresa['cnpj_chave'], empresa_id))
         if cursor.fetchone():
             raise HTTPException(status_code=400, detail="CNPJ já cadastrado")
         
-        cursor.execute("SELECT id FROM empresas WHERE inscricao_estadual = ? AND id != ?", (empresa.inscricao_estadual, empresa_id))
+        cursor.execute("SELECT id FROM empresas WHERE ie_chave = ? AND id != ?", (chaves_empresa['ie_chave'], empresa_id))
         if cursor.fetchone():
             raise HTTPException(status_code=400, detail="Inscrição Estadual já cadastrada")
         
@@ -570,25 +907,34 @@ async def atualizar_empresa(empresa_id: int, empresa: EmpresaRequest):
             cursor.execute("""
                 UPDATE empresas SET 
                     nome_empresa = ?, cnpj = ?, inscricao_estadual = ?, cpf_socio = ?, 
-                    senha = ?, observacoes = ?, ativo = ?, data_atualizacao = CURRENT_TIMESTAMP
+                    senha = ?, observacoes = ?, ativo = ?, data_atualizacao = CURRENT_TIMESTAMP,
+                    cnpj_chave = ?, ie_chave = ?, cpf_chave = ?, nome_busca = ?
                 WHERE id = ?
             """, (empresa.nome_empresa, empresa.cnpj, empresa.inscricao_estadual, 
-                  empresa.cpf_socio, senha_texto_plano, empresa.observacoes, empresa.ativo, empresa_id))
+                  empresa.cpf_socio, senha_texto_plano, empresa.observacoes, empresa.ativo,
+                  chaves_empresa['cnpj_chave'], chaves_empresa['ie_chave'], chaves_empresa['cpf_chave'],
+                  chaves_empresa['nome_busca'], empresa_id))
         else:
             # Não atualizar senha se não fornecida
             cursor.execute("""
                 UPDATE empresas SET 
                     nome_empresa = ?, cnpj = ?, inscricao_estadual = ?, cpf_socio = ?, 
-                    observacoes = ?, ativo = ?, data_atualizacao = CURRENT_TIMESTAMP
+                    observacoes = ?, ativo = ?, data_atualizacao = CURRENT_TIMESTAMP,
+                    cnpj_chave = ?, ie_chave = ?, cpf_chave = ?, nome_busca = ?
                 WHERE id = ?
             """, (empresa.nome_empresa, empresa.cnpj, empresa.inscricao_estadual, 
-                  empresa.cpf_socio, empresa.observacoes, empresa.ativo, empresa_id))
+                  empresa.cpf_socio, empresa.observacoes, empresa.ativo,
+                  chaves_empresa['cnpj_chave'], chaves_empresa['ie_chave'], chaves_empresa['cpf_chave'],
+                  chaves_empresa['nome_busca'], empresa_id))
+        
+        vincular_empresas(conn, chaves_empresa['ie_chave'])
         
         # Buscar empresa atualizada
         cursor.execute("SELECT * FROM empresas WHERE id = ?", (empresa_id,))
         row = cursor.fetchone()
         
         conn.commit()
+        notify_write('empresas')
         conn.close()
         
         return EmpresaResponse(
@@ -613,54 +959,50 @@ async def excluir_empresa(empresa_id: int):
     """Excluir empresa"""
     conn = None
     try:
-        print(f"🗑️ Tentando excluir empresa ID: {empresa_id}")
-        conn = sqlite3.connect(DB_PATH)
+        logger.info(f"🗑️ Tentando excluir empresa ID: {empresa_id}")
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Verificar se empresa existe
         cursor.execute("SELECT id FROM empresas WHERE id = ?", (empresa_id,))
         empresa = cursor.fetchone()
         if not empresa:
-            print(f"❌ Empresa {empresa_id} não encontrada")
+            logger.warning(f"❌ Empresa {empresa_id} não encontrada")
             raise HTTPException(status_code=404, detail="Empresa não encontrada")
         
-        print(f"✅ Empresa {empresa_id} encontrada")
-        
-        # Verificar se existem consultas vinculadas pela inscricao_estadual
-        cursor.execute("SELECT inscricao_estadual FROM empresas WHERE id = ?", (empresa_id,))
-        ie = cursor.fetchone()[0]
+        logger.debug(f"✅ Empresa {empresa_id} encontrada")
         
-        cursor.execute("SELECT COUNT(*) FROM consultas WHERE inscricao_estadual = ?", (ie,))
+        # Verificar se existem consultas vinculadas (empresa_id, preenchido pela IE canônica)
+        cursor.execute("SELECT COUNT(*) FROM consultas WHERE empresa_id = ?", (empresa_id,))
         total_consultas = cursor.fetchone()[0]
-        print(f"📊 Total de consultas vinculadas: {total_consultas}")
+        logger.debug(f"📊 Total de consultas vinculadas: {total_consultas}")
         
         # Verificar jobs na fila
         cursor.execute("SELECT COUNT(*) FROM queue_jobs WHERE empresa_id = ?", (empresa_id,))
         total_jobs = cursor.fetchone()[0]
-        print(f"📊 Total de jobs vinculados: {total_jobs}")
+        logger.debug(f"📊 Total de jobs vinculados: {total_jobs}")
         
         if total_consultas > 0 or total_jobs > 0:
             # Apenas desativar ao invés de excluir se houver consultas ou jobs
             cursor.execute("UPDATE empresas SET ativo = 0 WHERE id = ?", (empresa_id,))
             message = f"Empresa desativada (possui {total_consultas} consultas e {total_jobs} jobs vinculados)"
-            print(f"⚠️ {message}")
+            logger.info(f"⚠️ {message}")
         else:
             # Excluir permanentemente se não houver consultas nem jobs
             cursor.execute("DELETE FROM empresas WHERE id = ?", (empresa_id,))
             message = "Empresa excluída com sucesso"
-            print(f"✅ {message}")
+            logger.info(f"✅ {message}")
         
         conn.commit()
-        print(f"✅ Commit realizado com sucesso")
+        notify_write('empresas')
+        logger.debug("✅ Commit realizado com sucesso")
         
         return {"message": message, "id": empresa_id}
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Erro ao excluir empresa {empresa_id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Erro ao excluir empresa {empresa_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao excluir empresa: {str(e)}")
     finally:
         if conn:
@@ -670,7 +1012,7 @@ async def excluir_empresa(empresa_id: int):
 async def obter_credenciais_empresa(empresa_id: int):
     """Obter credenciais de login da empresa (CPF e senha)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -698,11 +1040,12 @@ async def obter_credenciais_empresa(empresa_id: int):
 async def obter_credenciais_por_ie(inscricao_estadual: str):
     """Obter credenciais de login da empresa por Inscrição Estadual"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        cursor.execute("SELECT id, cpf_socio, senha, nome_empresa, inscricao_estadual FROM empresas WHERE inscricao_estadual = ?", (inscricao_estadual,))
+        # Aceita a IE com ou sem formatação (busca pela chave canônica)
+        cursor.execute("SELECT id, cpf_socio, senha, nome_empresa, inscricao_estadual FROM empresas WHERE ie_chave = ?", (chave_ie(inscricao_estadual),))
         row = cursor.fetchone()
         
         if not row:
@@ -725,77 +1068,29 @@ async def obter_credenciais_por_ie(inscricao_estadual: str):
 
 @app.post("/api/empresas/importar-csv")
 async def importar_empresas_csv(request: dict):
-    """Importar múltiplas empresas via CSV"""
+    """Importar múltiplas empresas via CSV (linhas já convertidas pelo navegador)"""
     try:
-        print(f"Recebido request: {request}")
         empresas = request.get('empresas', [])
-        print(f"Total de empresas: {len(empresas)}")
         
         if not empresas:
             raise HTTPException(status_code=400, detail="Nenhuma empresa fornecida")
         
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        sucesso = 0
-        erros = 0
-        detalhes = []
-        
-        for empresa in empresas:
-            try:
-                print(f"Processando empresa: {empresa}")
-                
-                # Validar campos obrigatórios
-                nome = empresa.get('nome_empresa', '').strip()
-                cnpj = empresa.get('cnpj', '').strip()
-                ie = empresa.get('inscricao_estadual', '').strip()
-                cpf = empresa.get('cpf_socio', '').strip()
-                senha = empresa.get('senha', '').strip()
-                obs = empresa.get('observacoes', '').strip()
-                
-                print(f"Campos: nome={nome}, cnpj={cnpj}, ie={ie}, cpf={cpf}")
-                
-                if not all([nome, cnpj, ie, cpf, senha]):
-                    detalhes.append(f"❌ {nome or cnpj}: campos obrigatórios faltando")
-                    erros += 1
-                    continue
-                
-                # Verificar duplicatas no banco
-                cursor.execute("SELECT nome_empresa FROM empresas WHERE cnpj = ?", (cnpj,))
-                existing = cursor.fetchone()
-                if existing:
-                    detalhes.append(f"⚠️ {nome} (CNPJ: {cnpj}): já existe no sistema como '{existing[0]}'")
-                    erros += 1
-                    continue
-                
-                cursor.execute("SELECT nome_empresa FROM empresas WHERE inscricao_estadual = ?", (ie,))
-                existing_ie = cursor.fetchone()
-                if existing_ie:
-                    detalhes.append(f"⚠️ {nome} (IE: {ie}): já existe no sistema como '{existing_ie[0]}'")
-                    erros += 1
-                    continue
-                
-                # Inserir empresa
-                cursor.execute("""
-                    INSERT INTO empresas (nome_empresa, cnpj, inscricao_estadual, cpf_socio, senha, observacoes, ativo)
-                    VALUES (?, ?, ?, ?, ?, ?, 1)
-                """, (nome, cnpj, ie, cpf, senha, obs))
-                
-                detalhes.append(f"✓ {nome}: importada com sucesso")
-                sucesso += 1
-                
-            except Exception as e:
-                detalhes.append(f"❌ {empresa.get('nome_empresa', 'N/A')}: {str(e)}")
-                erros += 1
+        linhas = [
+            (numero_linha, {chave: str(valor or '').strip() for chave, valor in empresa.items()})
+            for numero_linha, empresa in enumerate(empresas, start=2)
+        ]
+        resultado = ResultadoImportacao()
         
-        conn.commit()
-        conn.close()
+        for bloco in em_blocos(linhas):
+            resultado.mesclar(await persistir(
+                DB_PATH, lambda conn, bloco=bloco: gravar_bloco(conn, bloco, resultado), 'empresas'
+            ))
         
         return {
-            "sucesso": sucesso,
-            "erros": erros,
+            "sucesso": resultado.sucesso,
+            "erros": resultado.erros,
             "total": len(empresas),
-            "detalhes": detalhes
+            "detalhes": resultado.detalhes
         }
         
     except HTTPException:
@@ -803,17 +1098,117 @@ async def importar_empresas_csv(request: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao importar empresas: {str(e)}")
 
+# Tamanho dos blocos lidos do corpo da requisição
+IMPORTACAO_CHUNK_BYTES = 64 * 1024
+
+def _formato_importacao(formato: Optional[str], nome_arquivo: Optional[str], content_type: Optional[str]) -> str:
+    """'xlsx' ou 'csv', pelo parâmetro, extensão do arquivo ou Content-Type"""
+    if formato:
+        formato = formato.lower()
+        if formato not in ('csv', 'xlsx'):
+            raise HTTPException(status_code=400, detail="Formato deve ser 'csv' ou 'xlsx'")
+        return formato
+    if (nome_arquivo or '').lower().endswith('.xlsx') or 'spreadsheetml' in (content_type or ''):
+        return 'xlsx'
+    return 'csv'
+
+async def _blocos_importacao(request: Request, formato: Optional[str]):
+    """
+    Blocos de linhas do arquivo enviado, lidos sob demanda
+    
+    Aceita o arquivo como corpo bruto da requisição (nome no header
+    X-Filename) ou como multipart/form-data no campo "arquivo"; nos dois
+    casos o corpo é lido em blocos, sem esperar o upload terminar.
+    """
+    content_type = request.headers.get('content-type', '')
+    
+    if content_type.startswith('multipart/form-data'):
+        nome_arquivo, tipo_arquivo, conteudo = await arquivo_multipart(request.stream(), content_type)
+    else:
+        nome_arquivo, tipo_arquivo, conteudo = request.headers.get('x-filename'), content_type, request.stream()
+    tipo = _formato_importacao(formato, nome_arquivo, tipo_arquivo)
+    
+    if tipo == 'csv':
+        return em_blocos_async(linhas_csv(conteudo))
+    
+    # XLSX é um zip: precisa de acesso aleatório, então vai para um arquivo temporário
+    arquivo = tempfile.SpooledTemporaryFile(max_size=IMPORTACAO_CHUNK_BYTES * 16)
+    async for chunk in conteudo:
+        arquivo.write(chunk)
+    arquivo.seek(0)
+    blocos = em_blocos(linhas_xlsx(arquivo))
+    
+    async def _blocos_xlsx():
+        # openpyxl é síncrono: cada bloco é lido em uma thread
+        while (bloco := await asyncio.to_thread(next, blocos, None)) is not None:
+            yield bloco
+    return _blocos_xlsx()
+
+def _classificar_importacao(bloco, anteriores: ResultadoImportacao, atualizar: bool) -> ResultadoImportacao:
+    """Classifica um bloco sem gravar (dry run), em conexão própria"""
+    conn = conectar_sqlite(DB_PATH)
+    try:
+        return gravar_bloco(conn, bloco, anteriores, atualizar, dry_run=True)
+    finally:
+        conn.close()
+
+@app.post("/api/empresas/importar")
+async def importar_empresas_arquivo(
+    request: Request,
+    dry_run: bool = False,
+    atualizar: bool = False,
+    formato: Optional[str] = None
+):
+    """
+    Importa empresas de um arquivo CSV ou XLSX em blocos
+    
+    A resposta é NDJSON: um evento {"tipo": "progresso", ...} por bloco e
+    um {"tipo": "resumo", ...} ao final. Com dry_run=true as linhas são
+    validadas e confrontadas com o banco, sem gravar nada.
+    """
+    try:
+        blocos = (await _blocos_importacao(request, formato)).__aiter__()
+        # Ler o primeiro bloco antes de responder: erros de cabeçalho viram HTTP 400
+        primeiro = await anext(blocos, None)
+    except ImportacaoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao ler arquivo de importação: {str(e)}")
+    
+    resultado = ResultadoImportacao()
+    
+    async def _processar():
+        bloco = primeiro
+        try:
+            while bloco is not None:
+                if dry_run:
+                    parcial = await asyncio.to_thread(_classificar_importacao, bloco, resultado, atualizar)
+                else:
+                    # Somado ao resumo só após o commit (um bloco desfeito não conta)
+                    parcial = await persistir(
+                        DB_PATH,
+                        lambda conn, bloco=bloco: gravar_bloco(conn, bloco, resultado, atualizar),
+                        'empresas'
+                    )
+                resultado.mesclar(parcial)
+                yield json.dumps(resultado.progresso()) + "\n"
+                bloco = await anext(blocos, None)
+        except Exception as e:
+            yield json.dumps({"tipo": "erro", "detail": f"Erro ao importar empresas: {str(e)}"}) + "\n"
+        
+        yield json.dumps(resultado.resumo(dry_run), ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(_processar(), media_type="application/x-ndjson")
+
 # ================================
 # ENDPOINTS ORIGINAIS (CONSULTAS)
 # ================================
 
-consulta_status = {
-    "running": False,
-    "message": "Aguardando consulta",
-    "progress": 0,
-    "current_step": "",
-    "last_result": None
-}
+# Progresso das consultas avulsas e dos jobs da fila (ver src/api/progresso.py)
+progresso = RegistroProgresso(publicar=eventos.publicar)
+_sequencia_consultas = itertools.count(1)
 
 @app.get("/")
 async def read_root():
@@ -828,40 +1223,113 @@ async def read_root():
             status_code=404
         )
 
-@app.get("/api/consultas", response_model=List[ConsultaResponse])
+# Última consulta de cada empresa (IE canônica, índice idx_consultas_ie_chave_data)
+ULTIMAS_CONSULTAS_JOIN = """
+    INNER JOIN (
+        SELECT ie_chave, MAX(data_consulta) as max_data
+        FROM consultas
+        GROUP BY ie_chave
+    ) latest ON c.ie_chave = latest.ie_chave 
+           AND c.data_consulta = latest.max_data
+"""
+
+def _filtros_consultas(
+    search: Optional[str],
+    status: Optional[str],
+    tem_tvi: Optional[str],
+    tem_divida: Optional[str]
+):
+    """Monta as condições WHERE e os parâmetros dos filtros de consultas (alias "c")"""
+    where_conditions = []
+    params = []
+    
+    if search:
+        where_conditions.append("(c.nome_empresa LIKE ? OR c.inscricao_estadual LIKE ?)")
+        params.extend([f"%{search}%", f"%{search}%"])
+    
+    if status:
+        where_conditions.append("c.status_ie = ?")
+        params.append(status)
+    
+    if tem_tvi:
+        # Aceita o enum (com_tvi, sem_tvi, ...) ou os valores antigos SIM/NÃO
+        flag_tvi = tipar_flag(tem_tvi)
+        where_conditions.append("c.tvi_status = ?")
+        params.append(tem_tvi if flag_tvi is None else (TVI_COM if flag_tvi else TVI_SEM))
+    
+    if tem_divida:
+        flag_divida = tipar_flag(tem_divida)
+        if flag_divida is None:
+            where_conditions.append("c.flag_divida_pendente IS NULL")
+        else:
+            where_conditions.append("c.flag_divida_pendente = ?")
+            params.append(flag_divida)
+    
+    return where_conditions, params
+
+def _contar_consultas(
+    search: Optional[str],
+    status: Optional[str],
+    tem_tvi: Optional[str],
+    tem_divida: Optional[str]
+) -> int:
+    """
+    Total de empresas consultadas com os filtros (última consulta de cada IE).
+    
+    O resultado fica em cache até a próxima escrita em consultas, de modo que
+    a listagem e /api/consultas/count compartilham a mesma contagem.
+    """
+    def _contar():
+        where_conditions, params = _filtros_consultas(search, status, tem_tvi, tem_divida)
+        where_clause = ""
+        if where_conditions:
+            where_clause = "WHERE " + " AND ".join(where_conditions)
+        
+        conn = conectar_sqlite(DB_PATH)
+        total = conn.execute(f"""
+            SELECT COUNT(*) FROM consultas c
+            {ULTIMAS_CONSULTAS_JOIN}
+            {where_clause}
+        """, params).fetchone()[0]
+        conn.close()
+        return total
+    
+    chave = ("consultas_total", search, status, tem_tvi, tem_divida)
+    return query_cache.get_or_compute(chave, ("consultas",), _contar)
+
+@app.get("/api/consultas", response_model=Union[List[ConsultaResponse], ConsultaPageResponse])
 async def get_consultas(
+    response: Response,
     limit: int = 50, 
     offset: int = 0,
     search: Optional[str] = None,
     status: Optional[str] = None,
     tem_tvi: Optional[str] = None,
-    tem_divida: Optional[str] = None
+    tem_divida: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False
 ):
-    """Retorna consultas com filtros e paginação"""
+    """
+    Retorna consultas com filtros e paginação
+    
+    Use o cursor do header X-Next-Cursor para buscar a próxima página
+    (paginação por chave, sem OFFSET); offset é ignorado quando há cursor.
+    Com include_total=true a resposta é {items, total}, dispensando /count.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
         
         # Construir query com filtros
-        where_conditions = []
-        params = []
-        
-        if search:
-            where_conditions.append("(c.nome_empresa LIKE ? OR c.inscricao_estadual LIKE ?)")
-            params.extend([f"%{search}%", f"%{search}%"])
-        
-        if status:
-            where_conditions.append("c.status_ie = ?")
-            params.append(status)
+        where_conditions, params = _filtros_consultas(search, status, tem_tvi, tem_divida)
         
-        if tem_tvi:
-            where_conditions.append("c.tem_tvi = ?")
-            params.append(tem_tvi)
-        
-        if tem_divida:
-            where_conditions.append("c.tem_divida_pendente = ?")
-            params.append(tem_divida)
+        # Posição da página: continua após o último item do cursor
+        keyset, keyset_params = keyset_condition(("c.data_consulta", "c.id"), cursor)
+        if keyset:
+            where_conditions.append(keyset)
+            params.extend(keyset_params)
+            offset = 0
         
         where_clause = ""
         if where_conditions:
@@ -870,76 +1338,35 @@ async def get_consultas(
         # Query principal - busca apenas a última consulta de cada empresa (inscricao_estadual)
         query = f"""
             SELECT c.* FROM consultas c
-            INNER JOIN (
-                SELECT inscricao_estadual, MAX(data_consulta) as max_data
-                FROM consultas
-                GROUP BY inscricao_estadual
-            ) latest ON c.inscricao_estadual = latest.inscricao_estadual 
-                   AND c.data_consulta = latest.max_data
+            {ULTIMAS_CONSULTAS_JOIN}
             {where_clause}
-            ORDER BY c.data_consulta DESC 
+            ORDER BY c.data_consulta DESC, c.id DESC 
             LIMIT ? OFFSET ?
         """
-        params.extend([limit, offset])
+        params.extend([limit + 1, offset])
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        
-        # Query para total (para paginação) - conta apenas últimas consultas
-        count_query = f"""
-            SELECT COUNT(*) FROM (
-                SELECT c.* FROM consultas c
-                INNER JOIN (
-                    SELECT inscricao_estadual, MAX(data_consulta) as max_data
-                    FROM consultas
-                    GROUP BY inscricao_estadual
-                ) latest ON c.inscricao_estadual = latest.inscricao_estadual 
-                       AND c.data_consulta = latest.max_data
-                {where_clause}
-            )
-        """
-        cursor.execute(count_query, params[:-2])  # Remove limit e offset
-        total = cursor.fetchone()[0]
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
         
         conn.close()
         
-        consultas = []
-        for row in rows:
-            # Formatar tem_tvi para exibição
-            tem_tvi_display = row["tem_tvi"]
-            if tem_tvi_display:
-                try:
-                    # Tentar converter para float
-                    tvi_valor = float(tem_tvi_display)
-                    if tvi_valor > 0:
-                        # Formatar como moeda brasileira
-                        tem_tvi_display = f"R$ {tvi_valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-                    elif tvi_valor == 0:
-                        tem_tvi_display = "NÃO"
-                except (ValueError, TypeError):
-                    # Se não for número, manter o valor original (SIM, NÃO, ERRO, etc)
-                    pass
-            
-            consulta = ConsultaResponse(
-                id=row["id"],
-                nome_empresa=row["nome_empresa"],
-                cnpj=row["cnpj"],
-                inscricao_estadual=row["inscricao_estadual"],
-                cpf_socio=row["cpf_socio"],
-                chave_acesso=row["chave_acesso"],
-                status_ie=row["status_ie"],
-                tem_tvi=tem_tvi_display,
-                valor_debitos=row["valor_debitos"],
-                tem_divida_pendente=row["tem_divida_pendente"],
-                omisso_declaracao=row["omisso_declaracao"],
-                inscrito_restritivo=row["inscrito_restritivo"],
-                data_consulta=row["data_consulta"]
+        proximo = next_cursor(rows, limit, "data_consulta", "id")
+        if proximo:
+            response.headers[NEXT_CURSOR_HEADER] = proximo
+        rows = rows[:limit]
+        
+        consultas = linhas_para_dicts(rows, CONSULTA_CAMPOS, booleanos=CONSULTA_FLAGS)
+        
+        if include_total:
+            return resposta_json(
+                {"items": consultas, "total": _contar_consultas(search, status, tem_tvi, tem_divida)},
+                response
             )
-            consultas.append(consulta)
         
-        # Adicionar header com total para paginação
-        return consultas
+        return resposta_json(consultas, response)
     
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar consultas: {str(e)}")
 
@@ -947,7 +1374,7 @@ async def get_consultas(
 async def delete_consulta(consulta_id: int):
     """Exclui uma consulta específica"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Verificar se a consulta existe
@@ -958,6 +1385,7 @@ async def delete_consulta(consulta_id: int):
         # Excluir a consulta
         cursor.execute("DELETE FROM consultas WHERE id = ?", (consulta_id,))
         conn.commit()
+        notify_write('consultas')
         
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Consulta não encontrada")
@@ -980,60 +1408,115 @@ async def get_consultas_count(
 ):
     """Retorna o total de consultas com filtros aplicados"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Construir query com filtros
-        where_conditions = []
-        params = []
-        
-        if search:
-            where_conditions.append("(c.nome_empresa LIKE ? OR c.inscricao_estadual LIKE ?)")
-            params.extend([f"%{search}%", f"%{search}%"])
-        
-        if status:
-            where_conditions.append("c.status_ie = ?")
-            params.append(status)
-        
-        if tem_tvi:
-            where_conditions.append("c.tem_tvi = ?")
-            params.append(tem_tvi)
-        
-        if tem_divida:
-            where_conditions.append("c.tem_divida_pendente = ?")
-            params.append(tem_divida)
-        
+        # Contar apenas a última consulta de cada empresa
+        return {"total": _contar_consultas(search, status, tem_tvi, tem_divida)}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao contar consultas: {str(e)}")
+
+def _resposta_exportacao(prefixo: str, formato: str, sql: str, params: list, transformar=None) -> StreamingResponse:
+    """Resposta em streaming com o arquivo exportado (ver src/api/exportacao.py)"""
+    return StreamingResponse(
+        exportar(DB_PATH, sql, params, formato, transformar),
+        media_type=FORMATOS_EXPORTACAO[formato],
+        headers={"Content-Disposition": f"attachment; filename={nome_arquivo(prefixo, formato)}"}
+    )
+
+CONSULTA_EXPORT_COLUNAS = (
+    'id', 'nome_empresa', 'cnpj', 'inscricao_estadual', 'cpf_socio', 'chave_acesso',
+    'status_ie', 'tem_tvi', 'valor_debitos', 'tem_divida_pendente', 'omisso_declaracao',
+    'inscrito_restritivo', 'data_consulta', 'tvi_status', 'tvi_saldo_centavos', 'debitos_centavos',
+    'flag_divida_pendente', 'flag_omisso_declaracao', 'flag_inscrito_restritivo',
+)
+
+@app.get("/api/consultas/exportar")
+async def exportar_consultas(
+    formato: str = "csv",
+    search: Optional[str] = None,
+    status: Optional[str] = None,
+    tem_tvi: Optional[str] = None,
+    tem_divida: Optional[str] = None,
+    historico: bool = False
+):
+    """
+    Exporta consultas (CSV, NDJSON ou XLSX) com os filtros da listagem
+    
+    Por padrão exporta a última consulta de cada empresa, como a listagem;
+    com historico=true exporta todas as consultas.
+    """
+    try:
+        formato = validar_formato(formato)
+        where_conditions, params = _filtros_consultas(search, status, tem_tvi, tem_divida)
         where_clause = ""
         if where_conditions:
             where_clause = "WHERE " + " AND ".join(where_conditions)
         
-        # Contar apenas a última consulta de cada empresa
-        query = f"""
-            SELECT COUNT(*) FROM (
-                SELECT c.* FROM consultas c
-                INNER JOIN (
-                    SELECT inscricao_estadual, MAX(data_consulta) as max_data
-                    FROM consultas
-                    GROUP BY inscricao_estadual
-                ) latest ON c.inscricao_estadual = latest.inscricao_estadual 
-                       AND c.data_consulta = latest.max_data
-                {where_clause}
-            )
-        """
-        cursor.execute(query, params)
-        total = cursor.fetchone()[0]
-        
+        conn = conectar_sqlite(DB_PATH)
+        colunas = colunas_select(conn, "consultas", CONSULTA_EXPORT_COLUNAS, "c")
         conn.close()
         
-        return {"total": total}
+        sql = f"""
+            SELECT {colunas} FROM consultas c
+            {"" if historico else ULTIMAS_CONSULTAS_JOIN}
+            {where_clause}
+            ORDER BY c.data_consulta DESC, c.id DESC
+        """
+        return _resposta_exportacao("consultas", formato, sql, params)
     
+    except ExportacaoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao contar consultas: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar consultas: {str(e)}")
 
 # ========================================
 # ENDPOINTS DE MENSAGENS SEFAZ
 # ========================================
 
+def _filtros_mensagens(conn, search: Optional[str], inscricao_estadual: Optional[str], assunto: Optional[str]):
+    """
+    Monta JOIN, WHERE e parâmetros dos filtros de mensagens (alias "m").
+    
+    A busca livre usa o índice FTS5 (ranqueado, sem acentos) quando
+    disponível e cai para LIKE em bancos sem o índice.
+    
+    Returns:
+        tuple: (join_clause, where_clause, params, usa_fts)
+    """
+    join_clause = ""
+    where_conditions = []
+    params = []
+    usa_fts = False
+    
+    if search:
+        match = build_match_query(search)
+        if match and fts_ativo(conn):
+            usa_fts = True
+            join_clause = f"JOIN {FTS_TABLE} ON {FTS_TABLE}.rowid = m.id"
+            where_conditions.append(f"{FTS_TABLE} MATCH ?")
+            params.append(match)
+        else:
+            where_conditions.append("(m.assunto LIKE ? OR m.conteudo_mensagem LIKE ? OR m.nome_empresa LIKE ?)")
+            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
+    
+    if inscricao_estadual:
+        # IE em qualquer formato: igualdade na chave canônica (idx_mensagens_ie_chave)
+        where_conditions.append("m.ie_chave = ?")
+        params.append(chave_ie(inscricao_estadual))
+    
+    if assunto:
+        where_conditions.append("m.assunto LIKE ?")
+        params.append(f"%{assunto}%")
+    
+    where_clause = ""
+    if where_conditions:
+        where_clause = "WHERE " + " AND ".join(where_conditions)
+    
+    return join_clause, where_clause, params, usa_fts
+
+def _conteudo_html(conn, row_dict) -> Optional[str]:
+    """HTML da mensagem: coluna legada ou página no arquivo comprimido"""
+    return row_dict.get("conteudo_html") or carregar_pagina(conn, row_dict.get("pagina_hash"))
+
 class MensagemResponse(BaseModel):
     id: int
     inscricao_estadual: Optional[str]
@@ -1055,69 +1538,152 @@ class MensagemResponse(BaseModel):
     conteudo_mensagem: Optional[str]
     conteudo_html: Optional[str]
     link_recibo: Optional[str]
+    trecho: Optional[str] = None  # Trecho destacado da busca textual
 
-@app.get("/api/mensagens", response_model=List[MensagemResponse])
+class MensagemResumoResponse(BaseModel):
+    """Projeção enxuta para a tabela de mensagens (sem conteúdo completo nem HTML)"""
+    id: int
+    inscricao_estadual: Optional[str]
+    nome_empresa: Optional[str]
+    enviada_por: Optional[str]
+    data_envio: Optional[str]
+    assunto: Optional[str]
+    classificacao: Optional[str]
+    tributo: Optional[str]
+    tipo_mensagem: Optional[str]
+    vencimento: Optional[str]
+    competencia_dief: Optional[str]
+    status_dief: Optional[str]
+    data_leitura: Optional[str]
+    data_ciencia: Optional[str]
+    preview: Optional[str]  # Início do conteúdo da mensagem
+    trecho: Optional[str] = None  # Trecho destacado da busca textual
+
+# Colunas da projeção resumida e tamanho da prévia do conteúdo
+MENSAGEM_RESUMO_COLUNAS = (
+    'id', 'inscricao_estadual', 'nome_empresa', 'enviada_por', 'data_envio', 'assunto',
+    'classificacao', 'tributo', 'tipo_mensagem', 'vencimento', 'competencia_dief',
+    'status_dief', 'data_leitura', 'data_ciencia',
+)
+MENSAGEM_PREVIEW_CHARS = 160
+
+class MensagemPageResponse(BaseModel):
+    items: Union[List[MensagemResponse], List[MensagemResumoResponse]]
+    total: int
+
+def _contar_mensagens(search: Optional[str], inscricao_estadual: Optional[str], assunto: Optional[str]) -> int:
+    """Total de mensagens com os filtros (em cache até a próxima escrita em mensagens_sefaz)"""
+    def _contar():
+        conn = conectar_sqlite(DB_MENSAGENS)
+        join_clause, where_clause, params, _ = _filtros_mensagens(conn, search, inscricao_estadual, assunto)
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM mensagens_sefaz m {join_clause} {where_clause}", params
+        ).fetchone()[0]
+        conn.close()
+        return total
+    
+    chave = ("mensagens_total", search, inscricao_estadual, assunto)
+    return query_cache.get_or_compute(chave, ("mensagens_sefaz",), _contar)
+
+@app.get(
+    "/api/mensagens",
+    response_model=Union[List[MensagemResponse], List[MensagemResumoResponse], MensagemPageResponse]
+)
 async def get_mensagens(
+    response: Response,
     limit: int = 50,
     offset: int = 0,
     search: Optional[str] = None,
     inscricao_estadual: Optional[str] = None,
-    assunto: Optional[str] = None
+    assunto: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    resumo: bool = False
 ):
-    """Retorna mensagens SEFAZ com filtros e paginação"""
+    """
+    Retorna mensagens SEFAZ com filtros e paginação
+    
+    Use o cursor do header X-Next-Cursor para buscar a próxima página
+    (paginação por chave, sem OFFSET); offset é ignorado quando há cursor.
+    Com include_total=true a resposta é {items, total}, dispensando /count.
+    Com resumo=true cada item traz apenas as colunas da tabela e uma prévia
+    do conteúdo; o corpo completo fica em /api/mensagens/{id}.
+    """
     try:
-        print(f"🔍 GET /api/mensagens - Parâmetros recebidos:")
-        print(f"   - limit: {limit}")
-        print(f"   - offset: {offset}")
-        print(f"   - search: {search}")
-        print(f"   - inscricao_estadual: {inscricao_estadual}")
-        print(f"   - assunto: {assunto}")
-        
-        conn = sqlite3.connect(DB_MENSAGENS)
+        logger.debug(
+            f"🔍 GET /api/mensagens - limit={limit} offset={offset} search={search} "
+            f"inscricao_estadual={inscricao_estadual} assunto={assunto}"
+        )
+        
+        conn = conectar_sqlite(DB_MENSAGENS)
         conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
         
         # Construir query com filtros
-        where_conditions = []
-        params = []
-        
-        if search:
-            where_conditions.append("(assunto LIKE ? OR conteudo_mensagem LIKE ? OR nome_empresa LIKE ?)")
-            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
-        
-        if inscricao_estadual:
-            where_conditions.append("inscricao_estadual = ?")
-            params.append(inscricao_estadual)
-            print(f"   ✓ Filtro IE aplicado: {inscricao_estadual}")
-        
-        if assunto:
-            where_conditions.append("assunto LIKE ?")
-            params.append(f"%{assunto}%")
-            print(f"   ✓ Filtro assunto aplicado: {assunto}")
+        join_clause, where_clause, params, usa_fts = _filtros_mensagens(conn, search, inscricao_estadual, assunto)
         
-        where_clause = ""
-        if where_conditions:
-            where_clause = "WHERE " + " AND ".join(where_conditions)
+        if usa_fts:
+            # Resultados ranqueados por relevância (bm25) com trecho destacado
+            chave_ordem = f"{FTS_TABLE}.rank"
+            select_extra = f", snippet({FTS_TABLE}, -1, '<mark>', '</mark>', '…', 16) AS trecho"
+            order_by = f"ORDER BY {FTS_TABLE}.rank, m.id"
+        else:
+            chave_ordem = "COALESCE(m.data_envio, '')"
+            select_extra = ""
+            order_by = "ORDER BY COALESCE(m.data_envio, '') DESC, m.id DESC"
+        select_extra += f", {chave_ordem} AS chave_ordem"
+        
+        keyset, keyset_params = keyset_condition((chave_ordem, "m.id"), cursor, descending=not usa_fts)
+        if keyset:
+            where_clause = f"{where_clause} AND {keyset}" if where_clause else f"WHERE {keyset}"
+            params.extend(keyset_params)
+            offset = 0
+        
+        if resumo:
+            # Apenas as colunas exibidas na tabela + prévia do conteúdo
+            existentes = {col[1] for col in conn.execute("PRAGMA table_info(mensagens_sefaz)")}
+            colunas = ', '.join(
+                f"m.{col}" if col in existentes else f"NULL AS {col}"
+                for col in MENSAGEM_RESUMO_COLUNAS
+            )
+            select_colunas = f"{colunas}, substr(m.conteudo_mensagem, 1, {MENSAGEM_PREVIEW_CHARS}) AS preview"
+        else:
+            select_colunas = "m.*"
         
         query = f"""
-            SELECT * FROM mensagens_sefaz
+            SELECT {select_colunas}{select_extra} FROM mensagens_sefaz m
+            {join_clause}
             {where_clause}
-            ORDER BY data_envio DESC, id DESC
+            {order_by}
             LIMIT ? OFFSET ?
         """
-        params.extend([limit, offset])
+        params.extend([limit + 1, offset])
         
-        print(f"   📋 Query SQL: {query}")
-        print(f"   📋 Parâmetros: {params}")
+        logger.debug(f"📋 Query SQL: {query} | Parâmetros: {params}")
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
+        
+        logger.debug(f"✅ Mensagens encontradas: {len(rows)}")
+        
+        proximo = next_cursor(rows, limit, "chave_ordem", "id")
+        if proximo:
+            response.headers[NEXT_CURSOR_HEADER] = proximo
         
-        print(f"   ✅ Mensagens encontradas: {len(rows)}")
+        # Páginas arquivadas da página de resultados, numa consulta só
+        rows = [dict(row) for row in rows[:limit]]
+        paginas = {} if resumo else carregar_paginas(
+            conn, (row.get("pagina_hash") for row in rows if not row.get("conteudo_html"))
+        )
         
         mensagens = []
-        for row in rows:
-            row_dict = dict(row)
+        for row_dict in rows:
+            if resumo:
+                item = {col: row_dict[col] for col in MENSAGEM_RESUMO_COLUNAS}
+                item["preview"] = row_dict["preview"]
+                item["trecho"] = row_dict.get("trecho")
+                mensagens.append(item)
+                continue
             mensagens.append({
                 "id": row_dict["id"],
                 "inscricao_estadual": row_dict["inscricao_estadual"],
@@ -1137,18 +1703,25 @@ async def get_mensagens(
                 "data_leitura": row_dict.get("data_leitura"),
                 "data_ciencia": row_dict.get("data_ciencia"),
                 "conteudo_mensagem": row_dict["conteudo_mensagem"],
-                "conteudo_html": row_dict.get("conteudo_html"),
-                "link_recibo": row_dict.get("link_recibo")
+                "conteudo_html": row_dict.get("conteudo_html") or paginas.get(row_dict.get("pagina_hash")),
+                "link_recibo": row_dict.get("link_recibo"),
+                "trecho": row_dict.get("trecho")
             })
         
         conn.close()
-        return mensagens
+        
+        if include_total:
+            return resposta_json(
+                {"items": mensagens, "total": _contar_mensagens(search, inscricao_estadual, assunto)},
+                response
+            )
+        
+        return resposta_json(mensagens, response)
     
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        import traceback
-        error_detail = f"Erro ao buscar mensagens: {str(e)}\n{traceback.format_exc()}"
-        print(f"❌ ERRO NO ENDPOINT /api/mensagens:")
-        print(error_detail)
+        logger.exception(f"❌ Erro no endpoint /api/mensagens: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao buscar mensagens: {str(e)}")
 
 @app.get("/api/mensagens/count")
@@ -1159,47 +1732,56 @@ async def get_mensagens_count(
 ):
     """Retorna o total de mensagens"""
     try:
-        print(f"🔍 GET /api/mensagens/count - Parâmetros:")
-        print(f"   - inscricao_estadual: {inscricao_estadual}")
-        print(f"   - assunto: {assunto}")
-        
-        conn = sqlite3.connect(DB_MENSAGENS)
-        cursor = conn.cursor()
-        
-        where_conditions = []
-        params = []
-        
-        if search:
-            where_conditions.append("(assunto LIKE ? OR conteudo_mensagem LIKE ? OR nome_empresa LIKE ?)")
-            params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
-        
-        if inscricao_estadual:
-            where_conditions.append("inscricao_estadual = ?")
-            params.append(inscricao_estadual)
+        logger.debug(f"🔍 GET /api/mensagens/count - inscricao_estadual={inscricao_estadual} assunto={assunto}")
         
-        if assunto:
-            where_conditions.append("assunto LIKE ?")
-            params.append(f"%{assunto}%")
+        return {"total": _contar_mensagens(search, inscricao_estadual, assunto)}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao contar mensagens: {str(e)}")
+
+MENSAGEM_EXPORT_COLUNAS = MENSAGEM_RESUMO_COLUNAS + (
+    'cpf_socio', 'numero_documento', 'chave_dief', 'protocolo_dief', 'link_recibo', 'conteudo_mensagem',
+)
+
+@app.get("/api/mensagens/exportar")
+async def exportar_mensagens(
+    formato: str = "csv",
+    search: Optional[str] = None,
+    inscricao_estadual: Optional[str] = None,
+    assunto: Optional[str] = None
+):
+    """Exporta mensagens (CSV, NDJSON ou XLSX) com os filtros da listagem, sem o HTML"""
+    try:
+        formato = validar_formato(formato)
         
-        where_clause = ""
-        if where_conditions:
-            where_clause = "WHERE " + " AND ".join(where_conditions)
+        conn = conectar_sqlite(DB_MENSAGENS)
+        join_clause, where_clause, params, usa_fts = _filtros_mensagens(conn, search, inscricao_estadual, assunto)
+        colunas = colunas_select(conn, "mensagens_sefaz", MENSAGEM_EXPORT_COLUNAS, "m")
+        conn.close()
         
-        query = f"SELECT COUNT(*) FROM mensagens_sefaz {where_clause}"
-        cursor.execute(query, params)
-        total = cursor.fetchone()[0]
+        if usa_fts:
+            order_by = f"ORDER BY {FTS_TABLE}.rank, m.id"
+        else:
+            order_by = "ORDER BY COALESCE(m.data_envio, '') DESC, m.id DESC"
         
-        conn.close()
-        return {"total": total}
+        sql = f"""
+            SELECT {colunas} FROM mensagens_sefaz m
+            {join_clause}
+            {where_clause}
+            {order_by}
+        """
+        return _resposta_exportacao("mensagens", formato, sql, params)
     
+    except ExportacaoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao contar mensagens: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar mensagens: {str(e)}")
 
 @app.get("/api/mensagens/empresas")
 async def listar_empresas_mensagens():
     """Lista empresas únicas que têm mensagens"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1230,11 +1812,11 @@ async def listar_empresas_mensagens():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar empresas: {str(e)}")
 
-@app.get("/api/mensagens/{mensagem_id}", response_model=MensagemResponse)
+@app.get("/api/mensagens/{mensagem_id:int}", response_model=MensagemResponse)
 async def get_mensagem(mensagem_id: int):
     """Retorna uma mensagem específica pelo ID"""
     try:
-        conn = sqlite3.connect(DB_MENSAGENS)
+        conn = conectar_sqlite(DB_MENSAGENS)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1264,7 +1846,7 @@ async def get_mensagem(mensagem_id: int):
             "data_leitura": row_dict.get("data_leitura"),
             "data_ciencia": row_dict.get("data_ciencia"),
             "conteudo_mensagem": row_dict["conteudo_mensagem"],
-            "conteudo_html": row_dict.get("conteudo_html"),
+            "conteudo_html": _conteudo_html(conn, row_dict),
             "link_recibo": row_dict.get("link_recibo")
         }
         
@@ -1276,11 +1858,11 @@ async def get_mensagem(mensagem_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar mensagem: {str(e)}")
 
-@app.delete("/api/mensagens/{mensagem_id}")
+@app.delete("/api/mensagens/{mensagem_id:int}")
 async def delete_mensagem(mensagem_id: int):
     """Exclui uma mensagem pelo ID"""
     try:
-        conn = sqlite3.connect(DB_MENSAGENS)
+        conn = conectar_sqlite(DB_MENSAGENS)
         cursor = conn.cursor()
         
         # Verificar se a mensagem existe
@@ -1291,6 +1873,7 @@ async def delete_mensagem(mensagem_id: int):
         # Excluir mensagem
         cursor.execute("DELETE FROM mensagens_sefaz WHERE id = ?", (mensagem_id,))
         conn.commit()
+        notify_write('mensagens_sefaz')
         conn.close()
         
         return {"message": "Mensagem excluída com sucesso", "id": mensagem_id}
@@ -1308,6 +1891,11 @@ async def delete_mensagem(mensagem_id: int):
 # ENDPOINT PARA MESSAGE BOT (PROCESSAMENTO INDEPENDENTE)
 # ========================================
 
+def _message_bot():
+    """MessageBot importado sob demanda (carrega o Playwright)"""
+    from src.bot.message_bot import MessageBot
+    return MessageBot()
+
 @app.post("/api/mensagens/processar", response_model=ProcessarMensagensResponse)
 async def processar_mensagens_empresa(request: ProcessarMensagensRequest, background_tasks: BackgroundTasks):
     """
@@ -1336,7 +1924,7 @@ async def processar_mensagens_empresa(request: ProcessarMensagensRequest, backgr
             raise HTTPException(status_code=400, detail="Inscrição Estadual é obrigatória")
         
         # Criar instância do MessageBot
-        message_bot = MessageBot()
+        message_bot = _message_bot()
         
         # Verificar conexão com banco antes de executar
         if not message_bot.verificar_conexao_banco():
@@ -1369,8 +1957,6 @@ async def processar_mensagens_empresa(request: ProcessarMensagensRequest, backgr
         raise
     except Exception as e:
         # Log detalhado do erro
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"❌ Erro no processamento de mensagens: {e}")
         logger.error(f"   - CPF: {request.cpf}")
         logger.error(f"   - IE: {request.inscricao_estadual}")
@@ -1413,8 +1999,13 @@ async def get_estatisticas_mensagens(inscricao_estadual: str):
         Dict com total, mensagens de hoje e da semana
     """
     try:
-        message_bot = MessageBot()
-        estatisticas = message_bot.get_estatisticas_mensagens(inscricao_estadual)
+        # "hoje" e "semana" dependem do relógio: validade curta além da invalidação por escrita
+        estatisticas = query_cache.get_or_compute(
+            ("mensagens_estatisticas", inscricao_estadual),
+            ("mensagens_sefaz",),
+            lambda: _message_bot().get_estatisticas_mensagens(inscricao_estadual),
+            ttl=60
+        )
         
         return {
             "inscricao_estadual": inscricao_estadual,
@@ -1433,8 +2024,12 @@ async def get_estatisticas_mensagens_globais():
         Dict com estatísticas de todas as empresas
     """
     try:
-        message_bot = MessageBot()
-        estatisticas = message_bot.get_estatisticas_mensagens()
+        estatisticas = query_cache.get_or_compute(
+            ("mensagens_estatisticas", None),
+            ("mensagens_sefaz",),
+            lambda: _message_bot().get_estatisticas_mensagens(),
+            ttl=60
+        )
         
         return {
             "estatisticas_globais": estatisticas
@@ -1449,37 +2044,53 @@ async def get_estatisticas_mensagens_globais():
 
 @app.get("/api/status", response_model=StatusResponse)
 async def get_status():
-    """Retorna o status atual da consulta"""
+    """Retorna o status da consulta avulsa mais recente"""
+    ultima = progresso.ultima(tipo='consulta')
+    if ultima is None:
+        return StatusResponse(
+            status="success",
+            message="Aguardando consulta",
+            data={"running": False, "progress": 0, "current_step": "", "last_result": None}
+        )
+    
+    running = ultima["status"] == "running"
     return StatusResponse(
-        status="success" if not consulta_status["running"] else "running",
-        message=consulta_status["message"],
+        status="running" if running else "success",
+        message=ultima["mensagem"] or ("Consulta em andamento" if running else "Consulta finalizada"),
         data={
-            "running": consulta_status["running"],
-            "progress": consulta_status["progress"],
-            "current_step": consulta_status["current_step"],
-            "last_result": consulta_status["last_result"]
+            "job_id": ultima["job_id"],
+            "running": running,
+            "progress": ultima["progresso"],
+            "current_step": ultima["etapa"] or "",
+            "last_result": ultima.get("resultado")
         }
     )
 
+@app.get("/api/progresso")
+async def listar_progresso(ativos: bool = True):
+    """Progresso das execuções em memória (jobs da fila e consultas avulsas) e resumo por etapa"""
+    return {
+        "resumo": progresso.resumo(),
+        "execucoes": progresso.listar(ativos_apenas=ativos)
+    }
+
+@app.get("/api/progresso/{job_id}")
+async def obter_progresso(job_id: str):
+    """Progresso de uma execução (id do job da fila ou da consulta avulsa)"""
+    entrada = progresso.obter(job_id)
+    if entrada is None:
+        raise HTTPException(status_code=404, detail=f"Execução {job_id} não encontrada")
+    return entrada
+
 @app.post("/api/executar-consulta", response_model=StatusResponse)
 @app.post("/api/consulta", response_model=StatusResponse)  # Manter compatibilidade
 async def executar_consulta(request: ConsultaRequest, background_tasks: BackgroundTasks):
     """Executa uma nova consulta em background (modo headless ou visual)"""
-    global consulta_status
-    
-    if consulta_status["running"]:
+    if progresso.em_execucao(tipo='consulta'):
         raise HTTPException(status_code=400, detail="Já existe uma consulta em execução")
     
-    # Se modo visual está ativo, retornar resposta especial
+    # Modo visual: a consulta roda na extensão Chrome, que acompanha o próprio progresso
     if request.modo_visual:
-        consulta_status["running"] = True
-        consulta_status["message"] = "Consulta em modo visual - aguardando extensão Chrome"
-        consulta_status["progress"] = 50
-        consulta_status["current_step"] = "Executando no navegador..."
-        
-        # Simular execução visual (dados serão processados pela extensão)
-        background_tasks.add_task(simulate_visual_mode_execution)
-        
         return StatusResponse(
             status="success",
             message="Modo visual ativado - consulta sendo executada no navegador",
@@ -1487,135 +2098,104 @@ async def executar_consulta(request: ConsultaRequest, background_tasks: Backgrou
         )
     
     # Modo headless tradicional
+    job_id = f"consulta-{next(_sequencia_consultas)}"
+    progresso.iniciar(job_id, tipo='consulta', inscricao_estadual=request.inscricao_estadual)
     background_tasks.add_task(
         run_consulta_background, 
+        job_id,
         request.usuario or request.cpf_socio, 
         request.senha, 
         request.inscricao_estadual,
         request.headless
     )
     
-    consulta_status["running"] = True
-    consulta_status["message"] = "Consulta iniciada"
-    consulta_status["progress"] = 0
-    consulta_status["current_step"] = "Iniciando..."
-    
     return StatusResponse(
         status="success",
         message="Consulta iniciada com sucesso",
-        data={"running": True, "visual_mode": False}
+        data={"running": True, "visual_mode": False, "job_id": job_id}
     )
 
-async def run_consulta_background(usuario: Optional[str], senha: Optional[str], inscricao_estadual: Optional[str] = None, headless: bool = True):
+# Vazão e duração das consultas (fila e avulsas), exportadas em /metrics
+JOBS_FINALIZADOS = metricas.contador(
+    'sefaz_jobs_total', 'Consultas finalizadas por origem e resultado', ('origem', 'resultado')
+)
+JOB_DURACAO = metricas.histograma(
+    'sefaz_job_duracao_segundos', 'Duração das consultas (navegador aberto até o logout)', ('origem', 'resultado'),
+    (5, 10, 20, 30, 60, 90, 120, 180, 300, 600, 900)
+)
+JOB_ERROS = metricas.contador(
+    'sefaz_erros_total', 'Consultas interrompidas por exceção, por categoria do erro', ('origem', 'categoria')
+)
+
+def _registrar_fim_job(origem: str, inicio: float, resultado: str, erro: Optional[str] = None) -> None:
+    """resultado: 'sucesso', 'falha' (sem dados) ou 'erro' (exceção)"""
+    JOBS_FINALIZADOS.inc(origem=origem, resultado=resultado)
+    JOB_DURACAO.observar(time.monotonic() - inicio, origem=origem, resultado=resultado)
+    if erro is not None:
+        JOB_ERROS.inc(origem=origem, categoria=get_error_category(erro))
+
+async def run_consulta_background(job_id: str, usuario: Optional[str], senha: Optional[str], inscricao_estadual: Optional[str] = None, headless: bool = True):
     """Executa a consulta em background"""
-    global consulta_status
-    
+    inicio = time.monotonic()
     try:
-        consulta_status["current_step"] = "Inicializando bot..."
-        consulta_status["progress"] = 10
-        
         # Configurar modo headless via variável de ambiente
         os.environ['HEADLESS'] = 'true' if headless else 'false'
-        bot = SEFAZBot()
+        from src.bot.sefaz_bot import SEFAZBot  # Playwright carregado só na primeira consulta
+        bot = SEFAZBot(ao_progresso=progresso.callback(job_id))
         
-        consulta_status["current_step"] = "Fazendo login..."
-        consulta_status["progress"] = 20
-        
-        resultado = await bot.executar_consulta(usuario, senha, inscricao_estadual)
-        
-        consulta_status["progress"] = 100
+        with contexto_log(job_id=job_id, cpf_hash=hash_cpf(usuario), segredos=(senha,) if senha else ()):
+            resultado = await bot.executar_consulta(usuario, senha, inscricao_estadual)
         
         if resultado:
-            consulta_status["message"] = "Consulta realizada com sucesso!"
-            consulta_status["current_step"] = "Concluído"
-            consulta_status["last_result"] = resultado
+            progresso.finalizar(job_id, True, "Consulta realizada com sucesso!", resultado=resultado)
         else:
-            consulta_status["message"] = "Falha na consulta"
-            consulta_status["current_step"] = "Erro"
+            progresso.finalizar(job_id, False, "Falha na consulta")
+        _registrar_fim_job('avulsa', inicio, 'sucesso' if resultado else 'falha')
             
     except Exception as e:
-        consulta_status["message"] = f"Erro: {str(e)}"
-        consulta_status["current_step"] = "Erro"
-        consulta_status["progress"] = 0
-    
-    finally:
-        consulta_status["running"] = False
+        logger.error(f"❌ Erro na consulta {job_id}: {str(e)}")
+        progresso.finalizar(job_id, False, f"Erro: {str(e)}")
+        _registrar_fim_job('avulsa', inicio, 'erro', str(e))
 
-async def simulate_visual_mode_execution():
-    """Simula execução de consulta em modo visual"""
-    global consulta_status
+def _calcular_estatisticas() -> dict:
+    """Calcula as estatísticas do dashboard em uma única varredura"""
+    conn = conectar_sqlite(DB_PATH)
+    cursor = conn.cursor()
     
-    try:
-        # Aguardar um pouco para simular processamento
-        await asyncio.sleep(2)
-        
-        consulta_status["progress"] = 75
-        consulta_status["current_step"] = "Aguardando resultado da extensão..."
-        
-        # Aguardar mais tempo para simular execução no navegador
-        await asyncio.sleep(5)
-        
-        consulta_status["progress"] = 100
-        consulta_status["current_step"] = "Concluído via modo visual"
-        consulta_status["message"] = "Consulta executada com sucesso no modo visual"
-        
-    except Exception as e:
-        logger.error(f"Erro na simulação visual: {str(e)}")
-        consulta_status["message"] = f"Erro no modo visual: {str(e)}"
-        consulta_status["current_step"] = "Erro"
-    finally:
-        # Aguardar mais um pouco antes de resetar status
-        await asyncio.sleep(3)
-        consulta_status["running"] = False
+    # Contagens e somas condicionais sobre as últimas consultas por empresa
+    cursor.execute(f"""
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(CASE WHEN c.status_ie = 'ATIVO' THEN 1 ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN c.debitos_centavos > 0 THEN 1 ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN c.tvi_status = 'com_tvi' THEN 1 ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN c.debitos_centavos > 0 THEN c.debitos_centavos ELSE 0 END), 0) / 100.0
+        FROM consultas c
+        {ULTIMAS_CONSULTAS_JOIN}
+    """)
+    (total_consultas, empresas_ativas, empresas_com_dividas,
+     empresas_com_tvis, valor_total_dividas) = cursor.fetchone()
+    
+    conn.close()
+    
+    return {
+        "total_consultas": total_consultas,
+        "empresas_ativas": empresas_ativas,
+        "empresas_com_dividas": empresas_com_dividas,
+        "empresas_com_tvis": empresas_com_tvis,
+        "valor_total_dividas": valor_total_dividas,
+        "percentual_ativas": round((empresas_ativas / total_consultas * 100) if total_consultas > 0 else 0, 2)
+    }
+
+def _estatisticas() -> dict:
+    # Recalculado apenas quando a tabela consultas é alterada
+    return query_cache.get_or_compute("estatisticas", ("consultas",), _calcular_estatisticas)
 
 @app.get("/api/estatisticas")
 async def get_estatisticas():
     """Retorna estatísticas das consultas (apenas últimas consultas por empresa)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Subquery para últimas consultas
-        latest_query = """
-            SELECT c.* FROM consultas c
-            INNER JOIN (
-                SELECT inscricao_estadual, MAX(data_consulta) as max_data
-                FROM consultas
-                GROUP BY inscricao_estadual
-            ) latest ON c.inscricao_estadual = latest.inscricao_estadual 
-                   AND c.data_consulta = latest.max_data
-        """
-        
-        # Total de consultas (últimas por empresa)
-        cursor.execute(f"SELECT COUNT(*) FROM ({latest_query})")
-        total_consultas = cursor.fetchone()[0]
-        
-        # Empresas ativas
-        cursor.execute(f"SELECT COUNT(*) FROM ({latest_query}) WHERE status_ie = 'ATIVO'")
-        empresas_ativas = cursor.fetchone()[0]
-        
-        # Empresas com dívidas
-        cursor.execute(f"SELECT COUNT(*) FROM ({latest_query}) WHERE valor_debitos > 0")
-        empresas_com_dividas = cursor.fetchone()[0]
-        
-        # Empresas com TVIs
-        cursor.execute(f"SELECT COUNT(*) FROM ({latest_query}) WHERE tem_tvi = 'SIM'")
-        empresas_com_tvis = cursor.fetchone()[0]
-        
-        # Valor total de dívidas
-        cursor.execute(f"SELECT SUM(valor_debitos) FROM ({latest_query}) WHERE valor_debitos > 0")
-        valor_total_dividas = cursor.fetchone()[0] or 0
-        
-        conn.close()
-        
-        return {
-            "total_consultas": total_consultas,
-            "empresas_ativas": empresas_ativas,
-            "empresas_com_dividas": empresas_com_dividas,
-            "empresas_com_tvis": empresas_com_tvis,
-            "valor_total_dividas": valor_total_dividas,
-            "percentual_ativas": round((empresas_ativas / total_consultas * 100) if total_consultas > 0 else 0, 2)
-        }
+        return _estatisticas()
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao calcular estatísticas: {str(e)}")
@@ -1625,7 +2205,7 @@ async def get_estatisticas():
 async def adicionar_fila(request: QueueJobRequest, background_tasks: BackgroundTasks):
     """Adiciona empresas à fila de processamento"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         job_ids = []
@@ -1633,7 +2213,7 @@ async def adicionar_fila(request: QueueJobRequest, background_tasks: BackgroundT
             # Verificar se a empresa existe
             cursor.execute("SELECT id FROM empresas WHERE id = ? AND ativo = 1", (empresa_id,))
             if not cursor.fetchone():
-                print(f"❌ Empresa {empresa_id} não encontrada ou inativa")
+                logger.warning(f"❌ Empresa {empresa_id} não encontrada ou inativa")
                 raise HTTPException(status_code=404, detail=f"Empresa com ID {empresa_id} não encontrada ou inativa")
             
             # Verificar se já existe um job pendente para esta empresa
@@ -1644,10 +2224,10 @@ async def adicionar_fila(request: QueueJobRequest, background_tasks: BackgroundT
             
             existing_job = cursor.fetchone()
             if existing_job:
-                print(f"⚠️ Empresa {empresa_id} já tem job pendente/em execução (ID: {existing_job[0]})")
+                logger.info(f"⚠️ Empresa {empresa_id} já tem job pendente/em execução (ID: {existing_job[0]})")
                 continue  # Pular se já existe job pendente/executando
             
-            print(f"➕ Adicionando empresa {empresa_id} à fila")
+            logger.debug(f"➕ Adicionando empresa {empresa_id} à fila")
             
             # Adicionar à fila (sem especificar data_adicao, deixar o DEFAULT CURRENT_TIMESTAMP)
             try:
@@ -1657,25 +2237,28 @@ async def adicionar_fila(request: QueueJobRequest, background_tasks: BackgroundT
                 """, (empresa_id, request.prioridade))
                 
                 job_ids.append(cursor.lastrowid)
-                print(f"✅ Job ID {cursor.lastrowid} criado com sucesso")
+                logger.info(f"✅ Job ID {cursor.lastrowid} criado para empresa {empresa_id}")
             except Exception as insert_error:
-                print(f"❌ ERRO AO INSERIR: {type(insert_error).__name__}: {insert_error}")
-                import traceback
-                traceback.print_exc()
+                logger.exception(f"❌ Erro ao inserir job: {type(insert_error).__name__}: {insert_error}")
                 raise
         
         conn.commit()
+        notify_write('queue_jobs')
         conn.close()
         
+        for job_id in job_ids:
+            _publicar_job(job_id, 'pending')
+        
         # Iniciar processamento automaticamente se houver jobs adicionados
         global processing_active
-        print(f"🔍 DEBUG: job_ids={job_ids}, len={len(job_ids)}, processing_active={processing_active}")
+        logger.debug(f"🔍 job_ids={job_ids}, processing_active={processing_active}")
         if len(job_ids) > 0 and not processing_active:
             processing_active = True
-            print(f"✅ Iniciando processamento automático da fila...")
+            eventos.publicar('processamento', {"processando": True})
+            logger.info("✅ Iniciando processamento automático da fila...")
             background_tasks.add_task(processar_fila)
         else:
-            print(f"⚠️ Não iniciou: job_ids vazio={len(job_ids)==0}, já processando={processing_active}")
+            logger.debug(f"⚠️ Não iniciou: job_ids vazio={len(job_ids)==0}, já processando={processing_active}")
         
         return {
             "message": f"{len(job_ids)} empresas adicionadas à fila",
@@ -1685,14 +2268,50 @@ async def adicionar_fila(request: QueueJobRequest, background_tasks: BackgroundT
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao adicionar à fila: {str(e)}")
 
+def _filtros_fila(status: Optional[str]):
+    """Monta as condições WHERE e os parâmetros dos filtros da fila (alias "qj")"""
+    where_conditions = []
+    params = []
+    
+    if status:
+        where_conditions.append("qj.status = ?")
+        params.append(status)
+    
+    return where_conditions, params
+
 @app.get("/api/fila", response_model=List[QueueJobResponse])
-async def listar_fila(limit: int = 50, offset: int = 0):
-    """Lista jobs na fila"""
+async def listar_fila(
+    response: Response,
+    limit: int = 50,
+    offset: int = 0,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    """
+    Lista jobs na fila
+    
+    Use o cursor do header X-Next-Cursor para buscar a próxima página
+    (paginação por chave, sem OFFSET); offset é ignorado quando há cursor.
+    """
+    conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        conn = conectar_sqlite(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        db_cursor = conn.cursor()
         
-        cursor.execute("""
+        where_conditions, params = _filtros_fila(status)
+        
+        keyset, keyset_params = keyset_condition(("qj.data_adicao", "qj.id"), cursor)
+        if keyset:
+            where_conditions.append(keyset)
+            params.extend(keyset_params)
+            offset = 0
+        
+        where_clause = ""
+        if where_conditions:
+            where_clause = "WHERE " + " AND ".join(where_conditions)
+        
+        db_cursor.execute(f"""
             SELECT 
                 qj.id,
                 qj.empresa_id,
@@ -1708,65 +2327,185 @@ async def listar_fila(limit: int = 50, offset: int = 0):
                 qj.erro_detalhes
             FROM queue_jobs qj
             JOIN empresas e ON qj.empresa_id = e.id
-            ORDER BY qj.data_adicao DESC
+            {where_clause}
+            ORDER BY qj.data_adicao DESC, qj.id DESC
             LIMIT ? OFFSET ?
-        """, (limit, offset))
+        """, params + [limit + 1, offset])
+        
+        rows = db_cursor.fetchall()
+        
+        proximo = next_cursor(rows, limit, "data_adicao", "id")
+        if proximo:
+            response.headers[NEXT_CURSOR_HEADER] = proximo
         
         jobs = []
-        for row in cursor.fetchall():
-            erro_original = row[11]
+        for row in rows[:limit]:
+            erro_original = row["erro_detalhes"]
             erro_amigavel = get_user_friendly_error_message(erro_original) if erro_original else None
             
             jobs.append({
-                "id": row[0],
-                "empresa_id": row[1],
-                "nome_empresa": row[2],
-                "cnpj": row[3],
-                "inscricao_estadual": row[4],
-                "status": row[5],
-                "prioridade": row[6],
-                "data_adicao": row[7],
-                "data_processamento": row[8],
-                "tentativas": row[9],
-                "max_tentativas": row[10],
+                "id": row["id"],
+                "empresa_id": row["empresa_id"],
+                "nome_empresa": row["nome_empresa"],
+                "cnpj": row["cnpj"],
+                "inscricao_estadual": row["inscricao_estadual"],
+                "status": row["status"],
+                "prioridade": row["prioridade"],
+                "data_adicao": row["data_adicao"],
+                "data_processamento": row["data_processamento"],
+                "tentativas": row["tentativas"],
+                "max_tentativas": row["max_tentativas"],
                 "erro": erro_amigavel
             })
         
-        conn.close()
         return jobs
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar fila: {str(e)}")
+    finally:
+        if conn:
+            conn.close()
+
+
+@app.get("/api/fila/exportar")
+async def exportar_fila(formato: str = "csv", status: Optional[str] = None):
+    """Exporta os jobs da fila (CSV, NDJSON ou XLSX) com os filtros da listagem"""
+    try:
+        formato = validar_formato(formato)
+        where_conditions, params = _filtros_fila(status)
+        where_clause = ""
+        if where_conditions:
+            where_clause = "WHERE " + " AND ".join(where_conditions)
+        
+        sql = f"""
+            SELECT 
+                qj.id,
+                qj.empresa_id,
+                e.nome_empresa,
+                e.cnpj,
+                e.inscricao_estadual,
+                qj.status,
+                qj.prioridade,
+                qj.data_adicao,
+                qj.data_processamento,
+                qj.tentativas,
+                qj.max_tentativas,
+                qj.erro_detalhes AS erro
+            FROM queue_jobs qj
+            JOIN empresas e ON qj.empresa_id = e.id
+            {where_clause}
+            ORDER BY qj.data_adicao DESC, qj.id DESC
+        """
+        
+        def _erro_amigavel(linha):
+            if linha["erro"]:
+                linha["erro"] = get_user_friendly_error_message(linha["erro"])
+            return linha
+        
+        return _resposta_exportacao("fila", formato, sql, params, _erro_amigavel)
+    
+    except ExportacaoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao exportar fila: {str(e)}")
+
+def _contar_por_status():
+    conn = conectar_sqlite(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT status, COUNT(*) FROM queue_jobs GROUP BY status")
+    stats = dict(cursor.fetchall())
+    conn.close()
+    return stats
+
+def _fila_stats() -> dict:
+    """Contagem de jobs por status (também publicada no evento fila_stats)"""
+    stats = query_cache.get_or_compute("fila_stats", ("queue_jobs",), _contar_por_status)
+    
+    # Retornar com os nomes reais do banco de dados (em inglês)
+    # O banco usa: pending, running, completed, failed
+    pending = stats.get("pending", 0)
+    completed = stats.get("completed", 0)
+    failed = stats.get("failed", 0)
+    running = stats.get("running", 0)
+    
+    return {
+        "pendente": pending,
+        "processando": running,
+        "concluido": completed,
+        "erro": failed,
+        "total": pending + running + completed + failed
+    }
 
 @app.get("/api/fila/stats")
 async def stats_fila():
     """Estatísticas da fila"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT status, COUNT(*) FROM queue_jobs GROUP BY status")
-        stats = dict(cursor.fetchall())
+        return _fila_stats()
         
-        conn.close()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas da fila: {str(e)}")
+
+# Linhas do tempo dos jobs em execução (gravadas em queue_jobs ao final)
+_linhas_em_execucao = {}
+
+@app.get("/api/fila/etapas")
+async def estatisticas_etapas(data_inicio: Optional[str] = None, data_fim: Optional[str] = None):
+    """
+    p50/p95 por etapa (duração, atraso artificial e espera real) dos jobs
+    processados no período (datas YYYY-MM-DD; padrão: últimos 7 dias)
+    """
+    try:
+        condicoes = ["linha_do_tempo IS NOT NULL"]
+        params = []
+        if data_inicio:
+            condicoes.append("date(data_processamento) >= date(?)")
+            params.append(data_inicio)
+        else:
+            condicoes.append("date(data_processamento) >= date('now', '-7 days')")
+        if data_fim:
+            condicoes.append("date(data_processamento) <= date(?)")
+            params.append(data_fim)
         
-        # Retornar com os nomes reais do banco de dados (em inglês)
-        # O banco usa: pending, running, completed, failed
-        pending = stats.get("pending", 0)
-        completed = stats.get("completed", 0)
-        failed = stats.get("failed", 0)
-        running = stats.get("running", 0)
+        def calcular():
+            conn = conectar_sqlite(DB_PATH)
+            try:
+                rows = conn.execute(
+                    f"SELECT linha_do_tempo FROM queue_jobs WHERE {' AND '.join(condicoes)}", params
+                ).fetchall()
+            finally:
+                conn.close()
+            return {"jobs": len(rows), "etapas": percentis_por_etapa(row[0] for row in rows)}
         
-        return {
-            "pendente": pending,
-            "processando": running,
-            "concluido": completed,
-            "erro": failed,
-            "total": pending + running + completed + failed
-        }
+        return await asyncio.to_thread(
+            query_cache.get_or_compute, ("fila_etapas", data_inicio, data_fim), ("queue_jobs",), calcular
+        )
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas da fila: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular estatísticas das etapas: {str(e)}")
+
+@app.get("/api/fila/{job_id}/timeline")
+async def timeline_job(job_id: int):
+    """Linha do tempo das etapas do job (em andamento ou da última execução)"""
+    linha = _linhas_em_execucao.get(job_id)
+    if linha is not None:
+        return {"job_id": job_id, "status": "running", **linha.expandir()}
+    
+    try:
+        conn = conectar_sqlite(DB_PATH)
+        row = conn.execute(
+            "SELECT status, data_processamento, linha_do_tempo FROM queue_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        conn.close()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter linha do tempo: {str(e)}")
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    dados = expandir(row[2]) or {"inicio": None, "duracao_ms": 0, "etapas": []}
+    return {"job_id": job_id, "status": row[0], "data_processamento": row[1], **dados}
 
 async def criar_proximo_agendamento(job_id: int, empresa_id: int, recorrencia: str, 
                                    data_atual: str, cursor):
@@ -1795,10 +2534,14 @@ async def criar_proximo_agendamento(job_id: int, empresa_id: int, recorrencia: s
             ) VALUES (?, 'pending', 'agendada', ?, ?, 1, 'recorrencia')
         """, (empresa_id, proxima_data.isoformat(), recorrencia))
         
-        print(f"🔄 Próximo agendamento criado para empresa {empresa_id}: {proxima_data}")
+        logger.info(f"🔄 Próximo agendamento criado para empresa {empresa_id}: {proxima_data}")
         
     except Exception as e:
-        print(f"⚠️ Erro ao criar próximo agendamento: {e}")
+        logger.warning(f"⚠️ Erro ao criar próximo agendamento: {e}")
+
+def _publicar_job(job_id: int, status: str, **dados):
+    """Publica a transição de estado de um job (evento job)"""
+    eventos.publicar('job', {"id": job_id, "status": status, **dados})
 
 async def processar_fila():
     """Processa a fila de jobs sequencialmente"""
@@ -1811,155 +2554,112 @@ async def processar_fila():
             if policy_cls:
                 current_policy = asyncio.get_event_loop_policy()
                 if not isinstance(current_policy, policy_cls):
-                    print(f"⚠️ Alterando event loop policy de {current_policy.__class__.__name__} para WindowsProactorEventLoopPolicy")
+                    logger.warning(f"⚠️ Alterando event loop policy de {current_policy.__class__.__name__} para WindowsProactorEventLoopPolicy")
                     asyncio.set_event_loop_policy(policy_cls())
-                    print("✅ Event loop policy alterada com sucesso")
+                    logger.info("✅ Event loop policy alterada com sucesso")
             else:
-                print("⚠️ WindowsProactorEventLoopPolicy não está disponível nesta versão do Python")
+                logger.warning("⚠️ WindowsProactorEventLoopPolicy não está disponível nesta versão do Python")
         except Exception as e:
-            print(f"⚠️ Aviso ao configurar event loop policy: {e}")
+            logger.warning(f"⚠️ Aviso ao configurar event loop policy: {e}")
     
-    print(f"🚀 ========================================")
-    print(f"🚀 INICIANDO processar_fila()")
-    print(f"🚀 processing_active={processing_active}")
-    print(f"🚀 ========================================")
+    logger.info(f"🚀 Iniciando processar_fila() (processing_active={processing_active})")
     
+    global _fila_laco_ativo, _fila_batimento
+    _fila_laco_ativo = True
     try:
         while processing_active:
-            print(f"🔄 Loop: Buscando próximo job pendente...")
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Buscar próximo job pendente considerando agendamento
-            current_time = datetime.now()
-            cursor.execute("""
-                SELECT qj.id, qj.empresa_id, e.nome_empresa, e.cpf_socio, e.inscricao_estadual, e.senha,
-                       qj.tipo_execucao, qj.data_agendada, qj.recorrencia, qj.ativo_agendamento
-                FROM queue_jobs qj
-                JOIN empresas e ON qj.empresa_id = e.id
-                WHERE qj.status = 'pending' 
-                  AND qj.tentativas < qj.max_tentativas
-                  AND qj.ativo_agendamento = 1
-                  AND (
-                    qj.tipo_execucao = 'imediata' 
-                    OR (qj.tipo_execucao = 'agendada' AND datetime(qj.data_agendada) <= datetime('now'))
-                  )
-                ORDER BY qj.prioridade DESC, qj.data_adicao ASC
-                LIMIT 1
-            """)
+            _fila_batimento = time.monotonic()
+            logger.debug("🔄 Loop: Buscando próximo job pendente...")
             
-            job = cursor.fetchone()
+            # Reservar o próximo job pendente considerando agendamento (já marcado
+            # como 'running'; outros workers não pegam o mesmo job)
+            job = await asyncio.to_thread(storage.reservar_job)
             if not job:
-                conn.close()
-                print(f"⏸️ Nenhum job pendente encontrado. Aguardando 5 segundos...")
+                logger.debug("⏸️ Nenhum job pendente encontrado. Aguardando 5 segundos...")
                 # Aguardar 5 segundos antes de verificar novamente
                 await asyncio.sleep(5)
                 continue
             
-            (job_id, empresa_id, empresa_nome, cpf_socio, inscricao_estadual, 
-             senha, tipo_execucao, data_agendada, recorrencia, ativo_agendamento) = job
+            job_id = job['id']
+            empresa_id = job['empresa_id']
+            empresa_nome = job['nome_empresa']
+            cpf_socio = job['cpf_socio']
+            inscricao_estadual = job['inscricao_estadual']
+            senha = job['senha']
+            tipo_execucao = job['tipo_execucao']
+            data_agendada = job['data_agendada']
+            recorrencia = job['recorrencia']
              
-            print(f"✅ Job encontrado: ID={job_id}, Empresa={empresa_nome} (ID={empresa_id})")
-            print(f"   📅 Tipo: {tipo_execucao}")
-            if tipo_execucao == 'agendada':
-                print(f"   🕒 Agendado para: {data_agendada}")
-                print(f"   🔄 Recorrência: {recorrencia}")
+            # job_id/hash do CPF em cada linha de log do job (inclusive as do bot)
+            with contexto_log(job_id=job_id, cpf_hash=hash_cpf(cpf_socio), segredos=(senha,)):
+                logger.info(f"✅ Job encontrado: ID={job_id}, Empresa={empresa_nome} (ID={empresa_id})")
+                _publicar_job(job_id, 'running', empresa_id=empresa_id, nome_empresa=empresa_nome)
+                progresso.iniciar(job_id, empresa_id=empresa_id, nome_empresa=empresa_nome,
+                                  inscricao_estadual=inscricao_estadual)
+                if tipo_execucao == 'agendada':
+                    logger.info(f"🕒 Agendado para: {data_agendada} (recorrência: {recorrencia})")
             
-            # Se job tem recorrência, criar próximo agendamento antes de processar
-            if recorrencia and recorrencia != 'unica' and tipo_execucao == 'agendada':
-                await criar_proximo_agendamento(job_id, empresa_id, recorrencia, data_agendada, cursor)
-            
-            # Marcar como executando
-            print(f"🔄 Marcando job {job_id} como 'running'...")
-            cursor.execute("""
-                UPDATE queue_jobs 
-                SET status = 'running', data_processamento = datetime('now'), tentativas = tentativas + 1
-                WHERE id = ?
-            """, (job_id,))
-            conn.commit()
-            conn.close()
+                # Se job tem recorrência, criar próximo agendamento antes de processar
+                if recorrencia and recorrencia != 'unica' and tipo_execucao == 'agendada':
+                    conn = storage.conectar()
+                    await criar_proximo_agendamento(job_id, empresa_id, recorrencia, str(data_agendada), conn.cursor())
+                    conn.commit()
+                    conn.close()
+                    notify_write('queue_jobs')
             
-            print(f"🔄 Processando job {job_id} - Empresa: {empresa_nome}")
+                logger.info(f"🔄 Processando job {job_id} - Empresa: {empresa_nome}")
             
-            # Executar consulta
-            try:
-                # Senha já está em texto plano
-                senha_texto_plano = senha
-                
-                # Logs detalhados para debug - SENHA COMPLETA
-                print(f"📋 Dados da empresa - DEBUG COMPLETO:")
-                print(f"   • ID: {empresa_id}")
-                print(f"   • Nome: {empresa_nome}")
-                print(f"   • IE: {inscricao_estadual}")
-                print(f"   • CPF (usuário login): {cpf_socio}")
-                print(f"   • Senha do banco: '{senha}'")
-                print(f"   • Senha texto plano: '{senha_texto_plano}'")
-                print(f"   • Tipo da senha: {type(senha_texto_plano)}")
-                print(f"   • Tamanho da senha: {len(senha_texto_plano)}")
-                print(f"   • Representação da senha: {repr(senha_texto_plano)}")
-                print(f"🚀 Enviando para bot:")
-                print(f"   • Parâmetro 1 (CPF): '{cpf_socio}' (tipo: {type(cpf_socio)})")
-                print(f"   • Parâmetro 2 (Senha): '{senha_texto_plano}' (tipo: {type(senha_texto_plano)})")
-                print(f"   • Parâmetro 3 (IE): '{inscricao_estadual}' (tipo: {type(inscricao_estadual)})")
-                
-                # Bot sempre em modo headless na fila
-                os.environ['HEADLESS'] = 'true'
-                bot = SEFAZBot()
-                resultado = await bot.executar_consulta(cpf_socio, senha_texto_plano, inscricao_estadual)
-                
-                # Atualizar status
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                
-                if resultado:
-                    cursor.execute("""
-                        UPDATE queue_jobs 
-                        SET status = 'completed', data_processamento = datetime('now')
-                        WHERE id = ?
-                    """, (job_id,))
-                    print(f"✅ Job {job_id} concluído com sucesso")
-                else:
-                    cursor.execute("""
-                        UPDATE queue_jobs 
-                        SET status = 'failed', erro_detalhes = 'Falha na execução da consulta'
-                        WHERE id = ?
-                    """, (job_id,))
-                    print(f"❌ Job {job_id} falhou")
-                
-                conn.commit()
-                conn.close()
+                # Executar consulta
+                inicio_job = time.monotonic()
+                linha = _linhas_em_execucao[job_id] = LinhaDoTempo()
+                try:
+                    # Senha já está em texto plano
+                    senha_texto_plano = senha
                 
-            except Exception as e:
-                print(f"❌ Erro no job {job_id}: {str(e)}")
+                    # Nunca logar a senha (o contexto a oculta se aparecer numa mensagem)
+                    logger.debug(f"📋 Enviando para o bot: empresa={empresa_id} IE={inscricao_estadual}")
                 
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
+                    # Bot sempre em modo headless na fila
+                    os.environ['HEADLESS'] = 'true'
+                    from src.bot.sefaz_bot import SEFAZBot  # Playwright carregado só no primeiro job
+                    bot = SEFAZBot(ao_progresso=progresso.callback(job_id))
+                    with linha.ativa():
+                        resultado = await bot.executar_consulta(cpf_socio, senha_texto_plano, inscricao_estadual)
+                    progresso.finalizar(job_id, bool(resultado))
                 
-                # Verificar se deve tentar novamente
-                cursor.execute("SELECT tentativas, max_tentativas FROM queue_jobs WHERE id = ?", (job_id,))
-                tentativas, max_tentativas = cursor.fetchone()
+                    # Atualizar status e linha do tempo (pela fila de escrita)
+                    etapas = linha.serializar()
+                    await storage.persistir(
+                        lambda conn: Storage.finalizar_job(conn, job_id, bool(resultado), etapas), 'queue_jobs'
+                    )
+                    _publicar_job(job_id, 'completed' if resultado else 'failed', empresa_id=empresa_id)
+                    _registrar_fim_job('fila', inicio_job, 'sucesso' if resultado else 'falha')
+                    if resultado:
+                        logger.info(f"✅ Job {job_id} concluído com sucesso")
+                    else:
+                        logger.warning(f"❌ Job {job_id} falhou")
                 
-                if tentativas >= max_tentativas:
-                    cursor.execute("""
-                        UPDATE queue_jobs 
-                        SET status = 'failed', erro_detalhes = ?
-                        WHERE id = ?
-                    """, (str(e), job_id))
-                else:
-                    cursor.execute("""
-                        UPDATE queue_jobs 
-                        SET status = 'pending', erro_detalhes = ?
-                        WHERE id = ?
-                    """, (str(e), job_id))
+                except Exception as e:
+                    logger.error(f"❌ Erro no job {job_id}: {str(e)}")
                 
-                conn.commit()
-                conn.close()
+                    erro = str(e)
+                    etapas = linha.serializar()
+                    progresso.finalizar(job_id, False, erro)
+                    await storage.persistir(
+                        lambda conn: Storage.registrar_erro_job(conn, job_id, erro, etapas), 'queue_jobs'
+                    )
+                    _publicar_job(job_id, 'failed', empresa_id=empresa_id, erro=erro)
+                    _registrar_fim_job('fila', inicio_job, 'erro', erro)
+                finally:
+                    _linhas_em_execucao.pop(job_id, None)
             
             # Pequeno delay entre jobs
             await asyncio.sleep(2)
     
     except Exception as e:
-        print(f"❌ Erro no processamento da fila: {str(e)}")
+        logger.exception(f"❌ Erro no processamento da fila: {str(e)}")
+    finally:
+        _fila_laco_ativo = False
 
 # ================================
 # ENDPOINTS DE CONTROLE DA FILA
@@ -1975,6 +2675,7 @@ async def iniciar_processamento(background_tasks: BackgroundTasks):
     
     processing_active = True
     background_tasks.add_task(processar_fila)
+    eventos.publicar('processamento', {"processando": True})
     
     return {"message": "Processamento iniciado", "processando": True}
 
@@ -1987,6 +2688,7 @@ async def parar_processamento():
         return {"message": "Processamento já está parado", "processando": False}
     
     processing_active = False
+    eventos.publicar('processamento', {"processando": False})
     
     return {"message": "Processamento será pausado após o job atual", "processando": False}
 
@@ -1994,7 +2696,7 @@ async def parar_processamento():
 async def deletar_job(job_id: int):
     """Deleta um job da fila (apenas se não estiver processando)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Verificar se o job existe e não está em processamento
@@ -2012,7 +2714,9 @@ async def deletar_job(job_id: int):
         # Deletar o job
         cursor.execute("DELETE FROM queue_jobs WHERE id = ?", (job_id,))
         conn.commit()
+        notify_write('queue_jobs')
         conn.close()
+        _publicar_job(job_id, 'deleted')
         
         return {"message": f"Job {job_id} deletado com sucesso"}
         
@@ -2027,7 +2731,7 @@ async def cancelar_job(job_id: int):
     try:
         from datetime import datetime
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Verificar se o job existe
@@ -2051,15 +2755,16 @@ async def cancelar_job(job_id: int):
         """, (data_processamento, job_id))
         
         conn.commit()
+        notify_write('queue_jobs')
         conn.close()
+        _publicar_job(job_id, 'failed', erro='Cancelado pelo usuário')
         
         return {"message": f"Job {job_id} cancelado com sucesso"}
         
     except HTTPException:
         raise
     except Exception as e:
-        import logging
-        logging.error(f"Erro ao cancelar job {job_id}: {e}")
+        logger.error(f"Erro ao cancelar job {job_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao cancelar job: {str(e)}")
 
 @app.get("/api/fila/status")
@@ -2069,11 +2774,193 @@ async def status_processamento():
         "processando": processing_active
     }
 
+# ================================
+# HEALTH CHECK / READINESS
+# ================================
+
+# Navegadores simultâneos: o worker da fila + uma consulta avulsa
+NAVEGADORES_MAX = int(os.getenv('NAVEGADORES_MAX', '2') or 2)
+# Volta do laço da fila mais antiga aceita quando nenhum job está executando
+FILA_BATIMENTO_MAX_SEGUNDOS = float(os.getenv('FILA_BATIMENTO_MAX_SEGUNDOS', '60') or 60)
+# Espera máxima do job pronto mais antigo com o processamento ativo
+FILA_ATRASO_MAX_SEGUNDOS = float(os.getenv('FILA_ATRASO_MAX_SEGUNDOS', '900') or 900)
+READYZ_TIMEOUT_BANCO = 2.0
+
+def _ping_banco():
+    conn = storage.conectar()
+    try:
+        conn.execute("SELECT 1").fetchone()
+    finally:
+        conn.close()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: o processo responde (tempo constante, sem banco)"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: banco acessível (SELECT 1), laço da fila vivo, navegador
+    disponível e fila sem atraso acima do limite. Responde 503 se alguma
+    verificação falhar.
+    
+    O atraso da fila fica em cache até a próxima escrita em queue_jobs
+    (no máximo 30 s), de modo que sondagens frequentes não consultam a fila.
+    """
+    verificacoes = {}
+    
+    inicio = time.perf_counter()
+    try:
+        await asyncio.wait_for(asyncio.to_thread(_ping_banco), timeout=READYZ_TIMEOUT_BANCO)
+        verificacoes["banco"] = {"ok": True, "ms": round((time.perf_counter() - inicio) * 1000, 1)}
+    except Exception as e:
+        verificacoes["banco"] = {"ok": False, "erro": str(e) or e.__class__.__name__}
+    
+    job_em_execucao = progresso.em_execucao('fila')
+    ultima_volta = None if _fila_batimento is None else round(time.monotonic() - _fila_batimento, 1)
+    verificacoes["agendador"] = {
+        "ok": not processing_active or (
+            _fila_laco_ativo and (job_em_execucao or (ultima_volta is not None and ultima_volta <= FILA_BATIMENTO_MAX_SEGUNDOS))
+        ),
+        "processando": processing_active,
+        "laco_ativo": _fila_laco_ativo,
+        "segundos_desde_ultima_volta": ultima_volta,
+    }
+    
+    em_uso = len(progresso.listar(ativos_apenas=True))
+    verificacoes["navegadores"] = {"ok": em_uso < NAVEGADORES_MAX, "em_uso": em_uso, "maximo": NAVEGADORES_MAX}
+    
+    if verificacoes["banco"]["ok"]:
+        try:
+            atraso = await asyncio.to_thread(
+                query_cache.get_or_compute, "fila_atraso", ("queue_jobs",), storage.atraso_fila, 30
+            )
+            verificacoes["fila"] = {
+                "ok": not processing_active or atraso <= FILA_ATRASO_MAX_SEGUNDOS,
+                "atraso_segundos": round(atraso, 1),
+                "limite_segundos": FILA_ATRASO_MAX_SEGUNDOS,
+            }
+        except Exception as e:
+            verificacoes["fila"] = {"ok": False, "erro": str(e)}
+    else:
+        verificacoes["fila"] = {"ok": False, "erro": "banco indisponível"}
+    
+    pronto = all(v["ok"] for v in verificacoes.values())
+    return JSONResponse(
+        status_code=200 if pronto else 503,
+        content={"status": "ok" if pronto else "indisponivel", "verificacoes": verificacoes}
+    )
+
+# Medidores atualizados a cada coleta do /metrics
+FILA_JOBS = metricas.medidor('sefaz_fila_jobs', 'Jobs na fila por status', ('status',))
+NAVEGADORES_MAXIMO = metricas.medidor('sefaz_navegadores_maximo', 'Navegadores simultâneos permitidos (NAVEGADORES_MAX)')
+EXECUCOES_EM_ANDAMENTO = metricas.medidor(
+    'sefaz_execucoes_em_andamento', 'Consultas em execução (fila e avulsas)', ('tipo',)
+)
+
+@app.get("/api/loop")
+async def get_loop():
+    """
+    Atraso do event loop (último e máximo) e os bloqueios recentes acima de
+    LOOP_BLOQUEIO_MS, com o local e a pilha do código que bloqueou
+    """
+    return monitor_loop.resumo()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Métricas no formato de texto do Prometheus: duração por etapa dos bots,
+    vazão/erros/retentativas das consultas, profundidade da fila, uso de
+    navegadores, tempo de SQLite por endpoint (ver src/bot/utils/metricas.py)
+    e atraso/bloqueios do event loop (src/api/monitor_loop.py)
+    """
+    try:
+        por_status = await asyncio.to_thread(
+            query_cache.get_or_compute, "fila_stats", ("queue_jobs",), _contar_por_status
+        )
+    except sqlite3.Error:
+        por_status = {}
+    for status in set(por_status) | {'pending', 'running', 'completed', 'failed'}:
+        FILA_JOBS.definir(por_status.get(status, 0), status=status)
+    
+    NAVEGADORES_MAXIMO.definir(NAVEGADORES_MAX)
+    ativos = progresso.listar(ativos_apenas=True)
+    for tipo in ('fila', 'consulta'):
+        EXECUCOES_EM_ANDAMENTO.definir(sum(1 for e in ativos if e['tipo'] == tipo), tipo=tipo)
+    
+    return Response(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/eventos")
+async def stream_eventos(request: Request):
+    """
+    Fluxo SSE (text/event-stream) com as mudanças da fila, das estatísticas
+    e do status da consulta, substituindo o polling do frontend.
+    
+    Na conexão é enviado um evento snapshot com o estado atual; na
+    reconexão (cabeçalho Last-Event-ID) os eventos perdidos são reenviados.
+    """
+    ultimo_id = request.headers.get("last-event-id")
+    ultimo_id = int(ultimo_id) if ultimo_id and ultimo_id.isdigit() else eventos.ultimo_id
+    
+    # Uma seção que falha fica fora do snapshot: responder 500 faria o
+    # EventSource desistir de reconectar e o frontend parar de atualizar
+    snapshot = {}
+    for secao, calcular in (("fila_stats", _fila_stats), ("estatisticas", _estatisticas)):
+        try:
+            snapshot[secao] = await asyncio.to_thread(calcular)
+        except Exception as e:
+            logger.warning(f"⚠️ Snapshot de eventos sem {secao}: {e}")
+    snapshot["processando"] = processing_active
+    snapshot["progresso"] = progresso.listar(ativos_apenas=True)
+    
+    return StreamingResponse(
+        eventos.assinar(snapshot, ultimo_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/manutencao/retencao")
+async def executar_retencao(dry_run: bool = True):
+    """
+    Aplica as políticas de retenção (padrão: dry_run, apenas conta)
+    
+    Consultas e jobs antigos são movidos para os bancos de arquivo e o HTML
+    das mensagens antigas para o arquivo comprimido de páginas.
+    """
+    try:
+        politica = PoliticaRetencao.do_ambiente()
+        resumo = await asyncio.to_thread(aplicar_retencao, DB_PATH, politica, dry_run)
+        return {"dry_run": dry_run, "resumo": resumo}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao aplicar retenção: {str(e)}")
+
+@app.post("/api/manutencao/backup")
+async def executar_backup():
+    """Cria um snapshot do banco sem interromper o processamento da fila"""
+    try:
+        return await asyncio.to_thread(criar_backup, DB_PATH, PoliticaBackup.do_ambiente())
+    
+    except BackupError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao criar backup: {str(e)}")
+
+@app.get("/api/manutencao/backups")
+async def listar_snapshots():
+    """Lista os snapshots disponíveis (mais recente primeiro)"""
+    try:
+        return listar_backups(DB_PATH, PoliticaBackup.do_ambiente())
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao listar backups: {str(e)}")
+
 @app.post("/api/fila/limpar-travados")
 async def limpar_jobs_travados():
     """Limpa jobs travados (pendentes ou processando há muito tempo)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Marcar como failed jobs que estão processando há mais de 1 hora
@@ -2091,6 +2978,7 @@ async def limpar_jobs_travados():
         
         jobs_limpos = cursor.rowcount
         conn.commit()
+        notify_write('queue_jobs')
         conn.close()
         
         return {
@@ -2105,7 +2993,7 @@ async def limpar_jobs_travados():
 async def reprocessar_job(job_id: int):
     """Reprocessa um job que falhou, resetando para status pendente"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Verificar se o job existe e pode ser reprocessado
@@ -2155,6 +3043,7 @@ async def reprocessar_job(job_id: int):
             mensagem = f"Job {job_id} foi resetado para reprocessamento (tentativa {tentativas + 1}/{max_tentativas})"
         
         conn.commit()
+        notify_write('queue_jobs')
         conn.close()
         
         return {
@@ -2202,7 +3091,7 @@ async def criar_agendamento(agendamento: AgendamentoRequest):
         if agendamento.recorrencia not in recorrencias_validas:
             raise HTTPException(status_code=400, detail=f"Recorrência deve ser: {', '.join(recorrencias_validas)}")
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Verificar se empresas existem
@@ -2240,6 +3129,7 @@ async def criar_agendamento(agendamento: AgendamentoRequest):
             jobs_criados.append(cursor.lastrowid)
         
         conn.commit()
+        notify_write('queue_jobs')
         conn.close()
         
         return {
@@ -2257,19 +3147,27 @@ async def criar_agendamento(agendamento: AgendamentoRequest):
 
 @app.get("/api/agendamentos", response_model=List[QueueJobResponse])
 async def listar_agendamentos(
+    response: Response,
     limit: int = 50,
     offset: int = 0,
     ativo_apenas: bool = True,
-    futuro_apenas: bool = True
+    futuro_apenas: bool = True,
+    cursor: Optional[str] = None
 ):
-    """Lista agendamentos criados"""
+    """
+    Lista agendamentos criados
+    
+    Use o cursor do header X-Next-Cursor para buscar a próxima página
+    (paginação por chave, sem OFFSET); offset é ignorado quando há cursor.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
         
         # Construir query com filtros
         where_conditions = ["qj.tipo_execucao = 'agendada'"]
+        params = []
         
         if ativo_apenas:
             where_conditions.append("qj.ativo_agendamento = 1")
@@ -2277,20 +3175,34 @@ async def listar_agendamentos(
         if futuro_apenas:
             where_conditions.append("datetime(qj.data_agendada) > datetime('now')")
         
+        keyset, keyset_params = keyset_condition(
+            ("COALESCE(qj.data_agendada, '')", "qj.id"), cursor, descending=False
+        )
+        if keyset:
+            where_conditions.append(keyset)
+            params.extend(keyset_params)
+            offset = 0
+        
         where_clause = " AND ".join(where_conditions)
         
-        cursor.execute(f"""
-            SELECT qj.*, e.nome_empresa, e.cnpj, e.inscricao_estadual
+        db_cursor.execute(f"""
+            SELECT qj.*, e.nome_empresa, e.cnpj, e.inscricao_estadual,
+                   COALESCE(qj.data_agendada, '') AS chave_ordem
             FROM queue_jobs qj
             LEFT JOIN empresas e ON qj.empresa_id = e.id
             WHERE {where_clause}
-            ORDER BY qj.data_agendada ASC
+            ORDER BY COALESCE(qj.data_agendada, '') ASC, qj.id ASC
             LIMIT ? OFFSET ?
-        """, (limit, offset))
+        """, params + [limit + 1, offset])
         
-        jobs = cursor.fetchall()
+        jobs = db_cursor.fetchall()
         conn.close()
         
+        proximo = next_cursor(jobs, limit, "chave_ordem", "id")
+        if proximo:
+            response.headers[NEXT_CURSOR_HEADER] = proximo
+        jobs = jobs[:limit]
+        
         return [
             QueueJobResponse(
                 id=job['id'],
@@ -2313,6 +3225,8 @@ async def listar_agendamentos(
             ) for job in jobs
         ]
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar agendamentos: {str(e)}")
 
@@ -2330,7 +3244,7 @@ async def atualizar_agendamento(job_id: int, agendamento: AgendamentoRequest):
         except ValueError:
             raise HTTPException(status_code=400, detail="Formato de data inválido")
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Verificar se o agendamento existe e pode ser atualizado
@@ -2362,6 +3276,7 @@ async def atualizar_agendamento(job_id: int, agendamento: AgendamentoRequest):
             raise HTTPException(status_code=404, detail="Agendamento não encontrado")
         
         conn.commit()
+        notify_write('queue_jobs')
         conn.close()
         
         return {"message": "Agendamento atualizado com sucesso"}
@@ -2375,7 +3290,7 @@ async def atualizar_agendamento(job_id: int, agendamento: AgendamentoRequest):
 async def cancelar_agendamento(job_id: int):
     """Cancela um agendamento"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         # Verificar se existe e pode ser cancelado
@@ -2400,6 +3315,7 @@ async def cancelar_agendamento(job_id: int):
         cursor.execute("DELETE FROM queue_jobs WHERE id = ?", (job_id,))
         
         conn.commit()
+        notify_write('queue_jobs')
         conn.close()
         
         return {"message": "Agendamento cancelado com sucesso"}
@@ -2423,7 +3339,7 @@ async def listar_mensagens(
 ):
     """Lista mensagens SEFAZ processadas"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -2432,12 +3348,12 @@ async def listar_mensagens(
         params = []
         
         if inscricao_estadual:
-            where_conditions.append("inscricao_estadual = ?")
-            params.append(inscricao_estadual)
+            where_conditions.append("ie_chave = ?")
+            params.append(chave_ie(inscricao_estadual))
         
         if cpf_socio:
-            where_conditions.append("cpf_socio = ?")
-            params.append(cpf_socio)
+            where_conditions.append("cpf_chave = ?")
+            params.append(chave_cpf(cpf_socio))
         
         if assunto:
             where_conditions.append("assunto LIKE ?")
@@ -2493,19 +3409,19 @@ async def contar_mensagens(
 ):
     """Conta total de mensagens"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = conectar_sqlite(DB_PATH)
         cursor = conn.cursor()
         
         where_conditions = []
         params = []
         
         if inscricao_estadual:
-            where_conditions.append("inscricao_estadual = ?")
-            params.append(inscricao_estadual)
+            where_conditions.append("ie_chave = ?")
+            params.append(chave_ie(inscricao_estadual))
         
         if cpf_socio:
-            where_conditions.append("cpf_socio = ?")
-            params.append(cpf_socio)
+            where_conditions.append("cpf_chave = ?")
+            params.append(chave_cpf(cpf_socio))
         
         where_clause = ""
         if where_conditions:
@@ -2567,7 +3483,7 @@ async def processar_mensagens_extensao(request: ProcessarMensagensRequest):
         }
         
     except Exception as e:
-        print(f"Erro ao processar mensagens via extensao: {str(e)}")
+        logger.error(f"Erro ao processar mensagens via extensao: {str(e)}")
         return {
             "success": False,
             "error": str(e)
@@ -2580,7 +3496,7 @@ try:
     app.mount("/css", StaticFiles(directory="frontend/css"), name="css")
     app.mount("/js", StaticFiles(directory="frontend/js"), name="js")
 except Exception as e:
-    print(f"Aviso: Não foi possível montar arquivos estáticos: {e}")
+    logger.warning(f"Aviso: Não foi possível montar arquivos estáticos: {e}")
 
 if __name__ == "__main__":
     import uvicorn
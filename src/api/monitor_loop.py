@@ -0,0 +1,198 @@
+"""
+Atraso do event loop e detecção de chamadas bloqueantes.
+
+O loop da API é compartilhado pelas requisições do uvicorn, pelo
+``processar_fila`` e pelo Playwright; qualquer trabalho síncrono nele
+(``sqlite3``, ``smtplib``, escrita de arquivos, formatação de muitas
+linhas) atrasa todo o resto. ``MonitorLoop`` mede isso de três formas:
+
+- amostragem: uma task dorme ``LOOP_AMOSTRAGEM_MS`` e mede quanto acordou
+  atrasada (histograma ``sefaz_loop_atraso_segundos``);
+- vigia: uma thread confere se a amostragem está em dia; se o loop ficar
+  parado por mais de ``LOOP_BLOQUEIO_MS``, captura a pilha da thread do
+  loop naquele instante (o código que está bloqueando), grava no log e
+  conta em ``sefaz_loop_bloqueios_total{local}`` (arquivo:função do
+  projeto mais interno da pilha);
+- opcional (``LOOP_DEBUG=true``): modo debug do asyncio, que loga os
+  callbacks que passam de ``LOOP_BLOQUEIO_MS`` com a origem da task
+  (``sefaz_loop_callbacks_lentos_total``). Tem custo; para diagnóstico.
+
+A vigia só vê bloqueios que atrasam a amostragem em mais que o limite:
+um bloqueio curto entre duas amostras pode passar; o modo debug pega todos.
+
+``LOOP_AMOSTRAGEM_MS=0`` desativa o monitor. ``scripts/verificar_bloqueios.py``
+(também rodado pelo ``pytest``, em tests/unit/test_bloqueios.py) usa o mesmo
+monitor para falhar quando um endpoint bloqueia o loop.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.bot.utils.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+LOOP_AMOSTRAGEM_MS = float(os.getenv('LOOP_AMOSTRAGEM_MS', '100') or 0)
+LOOP_BLOQUEIO_MS = float(os.getenv('LOOP_BLOQUEIO_MS', '100') or 100)
+LOOP_DEBUG = os.getenv('LOOP_DEBUG', 'false').lower() == 'true'
+
+# Bloqueios recentes mantidos para consulta (GET /api/loop)
+MAX_BLOQUEIOS = 20
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Instrumentação que envolve as chamadas (conexão medida, logs): o local do
+# bloqueio é quem as chamou
+_MODULOS_INSTRUMENTACAO = tuple(
+    os.path.join(RAIZ_PROJETO, *caminho.split('/'))
+    for caminho in ('src/bot/utils/metricas.py', 'src/bot/utils/logs.py', 'src/api/monitor_loop.py')
+)
+
+LOOP_ATRASO = metricas.histograma(
+    'sefaz_loop_atraso_segundos', 'Atraso do event loop em cada amostra',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+LOOP_BLOQUEIOS = metricas.contador(
+    'sefaz_loop_bloqueios_total', 'Event loop parado acima do limite, por local do código', ('local',)
+)
+LOOP_CALLBACKS_LENTOS = metricas.contador(
+    'sefaz_loop_callbacks_lentos_total', 'Callbacks lentos reportados pelo modo debug do asyncio'
+)
+
+
+def _local(pilha: List[traceback.FrameSummary]) -> str:
+    """Frame do projeto mais interno da pilha (arquivo:função)"""
+    for frame in reversed(pilha):
+        caminho = os.path.abspath(frame.filename)
+        if caminho.startswith(RAIZ_PROJETO) and caminho not in _MODULOS_INSTRUMENTACAO:
+            return f"{os.path.relpath(caminho, RAIZ_PROJETO)}:{frame.name}"
+    return 'desconhecido'
+
+
+class _FiltroCallbacksLentos(logging.Filter):
+    """Conta os avisos "Executing <Handle ...> took X seconds" do asyncio"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg, str) and record.msg.startswith('Executing '):
+            LOOP_CALLBACKS_LENTOS.inc()
+        return True
+
+
+class MonitorLoop:
+    """Amostra o atraso do loop e captura a pilha quando ele bloqueia"""
+
+    def __init__(
+        self,
+        amostragem_ms: float = LOOP_AMOSTRAGEM_MS,
+        bloqueio_ms: float = LOOP_BLOQUEIO_MS,
+        debug: bool = LOOP_DEBUG
+    ):
+        self.intervalo = amostragem_ms / 1000
+        self.limite = bloqueio_ms / 1000
+        self.debug = debug
+        self.atraso_maximo = 0.0
+        self.ultimo_atraso = 0.0
+        self.bloqueios: List[Dict] = []
+        self._tarefa: Optional[asyncio.Task] = None
+        self._vigia: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._thread_loop: Optional[int] = None
+        # Instante (monotonic) em que a amostragem deveria acordar
+        self._esperado: Optional[float] = None
+        self._bloqueio_atual: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self) -> bool:
+        return self._tarefa is not None and not self._tarefa.done()
+
+    def iniciar(self) -> None:
+        """Inicia a amostragem e a vigia no loop em execução"""
+        if self.intervalo <= 0 or self.ativo:
+            return
+        loop = asyncio.get_running_loop()
+        if self.debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.limite
+            logging.getLogger('asyncio').addFilter(_FiltroCallbacksLentos())
+        self._thread_loop = threading.get_ident()
+        self._parar.clear()
+        self._esperado = time.monotonic() + self.intervalo
+        self._tarefa = loop.create_task(self._amostrar())
+        self._vigia = threading.Thread(target=self._vigiar, name='monitor-loop', daemon=True)
+        self._vigia.start()
+
+    async def parar(self) -> None:
+        self._parar.set()
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        if self._vigia is not None:
+            self._vigia.join(timeout=1)
+            self._vigia = None
+
+    async def _amostrar(self) -> None:
+        while True:
+            self._esperado = time.monotonic() + self.intervalo
+            await asyncio.sleep(self.intervalo)
+            atraso = max(time.monotonic() - self._esperado, 0.0)
+            self.ultimo_atraso = atraso
+            self.atraso_maximo = max(self.atraso_maximo, atraso)
+            LOOP_ATRASO.observar(atraso)
+            with self._lock:
+                bloqueio, self._bloqueio_atual = self._bloqueio_atual, None
+            if bloqueio is not None:
+                bloqueio['duracao_ms'] = round(atraso * 1000)
+                logger.warning(f"🐢 Event loop liberado após {bloqueio['duracao_ms']} ms bloqueado em {bloqueio['local']}")
+
+    def _vigiar(self) -> None:
+        verificacao = max(self.limite / 2, 0.005)
+        while not self._parar.wait(verificacao):
+            esperado = self._esperado
+            if esperado is None or time.monotonic() - esperado <= self.limite:
+                continue
+            with self._lock:
+                if self._bloqueio_atual is not None:
+                    continue  # Mesmo bloqueio, já reportado
+                frame = sys._current_frames().get(self._thread_loop)
+                if frame is None:
+                    continue
+                pilha = traceback.extract_stack(frame)
+                bloqueio = {
+                    'inicio': datetime.fromtimestamp(time.time() - (time.monotonic() - esperado)).isoformat(timespec='milliseconds'),
+                    'local': _local(pilha),
+                    'duracao_ms': None,
+                    'pilha': ''.join(traceback.format_list(pilha[-15:])),
+                }
+                self._bloqueio_atual = bloqueio
+                self.bloqueios.append(bloqueio)
+                del self.bloqueios[:-MAX_BLOQUEIOS]
+            LOOP_BLOQUEIOS.inc(local=bloqueio['local'])
+            logger.warning(
+                f"🐢 Event loop bloqueado há mais de {self.limite * 1000:.0f} ms em {bloqueio['local']}:\n{bloqueio['pilha']}"
+            )
+
+    def resumo(self) -> Dict:
+        """Estado para GET /api/loop"""
+        with self._lock:
+            bloqueios = [dict(bloqueio) for bloqueio in reversed(self.bloqueios)]
+        return {
+            'ativo': self.ativo,
+            'debug': self.debug,
+            'amostragem_ms': self.intervalo * 1000,
+            'limite_ms': self.limite * 1000,
+            'ultimo_atraso_ms': round(self.ultimo_atraso * 1000, 1),
+            'atraso_maximo_ms': round(self.atraso_maximo * 1000, 1),
+            'bloqueios': bloqueios,
+        }
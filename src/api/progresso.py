@@ -0,0 +1,202 @@
+"""
+Registro em memória do progresso das consultas em execução.
+
+Substitui o antigo dicionário global ``consulta_status``, que só
+representava uma execução por vez e tinha o progresso simulado. Cada
+execução (job da fila ou consulta avulsa) tem uma entrada própria,
+atualizada pelo bot através do callback ``ao_progresso`` a cada etapa
+(ver ``ETAPAS_CONSULTA``). O registro é limitado: ao passar de
+``max_entradas`` as execuções finalizadas mais antigas são descartadas.
+
+Atualizar uma etapa custa um lock e uma escrita no dicionário; o resumo
+agregado percorre apenas as entradas em memória, sem tocar no banco.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from src.bot.utils.constants import ETAPAS_CONSULTA
+
+# Execuções mantidas em memória (em execução + finalizadas recentes)
+MAX_ENTRADAS_PADRAO = 500
+
+STATUS_EXECUTANDO = 'running'
+STATUS_CONCLUIDO = 'completed'
+STATUS_FALHA = 'failed'
+
+_INDICE_ETAPA = {etapa: indice for indice, etapa in enumerate(ETAPAS_CONSULTA)}
+
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def percentual_etapa(etapa: str) -> int:
+    """Percentual aproximado ao entrar na etapa (100 só na finalização)"""
+    indice = _INDICE_ETAPA.get(etapa)
+    if indice is None:
+        return 0
+    return int((indice + 1) * 100 / (len(ETAPAS_CONSULTA) + 1))
+
+
+class RegistroProgresso:
+    """Progresso por execução, indexado pelo id do job (thread-safe)"""
+
+    def __init__(
+        self,
+        max_entradas: int = MAX_ENTRADAS_PADRAO,
+        publicar: Optional[Callable[[str, Any], None]] = None
+    ):
+        """
+        Args:
+            max_entradas: Limite de execuções guardadas
+            publicar: Função ``(tipo, dados)`` chamada a cada mudança
+                      (ex.: ``BarramentoEventos.publicar``)
+        """
+        self.max_entradas = max_entradas
+        self.publicar = publicar
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._totais = {STATUS_CONCLUIDO: 0, STATUS_FALHA: 0}
+
+    def _notificar(self, entrada: Dict[str, Any]) -> None:
+        if self.publicar is not None:
+            self.publicar('progresso', entrada)
+
+    def _descartar_excedentes(self) -> None:
+        """Remove as finalizadas mais antigas (ou as mais antigas, se todas executam)"""
+        excedente = len(self._entradas) - self.max_entradas
+        if excedente <= 0:
+            return
+        finalizadas = [chave for chave, entrada in self._entradas.items()
+                       if entrada['status'] != STATUS_EXECUTANDO]
+        executando = [chave for chave, entrada in self._entradas.items()
+                      if entrada['status'] == STATUS_EXECUTANDO]
+        for chave in (finalizadas + executando)[:excedente]:
+            del self._entradas[chave]
+
+    def iniciar(self, job_id: Any, tipo: str = 'fila', **info: Any) -> Dict[str, Any]:
+        """
+        Registra o início de uma execução (substitui uma anterior com o mesmo id)
+
+        Args:
+            job_id: Id do job da fila ou da consulta avulsa
+            tipo: 'fila' ou 'consulta'
+            **info: Dados exibidos junto do progresso (empresa_id, nome_empresa...)
+        """
+        chave = str(job_id)
+        agora = _agora()
+        entrada = {
+            'job_id': chave,
+            'tipo': tipo,
+            'status': STATUS_EXECUTANDO,
+            'etapa': None,
+            'progresso': 0,
+            'mensagem': None,
+            'inicio': agora,
+            'atualizado_em': agora,
+            'fim': None,
+            **info,
+        }
+        with self._lock:
+            self._entradas.pop(chave, None)
+            self._entradas[chave] = entrada
+            self._descartar_excedentes()
+            copia = dict(entrada)
+        self._notificar(copia)
+        return copia
+
+    def reportar(self, job_id: Any, etapa: str, mensagem: Optional[str] = None) -> None:
+        """Registra a etapa atual; ignora execuções desconhecidas ou já finalizadas"""
+        with self._lock:
+            entrada = self._entradas.get(str(job_id))
+            if entrada is None or entrada['status'] != STATUS_EXECUTANDO:
+                return
+            entrada['etapa'] = etapa
+            entrada['progresso'] = percentual_etapa(etapa)
+            entrada['mensagem'] = mensagem
+            entrada['atualizado_em'] = _agora()
+            copia = dict(entrada)
+        self._notificar(copia)
+
+    def callback(self, job_id: Any) -> Callable[[str], None]:
+        """Callback ``ao_progresso`` para o bot que executa este job"""
+        return partial(self.reportar, job_id)
+
+    def finalizar(
+        self,
+        job_id: Any,
+        sucesso: bool,
+        mensagem: Optional[str] = None,
+        **extras: Any
+    ) -> None:
+        """Marca a execução como concluída ou com falha"""
+        status = STATUS_CONCLUIDO if sucesso else STATUS_FALHA
+        with self._lock:
+            entrada = self._entradas.get(str(job_id))
+            if entrada is None:
+                return
+            agora = _agora()
+            entrada.update(extras)
+            entrada['status'] = status
+            entrada['mensagem'] = mensagem
+            entrada['atualizado_em'] = agora
+            entrada['fim'] = agora
+            if sucesso:
+                entrada['progresso'] = 100
+            self._totais[status] += 1
+            copia = dict(entrada)
+        self._notificar(copia)
+
+    def obter(self, job_id: Any) -> Optional[Dict[str, Any]]:
+        """Cópia do progresso da execução, ou None"""
+        with self._lock:
+            entrada = self._entradas.get(str(job_id))
+            return dict(entrada) if entrada is not None else None
+
+    def listar(self, ativos_apenas: bool = False, tipo: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Execuções em memória, das mais recentes para as mais antigas"""
+        with self._lock:
+            entradas = [dict(entrada) for entrada in reversed(self._entradas.values())]
+        return [
+            entrada for entrada in entradas
+            if (not ativos_apenas or entrada['status'] == STATUS_EXECUTANDO)
+            and (tipo is None or entrada['tipo'] == tipo)
+        ]
+
+    def ultima(self, tipo: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Execução iniciada mais recentemente (opcionalmente de um tipo)"""
+        with self._lock:
+            for entrada in reversed(self._entradas.values()):
+                if tipo is None or entrada['tipo'] == tipo:
+                    return dict(entrada)
+        return None
+
+    def em_execucao(self, tipo: Optional[str] = None) -> bool:
+        with self._lock:
+            return any(
+                entrada['status'] == STATUS_EXECUTANDO and (tipo is None or entrada['tipo'] == tipo)
+                for entrada in self._entradas.values()
+            )
+
+    def resumo(self) -> Dict[str, Any]:
+        """Contagem agregada: execuções ativas por etapa e totais finalizados"""
+        por_etapa = {etapa: 0 for etapa in ETAPAS_CONSULTA}
+        em_execucao = 0
+        with self._lock:
+            for entrada in self._entradas.values():
+                if entrada['status'] != STATUS_EXECUTANDO:
+                    continue
+                em_execucao += 1
+                if entrada['etapa'] in por_etapa:
+                    por_etapa[entrada['etapa']] += 1
+            totais = dict(self._totais)
+        return {
+            'em_execucao': em_execucao,
+            'por_etapa': por_etapa,
+            'concluidas': totais[STATUS_CONCLUIDO],
+            'falhas': totais[STATUS_FALHA],
+        }
@@ -0,0 +1,86 @@
+"""
+Serialização rápida das listagens da API.
+
+Com ``response_model`` o FastAPI valida cada linha num modelo Pydantic e
+serializa o resultado com ``json``; em listagens de milhares de linhas
+(principalmente mensagens com ``conteudo_html``) isso domina o tempo da
+requisição. As listagens montam dicionários direto das linhas
+(``sqlite3.Row``) e devolvem ``RespostaJSON``, serializada com ``orjson``
+quando o pacote está instalado. O ``response_model`` continua declarado
+para a documentação (OpenAPI), mas não é aplicado a uma resposta pronta.
+
+Benchmark: ``python scripts/benchmark_respostas.py``.
+"""
+
+import json
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Dependência opcional
+    orjson = None
+
+
+def dumps_json(conteudo: Any) -> bytes:
+    """JSON compacto em UTF-8 (orjson se disponível)"""
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=str)
+    return json.dumps(conteudo, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+class RespostaJSON(JSONResponse):
+    """JSONResponse serializada por ``dumps_json``"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+def resposta_json(conteudo: Any, response: Optional[Response] = None) -> RespostaJSON:
+    """
+    Resposta pronta para o conteúdo, sem validação pelo response_model
+
+    Args:
+        conteudo: Lista/dicionário já no formato do modelo de resposta
+        response: Response injetado no endpoint; seus cabeçalhos
+                  (ex.: X-Next-Cursor) são copiados para a resposta
+    """
+    headers = dict(response.headers) if response is not None else None
+    return RespostaJSON(conteudo, headers=headers)
+
+
+def linhas_para_dicts(
+    rows: Iterable[sqlite3.Row],
+    colunas: Sequence[str],
+    booleanos: Sequence[str] = ()
+) -> List[Dict[str, Any]]:
+    """
+    Dicionários com as ``colunas`` de cada linha (ausentes viram None)
+
+    Args:
+        rows: Linhas lidas com ``row_factory = sqlite3.Row``
+        colunas: Campos do modelo de resposta, na ordem
+        booleanos: Colunas INTEGER 0/1 convertidas para bool (None se NULL)
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+
+    presentes = set(rows[0].keys())
+    lidas = [coluna for coluna in colunas if coluna in presentes]
+    ausentes = {coluna: None for coluna in colunas if coluna not in presentes}
+    bools = [coluna for coluna in booleanos if coluna in presentes]
+
+    itens = []
+    for row in rows:
+        item = {coluna: row[coluna] for coluna in lidas}
+        for coluna in bools:
+            if item[coluna] is not None:
+                item[coluna] = bool(item[coluna])
+        if ausentes:
+            item.update(ausentes)
+        itens.append(item)
+    return itens
@@ -3,13 +3,34 @@ Módulo principal do Bot SEFAZ.
 
 Este módulo contém todas as funcionalidades de automação do sistema SEFAZ,
 incluindo autenticação, navegação, extração de dados e processamento de mensagens.
+
+As classes são importadas sob demanda (no primeiro acesso): importar
+``src.bot.utils`` ou ``src.bot.exceptions`` (como faz a API) não carrega o
+Playwright nem o restante da automação.
 """
 
-from .sefaz_bot import SEFAZBot, BrowserManager
-from .core.authenticator import SEFAZAuthenticator
-from .core.navigator import SEFAZNavigator
-from .core.data_extractor import DataExtractor, MessageExtractor
-from .core.message_processor import SEFAZMessageProcessor
+import importlib
+
+# Nome exportado -> submódulo que o define
+_EXPORTACOES = {
+    'SEFAZBot': '.sefaz_bot',
+    'BrowserManager': '.sefaz_bot',
+    'SEFAZAuthenticator': '.core.authenticator',
+    'SEFAZNavigator': '.core.navigator',
+    'DataExtractor': '.core.data_extractor',
+    'MessageExtractor': '.core.data_extractor',
+    'SEFAZMessageProcessor': '.core.message_processor',
+}
+
+
+def __getattr__(nome):
+    modulo = _EXPORTACOES.get(nome)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+    valor = getattr(importlib.import_module(modulo, __name__), nome)
+    globals()[nome] = valor
+    return valor
+
 
 __all__ = [
     'SEFAZBot',
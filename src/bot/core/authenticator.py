@@ -287,8 +287,9 @@ class SEFAZAuthenticator:
             if len(content) < 1000:
                 raise LoginFailedException(f"Página muito pequena após login ({len(content)} bytes)")
             
-            # Salvar arquivos de debug
-            await self._save_debug_files(page, content)
+            # Salvar arquivos de debug (escrita síncrona + screenshot: só em DEBUG)
+            if logger.isEnabledFor(logging.DEBUG):
+                await self._save_debug_files(page, content)
             
         except LoginFailedException:
             raise
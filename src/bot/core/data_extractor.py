@@ -7,11 +7,18 @@ das páginas do sistema SEFAZ.
 
 import re
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Optional
 from playwright.async_api import Page
 
 from src.bot.utils.selectors import SEFAZSelectors
 from src.bot.utils.human_behavior import HumanBehavior
+from src.bot.utils.metricas import medir_etapa
+from src.bot.utils.extraction_rules import (
+    extrair_valor_monetario,
+    extrair_todos_valores_monetarios,
+    extrair_saldo_tvi,
+    extrair_valor_dividas
+)
 from src.bot.exceptions.base import (
     ExtractionException,
     TimeoutException
@@ -23,8 +30,20 @@ logger = logging.getLogger(__name__)
 class DataExtractor:
     """Classe responsável pela extração de dados do sistema SEFAZ"""
     
-    def __init__(self):
+    def __init__(self, ao_progresso: Optional[Callable[[str], None]] = None):
         self.selectors = SEFAZSelectors()
+        # HTML das páginas usadas na última extração (para o arquivo de páginas)
+        self.paginas_capturadas: Dict[str, str] = {}
+        # Callback de progresso (recebe a etapa: 'tvis', 'dividas')
+        self.ao_progresso = ao_progresso
+    
+    def _reportar_etapa(self, etapa: str) -> None:
+        if self.ao_progresso is None:
+            return
+        try:
+            self.ao_progresso(etapa)
+        except Exception as e:
+            logger.debug(f"Falha ao reportar etapa {etapa}: {e}")
     
     async def extract_company_data(self, page: Page) -> Dict[str, Any]:
         """
@@ -41,22 +60,29 @@ class DataExtractor:
         logger.info("="*80)
         
         dados = {}
+        self.paginas_capturadas = {}
         
         try:
-            # Aguardar carregamento completo da página
-            await self._wait_for_page_load(page)
-            
-            # Verificar se estamos na página correta
-            if not await self._validate_correct_page(page):
-                return dados
-            
-            # Extrair dados específicos
-            await self._extract_basic_company_info(page, dados)
-            await self._extract_pending_status_flags(page, dados)
+            # Conta Corrente (TVIs e dívidas são medidas à parte)
+            with medir_etapa('extracao'):
+                # Aguardar carregamento completo da página
+                await self._wait_for_page_load(page)
+                
+                # Verificar se estamos na página correta
+                if not await self._validate_correct_page(page):
+                    return dados
+                
+                # Extrair dados específicos
+                await self._extract_basic_company_info(page, dados)
+                await self._extract_pending_status_flags(page, dados)
             
             # Verificar TVIs e dívidas
-            dados['tem_tvi'] = await self._check_tvis(page)
-            dados['valor_debitos'] = await self._check_pending_debts(page)
+            self._reportar_etapa('tvis')
+            with medir_etapa('tvis'):
+                dados['tem_tvi'] = await self._check_tvis(page)
+            self._reportar_etapa('dividas')
+            with medir_etapa('dividas'):
+                dados['valor_debitos'] = await self._check_pending_debts(page)
             
             # Campos não utilizados no momento - manter por compatibilidade
             dados['cnpj'] = None
@@ -94,6 +120,7 @@ class DataExtractor:
             return await self._handle_incorrect_page(page)
         else:
             logger.info("✅ Página de Conta Corrente detectada corretamente!")
+            self.paginas_capturadas['conta_corrente'] = page_content
             return True
     
     async def _handle_incorrect_page(self, page: Page) -> bool:
@@ -109,6 +136,7 @@ class DataExtractor:
             page_content = await page.content()
             if "Inscrição Estadual" in page_content:
                 logger.info("✅ Página correta carregada após segundo clique!")
+                self.paginas_capturadas['conta_corrente'] = page_content
                 return True
         
         logger.error("❌ Ainda não está na página correta")
@@ -224,57 +252,15 @@ class DataExtractor:
             await page.wait_for_timeout(HumanBehavior.random_delay(2000, 3000))
             
             # Capturar screenshot para debug
-            await page.screenshot(path="debug_tvi_page.png")
-            logger.info("Screenshot da página de TVI salvo")
+            if logger.isEnabledFor(logging.DEBUG):
+                await page.screenshot(path="debug_tvi_page.png")
+                logger.debug("Screenshot da página de TVI salvo")
             
             page_content = await page.content()
+            self.paginas_capturadas['tvi'] = page_content
             
-            # Verificar mensagens de ausência de dados
-            no_data_messages = [
-                "Nenhum resultado foi encontrado",
-                "Nenhum registro encontrado",
-                "Sem dados disponíveis",
-                "Não há TVIs",
-                "Nenhuma TVI cadastrada"
-            ]
-            
-            for message in no_data_messages:
-                if message in page_content:
-                    logger.info(f"TVI: Encontrada mensagem '{message}'")
-                    return "0.0"
-            
-            # Verificar tabela com saldos devedores
-            tvi_rows = await page.query_selector_all("table.table.table-striped tbody tr")
-            
-            if tvi_rows and len(tvi_rows) > 0:
-                logger.info(f"TVI: Encontradas {len(tvi_rows)} linha(s) na tabela")
-                
-                for idx, row in enumerate(tvi_rows, 1):
-                    try:
-                        cells = await row.query_selector_all("td")
-                        
-                        if len(cells) >= 6:
-                            # Coluna 5 (índice 4) contém o saldo devedor
-                            saldo_cell = cells[4]
-                            saldo_text = await saldo_cell.text_content()
-                            saldo_text = saldo_text.strip() if saldo_text else "0,00"
-                            
-                            # Converter para float
-                            valor_tvi = self._extract_monetary_value(saldo_text)
-                            
-                            if valor_tvi > 0:
-                                logger.info(f"TVI: ❌ Encontrado saldo devedor: R$ {valor_tvi:.2f}")
-                                return str(valor_tvi)
-                            else:
-                                logger.info("TVI: ✅ Saldo zero encontrado")
-                    
-                    except Exception as row_error:
-                        logger.warning(f"Erro ao processar linha TVI {idx}: {row_error}")
-                        continue
-                
-                return "0.0"  # Todas as linhas com saldo zero
-            
-            return "0.0"  # Nenhuma TVI encontrada
+            # Regras de extração compartilhadas com a re-extração offline
+            return extrair_saldo_tvi(page_content)
                 
         except Exception as e:
             logger.error(f"Erro ao extrair dados de TVI: {e}")
@@ -322,34 +308,15 @@ class DataExtractor:
             await page.wait_for_timeout(HumanBehavior.random_delay(2000, 3000))
             
             # Capturar screenshot para debug
-            await page.screenshot(path="debug_dividas_page.png")
-            logger.info("Screenshot da página de Dívidas salvo")
+            if logger.isEnabledFor(logging.DEBUG):
+                await page.screenshot(path="debug_dividas_page.png")
+                logger.debug("Screenshot da página de Dívidas salvo")
             
             page_content = await page.content()
+            self.paginas_capturadas['dividas'] = page_content
             
-            # Verificar mensagens de ausência de dados
-            no_data_messages = [
-                "Nenhum resultado foi encontrado",
-                "Nenhum registro encontrado",
-                "Sem dados disponíveis",
-                "Não há dívidas",
-                "Sem débitos pendentes"
-            ]
-            
-            for message in no_data_messages:
-                if message in page_content:
-                    logger.info(f"DÍVIDAS: Encontrada mensagem '{message}'")
-                    return 0.0
-            
-            # Procurar valores monetários na página
-            valores_encontrados = self._extract_all_monetary_values(page_content)
-            
-            if valores_encontrados:
-                valor_total = max(valores_encontrados)
-                logger.info(f"DÍVIDAS: Valor máximo encontrado: R$ {valor_total:.2f}")
-                return valor_total
-            
-            return 0.0
+            # Regras de extração compartilhadas com a re-extração offline
+            return extrair_valor_dividas(page_content)
                 
         except Exception as e:
             logger.error(f"Erro ao extrair dados de dívida: {e}")
@@ -357,64 +324,11 @@ class DataExtractor:
     
     def _extract_monetary_value(self, text: str) -> float:
         """Extrai valor monetário de um texto com maior precisão"""
-        try:
-            if not text:
-                return 0.0
-            
-            clean_text = text.strip()
-            
-            # Padrões para valores monetários brasileiros
-            patterns = [
-                r'R?\$?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',  # R$ 1.234.567,89
-                r'R?\$?\s*(\d{4,7},\d{2})(?!\d)',        # R$ 123456,78
-                r'R?\$?\s*(\d{1,7}\.\d{2})(?!\d)',       # R$ 123456.78
-                r'R?\$?\s*(\d{1,3}(?:\.\d{3})+)(?!\d|,)', # R$ 1.234.567
-                r'R?\$?\s*(\d{5,})(?!\d)',               # R$ 1234567
-                r'R?\$?\s*(\d{1,4})(?!\d)'               # R$ 123
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, clean_text)
-                if match:
-                    value_str = match.group(1)
-                    
-                    # Converter baseado no formato
-                    if ',' in value_str and value_str.count(',') == 1:
-                        # Formato brasileiro: 1.234,56
-                        value_str = value_str.replace('.', '').replace(',', '.')
-                    elif value_str.count('.') > 1:
-                        # Múltiplos pontos = separadores de milhares: 1.234.567
-                        value_str = value_str.replace('.', '')
-                    
-                    return float(value_str)
-            
-            return 0.0
-            
-        except (ValueError, AttributeError) as e:
-            logger.debug(f"Erro ao extrair valor monetário de '{text}': {e}")
-            return 0.0
+        return extrair_valor_monetario(text)
     
     def _extract_all_monetary_values(self, content: str) -> list:
         """Extrai todos os valores monetários encontrados no conteúdo"""
-        valores_encontrados = []
-        
-        # Padrões para valores monetários
-        money_patterns = [
-            r'R\$\s*[\d.,]+',
-            r'[\d.,]+\s*(?:reais?|R\$)',
-            r'(?:valor|total|débito|dívida)[:\s]*R\$?\s*[\d.,]+',
-            r'[\d]{1,3}(?:\.[\d]{3})*(?:,[\d]{2})?'
-        ]
-        
-        for pattern in money_patterns:
-            matches = re.findall(pattern, content, re.IGNORECASE)
-            for match in matches:
-                valor = self._extract_monetary_value(match)
-                if valor > 0:
-                    valores_encontrados.append(valor)
-                    logger.info(f"DÍVIDAS: Valor encontrado: R$ {valor:.2f} (padrão: {match})")
-        
-        return valores_encontrados
+        return extrair_todos_valores_monetarios(content)
     
     async def _go_back_safely(self, page: Page) -> None:
         """Volta para a página anterior de forma segura"""
@@ -15,6 +15,7 @@ from playwright.async_api import Page
 
 from src.bot.utils.selectors import SEFAZSelectors
 from src.bot.utils.human_behavior import HumanBehavior
+from src.bot.utils.extraction_rules import extrair_dados_dief, extrair_link_recibo
 from src.bot.exceptions import (
     ExtractionException,
     ElementNotFoundException,
@@ -26,6 +27,11 @@ from src.bot.exceptions import (
 import sqlite3
 from datetime import datetime
 
+from src.database.chaves import chave_cpf, chave_ie, ensure_chaves
+from src.database.fts import ensure_mensagens_fts
+from src.database.page_archive import PAGINAS_MENSAGEM, ensure_page_archive, arquivar_paginas
+from src.database.storage import persistir
+
 logger = logging.getLogger(__name__)
 
 
@@ -92,6 +98,15 @@ class SEFAZMessageProcessor:
                 except sqlite3.OperationalError:
                     pass  # Coluna já existe
             
+            # Índice de busca textual (criado assim que as colunas existem)
+            ensure_mensagens_fts(conn)
+            
+            # Arquivo de páginas (HTML comprimido das mensagens)
+            ensure_page_archive(conn)
+            
+            # Chaves canônicas de IE/CPF (filtros por igualdade indexada)
+            ensure_chaves(conn)
+            
             conn.commit()
             conn.close()
             
@@ -472,7 +487,7 @@ class SEFAZMessageProcessor:
                 
                 # 3. Salvar no banco
                 logger.info("3️⃣ Salvando no banco de dados...")
-                message_id = self._save_message_to_database(message_data)
+                message_id = await self._save_message_to_database(message_data)
                 if message_id:
                     logger.info(f"✅ Mensagem salva com ID: {message_id}")
                 else:
@@ -607,9 +622,10 @@ class SEFAZMessageProcessor:
             logger.info("   📄 Extraindo conteúdo HTML da mensagem...")
             try:
                 # Primeiro, fazer screenshot da página para debug
-                screenshot_path = f"debug_mensagem_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-                await page.screenshot(path=screenshot_path)
-                logger.info(f"      📸 Screenshot salvo: {screenshot_path}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    screenshot_path = f"debug_mensagem_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+                    await page.screenshot(path=screenshot_path)
+                    logger.debug(f"      📸 Screenshot salvo: {screenshot_path}")
                 
                 # Seletor correto baseado na estrutura HTML real da página
                 # O conteúdo está dentro de: <td width="100%"> que contém o recibo completo
@@ -651,7 +667,7 @@ class SEFAZMessageProcessor:
                                 conteudo_html = html
                                 conteudo_texto = texto
                                 logger.info(f"      ✅ Conteúdo aceito! Tamanho: {len(texto.strip())} caracteres")
-                                logger.info(f"      📝 Preview HTML: {html[:200]}...")
+                                logger.debug(f"      📝 Preview HTML: {html[:200]}...")
                                 break
                             else:
                                 logger.info(f"      ⚠️ Elemento encontrado mas conteúdo insuficiente")
@@ -712,41 +728,17 @@ class SEFAZMessageProcessor:
                     logger.info(f"      📝 Preview: {conteudo_texto.strip()[:200]}...")
                     
                     # EXTRAIR DADOS ESPECÍFICOS DA DIEF DO CONTEÚDO
+                    # (regras compartilhadas com a re-extração offline)
                     logger.info("   🔍 Extraindo dados da DIEF do conteúdo...")
+                    dados_dief = extrair_dados_dief(conteudo_texto)
+                    dados.update(dados_dief)
                     
-                    import re
-                    
-                    # Competência DIEF (Período da DIEF: 202510)
-                    match_competencia = re.search(r'Período da DIEF:\s*(\d{6})', conteudo_texto)
-                    if match_competencia:
-                        dados['competencia_dief'] = match_competencia.group(1)
-                        logger.info(f"      ✓ Competência: {dados['competencia_dief']}")
-                    else:
-                        logger.warning(f"      ⚠️ Competência DIEF não encontrada")
-                    
-                    # Status DIEF (Situação: DIEF PROCESSADA)
-                    match_status = re.search(r'Situação:\s*([^\n]+)', conteudo_texto)
-                    if match_status:
-                        dados['status_dief'] = match_status.group(1).strip()
-                        logger.info(f"      ✓ Status: {dados['status_dief']}")
-                    else:
-                        logger.warning(f"      ⚠️ Status DIEF não encontrado")
-                    
-                    # Chave de segurança DIEF
-                    match_chave = re.search(r'Chave de segurança:\s*([\d-]+)', conteudo_texto)
-                    if match_chave:
-                        dados['chave_dief'] = match_chave.group(1).strip()
-                        logger.info(f"      ✓ Chave: {dados['chave_dief']}")
-                    else:
-                        logger.warning(f"      ⚠️ Chave DIEF não encontrada")
-                    
-                    # Protocolo DIEF
-                    match_protocolo = re.search(r'Protocolo DIEF:\s*(\d+)', conteudo_texto)
-                    if match_protocolo:
-                        dados['protocolo_dief'] = match_protocolo.group(1).strip()
-                        logger.info(f"      ✓ Protocolo: {dados['protocolo_dief']}")
-                    else:
-                        logger.warning(f"      ⚠️ Protocolo DIEF não encontrado")
+                    for campo, rotulo in (('competencia_dief', 'Competência'), ('status_dief', 'Status'),
+                                          ('chave_dief', 'Chave'), ('protocolo_dief', 'Protocolo')):
+                        if campo in dados_dief:
+                            logger.info(f"      ✓ {rotulo}: {dados_dief[campo]}")
+                        else:
+                            logger.warning(f"      ⚠️ {rotulo} DIEF ausente no conteúdo")
                 else:
                     logger.warning("      ❌ Não foi possível extrair conteúdo")
                     
@@ -956,54 +948,57 @@ class SEFAZMessageProcessor:
         except Exception as e:
             logger.warning(f"⚠️ Erro ao voltar para lista: {e}")
     
-    def _save_message_to_database(self, message_data: Dict[str, Any]) -> Optional[int]:
-        """Salva mensagem no banco de dados"""
+    async def _save_message_to_database(self, message_data: Dict[str, Any]) -> Optional[int]:
+        """Salva mensagem no banco de dados (pela fila de escrita, quando ativa)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Extrair link do recibo se presente no HTML
             link_recibo = self._extract_receipt_link(message_data.get('conteudo_html', ''))
             
             # Data de ciência atual
             data_ciencia = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            cursor.execute('''
-                INSERT INTO mensagens_sefaz 
-                (inscricao_estadual, cpf_socio, enviada_por, data_envio, assunto, 
-                 classificacao, tributo, tipo_mensagem, numero_documento, vencimento, 
-                 conteudo_mensagem, competencia_dief, status_dief, chave_dief, 
-                 protocolo_dief, conteudo_html, nome_empresa, data_leitura, 
-                 data_ciencia, link_recibo)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                message_data.get('inscricao_estadual'),
-                message_data.get('cpf_socio'),
-                message_data.get('enviada_por'),
-                message_data.get('data_envio'),
-                message_data.get('assunto'),
-                message_data.get('classificacao'),
-                message_data.get('tributo'),
-                message_data.get('tipo_mensagem'),
-                message_data.get('numero_documento'),
-                message_data.get('vencimento'),
-                message_data.get('conteudo_mensagem'),
-                message_data.get('competencia_dief'),
-                message_data.get('status_dief'),
-                message_data.get('chave_dief'),
-                message_data.get('protocolo_dief'),
-                message_data.get('conteudo_html'),
-                message_data.get('nome_empresa'),
-                message_data.get('data_leitura'),
-                data_ciencia,
-                link_recibo
-            ))
-            
-            message_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            return message_id
+            def _inserir(conn: sqlite3.Connection) -> int:
+                # HTML vai para o arquivo de páginas (comprimido); a linha guarda o hash
+                hashes = arquivar_paginas(conn, {'mensagem': message_data.get('conteudo_html')}, PAGINAS_MENSAGEM)
+                pagina_hash = hashes.get('pagina_hash')
+                conteudo_html = None if pagina_hash else message_data.get('conteudo_html')
+                
+                cursor = conn.execute('''
+                    INSERT INTO mensagens_sefaz 
+                    (inscricao_estadual, cpf_socio, enviada_por, data_envio, assunto, 
+                     classificacao, tributo, tipo_mensagem, numero_documento, vencimento, 
+                     conteudo_mensagem, competencia_dief, status_dief, chave_dief, 
+                     protocolo_dief, conteudo_html, nome_empresa, data_leitura, 
+                     data_ciencia, link_recibo, pagina_hash, ie_chave, cpf_chave)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    message_data.get('inscricao_estadual'),
+                    message_data.get('cpf_socio'),
+                    message_data.get('enviada_por'),
+                    message_data.get('data_envio'),
+                    message_data.get('assunto'),
+                    message_data.get('classificacao'),
+                    message_data.get('tributo'),
+                    message_data.get('tipo_mensagem'),
+                    message_data.get('numero_documento'),
+                    message_data.get('vencimento'),
+                    message_data.get('conteudo_mensagem'),
+                    message_data.get('competencia_dief'),
+                    message_data.get('status_dief'),
+                    message_data.get('chave_dief'),
+                    message_data.get('protocolo_dief'),
+                    conteudo_html,
+                    message_data.get('nome_empresa'),
+                    message_data.get('data_leitura'),
+                    data_ciencia,
+                    link_recibo,
+                    pagina_hash,
+                    chave_ie(message_data.get('inscricao_estadual')),
+                    chave_cpf(message_data.get('cpf_socio'))
+                ))
+                return cursor.lastrowid
+            
+            return await persistir(self.db_path, _inserir, 'mensagens_sefaz')
             
         except Exception as e:
             logger.error(f"❌ Erro ao salvar mensagem: {e}")
@@ -1011,16 +1006,11 @@ class SEFAZMessageProcessor:
     
     def _extract_receipt_link(self, html_content: str) -> Optional[str]:
         """Extrai link do recibo do conteúdo HTML"""
-        if not html_content or 'listIReciboDief' not in html_content:
-            return None
-        
         try:
-            import re
-            match = re.search(r'href=["\']([^"\']*listIReciboDief\.do[^"\']*)["\']', html_content, re.IGNORECASE)
-            if match:
-                link = match.group(1).replace('&amp;', '&')
+            link = extrair_link_recibo(html_content)
+            if link:
                 logger.info(f"🔗 Link do recibo extraído: {link}")
-                return link
+            return link
         except Exception as e:
             logger.debug(f"Erro ao extrair link do recibo: {e}")
         
@@ -1048,7 +1038,7 @@ class SEFAZMessageProcessor:
                 
                 # Salvar no banco
                 logger.info("   💾 Salvando no banco...")
-                message_id = self._save_message_to_database(message_data)
+                message_id = await self._save_message_to_database(message_data)
                 
                 if message_id:
                     logger.info(f"   ✅ Mensagem salva com ID: {message_id}")
@@ -1107,7 +1097,7 @@ class SEFAZBotCiencia(SEFAZMessageProcessor):
                 
                 # Salvar no banco
                 logger.info("   💾 Salvando no banco...")
-                message_id = self._save_message_to_database(message_data)
+                message_id = await self._save_message_to_database(message_data)
                 
                 if message_id:
                     logger.info(f"   ✅ Mensagem salva com ID: {message_id}")
@@ -11,6 +11,7 @@ from playwright.async_api import Page
 
 from src.bot.utils.selectors import SEFAZSelectors
 from src.bot.utils.human_behavior import HumanBehavior
+from src.bot.utils.metricas import medir_etapa
 from src.bot.exceptions.base import (
     NavigationException,
     ElementNotFoundException,
@@ -495,34 +496,38 @@ class SEFAZNavigator:
             logger.info("🚀 INICIANDO NAVEGAÇÃO COMPLETA PARA CONTA-CORRENTE")
             logger.info("="*80)
             
-            # Passo 1: Abrir menu Sistemas
-            if not await self.open_sistemas_menu(page):
-                logger.error("❌ Falha ao abrir menu Sistemas")
-                return False
+            # Passos 1-4: menu Sistemas e árvore (jstree) até a Conta-Corrente
+            with medir_etapa('navegacao'):
+                # Passo 1: Abrir menu Sistemas
+                if not await self.open_sistemas_menu(page):
+                    logger.error("❌ Falha ao abrir menu Sistemas")
+                    return False
             
-            # Passo 2: Clicar em Todas as Áreas de Negócio
-            if not await self.click_todas_areas_negocio(page):
-                logger.error("❌ Falha ao clicar em 'Todas as Áreas de Negócio'")
-                return False
+                # Passo 2: Clicar em Todas as Áreas de Negócio
+                if not await self.click_todas_areas_negocio(page):
+                    logger.error("❌ Falha ao clicar em 'Todas as Áreas de Negócio'")
+                    return False
             
-            # Passo 3: Expandir nó Conta Fiscal
-            if not await self.expand_conta_fiscal_node(page):
-                logger.error("❌ Falha ao expandir nó 'Conta Fiscal'")
-                return False
+                # Passo 3: Expandir nó Conta Fiscal
+                if not await self.expand_conta_fiscal_node(page):
+                    logger.error("❌ Falha ao expandir nó 'Conta Fiscal'")
+                    return False
             
-            # Passo 4: Clicar em Consultar Conta-Corrente Fiscal
-            if not await self.click_consultar_conta_corrente(page):
-                logger.error("❌ Falha ao clicar em 'Consultar Conta-Corrente Fiscal'")
-                return False
+                # Passo 4: Clicar em Consultar Conta-Corrente Fiscal
+                if not await self.click_consultar_conta_corrente(page):
+                    logger.error("❌ Falha ao clicar em 'Consultar Conta-Corrente Fiscal'")
+                    return False
             
-            # Passo 5: Preencher IE se necessário
-            if not await self.fill_inscricao_estadual_form(page, inscricao_estadual):
-                logger.error("❌ Falha ao preencher/confirmar IE")
-                return False
+            # Passos 5-6: formulário da IE
+            with medir_etapa('formulario_ie'):
+                # Passo 5: Preencher IE se necessário
+                if not await self.fill_inscricao_estadual_form(page, inscricao_estadual):
+                    logger.error("❌ Falha ao preencher/confirmar IE")
+                    return False
             
-            # Passo 6: Clicar em Continuar
-            if not await self.click_continuar_button(page):
-                logger.warning("⚠️ Problema ao clicar em Continuar, mas pode estar na página correta")
+                # Passo 6: Clicar em Continuar
+                if not await self.click_continuar_button(page):
+                    logger.warning("⚠️ Problema ao clicar em Continuar, mas pode estar na página correta")
             
             logger.info("="*80)
             logger.info("✅ NAVEGAÇÃO COMPLETA CONCLUÍDA COM SUCESSO!")
@@ -15,6 +15,7 @@ from src.bot.core.authenticator import SEFAZAuthenticator
 from src.bot.core.navigator import SEFAZNavigator  
 from src.bot.core.message_processor import SEFAZMessageProcessor
 from src.bot.utils.constants import URL_SEFAZ_LOGIN
+from src.bot.utils.metricas import NAVEGADORES_ABERTOS, medir_etapa
 from src.bot.exceptions import (
     BrowserLaunchException,
     LoginFailedException,
@@ -26,6 +27,7 @@ from src.bot.exceptions import (
     create_user_friendly_error_message,
     log_exception_details
 )
+from src.database.chaves import chave_ie
 
 logger = logging.getLogger(__name__)
 
@@ -39,9 +41,18 @@ class BrowserManager:
         self.browser = None
         self.context = None
         self.page = None
+        self._aberto = False
         
     async def __aenter__(self):
         """Inicializa o navegador ao entrar no contexto"""
+        with medir_etapa('navegador', bot='mensagens'):
+            page = await self._iniciar()
+        NAVEGADORES_ABERTOS.inc(bot='mensagens')
+        self._aberto = True
+        return page
+    
+    async def _iniciar(self):
+        """Inicia Playwright, navegador e página"""
         try:
             logger.info("🌐 MessageBot: Iniciando navegador...")
             self.playwright = await async_playwright().start()
@@ -93,6 +104,9 @@ class BrowserManager:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Garante que o navegador seja fechado ao sair do contexto"""
         await self._cleanup()
+        if self._aberto:
+            NAVEGADORES_ABERTOS.dec(bot='mensagens')
+            self._aberto = False
         
         if exc_type:
             logger.error(f"❌ MessageBot: Exceção capturada: {exc_type.__name__}: {exc_val}")
@@ -194,9 +208,10 @@ class MessageBot:
             async with BrowserManager(headless=headless) as page:
                 # Etapa 1: Login
                 logger.info("🔐 Etapa 1/4: Fazendo login...")
-                login_success = await self.authenticator.perform_login(
-                    page, cpf, senha, URL_SEFAZ_LOGIN
-                )
+                with medir_etapa('login', bot='mensagens'):
+                    login_success = await self.authenticator.perform_login(
+                        page, cpf, senha, URL_SEFAZ_LOGIN
+                    )
                 
                 if not login_success:
                     raise LoginFailedException("Falha na autenticação")
@@ -206,28 +221,29 @@ class MessageBot:
                 # Etapa 2: Verificar se há mensagens aguardando ciência
                 logger.info("🧭 Etapa 2/4: Verificando mensagens pendentes...")
                 
-                has_pending_messages = await self.navigator.check_pending_messages(page)
+                with medir_etapa('menu', bot='mensagens'):
+                    has_pending_messages = await self.navigator.check_pending_messages(page)
                 
-                if has_pending_messages:
-                    logger.info("📨 Mensagens aguardando ciência detectadas - indo diretamente para processamento")
+                    if has_pending_messages:
+                        logger.info("📨 Mensagens aguardando ciência detectadas - indo diretamente para processamento")
                     
-                    # Clicar no link da mensagem
-                    message_clicked = await self.navigator.click_message_link(page)
-                    if not message_clicked:
-                        raise NavigationException("Não foi possível acessar mensagens aguardando ciência")
+                        # Clicar no link da mensagem
+                        message_clicked = await self.navigator.click_message_link(page)
+                        if not message_clicked:
+                            raise NavigationException("Não foi possível acessar mensagens aguardando ciência")
                         
-                else:
-                    logger.info("🧭 Navegando para área de mensagens via menu...")
+                    else:
+                        logger.info("🧭 Navegando para área de mensagens via menu...")
                     
-                    # Abrir menu sistemas
-                    menu_opened = await self.navigator.open_sistemas_menu(page)
-                    if not menu_opened:
-                        raise NavigationException("Não foi possível abrir menu Sistemas")
+                        # Abrir menu sistemas
+                        menu_opened = await self.navigator.open_sistemas_menu(page)
+                        if not menu_opened:
+                            raise NavigationException("Não foi possível abrir menu Sistemas")
                     
-                    # Navegar para todas as áreas de negócio
-                    areas_clicked = await self.navigator.click_todas_areas_negocio(page)
-                    if not areas_clicked:
-                        raise NavigationException("Não foi possível acessar Todas as Áreas de Negócio")
+                        # Navegar para todas as áreas de negócio
+                        areas_clicked = await self.navigator.click_todas_areas_negocio(page)
+                        if not areas_clicked:
+                            raise NavigationException("Não foi possível acessar Todas as Áreas de Negócio")
                 
                 logger.info("✅ Navegação para área de mensagens concluída")
                 
@@ -247,7 +263,8 @@ class MessageBot:
                 
                 # Etapa 4: Logout
                 logger.info("🚪 Etapa 4/4: Fazendo logout...")
-                await self.authenticator.perform_logout(page)
+                with medir_etapa('logout', bot='mensagens'):
+                    await self.authenticator.perform_logout(page)
                 logger.info("✅ Logout realizado com sucesso")
                 
                 # Resultado final
@@ -616,16 +633,18 @@ class MessageBot:
                     logger.warning(f"⚠️ Link da mensagem não está visível")
                     continue
                 
-                # Clicar na mensagem
-                await primeiro_link.click()
-                
-                # Aguardar carregamento da página da mensagem
-                await page.wait_for_timeout(3000)
-                
-                # Processar a mensagem usando o processador existente
-                resultado_processamento = await self.message_processor.processar_mensagem_individual(
-                    page, cpf, inscricao_estadual
-                )
+                # Abertura + ciência + extração da mensagem
+                with medir_etapa('mensagem', bot='mensagens'):
+                    # Clicar na mensagem
+                    await primeiro_link.click()
+                    
+                    # Aguardar carregamento da página da mensagem
+                    await page.wait_for_timeout(3000)
+                    
+                    # Processar a mensagem usando o processador existente
+                    resultado_processamento = await self.message_processor.processar_mensagem_individual(
+                        page, cpf, inscricao_estadual
+                    )
                 
                 if resultado_processamento:
                     processadas += 1
@@ -717,8 +736,8 @@ class MessageBot:
                         COUNT(CASE WHEN data_envio >= datetime('now', '-1 day') THEN 1 END) as hoje,
                         COUNT(CASE WHEN data_envio >= datetime('now', '-7 days') THEN 1 END) as semana
                     FROM mensagens_sefaz 
-                    WHERE inscricao_estadual = ?
-                """, (inscricao_estadual,))
+                    WHERE ie_chave = ?
+                """, (chave_ie(inscricao_estadual),))
             else:
                 # Estatísticas globais
                 cursor.execute("""
@@ -8,7 +8,7 @@ import os
 from dotenv import load_dotenv
 import smtplib
 from email.message import EmailMessage
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Callable, Tuple
 
 # Corrigir policy do asyncio no Windows para Python 3.13+
 if sys.platform == 'win32' and sys.version_info >= (3, 8):
@@ -26,6 +26,7 @@ from src.bot.core.navigator import SEFAZNavigator
 from src.bot.core.data_extractor import DataExtractor, MessageExtractor
 from src.bot.core.message_processor import SEFAZMessageProcessor
 from src.bot.utils.validators import SEFAZValidator
+from src.bot.utils.extraction_rules import extrair_link_recibo
 from src.bot.exceptions.base import (
     ValidationException,
     LoginFailedException,
@@ -55,12 +56,20 @@ from src.bot.exceptions.base import (
     is_session_conflict_message
 )
 from src.bot.utils.retry import retry, retry_on_timeout, retry_on_network, RetryExhaustedException
+from src.bot.utils.metricas import NAVEGADORES_ABERTOS, RETENTATIVAS, medir_etapa
+from src.database import notify_write
+from src.database.linha_do_tempo import anexar_pagina, ensure_linha_do_tempo
+from src.database.page_archive import PAGINAS_CONSULTA, PAGINAS_MENSAGEM, ensure_page_archive, arquivar_paginas
+from src.database.chaves import chave_cpf, chave_ie, chaves_canonicas, empresa_por_ie, ensure_chaves, migrar_chaves, vincular_empresas
+from src.database.consulta_tipos import campos_tipados, ensure_colunas_tipadas, migrar_consultas
+from src.database.storage import ensure_wal, persistir
+from src.bot.utils.logs import configurar_logs
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging (pipeline em fila; sem efeito se a API já configurou)
+configurar_logs()
 logger = logging.getLogger(__name__)
 
 class BrowserManager:
@@ -73,9 +82,18 @@ class BrowserManager:
         self.browser = None
         self.context = None
         self.page = None
+        self._aberto = False
         
     async def __aenter__(self):
         """Inicializa o navegador ao entrar no contexto"""
+        with medir_etapa('navegador', bot='consulta'):
+            page = await self._iniciar()
+        NAVEGADORES_ABERTOS.inc(bot='consulta')
+        self._aberto = True
+        return page
+    
+    async def _iniciar(self):
+        """Inicia Playwright, navegador e página"""
         try:
             # Garantir que a policy correta está ativa antes de iniciar Playwright
             if sys.platform == 'win32' and sys.version_info >= (3, 8):
@@ -144,6 +162,9 @@ class BrowserManager:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Garante que o navegador seja fechado ao sair do contexto"""
         await self._cleanup()
+        if self._aberto:
+            NAVEGADORES_ABERTOS.dec(bot='consulta')
+            self._aberto = False
         
         # Se houve exceção, loga mas não suprime
         if exc_type:
@@ -209,8 +230,15 @@ class BrowserManager:
             raise BrowserCloseException(f"Múltiplos erros durante cleanup: {'; '.join(errors)}")
 
 class SEFAZBot:
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(self, db_path: Optional[str] = None, ao_progresso: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            db_path: Caminho do banco (padrão: conforme o ambiente)
+            ao_progresso: Callback chamado com cada etapa da consulta
+                          (ver ETAPAS_CONSULTA); deve ser rápido e não bloquear
+        """
         self.db_path = db_path or self.get_database_path()
+        self.ao_progresso = ao_progresso
         self.sefaz_url = os.getenv('SEFAZ_URL', URL_SEFAZ_LOGIN)
         self.timeout = int(os.getenv('TIMEOUT', str(TIMEOUT_DEFAULT)))
         self.headless = os.getenv('HEADLESS', 'false').lower() == 'true'
@@ -218,7 +246,7 @@ class SEFAZBot:
         # Inicializar classes especializadas
         self.authenticator = SEFAZAuthenticator(self.timeout)
         self.navigator = SEFAZNavigator()
-        self.data_extractor = DataExtractor()
+        self.data_extractor = DataExtractor(ao_progresso=self._reportar_etapa)
         self.message_extractor = MessageExtractor()
         
         # Bot especializado para processar mensagens com ciência
@@ -234,6 +262,15 @@ class SEFAZBot:
 
         self.init_database()
     
+    def _reportar_etapa(self, etapa: str) -> None:
+        """Informa a etapa atual ao callback de progresso; falhas nele não interrompem a consulta"""
+        if self.ao_progresso is None:
+            return
+        try:
+            self.ao_progresso(etapa)
+        except Exception as e:
+            logger.debug(f"Falha ao reportar etapa {etapa}: {e}")
+    
     def get_database_path(self) -> str:
         """Retorna o caminho do banco baseado no ambiente"""
         # Verificar se está em produção
@@ -257,6 +294,7 @@ class SEFAZBot:
         """Inicializa o banco de dados"""
         try:
             conn = sqlite3.connect(self.db_path)
+            ensure_wal(conn)
             cursor = conn.cursor()
             
             # Tabela de consultas
@@ -352,6 +390,21 @@ class SEFAZBot:
             except sqlite3.OperationalError:
                 pass  # Coluna já existe
             
+            # Linha do tempo das etapas dos jobs da fila
+            ensure_linha_do_tempo(conn)
+            
+            # Arquivo de páginas capturadas (e colunas de ligação)
+            ensure_page_archive(conn)
+            
+            # Colunas tipadas dos resultados (migra as consultas antigas uma vez)
+            if ensure_colunas_tipadas(conn):
+                migrar_consultas(conn)
+            
+            # Chaves canônicas de CNPJ/IE/CPF e vínculo consulta -> empresa
+            ensure_chaves(conn)
+            migrar_chaves(conn)
+            vincular_empresas(conn)
+            
             conn.commit()
             conn.close()
             
@@ -364,34 +417,42 @@ class SEFAZBot:
         except Exception as e:
             raise DatabaseException(f"Erro inesperado ao inicializar banco: {e}") from e
     
-    def salvar_resultado(self, dados: Dict[str, Any]) -> None:
-        """Salva os dados no banco"""
+    async def salvar_resultado(self, dados: Dict[str, Any], paginas: Optional[Dict[str, str]] = None) -> None:
+        """
+        Salva os dados no banco
+        
+        A gravação passa pela fila de escrita do banco quando ela está ativa
+        (API), sendo agrupada com as demais; retorna após o commit.
+        
+        Args:
+            dados: Dados extraídos da conta corrente
+            paginas: HTML das páginas usadas na extração ({'conta_corrente', 'tvi', 'dividas'}),
+                     gravado no arquivo de páginas e ligado à consulta pelo hash
+        """
+        registro = {
+            coluna: dados.get(coluna)
+            for coluna in (
+                'nome_empresa', 'cnpj', 'inscricao_estadual', 'cpf_socio', 'chave_acesso',
+                'status_ie', 'tem_tvi', 'valor_debitos', 'tem_divida_pendente',
+                'omisso_declaracao', 'inscrito_restritivo',
+            )
+        }
+        registro.update(campos_tipados(dados))
+        registro.update(chaves_canonicas('consultas', dados))
+        
+        def _inserir(conn: sqlite3.Connection) -> int:
+            linha = dict(registro, **arquivar_paginas(conn, paginas, PAGINAS_CONSULTA))
+            linha['empresa_id'] = empresa_por_ie(conn, linha['ie_chave'])
+            
+            colunas = list(linha)
+            cursor = conn.execute(
+                f"INSERT INTO consultas ({', '.join(colunas)}) VALUES ({', '.join('?' for _ in colunas)})",
+                [linha[c] for c in colunas]
+            )
+            return cursor.lastrowid
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO consultas 
-                (nome_empresa, cnpj, inscricao_estadual, cpf_socio, chave_acesso, 
-                 status_ie, tem_tvi, valor_debitos, tem_divida_pendente, 
-                 omisso_declaracao, inscrito_restritivo)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                dados.get('nome_empresa'),
-                dados.get('cnpj'),
-                dados.get('inscricao_estadual'),
-                dados.get('cpf_socio'),
-                dados.get('chave_acesso'),
-                dados.get('status_ie'),
-                dados.get('tem_tvi'),
-                dados.get('valor_debitos'),
-                dados.get('tem_divida_pendente'),
-                dados.get('omisso_declaracao'),
-                dados.get('inscrito_restritivo')
-            ))
-            
-            conn.commit()
-            conn.close()
+            await persistir(self.db_path, _inserir, 'consultas')
             logger.info("Dados salvos no banco de dados")
             
         except sqlite3.IntegrityError as e:
@@ -580,11 +641,13 @@ class SEFAZBot:
                 if len(content) < 1000:
                     raise LoginFailedException(f"Página muito pequena após login ({len(content)} bytes)")
                 
-                with open(DEBUG_FILE_POST_LOGIN, "w", encoding="utf-8") as f:
-                    f.write(content)
-                    
-                await page.screenshot(path=DEBUG_FILE_POST_LOGIN.replace('.html', '.png'), full_page=True)
-                logger.debug(f"💾 Debug files salvos: {DEBUG_FILE_POST_LOGIN}")
+                # Cópia da página só em DEBUG (escrita síncrona + screenshot full page)
+                if logger.isEnabledFor(logging.DEBUG):
+                    with open(DEBUG_FILE_POST_LOGIN, "w", encoding="utf-8") as f:
+                        f.write(content)
+                        
+                    await page.screenshot(path=DEBUG_FILE_POST_LOGIN.replace('.html', '.png'), full_page=True)
+                    logger.debug(f"💾 Debug files salvos: {DEBUG_FILE_POST_LOGIN}")
             except LoginFailedException:
                 raise
             except PermissionError as e:
@@ -806,21 +869,16 @@ class SEFAZBot:
             cursor = conn.cursor()
             
             # Extrair link do recibo do conteúdo HTML se existir
-            link_recibo = None
-            conteudo = dados.get('conteudo_html') or dados.get('conteudo_mensagem', '')
-            if conteudo and 'listIReciboDief' in conteudo:
-                import re
-                match = re.search(r'href=["\']([^"\']*listIReciboDief\.do[^"\']*)["\']', conteudo, re.IGNORECASE)
-                if match:
-                    link_recibo = match.group(1).replace('&amp;', '&')
-                    logger.info(f"🔗 Link do recibo extraído: {link_recibo}")
+            link_recibo = extrair_link_recibo(dados.get('conteudo_html') or dados.get('conteudo_mensagem', ''))
+            if link_recibo:
+                logger.info(f"🔗 Link do recibo extraído: {link_recibo}")
             
             cursor.execute('''
                 INSERT INTO mensagens_sefaz 
                 (inscricao_estadual, cpf_socio, enviada_por, data_envio, assunto, 
                  classificacao, tributo, tipo_mensagem, numero_documento, vencimento, 
-                 conteudo_mensagem, link_recibo)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 conteudo_mensagem, link_recibo, ie_chave, cpf_chave)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 dados.get('inscricao_estadual'),
                 dados.get('cpf_socio'),
@@ -833,11 +891,14 @@ class SEFAZBot:
                 dados.get('numero_documento'),
                 dados.get('vencimento'),
                 dados.get('conteudo_mensagem'),
-                link_recibo
+                link_recibo,
+                chave_ie(dados.get('inscricao_estadual')),
+                chave_cpf(dados.get('cpf_socio'))
             ))
             
             conn.commit()
             conn.close()
+            notify_write('mensagens_sefaz')
             logger.info("💾 Mensagem salva no banco de dados")
         except Exception as e:
             logger.error(f"❌ Erro ao salvar mensagem: {e}")
@@ -928,12 +989,13 @@ class SEFAZBot:
                     logger.info("✅ Mensagem aberta")
                     
                     # Screenshot para debug (opcional)
-                    try:
-                        screenshot_path = f"mensagem_{idx + 1}_aberta.png"
-                        await page.screenshot(path=screenshot_path)
-                        logger.info(f"   📸 Screenshot salvo: {screenshot_path}")
-                    except Exception as e:
-                        logger.warning(f"   ⚠️ Erro ao capturar screenshot: {e}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        try:
+                            screenshot_path = f"mensagem_{idx + 1}_aberta.png"
+                            await page.screenshot(path=screenshot_path)
+                            logger.debug(f"   📸 Screenshot salvo: {screenshot_path}")
+                        except Exception as e:
+                            logger.warning(f"   ⚠️ Erro ao capturar screenshot: {e}")
                     
                     # 2. EXTRAIR DADOS DA MENSAGEM
                     logger.info("2️⃣ Extraindo dados da mensagem...")
@@ -948,7 +1010,7 @@ class SEFAZBot:
                         
                         # 3. SALVAR NO BANCO
                         logger.info("3️⃣ Salvando no banco de dados...")
-                        msg_id = self.salvar_mensagem_completa(dados_msg)
+                        msg_id = await self.salvar_mensagem_completa(dados_msg)
                         if msg_id:
                             logger.info(f"✅ Mensagem salva no banco com ID: {msg_id}")
                             # Verificar se realmente foi salvo
@@ -1150,28 +1212,28 @@ class SEFAZBot:
             except: pass
             
             # EXTRAIR CONTEÚDO HTML COMPLETO DA MENSAGEM
-            logger.info("   📄 Extraindo conteúdo HTML da mensagem...")
+            logger.debug("   📄 Extraindo conteúdo HTML da mensagem...")
             try:
                 conteudo_element = await page.query_selector("table.table-tripped tbody tr td")
                 if conteudo_element:
                     conteudo_html = await conteudo_element.inner_html()
                     dados['conteudo_html'] = conteudo_html
-                    logger.info(f"      ✓ HTML extraído: {len(conteudo_html)} caracteres")
+                    logger.debug(f"      ✓ HTML extraído: {len(conteudo_html)} caracteres")
                     
                     conteudo_texto = await conteudo_element.text_content()
                     dados['conteudo_mensagem'] = conteudo_texto.strip()
-                    logger.info(f"      ✓ Texto extraído: {len(conteudo_texto)} caracteres")
-                    logger.info(f"      📝 Preview: {conteudo_texto[:200]}...")
+                    logger.debug(f"      ✓ Texto extraído: {len(conteudo_texto)} caracteres")
+                    logger.debug(f"      📝 Preview: {conteudo_texto[:200]}...")
                     
                     # EXTRAIR DADOS ESPECÍFICOS DA DIEF DO CONTEÚDO
-                    logger.info("   🔍 Extraindo dados da DIEF do conteúdo...")
+                    logger.debug("   🔍 Extraindo dados da DIEF do conteúdo...")
                     
                     # Competência DIEF (Período da DIEF: 202510)
                     import re
                     match_competencia = re.search(r'Período da DIEF:\s*(\d{6})', conteudo_texto)
                     if match_competencia:
                         dados['competencia_dief'] = match_competencia.group(1)
-                        logger.info(f"      ✓ Competência: {dados['competencia_dief']}")
+                        logger.debug(f"      ✓ Competência: {dados['competencia_dief']}")
                     else:
                         logger.warning(f"      ⚠️ Competência DIEF não encontrada")
                     
@@ -1179,7 +1241,7 @@ class SEFAZBot:
                     match_status = re.search(r'Situação:\s*([^\n]+)', conteudo_texto)
                     if match_status:
                         dados['status_dief'] = match_status.group(1).strip()
-                        logger.info(f"      ✓ Status: {dados['status_dief']}")
+                        logger.debug(f"      ✓ Status: {dados['status_dief']}")
                     else:
                         logger.warning(f"      ⚠️ Status DIEF não encontrado")
                     
@@ -1187,7 +1249,7 @@ class SEFAZBot:
                     match_chave = re.search(r'Chave de segurança:\s*([\d-]+)', conteudo_texto)
                     if match_chave:
                         dados['chave_dief'] = match_chave.group(1).strip()
-                        logger.info(f"      ✓ Chave: {dados['chave_dief']}")
+                        logger.debug(f"      ✓ Chave: {dados['chave_dief']}")
                     else:
                         logger.warning(f"      ⚠️ Chave DIEF não encontrada")
                     
@@ -1195,7 +1257,7 @@ class SEFAZBot:
                     match_protocolo = re.search(r'Protocolo DIEF:\s*(\d+)', conteudo_texto)
                     if match_protocolo:
                         dados['protocolo_dief'] = match_protocolo.group(1).strip()
-                        logger.info(f"      ✓ Protocolo: {dados['protocolo_dief']}")
+                        logger.debug(f"      ✓ Protocolo: {dados['protocolo_dief']}")
                     else:
                         logger.warning(f"      ⚠️ Protocolo DIEF não encontrado")
                 else:
@@ -1205,17 +1267,16 @@ class SEFAZBot:
                 logger.warning(f"   ⚠️ Erro ao extrair conteúdo HTML: {e}")
             
             # Log resumo de dados extraídos
-            logger.info("   📊 RESUMO DOS DADOS EXTRAÍDOS:")
-            logger.info(f"      - IE: {dados.get('inscricao_estadual', 'N/A')}")
-            logger.info(f"      - Empresa: {dados.get('nome_empresa', 'N/A')}")
-            logger.info(f"      - Assunto: {dados.get('assunto', 'N/A')}")
-            logger.info(f"      - Data Envio: {dados.get('data_envio', 'N/A')}")
-            logger.info(f"      - Competência DIEF: {dados.get('competencia_dief', 'N/A')}")
-            logger.info(f"      - Status DIEF: {dados.get('status_dief', 'N/A')}")
-            logger.info(f"      - Chave DIEF: {dados.get('chave_dief', 'N/A')}")
-            logger.info(f"      - Protocolo: {dados.get('protocolo_dief', 'N/A')}")
-            logger.info(f"      - HTML: {len(dados.get('conteudo_html', '')) if dados.get('conteudo_html') else 0} chars")
-            logger.info(f"      - Texto: {len(dados.get('conteudo_mensagem', '')) if dados.get('conteudo_mensagem') else 0} chars")
+            logger.info(
+                f"   📊 Dados extraídos: IE={dados.get('inscricao_estadual', 'N/A')} "
+                f"competência={dados.get('competencia_dief', 'N/A')} status={dados.get('status_dief', 'N/A')} "
+                f"HTML={len(dados.get('conteudo_html') or '')} chars texto={len(dados.get('conteudo_mensagem') or '')} chars"
+            )
+            logger.debug(
+                f"      empresa={dados.get('nome_empresa', 'N/A')} assunto={dados.get('assunto', 'N/A')} "
+                f"data_envio={dados.get('data_envio', 'N/A')} chave={dados.get('chave_dief', 'N/A')} "
+                f"protocolo={dados.get('protocolo_dief', 'N/A')}"
+            )
             
             return dados
             
@@ -1225,7 +1286,7 @@ class SEFAZBot:
             logger.error(traceback.format_exc())
             return None
 
-    def salvar_mensagem_completa(self, dados: Dict[str, Any]) -> int:
+    async def salvar_mensagem_completa(self, dados: Dict[str, Any]) -> int:
         """
         Salva mensagem completa no banco de dados incluindo dados da DIEF
         
@@ -1236,106 +1297,60 @@ class SEFAZBot:
             int: ID da mensagem salva ou None em caso de erro
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Verificar se a tabela tem as colunas necessárias
-            cursor.execute("PRAGMA table_info(mensagens_sefaz)")
-            colunas_existentes = [row[1] for row in cursor.fetchall()]
-            
-            # Se não tem as novas colunas, adicionar
-            novas_colunas = {
-                'competencia_dief': 'TEXT',
-                'status_dief': 'TEXT',
-                'chave_dief': 'TEXT',
-                'protocolo_dief': 'TEXT',
-                'conteudo_html': 'TEXT',
-                'nome_empresa': 'TEXT',
-                'data_leitura': 'TEXT',
-                'data_ciencia': 'TEXT',
-                'link_recibo': 'TEXT'
-            }
-            
-            for col_name, col_type in novas_colunas.items():
-                if col_name not in colunas_existentes:
-                    try:
-                        cursor.execute(f"ALTER TABLE mensagens_sefaz ADD COLUMN {col_name} {col_type}")
-                        logger.info(f"   ✓ Coluna {col_name} adicionada")
-                    except sqlite3.OperationalError:
-                        pass  # Coluna já existe
-            
-            conn.commit()
-            
-            # Extrair link do recibo do conteúdo HTML
-            link_recibo = None
-            conteudo_html = dados.get('conteudo_html', '')
-            if conteudo_html and 'listIReciboDief' in conteudo_html:
-                import re
-                match = re.search(r'href=["\']([^"\']*listIReciboDief\.do[^"\']*)["\']', conteudo_html, re.IGNORECASE)
-                if match:
-                    link_recibo = match.group(1).replace('&amp;', '&')
-                    logger.info(f"   🔗 Link do recibo extraído: {link_recibo}")
-            
-            # Inserir mensagem com data de ciência atual
-            from datetime import datetime
-            data_ciencia = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Log de dados antes de inserir
-            logger.info("   💾 Preparando para salvar mensagem...")
-            logger.info(f"      - IE: {dados.get('inscricao_estadual')}")
-            logger.info(f"      - Empresa: {dados.get('nome_empresa')}")
-            logger.info(f"      - Assunto: {dados.get('assunto')}")
-            logger.info(f"      - Competência: {dados.get('competencia_dief')}")
-            logger.info(f"      - Status: {dados.get('status_dief')}")
-            logger.info(f"      - HTML: {'Sim' if dados.get('conteudo_html') else 'Não'} ({len(dados.get('conteudo_html', ''))} chars)")
-            logger.info(f"      - Texto: {'Sim' if dados.get('conteudo_mensagem') else 'Não'} ({len(dados.get('conteudo_mensagem', ''))} chars)")
-            
-            cursor.execute('''
-                INSERT INTO mensagens_sefaz 
-                (inscricao_estadual, cpf_socio, enviada_por, data_envio, assunto, 
-                 classificacao, tributo, tipo_mensagem, numero_documento, vencimento, 
-                 conteudo_mensagem, competencia_dief, status_dief, chave_dief, 
-                 protocolo_dief, conteudo_html, nome_empresa, data_leitura, data_ciencia, link_recibo)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                dados.get('inscricao_estadual'),
-                dados.get('cpf_socio'),
-                dados.get('enviada_por'),
-                dados.get('data_envio'),
-                dados.get('assunto'),
-                dados.get('classificacao'),
-                dados.get('tributo'),
-                dados.get('tipo_mensagem'),
-                dados.get('numero_documento'),
-                dados.get('vencimento'),
-                dados.get('conteudo_mensagem'),
-                dados.get('competencia_dief'),
-                dados.get('status_dief'),
-                dados.get('chave_dief'),
-                dados.get('protocolo_dief'),
-                dados.get('conteudo_html'),
-                dados.get('nome_empresa'),
-                dados.get('data_leitura'),
-                data_ciencia,
-                link_recibo
-            ))
-            
-            msg_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            link_recibo, data_ciencia = self._preparar_mensagem_completa(dados)
+            
+            def _inserir(conn: sqlite3.Connection) -> int:
+                self._garantir_colunas_mensagem(conn)
+                # HTML vai para o arquivo de páginas (comprimido); a linha guarda o hash
+                hashes = arquivar_paginas(conn, {'mensagem': dados.get('conteudo_html')}, PAGINAS_MENSAGEM)
+                pagina_hash = hashes.get('pagina_hash')
+                conteudo_html = None if pagina_hash else dados.get('conteudo_html')
+                
+                cursor = conn.execute('''
+                    INSERT INTO mensagens_sefaz 
+                    (inscricao_estadual, cpf_socio, enviada_por, data_envio, assunto, 
+                     classificacao, tributo, tipo_mensagem, numero_documento, vencimento, 
+                     conteudo_mensagem, competencia_dief, status_dief, chave_dief, 
+                     protocolo_dief, conteudo_html, nome_empresa, data_leitura, data_ciencia, link_recibo,
+                     pagina_hash, ie_chave, cpf_chave)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    dados.get('inscricao_estadual'),
+                    dados.get('cpf_socio'),
+                    dados.get('enviada_por'),
+                    dados.get('data_envio'),
+                    dados.get('assunto'),
+                    dados.get('classificacao'),
+                    dados.get('tributo'),
+                    dados.get('tipo_mensagem'),
+                    dados.get('numero_documento'),
+                    dados.get('vencimento'),
+                    dados.get('conteudo_mensagem'),
+                    dados.get('competencia_dief'),
+                    dados.get('status_dief'),
+                    dados.get('chave_dief'),
+                    dados.get('protocolo_dief'),
+                    conteudo_html,
+                    dados.get('nome_empresa'),
+                    dados.get('data_leitura'),
+                    data_ciencia,
+                    link_recibo,
+                    pagina_hash,
+                    chave_ie(dados.get('inscricao_estadual')),
+                    chave_cpf(dados.get('cpf_socio'))
+                ))
+                return cursor.lastrowid
+            
+            msg_id = await persistir(self.db_path, _inserir, 'mensagens_sefaz')
             logger.info(f"   ✅ Mensagem salva no banco de dados com ID: {msg_id}")
-            logger.info(f"   📋 Campos salvos:")
-            logger.info(f"      - inscricao_estadual: {dados.get('inscricao_estadual')}")
-            logger.info(f"      - nome_empresa: {dados.get('nome_empresa')}")
-            logger.info(f"      - assunto: {dados.get('assunto')}")
-            logger.info(f"      - data_envio: {dados.get('data_envio')}")
-            logger.info(f"      - competencia_dief: {dados.get('competencia_dief')}")
-            logger.info(f"      - status_dief: {dados.get('status_dief')}")
-            logger.info(f"      - chave_dief: {dados.get('chave_dief')}")
-            logger.info(f"      - protocolo_dief: {dados.get('protocolo_dief')}")
-            logger.info(f"      - conteudo_html: {len(dados.get('conteudo_html', ''))} caracteres")
-            logger.info(f"      - conteudo_mensagem: {len(dados.get('conteudo_mensagem', ''))} caracteres")
-            logger.info(f"      - data_ciencia: {data_ciencia}")
+            logger.debug(
+                f"   📋 Campos salvos: IE={dados.get('inscricao_estadual')} empresa={dados.get('nome_empresa')} "
+                f"assunto={dados.get('assunto')} data_envio={dados.get('data_envio')} "
+                f"competência={dados.get('competencia_dief')} status={dados.get('status_dief')} "
+                f"chave={dados.get('chave_dief')} protocolo={dados.get('protocolo_dief')} "
+                f"HTML={len(dados.get('conteudo_html') or '')} texto={len(dados.get('conteudo_mensagem') or '')} "
+                f"ciência={data_ciencia}"
+            )
             
             return msg_id
             
@@ -1345,6 +1360,59 @@ class SEFAZBot:
             logger.error(traceback.format_exc())
             return None
     
+    def _garantir_colunas_mensagem(self, conn: sqlite3.Connection) -> None:
+        """Adiciona à mensagens_sefaz as colunas da DIEF, se faltarem (sem commit)"""
+        cursor = conn.cursor()
+        
+        # Verificar se a tabela tem as colunas necessárias
+        cursor.execute("PRAGMA table_info(mensagens_sefaz)")
+        colunas_existentes = [row[1] for row in cursor.fetchall()]
+        
+        # Se não tem as novas colunas, adicionar
+        novas_colunas = {
+            'competencia_dief': 'TEXT',
+            'status_dief': 'TEXT',
+            'chave_dief': 'TEXT',
+            'protocolo_dief': 'TEXT',
+            'conteudo_html': 'TEXT',
+            'nome_empresa': 'TEXT',
+            'data_leitura': 'TEXT',
+            'data_ciencia': 'TEXT',
+            'link_recibo': 'TEXT',
+            'pagina_hash': 'TEXT',
+            'ie_chave': 'TEXT',
+            'cpf_chave': 'TEXT'
+        }
+        
+        for col_name, col_type in novas_colunas.items():
+            if col_name not in colunas_existentes:
+                try:
+                    cursor.execute(f"ALTER TABLE mensagens_sefaz ADD COLUMN {col_name} {col_type}")
+                    logger.info(f"   ✓ Coluna {col_name} adicionada")
+                except sqlite3.OperationalError:
+                    pass  # Coluna já existe
+    
+    def _preparar_mensagem_completa(self, dados: Dict[str, Any]):
+        """Calcula link do recibo e data de ciência de uma mensagem a salvar"""
+        # Extrair link do recibo do conteúdo HTML
+        link_recibo = extrair_link_recibo(dados.get('conteudo_html'))
+        if link_recibo:
+            logger.info(f"   🔗 Link do recibo extraído: {link_recibo}")
+        
+        # Inserir mensagem com data de ciência atual
+        from datetime import datetime
+        data_ciencia = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Log de dados antes de inserir
+        logger.debug(
+            f"   💾 Preparando para salvar mensagem: IE={dados.get('inscricao_estadual')} "
+            f"empresa={dados.get('nome_empresa')} assunto={dados.get('assunto')} "
+            f"competência={dados.get('competencia_dief')} status={dados.get('status_dief')} "
+            f"HTML={len(dados.get('conteudo_html') or '')} chars texto={len(dados.get('conteudo_mensagem') or '')} chars"
+        )
+        
+        return link_recibo, data_ciencia
+    
     def verificar_mensagem_salva(self, msg_id: int) -> bool:
         """
         Verifica se a mensagem foi realmente salva no banco de dados
@@ -1361,36 +1429,34 @@ class SEFAZBot:
             cursor = conn.cursor()
             
             cursor.execute("""
-                SELECT id, inscricao_estadual, nome_empresa, assunto, 
+                SELECT m.id, inscricao_estadual, nome_empresa, assunto, 
                        competencia_dief, status_dief, chave_dief,
-                       LENGTH(conteudo_html) as html_size,
+                       COALESCE(LENGTH(m.conteudo_html), p.tamanho) as html_size,
                        LENGTH(conteudo_mensagem) as texto_size
-                FROM mensagens_sefaz 
-                WHERE id = ?
+                FROM mensagens_sefaz m
+                LEFT JOIN paginas_arquivadas p ON p.hash = m.pagina_hash
+                WHERE m.id = ?
             """, (msg_id,))
             
             row = cursor.fetchone()
             conn.close()
             
             if row:
-                logger.info(f"   🔍 VERIFICAÇÃO DA MENSAGEM ID {msg_id}:")
-                logger.info(f"      - IE: {row['inscricao_estadual']}")
-                logger.info(f"      - Empresa: {row['nome_empresa']}")
-                logger.info(f"      - Assunto: {row['assunto']}")
-                logger.info(f"      - Competência: {row['competencia_dief']}")
-                logger.info(f"      - Status: {row['status_dief']}")
-                logger.info(f"      - Chave: {row['chave_dief']}")
-                logger.info(f"      - HTML: {row['html_size']} bytes")
-                logger.info(f"      - Texto: {row['texto_size']} bytes")
+                logger.debug(
+                    f"   🔍 Verificação da mensagem ID {msg_id}: IE={row['inscricao_estadual']} "
+                    f"empresa={row['nome_empresa']} assunto={row['assunto']} "
+                    f"competência={row['competencia_dief']} status={row['status_dief']} chave={row['chave_dief']} "
+                    f"HTML={row['html_size']} bytes texto={row['texto_size']} bytes"
+                )
                 
                 # Verificar se campos importantes estão preenchidos
                 if row['html_size'] and row['html_size'] > 100:
-                    logger.info(f"   ✅ Conteúdo HTML está completo!")
+                    logger.debug(f"   ✅ Conteúdo HTML está completo!")
                 else:
                     logger.warning(f"   ⚠️ Conteúdo HTML parece vazio ou incompleto!")
                     
                 if row['texto_size'] and row['texto_size'] > 50:
-                    logger.info(f"   ✅ Conteúdo de texto está completo!")
+                    logger.debug(f"   ✅ Conteúdo de texto está completo!")
                 else:
                     logger.warning(f"   ⚠️ Conteúdo de texto parece vazio ou incompleto!")
                 
@@ -1645,7 +1711,7 @@ class SEFAZBot:
                             logger.info(f"Modal/alerta encontrado: {text[:100]}...")
                             subject = "Mensagem SEFAZ - modal/alerta"
                             body = text.strip()
-                            sent = self.send_email(subject, body)
+                            sent = await asyncio.to_thread(self.send_email, subject, body)  # smtplib é bloqueante
                             
                             # Tentar fechar o modal
                             closed = await self.close_modal(page, modal)
@@ -1687,7 +1753,7 @@ class SEFAZBot:
                                 # Mensagem normal (não é sessão ativa)
                                 subject = "Mensagem SEFAZ - ciência necessária"
                                 body = text.strip()
-                                sent = self.send_email(subject, body)
+                                sent = await asyncio.to_thread(self.send_email, subject, body)  # smtplib é bloqueante
                                 
                                 # Tentar dar ciência
                                 ack_given = await self.dar_ciencia_mensagem(page, el)
@@ -2326,13 +2392,14 @@ class SEFAZBot:
             False se campo não existe ou não foi possível preencher
         """
         try:
-            # SALVAR SCREENSHOT E HTML ANTES DE VERIFICAR
-            logger.info("💾 Salvando screenshot ANTES de verificar campo IE...")
-            await page.screenshot(path="debug_antes_ie.png")
-            page_content = await page.content()
-            with open("debug_antes_ie.html", "w", encoding="utf-8") as f:
-                f.write(page_content)
-            logger.info(f"📏 Tamanho do HTML: {len(page_content)} bytes")
+            # SALVAR SCREENSHOT E HTML ANTES DE VERIFICAR (só em DEBUG)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("💾 Salvando screenshot ANTES de verificar campo IE...")
+                await page.screenshot(path="debug_antes_ie.png")
+                page_content = await page.content()
+                with open("debug_antes_ie.html", "w", encoding="utf-8") as f:
+                    f.write(page_content)
+                logger.debug(f"📏 Tamanho do HTML: {len(page_content)} bytes")
             
             # Verificar se o campo de inscrição estadual está presente
             logger.info("🔍 Procurando campo input[name='inscricaoEstadual']...")
@@ -2545,8 +2612,9 @@ class SEFAZBot:
             await page.wait_for_timeout(self.random_delay(2000, 3000))
             
             # Capturar screenshot para debug
-            await page.screenshot(path="debug_tvi_page.png")
-            logger.info("Screenshot da página de TVI salvo em debug_tvi_page.png")
+            if logger.isEnabledFor(logging.DEBUG):
+                await page.screenshot(path="debug_tvi_page.png")
+                logger.debug("Screenshot da página de TVI salvo em debug_tvi_page.png")
             
             # Obter conteúdo completo da página para análise
             page_content = await page.content()
@@ -2736,8 +2804,9 @@ class SEFAZBot:
             await page.wait_for_timeout(self.random_delay(2000, 3000))
             
             # Capturar screenshot para debug
-            await page.screenshot(path="debug_dividas_page.png")
-            logger.info("Screenshot da página de Dívidas salvo em debug_dividas_page.png")
+            if logger.isEnabledFor(logging.DEBUG):
+                await page.screenshot(path="debug_dividas_page.png")
+                logger.debug("Screenshot da página de Dívidas salvo em debug_dividas_page.png")
             
             # Obter conteúdo completo da página para análise
             page_content = await page.content()
@@ -3098,12 +3167,18 @@ class SEFAZBot:
             
             # Configurar scripts anti-detecção
             await AntiDetection.setup_page_scripts(page)
+            # URL, bytes e pausas por etapa na linha do tempo do job (se houver)
+            anexar_pagina(page)
             
             try:
                 # Fazer login
-                if await self.authenticator.perform_login(page, usuario, senha, self.sefaz_url):
-                    logger.info("Login bem-sucedido, capturando screenshot...")
-                    await page.screenshot(path="debug_login_success.png")
+                self._reportar_etapa('login')
+                with medir_etapa('login'):
+                    logado = await self.authenticator.perform_login(page, usuario, senha, self.sefaz_url)
+                if logado:
+                    logger.info("Login bem-sucedido")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        await page.screenshot(path="debug_login_success.png")
                     
                     # Verificar se a página ainda está ativa
                     try:
@@ -3122,13 +3197,16 @@ class SEFAZBot:
                     try:
                         current_url = page.url
                         logger.info(f"Página após pausa - URL: {current_url}")
-                        await page.screenshot(path="debug_after_pause.png")
+                        if logger.isEnabledFor(logging.DEBUG):
+                            await page.screenshot(path="debug_after_pause.png")
                     except Exception as e:
                         logger.error(f"Página foi fechada durante pausa: {e}")
                         return None
                     
                     # Após login, verificar se o menu 'Sistemas' está visível
-                    menu_opened = await self.check_and_open_sistemas_menu(page, inscricao_estadual)
+                    self._reportar_etapa('menu')
+                    with medir_etapa('menu'):
+                        menu_opened = await self.check_and_open_sistemas_menu(page, inscricao_estadual)
 
                     if not menu_opened:
                         logger.warning("⚠️ Menu não foi aberto na primeira tentativa")
@@ -3146,6 +3224,7 @@ class SEFAZBot:
                                 logger.info(f"⏳ Aguardando 5 segundos para sessão anterior expirar...")
                                 await asyncio.sleep(5)
                                 logger.info(f"🔄 RETRY {_retry + 2}/{MAX_RETRIES + 1} - Tentando novamente...")
+                                RETENTATIVAS.inc(operacao='sessao_conflito')
                                 return await self.executar_consulta(usuario, senha, inscricao_estadual, _retry + 1)
                             else:
                                 logger.error("❌ Número máximo de tentativas atingido")
@@ -3155,7 +3234,8 @@ class SEFAZBot:
                         # Processar mensagens que precisam de ciência
                         logger.info("📬 Verificando se há mensagens que precisam de ciência...")
                         cpf_limpo = SEFAZValidator.limpar_cpf(usuario) if usuario else ""
-                        mensagens_processadas = await self.processar_mensagens_ciencia(page, cpf_limpo)
+                        with medir_etapa('mensagem'):
+                            mensagens_processadas = await self.processar_mensagens_ciencia(page, cpf_limpo)
                         
                         if mensagens_processadas:
                             logger.info("✅ Mensagens processadas, tentando abrir menu novamente")
@@ -3170,6 +3250,7 @@ class SEFAZBot:
                     if menu_opened:
                         # Com o menu aberto, navegar até Conta Corrente
                         logger.info("🚀 Navegando para Conta Corrente com IE: %s", inscricao_estadual if inscricao_estadual else "NÃO FORNECIDA")
+                        self._reportar_etapa('formulario_ie')
                         ok = await self.navigator.navigate_to_conta_corrente_complete(page, inscricao_estadual)
                         if not ok:
                             logger.error("❌ Não foi possível acessar 'Conta Corrente'")
@@ -3187,6 +3268,7 @@ class SEFAZBot:
                     logger.info("="*80)
                     logger.info("📊 INICIANDO EXTRAÇÃO DE DADOS DA CONTA CORRENTE")
                     logger.info("="*80)
+                    self._reportar_etapa('extracao')
                     dados = await self.data_extractor.extract_company_data(page)
 
                     # Salvar no banco
@@ -3198,12 +3280,14 @@ class SEFAZBot:
                             logger.info(f"   {chave}: {valor}")
                         logger.info("="*80)
                         
-                        self.salvar_resultado(dados)
+                        await self.salvar_resultado(dados, paginas=self.data_extractor.paginas_capturadas)
                         logger.info("💾 Dados salvos no banco de dados")
                         
                         # Realizar logout antes de finalizar
                         logger.info("🚪 Realizando logout...")
-                        await self.authenticator.perform_logout(page)
+                        self._reportar_etapa('logout')
+                        with medir_etapa('logout'):
+                            await self.authenticator.perform_logout(page)
                         
                         logger.info("🎉 CONSULTA CONCLUÍDA COM SUCESSO!")
                         return dados
@@ -3212,7 +3296,9 @@ class SEFAZBot:
                         logger.warning("⚠️ NENHUM DADO FOI EXTRAÍDO")
                         logger.warning("="*80)
                         # Tentar logout mesmo sem dados
-                        await self.authenticator.perform_logout(page)
+                        self._reportar_etapa('logout')
+                        with medir_etapa('logout'):
+                            await self.authenticator.perform_logout(page)
                         return None
                 else:
                     logger.error("Falha no login")
@@ -6,15 +6,34 @@ Contém ferramentas reutilizáveis:
 - Seletores CSS/XPath
 - Validadores de dados
 - Decoradores de retry
+- Regras de extração sobre o HTML das páginas
 - Constantes globais
+
+``HumanBehavior``/``AntiDetection`` dependem do Playwright e são importados
+sob demanda, para que a API use validadores e constantes sem carregá-lo.
 """
 
-from .human_behavior import HumanBehavior, AntiDetection
 from .selectors import SEFAZSelectors
 from .validators import SEFAZValidator
 from .retry import retry, retry_on_timeout, retry_on_network, RetryExhaustedException
+from .extraction_rules import (
+    extrair_valor_monetario,
+    extrair_todos_valores_monetarios,
+    extrair_saldo_tvi,
+    extrair_valor_dividas,
+    extrair_dados_dief,
+    extrair_link_recibo,
+)
 from .constants import *
 
+
+def __getattr__(nome):
+    if nome in ('HumanBehavior', 'AntiDetection'):
+        from . import human_behavior
+        return getattr(human_behavior, nome)
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
 __all__ = [
     'HumanBehavior',
     'AntiDetection',
@@ -24,4 +43,10 @@ __all__ = [
     'retry_on_timeout',
     'retry_on_network',
     'RetryExhaustedException',
+    'extrair_valor_monetario',
+    'extrair_todos_valores_monetarios',
+    'extrair_saldo_tvi',
+    'extrair_valor_dividas',
+    'extrair_dados_dief',
+    'extrair_link_recibo',
 ]
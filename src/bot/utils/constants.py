@@ -22,6 +22,9 @@ DELAY_PAGE_LOAD = 2000
 MAX_RETRIES = 3              # Aumentado de 2 para 3
 RETRY_DELAY_SECONDS = 10     # Aumentado de 5 para 10
 
+# Etapas da consulta, na ordem, informadas ao callback de progresso do bot
+ETAPAS_CONSULTA = ('login', 'menu', 'formulario_ie', 'extracao', 'tvis', 'dividas', 'logout')
+
 # Seletores CSS - Login
 SELECTOR_LOGIN_USER = "input[name='CPF']"
 SELECTOR_LOGIN_PASSWORD = "input[name='PASSWORD']"
@@ -0,0 +1,240 @@
+"""
+Regras de extração sobre o HTML das páginas SEFAZ.
+
+Funções puras (sem Playwright) usadas tanto pelo bot durante a consulta
+quanto pela re-extração offline sobre o arquivo de páginas
+(scripts/reextrair_paginas.py). Alterar uma regra aqui e re-executar o
+script atualiza as colunas derivadas sem precisar consultar a SEFAZ de novo.
+"""
+
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Mensagens que indicam ausência de TVIs na página
+TVI_SEM_DADOS = [
+    "Nenhum resultado foi encontrado",
+    "Nenhum registro encontrado",
+    "Sem dados disponíveis",
+    "Não há TVIs",
+    "Nenhuma TVI cadastrada"
+]
+
+# Mensagens que indicam ausência de dívidas na página
+DIVIDAS_SEM_DADOS = [
+    "Nenhum resultado foi encontrado",
+    "Nenhum registro encontrado",
+    "Sem dados disponíveis",
+    "Não há dívidas",
+    "Sem débitos pendentes"
+]
+
+# Padrões de valores monetários brasileiros (ordem de prioridade)
+_VALOR_PATTERNS = [
+    r'R?\$?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',   # R$ 1.234.567,89
+    r'R?\$?\s*(\d{4,7},\d{2})(?!\d)',         # R$ 123456,78
+    r'R?\$?\s*(\d{1,7}\.\d{2})(?!\d)',        # R$ 123456.78
+    r'R?\$?\s*(\d{1,3}(?:\.\d{3})+)(?!\d|,)', # R$ 1.234.567
+    r'R?\$?\s*(\d{5,})(?!\d)',                # R$ 1234567
+    r'R?\$?\s*(\d{1,4})(?!\d)'                # R$ 123
+]
+
+# Padrões para localizar valores monetários em uma página inteira
+_MONEY_PATTERNS = [
+    r'R\$\s*[\d.,]+',
+    r'[\d.,]+\s*(?:reais?|R\$)',
+    r'(?:valor|total|débito|dívida)[:\s]*R\$?\s*[\d.,]+',
+    r'[\d]{1,3}(?:\.[\d]{3})*(?:,[\d]{2})?'
+]
+
+# Campos da DIEF presentes no texto das mensagens
+_DIEF_PATTERNS = {
+    'competencia_dief': r'Período da DIEF:\s*(\d{6})',
+    'status_dief': r'Situação:\s*([^\n]+)',
+    'chave_dief': r'Chave de segurança:\s*([\d-]+)',
+    'protocolo_dief': r'Protocolo DIEF:\s*(\d+)',
+}
+
+_RECIBO_PATTERN = re.compile(r'href=["\']([^"\']*listIReciboDief\.do[^"\']*)["\']', re.IGNORECASE)
+
+
+def extrair_valor_monetario(text: Optional[str]) -> float:
+    """
+    Extrai valor monetário de um texto
+
+    Examples:
+        >>> extrair_valor_monetario('R$ 1.234,56')
+        1234.56
+    """
+    try:
+        if not text:
+            return 0.0
+
+        clean_text = text.strip()
+
+        for pattern in _VALOR_PATTERNS:
+            match = re.search(pattern, clean_text)
+            if match:
+                value_str = match.group(1)
+
+                # Converter baseado no formato
+                if ',' in value_str and value_str.count(',') == 1:
+                    # Formato brasileiro: 1.234,56
+                    value_str = value_str.replace('.', '').replace(',', '.')
+                elif value_str.count('.') > 1:
+                    # Múltiplos pontos = separadores de milhares: 1.234.567
+                    value_str = value_str.replace('.', '')
+
+                return float(value_str)
+
+        return 0.0
+
+    except (ValueError, AttributeError) as e:
+        logger.debug(f"Erro ao extrair valor monetário de '{text}': {e}")
+        return 0.0
+
+
+def extrair_todos_valores_monetarios(content: str) -> List[float]:
+    """Extrai todos os valores monetários positivos encontrados no conteúdo"""
+    valores_encontrados = []
+
+    for pattern in _MONEY_PATTERNS:
+        for match in re.findall(pattern, content, re.IGNORECASE):
+            valor = extrair_valor_monetario(match)
+            if valor > 0:
+                valores_encontrados.append(valor)
+                logger.debug(f"Valor encontrado: R$ {valor:.2f} (padrão: {match})")
+
+    return valores_encontrados
+
+
+class _LinhasTabelaParser(HTMLParser):
+    """Coleta o texto das células de "table.table.table-striped tbody tr" """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.linhas: List[List[str]] = []
+        self._tabelas: List[bool] = []  # pilha: True se a tabela é table-striped
+        self._em_tbody = 0
+        self._linha: Optional[List[str]] = None
+        self._celula: Optional[List[str]] = None
+
+    def _na_tabela_alvo(self) -> bool:
+        return bool(self._tabelas) and self._tabelas[-1] and self._em_tbody > 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            classes = (dict(attrs).get('class') or '').split()
+            self._tabelas.append('table' in classes and 'table-striped' in classes)
+        elif tag == 'tbody' and self._tabelas and self._tabelas[-1]:
+            self._em_tbody += 1
+        elif tag == 'tr' and self._na_tabela_alvo():
+            self._linha = []
+        elif tag == 'td' and self._linha is not None:
+            self._celula = []
+
+    def handle_endtag(self, tag):
+        if tag == 'td' and self._celula is not None and self._linha is not None:
+            self._linha.append(''.join(self._celula).strip())
+            self._celula = None
+        elif tag == 'tr' and self._linha is not None:
+            self.linhas.append(self._linha)
+            self._linha = None
+        elif tag == 'tbody' and self._em_tbody and self._tabelas and self._tabelas[-1]:
+            self._em_tbody -= 1
+        elif tag == 'table' and self._tabelas:
+            self._tabelas.pop()
+
+    def handle_data(self, data):
+        if self._celula is not None:
+            self._celula.append(data)
+
+
+def extrair_saldo_tvi(page_content: str) -> str:
+    """
+    Extrai o saldo devedor de TVI da página de TVIs
+
+    A coluna 5 da tabela de TVIs contém o saldo devedor; a primeira linha
+    com saldo positivo determina o resultado.
+
+    Returns:
+        str: Saldo devedor (ex.: "1234.56") ou "0.0" se não houver
+    """
+    for message in TVI_SEM_DADOS:
+        if message in page_content:
+            logger.info(f"TVI: Encontrada mensagem '{message}'")
+            return "0.0"
+
+    parser = _LinhasTabelaParser()
+    parser.feed(page_content)
+    parser.close()
+
+    if parser.linhas:
+        logger.info(f"TVI: Encontradas {len(parser.linhas)} linha(s) na tabela")
+
+    for celulas in parser.linhas:
+        if len(celulas) >= 6:
+            # Coluna 5 (índice 4) contém o saldo devedor
+            valor_tvi = extrair_valor_monetario(celulas[4] or "0,00")
+            if valor_tvi > 0:
+                logger.info(f"TVI: ❌ Encontrado saldo devedor: R$ {valor_tvi:.2f}")
+                return str(valor_tvi)
+            logger.info("TVI: ✅ Saldo zero encontrado")
+
+    return "0.0"
+
+
+def extrair_valor_dividas(page_content: str) -> float:
+    """
+    Extrai o valor das dívidas pendentes da página de Dívidas Pendentes
+
+    Returns:
+        float: Maior valor monetário encontrado (0.0 se não houver dívidas)
+    """
+    for message in DIVIDAS_SEM_DADOS:
+        if message in page_content:
+            logger.info(f"DÍVIDAS: Encontrada mensagem '{message}'")
+            return 0.0
+
+    valores_encontrados = extrair_todos_valores_monetarios(page_content)
+
+    if valores_encontrados:
+        valor_total = max(valores_encontrados)
+        logger.info(f"DÍVIDAS: Valor máximo encontrado: R$ {valor_total:.2f}")
+        return valor_total
+
+    return 0.0
+
+
+def extrair_dados_dief(conteudo_texto: Optional[str]) -> Dict[str, Any]:
+    """
+    Extrai competência, situação, chave e protocolo da DIEF do texto da mensagem
+
+    Returns:
+        dict: Apenas os campos encontrados
+    """
+    dados = {}
+    if not conteudo_texto:
+        return dados
+
+    for campo, pattern in _DIEF_PATTERNS.items():
+        match = re.search(pattern, conteudo_texto)
+        if match:
+            dados[campo] = match.group(1).strip()
+
+    return dados
+
+
+def extrair_link_recibo(html_content: Optional[str]) -> Optional[str]:
+    """Extrai o link do recibo da DIEF do HTML da mensagem"""
+    if not html_content or 'listIReciboDief' not in html_content:
+        return None
+
+    match = _RECIBO_PATTERN.search(html_content)
+    if match:
+        return match.group(1).replace('&amp;', '&')
+
+    return None
@@ -0,0 +1,282 @@
+"""
+Logs estruturados e assíncronos (JSON lines) da API e dos bots.
+
+Os caminhos quentes (laço da fila, etapas dos bots) escreviam no terminal
+de forma síncrona, com ``print`` e banners, e chegavam a imprimir a senha
+dos jobs. ``configurar_logs`` troca os handlers do logger raiz por:
+
+- um ``QueueHandler`` (fila limitada): quem loga só formata a mensagem,
+  aplica os filtros e enfileira; quando a fila enche o registro é
+  descartado e contado (``sefaz_logs_descartados_total``) em vez de
+  bloquear o event loop;
+- um ``QueueListener`` (thread própria) que escreve no stderr e,
+  opcionalmente, em arquivo rotativo (``LOG_ARQUIVO``).
+
+Cada linha leva o contexto da execução (``contexto_log``: job_id, hash do
+CPF, etapa). As senhas do contexto (``segredos``) e valores no formato
+``senha=...``/``token: ...`` são substituídos por ``***`` antes de
+enfileirar. Linhas DEBUG repetidas são amostradas por ponto de chamada:
+as ``LOG_DEBUG_LIMITE`` primeiras de cada minuto passam, depois 1 a cada
+``TAXA_AMOSTRAGEM``. Banners (linhas só de ``=``/``-``) são descartados.
+
+Variáveis de ambiente:
+    LOG_FORMATO   json (padrão) ou texto
+    LOG_NIVEL     nível do logger raiz (padrão INFO)
+    LOG_NIVEIS    níveis por módulo: "src.bot.core=WARNING,src.api.main=DEBUG"
+    LOG_ARQUIVO   arquivo (rotativo, 10 MB x 5) além do stderr
+    LOG_DEBUG_LIMITE  linhas DEBUG por ponto de chamada por minuto (padrão 20)
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+TAMANHO_FILA = 10000
+TAXA_AMOSTRAGEM = 100
+JANELA_AMOSTRAGEM = 60.0
+ARQUIVO_MAX_BYTES = 10 * 1024 * 1024
+ARQUIVO_BACKUPS = 5
+
+# Contexto da execução atual (job, CPF, etapa); "segredos" não é emitido
+_contexto: ContextVar[Dict[str, Any]] = ContextVar('contexto_log', default={})
+
+_SEGREDO_CAMPO = re.compile(
+    r'(?i)\b(senha|password|passwd|pass|token|secret|api[_-]?key)(["\']?\s*[:=]\s*["\']?)([^\s"\',;}]+)'
+)
+_DECORACAO = re.compile(r'^\s*[=\-─#*]{10,}\s*$')
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock_configuracao = threading.Lock()
+
+
+def hash_cpf(cpf: Optional[str]) -> Optional[str]:
+    """Identificador estável do CPF para correlacionar logs sem expô-lo"""
+    digitos = re.sub(r'\D', '', cpf or '')
+    if not digitos:
+        return None
+    return hashlib.sha256(digitos.encode()).hexdigest()[:12]
+
+
+@contextmanager
+def contexto_log(segredos: Sequence[str] = (), **campos: Any) -> Iterator[None]:
+    """
+    Acrescenta campos (job_id, cpf_hash, etapa...) aos logs do bloco
+
+    Args:
+        segredos: Valores a ocultar em qualquer mensagem emitida no bloco
+        **campos: Campos do contexto (None é ignorado)
+    """
+    atual = _contexto.get()
+    novo = {**atual, **{chave: valor for chave, valor in campos.items() if valor is not None}}
+    if segredos:
+        novo['segredos'] = tuple(atual.get('segredos', ())) + tuple(s for s in segredos if s)
+    token = _contexto.set(novo)
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+def redigir(texto: str, segredos: Sequence[str] = ()) -> str:
+    """Oculta segredos conhecidos e valores de campos como senha=/token:"""
+    for segredo in segredos:
+        if len(segredo) >= 3:
+            texto = texto.replace(segredo, '***')
+    return _SEGREDO_CAMPO.sub(r'\1\2***', texto)
+
+
+class _FiltroAmostragem(logging.Filter):
+    """Amostra linhas DEBUG repetidas e descarta banners"""
+
+    def __init__(self, limite: int, taxa: int = TAXA_AMOSTRAGEM, janela: float = JANELA_AMOSTRAGEM):
+        super().__init__()
+        self.limite = limite
+        self.taxa = taxa
+        self.janela = janela
+        self._lock = threading.Lock()
+        # (arquivo, linha) -> [início da janela, contagem na janela]
+        self._contagens: Dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.INFO and isinstance(record.msg, str) and _DECORACAO.match(record.msg):
+            return False
+        if record.levelno >= logging.INFO or self.limite <= 0:
+            return True
+
+        chave = (record.pathname, record.lineno)
+        agora = time.monotonic()
+        with self._lock:
+            estado = self._contagens.get(chave)
+            if estado is None or agora - estado[0] >= self.janela:
+                estado = self._contagens[chave] = [agora, 0]
+            estado[1] += 1
+            contagem = estado[1]
+        if contagem <= self.limite:
+            return True
+        if (contagem - self.limite) % self.taxa == 0:
+            record.amostrado = self.taxa
+            return True
+        return False
+
+
+class _HandlerFila(logging.handlers.QueueHandler):
+    """Formata, anexa o contexto e oculta segredos antes de enfileirar"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        contexto = _contexto.get()
+        segredos = contexto.get('segredos', ())
+        mensagem = redigir(record.getMessage(), segredos)
+        excecao = None
+        if record.exc_info:
+            excecao = redigir(logging.Formatter().formatException(record.exc_info), segredos)
+
+        # Cópia rasa: o registro original pode ir para outros handlers
+        copia = logging.makeLogRecord(record.__dict__)
+        copia.msg = mensagem
+        copia.message = mensagem
+        copia.args = None
+        copia.exc_info = None
+        copia.exc_text = excecao
+        copia.contexto = {chave: valor for chave, valor in contexto.items() if chave != 'segredos'}
+        return copia
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # metricas importa este módulo (contexto das etapas)
+            from src.bot.utils.metricas import metricas
+            metricas.contador(
+                'sefaz_logs_descartados_total', 'Registros de log descartados (fila cheia)'
+            ).inc()
+
+
+class _ListenerFila(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Com a fila cheia, put_nowait lançaria queue.Full ao encerrar
+        self.queue.put(self._sentinel)
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            **getattr(record, 'contexto', {}),
+        }
+        if record.exc_text:
+            dados['exc'] = record.exc_text
+        if getattr(record, 'amostrado', None):
+            dados['amostrado'] = record.amostrado
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+    """Texto legível no terminal, com o contexto entre colchetes"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s%(contexto_texto)s %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        contexto = getattr(record, 'contexto', {})
+        record.contexto_texto = (' [' + ' '.join(f"{chave}={valor}" for chave, valor in contexto.items()) + ']') if contexto else ''
+        return super().format(record)
+
+
+def _niveis_modulos(texto: str) -> Dict[str, str]:
+    niveis = {}
+    for item in texto.split(','):
+        modulo, _, nivel = item.partition('=')
+        if modulo.strip() and nivel.strip():
+            niveis[modulo.strip()] = nivel.strip().upper()
+    return niveis
+
+
+def configurar_logs(
+    formato: Optional[str] = None,
+    nivel: Optional[str] = None,
+    niveis_modulos: Optional[Dict[str, str]] = None,
+    arquivo: Optional[str] = None,
+    limite_debug: Optional[int] = None,
+    forcar: bool = False
+) -> None:
+    """
+    Instala o pipeline no logger raiz (uma vez por processo)
+
+    Os parâmetros omitidos vêm das variáveis de ambiente (ver docstring do
+    módulo). ``forcar`` reconfigura mesmo se já instalado.
+    """
+    global _listener
+
+    with _lock_configuracao:
+        if _listener is not None and not forcar:
+            return
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+        formato = (formato or os.getenv('LOG_FORMATO') or 'json').lower()
+        nivel = (nivel or os.getenv('LOG_NIVEL') or 'INFO').upper()
+        if niveis_modulos is None:
+            niveis_modulos = _niveis_modulos(os.getenv('LOG_NIVEIS', ''))
+        arquivo = arquivo if arquivo is not None else os.getenv('LOG_ARQUIVO')
+        if limite_debug is None:
+            limite_debug = int(os.getenv('LOG_DEBUG_LIMITE', '20') or 20)
+
+        formatador = FormatadorTexto() if formato == 'texto' else FormatadorJSON()
+        saidas = [logging.StreamHandler(sys.stderr)]
+        if arquivo:
+            saidas.append(logging.handlers.RotatingFileHandler(
+                arquivo, maxBytes=ARQUIVO_MAX_BYTES, backupCount=ARQUIVO_BACKUPS, encoding='utf-8'
+            ))
+        for saida in saidas:
+            saida.setFormatter(formatador)
+
+        fila = queue.Queue(maxsize=TAMANHO_FILA)
+        handler = _HandlerFila(fila)
+        handler.addFilter(_FiltroAmostragem(limite_debug))
+
+        raiz = logging.getLogger()
+        for antigo in list(raiz.handlers):
+            raiz.removeHandler(antigo)
+        raiz.addHandler(handler)
+        raiz.setLevel(nivel)
+        for modulo, nivel_modulo in niveis_modulos.items():
+            logging.getLogger(modulo).setLevel(nivel_modulo)
+
+        _listener = _ListenerFila(fila, *saidas, respect_handler_level=True)
+        _listener.start()
+
+
+def encerrar_logs() -> None:
+    """Escreve os registros pendentes, para a thread de escrita e remove o handler"""
+    global _listener
+
+    with _lock_configuracao:
+        if _listener is None:
+            return
+        raiz = logging.getLogger()
+        for handler in list(raiz.handlers):
+            if isinstance(handler, _HandlerFila):
+                raiz.removeHandler(handler)
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(encerrar_logs)
@@ -0,0 +1,301 @@
+"""
+Instrumentação compartilhada (métricas no formato de texto do Prometheus).
+
+Registro em memória de contadores, medidores e histogramas, usado pelos
+bots (``SEFAZBot``, ``MessageBot``) e pela API, e exportado em
+``GET /metrics``. Não depende do ``prometheus_client``: cada observação
+custa um ``perf_counter``, uma busca binária nos buckets e uma escrita
+num dicionário sob lock.
+
+Uso:
+    with medir_etapa('login', bot='consulta'):
+        await authenticator.perform_login(...)
+
+    conn = conectar_sqlite(DB_PATH)   # tempo das queries por endpoint
+"""
+
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.bot.utils.logs import contexto_log
+from src.database.linha_do_tempo import RESULTADO_ERRO, RESULTADO_OK, linha_atual
+
+# Etapas dos bots (segundos)
+BUCKETS_ETAPA = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+# Queries SQLite somadas por requisição (segundos)
+BUCKETS_SQLITE = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes: Sequence[str], valores: Sequence[str], extra: str = '') -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class _Metrica:
+    tipo = ''
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        self._valores: Dict[Tuple[str, ...], object] = {}
+
+    def _chave(self, rotulos: Dict[str, object]) -> Tuple[str, ...]:
+        if len(rotulos) != len(self.rotulos):
+            raise ValueError(f"{self.nome}: rótulos esperados {self.rotulos}, recebidos {tuple(rotulos)}")
+        return tuple(str(rotulos[nome]) for nome in self.rotulos)
+
+    def _linhas(self) -> List[str]:
+        raise NotImplementedError
+
+    def exportar(self) -> List[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}", *self._linhas()]
+
+
+class Contador(_Metrica):
+    """Valor que só aumenta (ex.: jobs finalizados)"""
+
+    tipo = 'counter'
+
+    def inc(self, valor: float = 1, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def _linhas(self) -> List[str]:
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}"
+                for chave, valor in itens]
+
+
+class Medidor(_Metrica):
+    """Valor que sobe e desce (ex.: navegadores abertos, jobs na fila)"""
+
+    tipo = 'gauge'
+
+    def definir(self, valor: float, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = valor
+
+    def inc(self, valor: float = 1, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def dec(self, valor: float = 1, **rotulos) -> None:
+        self.inc(-valor, **rotulos)
+
+    _linhas = Contador._linhas
+
+
+class Histograma(_Metrica):
+    """Distribuição de durações em buckets cumulativos"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_ETAPA):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            estado = self._valores.get(chave)
+            if estado is None:
+                # [contagem por bucket (não cumulativa) + Inf, soma]
+                estado = self._valores[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            estado[0][indice] += 1
+            estado[1] += valor
+
+    @contextmanager
+    def medir(self, **rotulos) -> Iterator[None]:
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def _linhas(self) -> List[str]:
+        with self._lock:
+            itens = sorted((chave, (list(estado[0]), estado[1])) for chave, estado in self._valores.items())
+        linhas = []
+        for chave, (contagens, soma) in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), contagens):
+                acumulado += contagem
+                le = f'le="{_formatar_numero(limite)}"'
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le)} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Métricas do processo, criadas uma vez por nome"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas: Dict[str, _Metrica] = {}
+
+    def _obter(self, classe, nome: str, *args, **kwargs):
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(nome, *args, **kwargs)
+            elif not isinstance(metrica, classe):
+                raise ValueError(f"Métrica {nome} já registrada como {metrica.tipo}")
+            return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        return self._obter(Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Medidor:
+        return self._obter(Medidor, nome, ajuda, rotulos)
+
+    def histograma(
+        self, nome: str, ajuda: str, rotulos: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_ETAPA
+    ) -> Histograma:
+        return self._obter(Histograma, nome, ajuda, rotulos, buckets)
+
+    def exportar(self) -> str:
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        with self._lock:
+            metricas = sorted(self._metricas.values(), key=lambda metrica: metrica.nome)
+        linhas = []
+        for metrica in metricas:
+            linhas.extend(metrica.exportar())
+        return '\n'.join(linhas) + '\n'
+
+
+# Registro compartilhado pelo processo (API + bots executados pela fila)
+metricas = RegistroMetricas()
+
+ETAPA_DURACAO = metricas.histograma(
+    'sefaz_etapa_duracao_segundos', 'Duração de cada etapa dos bots', ('bot', 'etapa')
+)
+ETAPA_FALHAS = metricas.contador(
+    'sefaz_etapa_falhas_total', 'Etapas dos bots interrompidas por exceção', ('bot', 'etapa')
+)
+RETENTATIVAS = metricas.contador(
+    'sefaz_retentativas_total', 'Novas tentativas (decoradores de retry, sessão em conflito)', ('operacao',)
+)
+NAVEGADORES_ABERTOS = metricas.medidor(
+    'sefaz_navegadores_abertos', 'Navegadores Playwright abertos no momento', ('bot',)
+)
+SQLITE_DURACAO = metricas.histograma(
+    'sefaz_sqlite_duracao_segundos', 'Tempo em queries SQLite por requisição', ('endpoint',), BUCKETS_SQLITE
+)
+SQLITE_QUERIES = metricas.contador(
+    'sefaz_sqlite_queries_total', 'Queries SQLite executadas pelas requisições', ('endpoint',)
+)
+
+
+@contextmanager
+def medir_etapa(etapa: str, bot: str = 'consulta') -> Iterator[None]:
+    """
+    Registra a duração da etapa (e a falha, se ela lançar exceção), a etapa
+    no contexto dos logs e, dentro de um job da fila, na linha do tempo do job
+    """
+    linha = linha_atual()
+    registro = linha.abrir(etapa) if linha is not None else None
+    resultado = RESULTADO_OK
+    inicio = time.perf_counter()
+    try:
+        with contexto_log(etapa=etapa):
+            yield
+    except Exception:
+        resultado = RESULTADO_ERRO
+        ETAPA_FALHAS.inc(bot=bot, etapa=etapa)
+        raise
+    finally:
+        ETAPA_DURACAO.observar(time.perf_counter() - inicio, bot=bot, etapa=etapa)
+        if registro is not None:
+            linha.fechar(registro, resultado)
+
+
+# ---------------------------------------------------------------------------
+# Tempo das queries SQLite (por requisição)
+# ---------------------------------------------------------------------------
+
+# [segundos, queries] da requisição em andamento; None fora de uma medição.
+# asyncio.to_thread copia o contexto, então as threads somam na mesma lista.
+_medicao_sqlite: ContextVar[Optional[list]] = ContextVar('medicao_sqlite', default=None)
+
+
+class _CursorMedido(sqlite3.Cursor):
+    def _medir(self, metodo, *args, conta: bool = False):
+        medicao = _medicao_sqlite.get()
+        if medicao is None:
+            return metodo(*args)
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            medicao[0] += time.perf_counter() - inicio
+            if conta:
+                medicao[1] += 1
+
+    def execute(self, *args):
+        return self._medir(super().execute, *args, conta=True)
+
+    def executemany(self, *args):
+        return self._medir(super().executemany, *args, conta=True)
+
+    def fetchone(self):
+        return self._medir(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._medir(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._medir(super().fetchall)
+
+
+class _ConexaoMedida(sqlite3.Connection):
+    def cursor(self, factory=_CursorMedido):
+        return super().cursor(factory)
+
+    # Os atalhos nativos criam o cursor sem passar por cursor()
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+def conectar_sqlite(db_path: str, **kwargs) -> sqlite3.Connection:
+    """``sqlite3.connect`` com o tempo das queries somado à requisição atual"""
+    return sqlite3.connect(db_path, factory=_ConexaoMedida, **kwargs)
+
+
+@contextmanager
+def medir_sqlite() -> Iterator[list]:
+    """Acumula ``[segundos, queries]`` das conexões de ``conectar_sqlite`` no bloco"""
+    medicao = [0.0, 0]
+    token = _medicao_sqlite.set(medicao)
+    try:
+        yield medicao
+    finally:
+        _medicao_sqlite.reset(token)
@@ -26,6 +26,8 @@ from src.bot.exceptions.base import (
     DuplicateException
 )
 
+from src.bot.utils.metricas import RETENTATIVAS
+
 logger = logging.getLogger(__name__)
 
 # Exceções que devem ter retry (erros temporários)
@@ -166,6 +168,8 @@ def retry(
                         f"Retry em {current_delay:.1f}s..."
                     )
                     
+                    RETENTATIVAS.inc(operacao=func.__name__)
+                    
                     # Chamar callback se fornecido
                     if on_retry:
                         try:
@@ -243,6 +247,8 @@ def retry(
                         f"Retry em {current_delay:.1f}s..."
                     )
                     
+                    RETENTATIVAS.inc(operacao=func.__name__)
+                    
                     # Chamar callback se fornecido
                     if on_retry:
                         try:
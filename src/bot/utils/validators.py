@@ -207,6 +207,33 @@ class SEFAZValidator:
         
         return True, "IE válida"
     
+    @staticmethod
+    def validate_cnpj(cnpj: Optional[str]) -> tuple[bool, str]:
+        """
+        Valida formato do CNPJ
+        
+        Args:
+            cnpj: CNPJ a ser validado (com ou sem formatação)
+            
+        Returns:
+            tuple: (is_valid: bool, message: str)
+        """
+        if not cnpj:
+            return False, "CNPJ não pode ser vazio"
+        
+        # Remover formatação
+        cnpj_limpo = ''.join(filter(str.isdigit, cnpj))
+        
+        # Validar tamanho
+        if len(cnpj_limpo) != 14:
+            return False, f"CNPJ deve ter 14 dígitos. Encontrado: {len(cnpj_limpo)}"
+        
+        # Validar se não é sequência repetida
+        if cnpj_limpo == cnpj_limpo[0] * 14:
+            return False, "CNPJ não pode ser uma sequência de números iguais"
+        
+        return True, "CNPJ válido"
+    
     @staticmethod
     def validate_senha(senha: Optional[str]) -> tuple[bool, str]:
         """
@@ -239,6 +266,11 @@ class SEFAZValidator:
         """Remove formatação da IE, mantendo apenas dígitos"""
         return ''.join(filter(str.isdigit, ie))
     
+    @staticmethod
+    def limpar_cnpj(cnpj: str) -> str:
+        """Remove formatação do CNPJ, mantendo apenas dígitos"""
+        return ''.join(filter(str.isdigit, cnpj))
+    
     @staticmethod
     def validate_all(cpf: Optional[str], senha: Optional[str], ie: Optional[str] = None) -> tuple[bool, list[str]]:
         """
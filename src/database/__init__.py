@@ -0,0 +1,94 @@
+"""
+Camada de persistência do SEFAZ Bot.
+
+Contém os componentes compartilhados entre a API e os bots para acesso
+ao banco de dados:
+- Cache em memória de consultas agregadas (invalidado por escrita)
+- Índice de busca textual (FTS5) das mensagens SEFAZ
+- Paginação por cursor (keyset) das listagens
+- Arquivo comprimido e deduplicado das páginas capturadas
+- Fila de escrita com um único escritor (gravações agrupadas em lote)
+- Retenção: dados antigos movidos para bancos de arquivo anuais
+- Backup online (API de backup do SQLite) com rotação e restauração
+- Backend de armazenamento da fila de jobs e dos bots (reserva atômica de jobs)
+- Colunas tipadas (enum/centavos/flags) dos resultados das consultas
+- Chaves canônicas (só dígitos) de CNPJ/IE/CPF para buscas e junções indexadas
+- Índice trigram (FTS5) da busca de empresas por nome, CNPJ ou IE
+- Linha do tempo das etapas de cada job da fila (p50/p95 por etapa)
+"""
+
+from .backup import BackupError, PoliticaBackup, criar_backup, listar_backups, restaurar_backup, verificar_backup
+from .chaves import chave_cnpj, chave_cpf, chave_ie, chave_nome, chaves_canonicas, ensure_chaves, migrar_chaves, vincular_empresas
+from .consulta_tipos import campos_tipados, ensure_colunas_tipadas, migrar_consultas
+from .busca_empresas import condicao_busca, ensure_empresas_busca
+from .cache import QueryCache, query_cache, notify_write, registrar_ouvinte
+from .fts import ensure_mensagens_fts, build_match_query
+from .linha_do_tempo import LinhaDoTempo, anexar_pagina, ensure_linha_do_tempo, expandir, percentis_por_etapa
+from .page_archive import ensure_page_archive, arquivar_pagina, arquivar_paginas, carregar_pagina, carregar_paginas
+from .pagination import (
+    NEXT_CURSOR_HEADER,
+    InvalidCursorError,
+    encode_cursor,
+    decode_cursor,
+    keyset_condition,
+    next_cursor,
+)
+from .retention import PoliticaRetencao, aplicar_retencao, ensure_incremental_vacuum, converter_vacuum_incremental
+from .storage import SQLiteStorage, Storage, criar_storage, ensure_wal
+from .write_queue import WriteQueue, WriteQueueClosedError, fila_ativa, persistir
+
+__all__ = [
+    'BackupError',
+    'PoliticaBackup',
+    'criar_backup',
+    'listar_backups',
+    'restaurar_backup',
+    'verificar_backup',
+    'chave_cnpj',
+    'chave_cpf',
+    'chave_ie',
+    'chave_nome',
+    'chaves_canonicas',
+    'ensure_chaves',
+    'migrar_chaves',
+    'vincular_empresas',
+    'campos_tipados',
+    'ensure_colunas_tipadas',
+    'migrar_consultas',
+    'condicao_busca',
+    'ensure_empresas_busca',
+    'QueryCache',
+    'query_cache',
+    'notify_write',
+    'registrar_ouvinte',
+    'ensure_mensagens_fts',
+    'build_match_query',
+    'LinhaDoTempo',
+    'anexar_pagina',
+    'ensure_linha_do_tempo',
+    'expandir',
+    'percentis_por_etapa',
+    'ensure_page_archive',
+    'arquivar_pagina',
+    'arquivar_paginas',
+    'carregar_pagina',
+    'carregar_paginas',
+    'NEXT_CURSOR_HEADER',
+    'InvalidCursorError',
+    'encode_cursor',
+    'decode_cursor',
+    'keyset_condition',
+    'next_cursor',
+    'PoliticaRetencao',
+    'aplicar_retencao',
+    'ensure_incremental_vacuum',
+    'converter_vacuum_incremental',
+    'Storage',
+    'SQLiteStorage',
+    'criar_storage',
+    'ensure_wal',
+    'WriteQueue',
+    'WriteQueueClosedError',
+    'fila_ativa',
+    'persistir',
+]
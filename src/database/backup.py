@@ -0,0 +1,265 @@
+"""
+Backup online do banco com a API de backup do SQLite.
+
+A cópia do arquivo (zip) só é segura com tudo parado. Aqui o backup usa
+``sqlite3.Connection.backup`` em passos de poucas páginas, com uma pausa
+entre eles: cada passo segura o lock de leitura por pouco tempo e os
+escritores (fila de escrita, bots) continuam gravando entre os passos.
+
+Se o banco for alterado por outra conexão durante a cópia, o SQLite
+recomeça o backup do início. Sob escrita contínua isso poderia não
+terminar nunca: depois de ``MAX_REINICIOS`` recomeços o passo é
+multiplicado por ``FATOR_PASSO`` (menos pausas, menos janelas para
+escritas) até, no limite, a cópia ser feita em um único passo.
+
+Cada snapshot é gravado em um arquivo temporário, verificado com
+``PRAGMA integrity_check`` e só então renomeado; os mais antigos são
+removidos mantendo os ``manter`` mais recentes.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Padrões (sobrescritos por BACKUP_* no ambiente, ver PoliticaBackup)
+PAGINAS_POR_PASSO = 256
+PAUSA_ENTRE_PASSOS = 0.05  # segundos
+MANTER_PADRAO = 7
+MAX_REINICIOS = 3  # por tamanho de passo
+FATOR_PASSO = 8
+
+EXTENSAO_TEMPORARIA = '.tmp'
+
+
+class BackupError(RuntimeError):
+    """Backup inválido ou falha ao criar/restaurar"""
+    pass
+
+
+class _BackupReiniciado(Exception):
+    """Interrompe a cópia em passos quando o banco muda demais durante ela"""
+    pass
+
+
+def _env_num(nome: str, padrao, tipo=int):
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == '':
+        return padrao
+    try:
+        return tipo(valor)
+    except ValueError:
+        logger.warning(f"⚠️ {nome}={valor!r} inválido, usando {padrao}")
+        return padrao
+
+
+class PoliticaBackup:
+    """
+    Parâmetros do backup
+
+    Lidos do ambiente por ``do_ambiente``:
+        BACKUP_DIR                 diretório dos snapshots (<pasta do banco>/backups)
+        BACKUP_MANTER              snapshots mantidos na rotação (7)
+        BACKUP_PAGINAS_POR_PASSO   páginas copiadas por passo (256)
+        BACKUP_PAUSA               pausa entre passos em segundos (0.05)
+    """
+
+    def __init__(self, diretorio: Optional[str] = None, manter: int = MANTER_PADRAO,
+                 paginas_por_passo: int = PAGINAS_POR_PASSO,
+                 pausa: float = PAUSA_ENTRE_PASSOS):
+        self.diretorio = diretorio
+        self.manter = max(1, manter)
+        self.paginas_por_passo = max(1, paginas_por_passo)
+        self.pausa = max(0.0, pausa)
+
+    @classmethod
+    def do_ambiente(cls) -> 'PoliticaBackup':
+        return cls(
+            diretorio=os.getenv('BACKUP_DIR') or None,
+            manter=_env_num('BACKUP_MANTER', MANTER_PADRAO),
+            paginas_por_passo=_env_num('BACKUP_PAGINAS_POR_PASSO', PAGINAS_POR_PASSO),
+            pausa=_env_num('BACKUP_PAUSA', PAUSA_ENTRE_PASSOS, float),
+        )
+
+    def diretorio_backup(self, db_path: str) -> str:
+        return self.diretorio or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+
+
+def _prefixo(db_path: str) -> str:
+    return os.path.splitext(os.path.basename(db_path))[0] + '_'
+
+
+def verificar_backup(caminho: str) -> List[str]:
+    """
+    Executa PRAGMA integrity_check no arquivo
+
+    Returns:
+        Lista de problemas (vazia se o arquivo estiver íntegro)
+    """
+    if not os.path.exists(caminho):
+        return [f"Arquivo não encontrado: {caminho}"]
+
+    conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    try:
+        resultado = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if resultado == ['ok'] else resultado
+
+
+def _copiar(origem: sqlite3.Connection, destino: sqlite3.Connection,
+            politica: PoliticaBackup) -> int:
+    """
+    Copia em passos, aumentando o passo quando a cópia recomeça demais
+
+    Returns:
+        Total de recomeços
+    """
+    estado = {'restante': None, 'total': 0, 'reinicios': 0, 'tentativa': 0}
+
+    def progresso(status, restante, total):
+        estado['total'] = total
+        if estado['restante'] is not None and restante > estado['restante']:
+            estado['reinicios'] += 1
+            estado['tentativa'] += 1
+            if estado['tentativa'] >= MAX_REINICIOS:
+                raise _BackupReiniciado()
+        estado['restante'] = restante
+
+    paginas = politica.paginas_por_passo
+    while True:
+        estado['restante'] = None
+        estado['tentativa'] = 0
+        try:
+            origem.backup(destino, pages=paginas, progress=progresso, sleep=politica.pausa)
+            return estado['reinicios']
+        except _BackupReiniciado:
+            if paginas == -1:
+                raise  # Não acontece: um único passo não recomeça
+            paginas *= FATOR_PASSO
+            if paginas >= estado['total']:
+                paginas = -1
+            logger.warning(f"⚠️ Backup recomeçou {MAX_REINICIOS}x por escritas concorrentes; "
+                           f"passo aumentado para {'todas as' if paginas == -1 else paginas} páginas")
+
+
+def rotacionar(db_path: str, politica: PoliticaBackup) -> List[str]:
+    """Remove os snapshots mais antigos além de ``politica.manter``"""
+    removidos = []
+    for snapshot in listar_backups(db_path, politica)[politica.manter:]:
+        os.remove(snapshot['caminho'])
+        removidos.append(snapshot['caminho'])
+        logger.info(f"🗑️ Backup antigo removido: {snapshot['caminho']}")
+    return removidos
+
+
+def criar_backup(db_path: str, politica: Optional[PoliticaBackup] = None,
+                 rotacao: bool = True) -> Dict[str, Any]:
+    """
+    Cria um snapshot do banco sem parar as escritas
+
+    Args:
+        db_path: Caminho do banco
+        politica: Parâmetros (padrão: lidos do ambiente)
+        rotacao: Remover os snapshots além de ``politica.manter``
+
+    Returns:
+        Caminho, tamanho, duração, recomeços e snapshots removidos pela rotação
+
+    Raises:
+        BackupError: Se o snapshot não passar na verificação de integridade
+    """
+    politica = politica or PoliticaBackup.do_ambiente()
+    diretorio = politica.diretorio_backup(db_path)
+    os.makedirs(diretorio, exist_ok=True)
+
+    nome = f"{_prefixo(db_path)}{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.db"
+    caminho = os.path.join(diretorio, nome)
+    temporario = caminho + EXTENSAO_TEMPORARIA
+    inicio = time.time()
+
+    origem = sqlite3.connect(db_path)
+    destino = sqlite3.connect(temporario)
+    try:
+        reinicios = _copiar(origem, destino, politica)
+    finally:
+        destino.close()
+        origem.close()
+
+    problemas = verificar_backup(temporario)
+    if problemas:
+        os.remove(temporario)
+        raise BackupError(f"Backup falhou na verificação de integridade: {'; '.join(problemas[:5])}")
+
+    os.replace(temporario, caminho)
+    removidos = rotacionar(db_path, politica) if rotacao else []
+
+    resumo = {
+        'caminho': caminho,
+        'tamanho': os.path.getsize(caminho),
+        'duracao': round(time.time() - inicio, 2),
+        'reinicios': reinicios,
+        'removidos': removidos,
+    }
+    logger.info(f"💾 Backup criado: {caminho} ({resumo['tamanho']} bytes em {resumo['duracao']}s)")
+    return resumo
+
+
+def listar_backups(db_path: str, politica: Optional[PoliticaBackup] = None) -> List[Dict[str, Any]]:
+    """Snapshots do banco, do mais recente para o mais antigo"""
+    politica = politica or PoliticaBackup.do_ambiente()
+    diretorio = politica.diretorio_backup(db_path)
+    if not os.path.isdir(diretorio):
+        return []
+
+    prefixo = _prefixo(db_path)
+    snapshots = []
+    for nome in os.listdir(diretorio):
+        if not (nome.startswith(prefixo) and nome.endswith('.db')):
+            continue
+        caminho = os.path.join(diretorio, nome)
+        info = os.stat(caminho)
+        snapshots.append({
+            'nome': nome,
+            'caminho': caminho,
+            'tamanho': info.st_size,
+            'data': datetime.fromtimestamp(info.st_mtime).isoformat(timespec='seconds'),
+        })
+    # O nome contém o timestamp da criação
+    return sorted(snapshots, key=lambda s: s['nome'], reverse=True)
+
+
+def restaurar_backup(caminho: str, db_path: str,
+                     politica: Optional[PoliticaBackup] = None) -> Dict[str, Any]:
+    """
+    Restaura um snapshot sobre o banco (API e bots devem estar parados)
+
+    Antes de sobrescrever, o snapshot é verificado e o banco atual é salvo
+    como um novo snapshot (sem rotação, para não remover o que será restaurado).
+
+    Returns:
+        Snapshot restaurado e backup de segurança do banco anterior
+    """
+    problemas = verificar_backup(caminho)
+    if problemas:
+        raise BackupError(f"Snapshot inválido, restauração cancelada: {'; '.join(problemas[:5])}")
+
+    politica = politica or PoliticaBackup.do_ambiente()
+    seguranca = criar_backup(db_path, politica, rotacao=False)['caminho'] if os.path.exists(db_path) else None
+
+    origem = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    destino = sqlite3.connect(db_path)
+    try:
+        origem.backup(destino)
+    finally:
+        destino.close()
+        origem.close()
+
+    logger.info(f"♻️ Banco {db_path} restaurado de {caminho}")
+    return {'restaurado': caminho, 'backup_anterior': seguranca}
@@ -0,0 +1,155 @@
+"""
+Índice de busca de empresas (SQLite FTS5 com tokenizador trigram).
+
+A busca por nome, CNPJ ou IE com ``LIKE '%x%'`` varre a tabela inteira.
+A tabela virtual ``empresas_fts`` indexa trigramas do nome normalizado
+(``nome_busca``: sem acentos, minúsculas) e das chaves canônicas de CNPJ
+e IE (só dígitos), de modo que qualquer trecho com 3 ou mais caracteres
+é encontrado pelo índice. É um índice de conteúdo externo sobre
+``empresas``, sincronizado por triggers como ``mensagens_fts``.
+
+Termos com menos de 3 caracteres (ou bancos sem FTS5/trigram) usam o
+prefixo nos índices B-tree de ``nome_busca``, ``cnpj_chave`` e ``ie_chave``.
+"""
+
+import logging
+import re
+import sqlite3
+from typing import List, Tuple
+
+from .chaves import chave_nome
+from .fts import fts5_disponivel
+
+logger = logging.getLogger(__name__)
+
+EMPRESAS_FTS = 'empresas_fts'
+
+# Colunas de empresas indexadas
+EMPRESAS_FTS_COLUMNS = ('nome_busca', 'cnpj_chave', 'ie_chave')
+
+# Tamanho mínimo do termo para o índice trigram
+MIN_TRIGRAM = 3
+
+# CNPJ/IE/CPF digitados com ou sem pontuação
+_SO_DOCUMENTO = re.compile(r'^[\d\s./-]+$')
+
+
+def trigram_disponivel(conn: sqlite3.Connection) -> bool:
+    """O tokenizador trigram existe a partir do SQLite 3.34"""
+    return sqlite3.sqlite_version_info >= (3, 34, 0) and fts5_disponivel(conn)
+
+
+def busca_ativa(conn: sqlite3.Connection) -> bool:
+    """Verifica se o índice empresas_fts existe no banco"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (EMPRESAS_FTS,)
+    ).fetchone()
+    return row is not None
+
+
+def ensure_empresas_busca(conn: sqlite3.Connection) -> bool:
+    """
+    Cria o índice trigram e os triggers de sincronização, se necessário.
+
+    Depende das colunas criadas por ``ensure_chaves``; na primeira
+    criação o índice é populado com as empresas existentes.
+
+    Args:
+        conn: Conexão aberta com o banco (o commit fica a cargo do chamador)
+
+    Returns:
+        bool: True se o índice está disponível para consultas
+    """
+    if busca_ativa(conn):
+        return True
+
+    if not trigram_disponivel(conn):
+        logger.warning("⚠️ SQLite sem FTS5/trigram - busca de empresas usará prefixo e LIKE")
+        return False
+
+    colunas_existentes = {row[1] for row in conn.execute("PRAGMA table_info(empresas)")}
+    faltando = [col for col in EMPRESAS_FTS_COLUMNS if col not in colunas_existentes]
+    if faltando:
+        logger.warning(f"⚠️ Índice de busca de empresas adiado - colunas ausentes: {', '.join(faltando)}")
+        return False
+
+    colunas = ', '.join(EMPRESAS_FTS_COLUMNS)
+    novos = ', '.join(f"new.{col}" for col in EMPRESAS_FTS_COLUMNS)
+    antigos = ', '.join(f"old.{col}" for col in EMPRESAS_FTS_COLUMNS)
+
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {EMPRESAS_FTS} USING fts5(
+            {colunas},
+            content='empresas',
+            content_rowid='id',
+            tokenize='trigram'
+        )
+    """)
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS empresas_fts_ai AFTER INSERT ON empresas BEGIN
+            INSERT INTO {EMPRESAS_FTS} (rowid, {colunas}) VALUES (new.id, {novos});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS empresas_fts_ad AFTER DELETE ON empresas BEGIN
+            INSERT INTO {EMPRESAS_FTS} ({EMPRESAS_FTS}, rowid, {colunas}) VALUES ('delete', old.id, {antigos});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS empresas_fts_au AFTER UPDATE OF {colunas} ON empresas BEGIN
+            INSERT INTO {EMPRESAS_FTS} ({EMPRESAS_FTS}, rowid, {colunas}) VALUES ('delete', old.id, {antigos});
+            INSERT INTO {EMPRESAS_FTS} (rowid, {colunas}) VALUES (new.id, {novos});
+        END
+    """)
+
+    conn.execute(f"INSERT INTO {EMPRESAS_FTS} ({EMPRESAS_FTS}) VALUES ('rebuild')")
+    logger.info("✅ Índice trigram de busca de empresas criado")
+    return True
+
+
+def termo_busca(search: str) -> str:
+    """Só os dígitos quando o texto parece um documento, senão o nome normalizado"""
+    if _SO_DOCUMENTO.match(search) and any(c.isdigit() for c in search):
+        return ''.join(c for c in search if c.isdigit())
+    return chave_nome(search) or ''
+
+
+def _faixa_prefixo(coluna: str, termo: str) -> Tuple[str, List[str]]:
+    """``coluna LIKE 'termo%'`` como faixa, para usar o índice B-tree da coluna"""
+    proximo = termo[:-1] + chr(ord(termo[-1]) + 1)
+    return f"({coluna} >= ? AND {coluna} < ?)", [termo, proximo]
+
+
+def condicao_busca(conn: sqlite3.Connection, search: str, alias: str = 'empresas') -> Tuple[str, List[str]]:
+    """
+    Condição WHERE da busca livre de empresas (nome, CNPJ ou IE)
+
+    Args:
+        conn: Conexão aberta (para saber se o índice trigram existe)
+        search: Texto digitado pelo usuário
+        alias: Nome/alias da tabela empresas na consulta
+
+    Returns:
+        (condição, parâmetros); condição vazia se não houver termo pesquisável
+    """
+    termo = termo_busca(search)
+    if not termo:
+        return "", []
+
+    if len(termo) >= MIN_TRIGRAM and busca_ativa(conn):
+        # Frase entre aspas: trecho contíguo, sem operadores FTS vindos do usuário
+        frase = '"' + termo.replace('"', '""') + '"'
+        return f"{alias}.id IN (SELECT rowid FROM {EMPRESAS_FTS} WHERE {EMPRESAS_FTS} MATCH ?)", [frase]
+
+    if len(termo) >= MIN_TRIGRAM:
+        colunas = [f"{alias}.{col}" for col in EMPRESAS_FTS_COLUMNS]
+        return "(" + " OR ".join(f"{col} LIKE ?" for col in colunas) + ")", [f"%{termo}%"] * len(colunas)
+
+    condicoes, params = [], []
+    for col in EMPRESAS_FTS_COLUMNS:
+        condicao, faixa = _faixa_prefixo(f"{alias}.{col}", termo)
+        condicoes.append(condicao)
+        params.extend(faixa)
+    return "(" + " OR ".join(condicoes) + ")", params
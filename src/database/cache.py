@@ -0,0 +1,152 @@
+"""
+Cache em memória para consultas agregadas do banco de dados.
+
+Cada tabela possui um contador de versão que é incrementado sempre que
+a API ou os bots escrevem nela (``notify_write``). Um resultado em cache
+fica associado às versões das tabelas das quais depende e só é recalculado
+quando alguma delas muda, de modo que leituras repetidas entre escritas
+custam O(1).
+
+Outros componentes podem ser avisados das escritas (``registrar_ouvinte``),
+como o fluxo de eventos da API, que publica as mudanças da fila.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tabelas monitoradas pelo cache
+TABELAS_MONITORADAS = ('consultas', 'empresas', 'mensagens_sefaz', 'queue_jobs')
+
+# Idade máxima de uma entrada (segundos). Protege contra escritas feitas
+# fora do processo (scripts em scripts/) que não chamam notify_write.
+MAX_AGE_PADRAO = 300.0
+
+# Máximo de entradas mantidas. As chaves incluem filtros livres (busca,
+# datas), então sem limite cada combinação nova ficaria na memória até o
+# fim do processo; as menos usadas recentemente saem primeiro.
+MAX_ENTRADAS_PADRAO = 512
+
+
+class QueryCache:
+    """Cache de resultados indexado por chave e versões das tabelas"""
+
+    def __init__(self, max_age: float = MAX_AGE_PADRAO, max_entradas: int = MAX_ENTRADAS_PADRAO):
+        self.max_age = max_age
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {tabela: 0 for tabela in TABELAS_MONITORADAS}
+        # Horário (epoch) da última escrita de cada tabela; antes da primeira
+        # escrita vale o início do processo
+        self._iniciado_em = time.time()
+        self._modified: Dict[str, float] = {}
+        # Ordem de uso (LRU): a mais recente no fim
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], float, Any]]" = OrderedDict()
+
+    def bump(self, *tabelas: str) -> None:
+        """Incrementa a versão das tabelas informadas (invalida dependentes)"""
+        agora = time.time()
+        with self._lock:
+            for tabela in tabelas:
+                self._versions[tabela] = self._versions.get(tabela, 0) + 1
+                self._modified[tabela] = agora
+
+    def version(self, *tabelas: str) -> Tuple[int, ...]:
+        """Retorna a tupla de versões atuais das tabelas informadas"""
+        with self._lock:
+            return tuple(self._versions.get(tabela, 0) for tabela in tabelas)
+
+    def modified_at(self, *tabelas: str) -> float:
+        """Horário (epoch) da escrita mais recente entre as tabelas informadas"""
+        with self._lock:
+            return max(
+                (self._modified.get(tabela, self._iniciado_em) for tabela in tabelas),
+                default=self._iniciado_em
+            )
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        tabelas: Iterable[str],
+        compute: Callable[[], Any],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """
+        Retorna o valor em cache ou calcula e armazena um novo
+
+        Args:
+            key: Chave do resultado (ex.: nome do endpoint + filtros)
+            tabelas: Tabelas das quais o resultado depende
+            compute: Função sem argumentos que calcula o valor
+            ttl: Validade máxima em segundos (para resultados dependentes
+                 do relógio, como "mensagens de hoje"). Padrão: max_age
+
+        Returns:
+            Valor calculado ou em cache
+        """
+        tabelas = tuple(tabelas)
+        versoes = self.version(*tabelas)
+        validade = self.max_age if ttl is None else ttl
+        agora = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                versoes_entry, criado_em, valor = entry
+                if versoes_entry == versoes and (agora - criado_em) < validade:
+                    self._entries.move_to_end(key)
+                    return valor
+                del self._entries[key]  # Obsoleta: não ocupa espaço até o recálculo
+
+        valor = compute()
+
+        with self._lock:
+            self._entries[key] = (versoes, agora, valor)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entradas:
+                self._entries.popitem(last=False)
+
+        return valor
+
+    def clear(self) -> None:
+        """Remove todas as entradas do cache"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Instância compartilhada pelo processo (API + bots executados pela fila)
+query_cache = QueryCache()
+
+# Funções chamadas a cada notify_write com as tabelas alteradas
+_ouvintes: List[Callable[[Tuple[str, ...]], None]] = []
+
+
+def registrar_ouvinte(ouvinte: Callable[[Tuple[str, ...]], None]) -> None:
+    """
+    Registra uma função chamada após cada escrita notificada.
+
+    O ouvinte pode ser chamado de qualquer thread (fila de escrita, bots)
+    e deve apenas agendar o trabalho, sem bloquear.
+    """
+    if ouvinte not in _ouvintes:
+        _ouvintes.append(ouvinte)
+
+
+def notify_write(*tabelas: str) -> None:
+    """
+    Registra que houve escrita nas tabelas informadas.
+
+    Deve ser chamada após o commit de qualquer INSERT/UPDATE/DELETE em
+    consultas, empresas, mensagens_sefaz ou queue_jobs.
+    """
+    query_cache.bump(*tabelas)
+    logger.debug(f"Cache invalidado para: {', '.join(tabelas)}")
+    for ouvinte in list(_ouvintes):
+        try:
+            ouvinte(tabelas)
+        except Exception as e:
+            logger.warning(f"⚠️ Erro no ouvinte de escrita: {e}")
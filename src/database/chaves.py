@@ -0,0 +1,209 @@
+"""
+Chaves canônicas (só dígitos) de CNPJ, IE e CPF.
+
+Os identificadores são gravados como chegam: a mesma IE aparece como
+"12538398-3" em ``empresas`` e "125383983" em ``mensagens_sefaz``, o
+CPF com ou sem pontuação. Comparar esses valores exigia limpar strings
+nas consultas (sem índice) ou scripts como ``comparar_ie_formato.py``.
+
+Cada tabela ganha colunas ``*_chave`` com o valor normalizado por
+``SEFAZValidator.limpar_*``, preenchidas na gravação e retroativamente
+por ``migrar_chaves``. As buscas e junções usam igualdade indexada
+nessas colunas; ``consultas.empresa_id`` liga o resultado à empresa.
+
+``empresas.nome_busca`` guarda o nome sem acentos, em minúsculas, para
+a busca de empresas (ver ``busca_empresas.py``).
+"""
+
+import logging
+import re
+import sqlite3
+import unicodedata
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tabela -> {coluna chave: (coluna original, tipo de documento)}
+CHAVES = {
+    'empresas': {
+        'cnpj_chave': ('cnpj', 'cnpj'),
+        'ie_chave': ('inscricao_estadual', 'ie'),
+        'cpf_chave': ('cpf_socio', 'cpf'),
+        'nome_busca': ('nome_empresa', 'nome'),
+    },
+    'consultas': {
+        'cnpj_chave': ('cnpj', 'cnpj'),
+        'ie_chave': ('inscricao_estadual', 'ie'),
+        'cpf_chave': ('cpf_socio', 'cpf'),
+    },
+    'mensagens_sefaz': {
+        'ie_chave': ('inscricao_estadual', 'ie'),
+        'cpf_chave': ('cpf_socio', 'cpf'),
+    },
+}
+
+INDICES = {
+    'idx_empresas_cnpj_chave': ('empresas', 'cnpj_chave'),
+    'idx_empresas_ie_chave': ('empresas', 'ie_chave'),
+    'idx_empresas_cpf_chave': ('empresas', 'cpf_chave'),
+    'idx_empresas_nome_busca': ('empresas', 'nome_busca'),
+    'idx_consultas_ie_chave_data': ('consultas', 'ie_chave, data_consulta'),
+    'idx_consultas_empresa_data': ('consultas', 'empresa_id, data_consulta'),
+    'idx_mensagens_ie_chave': ('mensagens_sefaz', 'ie_chave'),
+    'idx_mensagens_cpf_chave': ('mensagens_sefaz', 'cpf_chave'),
+}
+
+
+_ESPACOS = re.compile(r'\s+')
+
+
+def chave_nome(valor: Any) -> Optional[str]:
+    """'  João  da Silva ' -> 'joao da silva' (sem acentos, minúsculas, espaços simples)"""
+    if valor is None:
+        return None
+    texto = unicodedata.normalize('NFKD', str(valor))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _ESPACOS.sub(' ', texto).strip().lower()
+
+
+def _limpar(tipo: str, valor: Any) -> Optional[str]:
+    """None continua None; qualquer outro valor vira só os dígitos (possivelmente '')"""
+    if valor is None:
+        return None
+    if tipo == 'nome':
+        return chave_nome(valor)
+    # Import tardio: src.bot importa src.database durante a própria inicialização
+    from src.bot.utils.validators import SEFAZValidator
+    limpar = {
+        'cnpj': SEFAZValidator.limpar_cnpj,
+        'ie': SEFAZValidator.limpar_ie,
+        'cpf': SEFAZValidator.limpar_cpf,
+    }[tipo]
+    return limpar(str(valor))
+
+
+def chave_cnpj(valor: Any) -> Optional[str]:
+    return _limpar('cnpj', valor)
+
+
+def chave_ie(valor: Any) -> Optional[str]:
+    return _limpar('ie', valor)
+
+
+def chave_cpf(valor: Any) -> Optional[str]:
+    return _limpar('cpf', valor)
+
+
+def chaves_canonicas(tabela: str, dados: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Colunas chave de ``tabela`` a partir dos dados (mesmas chaves das colunas originais)"""
+    return {
+        coluna: _limpar(tipo, dados.get(origem))
+        for coluna, (origem, tipo) in CHAVES[tabela].items()
+    }
+
+
+def empresa_por_ie(conn: sqlite3.Connection, ie: Any) -> Optional[int]:
+    """Id da empresa com a IE informada (em qualquer formato), ou None"""
+    chave = chave_ie(ie)
+    if not chave:
+        return None
+    row = conn.execute("SELECT id FROM empresas WHERE ie_chave = ? LIMIT 1", (chave,)).fetchone()
+    return row[0] if row else None
+
+
+def _colunas(conn: sqlite3.Connection, tabela: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+def ensure_chaves(conn: sqlite3.Connection) -> None:
+    """
+    Cria as colunas chave, ``consultas.empresa_id`` e os índices, se necessário
+
+    Args:
+        conn: Conexão aberta (o commit fica a cargo do chamador)
+    """
+    existentes = {}
+    for tabela, colunas in CHAVES.items():
+        atuais = _colunas(conn, tabela)
+        if not atuais:
+            continue
+        for coluna, (origem, _) in colunas.items():
+            if origem in atuais and coluna not in atuais:
+                conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} TEXT")
+                atuais.add(coluna)
+        if tabela == 'consultas' and 'empresa_id' not in atuais:
+            conn.execute("ALTER TABLE consultas ADD COLUMN empresa_id INTEGER REFERENCES empresas (id)")
+            atuais.add('empresa_id')
+        existentes[tabela] = atuais
+
+    for indice, (tabela, colunas) in INDICES.items():
+        if all(c.strip() in existentes.get(tabela, ()) for c in colunas.split(',')):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {indice} ON {tabela} ({colunas})")
+
+
+def migrar_chaves(conn: sqlite3.Connection, lote: int = 1000) -> int:
+    """
+    Preenche as colunas chave das linhas gravadas sem elas
+
+    Só visita linhas com chave NULL e valor original presente, então é
+    barata quando tudo já está migrado e pode rodar a cada inicialização
+    (cobre também scripts antigos que não gravam as chaves).
+
+    Args:
+        conn: Conexão aberta (o commit fica a cargo do chamador)
+        lote: Linhas convertidas por UPDATE em lote
+
+    Returns:
+        Quantidade de linhas atualizadas
+    """
+    total = 0
+    for tabela, colunas in CHAVES.items():
+        atuais = _colunas(conn, tabela)
+        mapa = {c: o for c, o in colunas.items() if c in atuais and o[0] in atuais}
+        for coluna, (origem, tipo) in mapa.items():
+            # Lotes por id (keyset): cada coluna é tratada separadamente para que
+            # a condição use só o índice da própria chave
+            ultimo_id = 0
+            while True:
+                rows = conn.execute(f"""
+                    SELECT id, {origem} FROM {tabela}
+                    WHERE id > ? AND {coluna} IS NULL AND {origem} IS NOT NULL
+                    ORDER BY id
+                    LIMIT ?
+                """, (ultimo_id, lote)).fetchall()
+                if not rows:
+                    break
+                conn.executemany(
+                    f"UPDATE {tabela} SET {coluna} = ? WHERE id = ?",
+                    [(_limpar(tipo, valor), id_) for id_, valor in rows]
+                )
+                total += len(rows)
+                ultimo_id = rows[-1][0]
+
+    if total:
+        logger.info(f"🔑 {total} chave(s) canônica(s) de CNPJ/IE/CPF preenchidas")
+    return total
+
+
+def vincular_empresas(conn: sqlite3.Connection, ie_chave: Optional[str] = None) -> int:
+    """
+    Preenche ``consultas.empresa_id`` pela IE canônica
+
+    Args:
+        conn: Conexão aberta (o commit fica a cargo do chamador)
+        ie_chave: Limita às consultas dessa IE (ex.: empresa recém-cadastrada)
+
+    Returns:
+        Quantidade de consultas vinculadas
+    """
+    filtro = "AND ie_chave = ?" if ie_chave else "AND ie_chave IS NOT NULL AND ie_chave != ''"
+    params = (ie_chave,) if ie_chave else ()
+    cursor = conn.execute(f"""
+        UPDATE consultas
+        SET empresa_id = (SELECT e.id FROM empresas e WHERE e.ie_chave = consultas.ie_chave LIMIT 1)
+        WHERE empresa_id IS NULL {filtro}
+          AND EXISTS (SELECT 1 FROM empresas e WHERE e.ie_chave = consultas.ie_chave)
+    """, params)
+    if cursor.rowcount:
+        logger.info(f"🔗 {cursor.rowcount} consulta(s) vinculadas à empresa pela IE")
+    return cursor.rowcount
@@ -0,0 +1,176 @@
+"""
+Colunas tipadas dos resultados das consultas.
+
+As colunas originais guardam texto livre: ``tem_tvi`` pode ser "SIM",
+"NÃO", "ERRO", "NÃO VERIFICADO" ou o saldo como string ("1234.5"), e as
+flags da conta corrente são "SIM"/"NÃO". Isso obrigava a API a
+reinterpretar e formatar cada linha em Python e as estatísticas a
+comparar strings. As colunas abaixo guardam os mesmos dados tipados,
+prontos para filtros, índices e agregações em SQL:
+
+- ``tvi_status``: enum ``com_tvi`` | ``sem_tvi`` | ``erro`` | ``nao_verificado``
+- ``tvi_saldo_centavos`` / ``debitos_centavos``: valores em centavos (INTEGER)
+- ``flag_divida_pendente`` / ``flag_omisso_declaracao`` /
+  ``flag_inscrito_restritivo``: 1, 0 ou NULL (não verificado)
+
+As colunas de texto continuam sendo gravadas (compatibilidade com
+scripts e exportações antigas); a formatação fica a cargo do cliente.
+"""
+
+import logging
+import sqlite3
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TVI_COM = 'com_tvi'
+TVI_SEM = 'sem_tvi'
+TVI_ERRO = 'erro'
+TVI_NAO_VERIFICADO = 'nao_verificado'
+TVI_STATUS = (TVI_COM, TVI_SEM, TVI_ERRO, TVI_NAO_VERIFICADO)
+
+# Coluna de texto original -> coluna tipada
+FLAGS = {
+    'tem_divida_pendente': 'flag_divida_pendente',
+    'omisso_declaracao': 'flag_omisso_declaracao',
+    'inscrito_restritivo': 'flag_inscrito_restritivo',
+}
+
+COLUNAS_TIPADAS = {
+    'tvi_status': f"TEXT CHECK (tvi_status IN ({', '.join(repr(s) for s in TVI_STATUS)}))",
+    'tvi_saldo_centavos': 'INTEGER',
+    'debitos_centavos': 'INTEGER',
+    **{coluna: 'INTEGER' for coluna in FLAGS.values()},
+}
+
+_SIM = {'SIM', 'S', 'TRUE', '1'}
+_NAO = {'NÃO', 'NAO', 'N', 'FALSE', '0'}
+
+
+def centavos(valor: Any) -> Optional[int]:
+    """Valor monetário (float ou string numérica) em centavos"""
+    if valor is None or valor == '':
+        return None
+    try:
+        return int(round(float(valor) * 100))
+    except (TypeError, ValueError):
+        return None
+
+
+def tipar_flag(valor: Any) -> Optional[int]:
+    """'SIM' -> 1, 'NÃO' -> 0, demais ('NÃO VERIFICADO', None) -> None"""
+    if valor is None:
+        return None
+    texto = str(valor).strip().upper()
+    if texto in _SIM:
+        return 1
+    if texto in _NAO:
+        return 0
+    return None
+
+
+def tipar_tvi(valor: Any) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Converte o ``tem_tvi`` original em (tvi_status, tvi_saldo_centavos)
+
+    O saldo só é conhecido quando o bot extraiu o valor da página de TVIs.
+    """
+    if valor is None or str(valor).strip() == '':
+        return None, None
+
+    saldo = centavos(valor)
+    if saldo is not None:
+        return (TVI_COM if saldo > 0 else TVI_SEM), saldo
+
+    texto = str(valor).strip().upper()
+    if texto == 'SIM':
+        return TVI_COM, None
+    if texto in ('NÃO', 'NAO'):
+        return TVI_SEM, 0
+    if texto == 'ERRO':
+        return TVI_ERRO, None
+    return TVI_NAO_VERIFICADO, None
+
+
+def campos_tipados(dados: Dict[str, Any]) -> Dict[str, Any]:
+    """Colunas tipadas a partir dos dados extraídos (mesmas chaves das colunas de texto)"""
+    tvi_status, tvi_saldo = tipar_tvi(dados.get('tem_tvi'))
+    campos = {
+        'tvi_status': tvi_status,
+        'tvi_saldo_centavos': tvi_saldo,
+        'debitos_centavos': centavos(dados.get('valor_debitos')),
+    }
+    for origem, coluna in FLAGS.items():
+        campos[coluna] = tipar_flag(dados.get(origem))
+    return campos
+
+
+def ensure_colunas_tipadas(conn: sqlite3.Connection) -> bool:
+    """
+    Cria as colunas tipadas e seus índices, se necessário
+
+    Args:
+        conn: Conexão aberta (o commit fica a cargo do chamador)
+
+    Returns:
+        True se alguma coluna foi criada (os dados existentes precisam de migração)
+    """
+    existentes = {row[1] for row in conn.execute("PRAGMA table_info(consultas)")}
+    if not existentes:
+        return False
+
+    criadas = False
+    for coluna, tipo in COLUNAS_TIPADAS.items():
+        if coluna not in existentes:
+            conn.execute(f"ALTER TABLE consultas ADD COLUMN {coluna} {tipo}")
+            criadas = True
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_consultas_tvi_status ON consultas (tvi_status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_consultas_flag_divida ON consultas (flag_divida_pendente)")
+    return criadas
+
+
+def migrar_consultas(conn: sqlite3.Connection, lote: int = 1000) -> int:
+    """
+    Preenche as colunas tipadas das consultas gravadas antes delas existirem
+
+    Args:
+        conn: Conexão aberta (o commit fica a cargo do chamador)
+        lote: Linhas convertidas por UPDATE em lote
+
+    Returns:
+        Quantidade de consultas migradas
+    """
+    existentes = {row[1] for row in conn.execute("PRAGMA table_info(consultas)")}
+    origem = [c for c in ('tem_tvi', 'valor_debitos', *FLAGS) if c in existentes]
+    if not origem:
+        return 0
+
+    selecao = f"""
+        SELECT id, {', '.join(origem)} FROM consultas
+        WHERE id > ? AND tvi_status IS NULL AND debitos_centavos IS NULL
+          AND ({' OR '.join(f'{coluna} IS NOT NULL' for coluna in origem)})
+        ORDER BY id
+        LIMIT ?
+    """
+    colunas = list(COLUNAS_TIPADAS)
+    atualizacao = f"UPDATE consultas SET {', '.join(f'{c} = ?' for c in colunas)} WHERE id = ?"
+
+    # Lotes por id (keyset): a leitura não atravessa as linhas já atualizadas
+    total = 0
+    ultimo_id = 0
+    while True:
+        rows = conn.execute(selecao, (ultimo_id, lote)).fetchall()
+        if not rows:
+            break
+        valores = []
+        for row in rows:
+            campos = campos_tipados(dict(zip(origem, row[1:])))
+            valores.append([campos[c] for c in colunas] + [row[0]])
+        conn.executemany(atualizacao, valores)
+        total += len(rows)
+        ultimo_id = rows[-1][0]
+
+    if total:
+        logger.info(f"🔢 {total} consulta(s) migradas para as colunas tipadas")
+    return total
@@ -0,0 +1,140 @@
+"""
+Índice de busca textual (SQLite FTS5) sobre as mensagens SEFAZ.
+
+A tabela virtual ``mensagens_fts`` é um índice de conteúdo externo sobre
+``mensagens_sefaz``: o texto não é duplicado, apenas indexado. Triggers
+mantêm o índice sincronizado em INSERT, UPDATE e DELETE.
+
+O tokenizador ``unicode61 remove_diacritics 2`` ignora acentos e caixa,
+de modo que "notificacao" encontra "Notificação".
+"""
+
+import logging
+import re
+import sqlite3
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'mensagens_fts'
+
+# Colunas de mensagens_sefaz indexadas (ordem = índice da coluna no FTS)
+FTS_COLUMNS = (
+    'assunto',
+    'conteudo_mensagem',
+    'nome_empresa',
+    'tributo',
+    'competencia_dief',
+    'status_dief',
+    'protocolo_dief',
+    'chave_dief',
+)
+
+# Sequências de letras/dígitos: pontuação (inclusive '.', '-' e '/') separa
+# termos, como no tokenizer unicode61 do índice; "12.345.678-9" vira os
+# prefixos "12"* "345"* "678"* "9"*
+_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def fts5_disponivel(conn: sqlite3.Connection) -> bool:
+    """Verifica se o SQLite em uso foi compilado com FTS5"""
+    try:
+        rows = conn.execute("PRAGMA compile_options").fetchall()
+        return any(row[0] == 'ENABLE_FTS5' for row in rows)
+    except sqlite3.DatabaseError:
+        return False
+
+
+def fts_ativo(conn: sqlite3.Connection) -> bool:
+    """Verifica se o índice mensagens_fts existe no banco"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (FTS_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def ensure_mensagens_fts(conn: sqlite3.Connection) -> bool:
+    """
+    Cria o índice FTS5 e os triggers de sincronização, se necessário.
+
+    Na primeira criação o índice é populado com as mensagens existentes.
+
+    Args:
+        conn: Conexão aberta com o banco (o commit fica a cargo do chamador)
+
+    Returns:
+        bool: True se o índice está disponível para consultas
+    """
+    if fts_ativo(conn):
+        return True
+
+    if not fts5_disponivel(conn):
+        logger.warning("⚠️ SQLite sem suporte a FTS5 - busca de mensagens usará LIKE")
+        return False
+
+    colunas_existentes = {row[1] for row in conn.execute("PRAGMA table_info(mensagens_sefaz)")}
+    faltando = [col for col in FTS_COLUMNS if col not in colunas_existentes]
+    if faltando:
+        # O schema de mensagens ainda não foi migrado (ver SEFAZMessageProcessor)
+        logger.warning(f"⚠️ Índice FTS adiado - colunas ausentes em mensagens_sefaz: {', '.join(faltando)}")
+        return False
+
+    colunas = ', '.join(FTS_COLUMNS)
+    novos = ', '.join(f"new.{col}" for col in FTS_COLUMNS)
+    antigos = ', '.join(f"old.{col}" for col in FTS_COLUMNS)
+
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            {colunas},
+            content='mensagens_sefaz',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS mensagens_fts_ai AFTER INSERT ON mensagens_sefaz BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, {colunas}) VALUES (new.id, {novos});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS mensagens_fts_ad AFTER DELETE ON mensagens_sefaz BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {colunas}) VALUES ('delete', old.id, {antigos});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS mensagens_fts_au AFTER UPDATE ON mensagens_sefaz BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {colunas}) VALUES ('delete', old.id, {antigos});
+            INSERT INTO {FTS_TABLE} (rowid, {colunas}) VALUES (new.id, {novos});
+        END
+    """)
+
+    # Popular com as mensagens já existentes
+    conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+    logger.info("✅ Índice FTS5 de mensagens criado")
+    return True
+
+
+def build_match_query(search: Optional[str]) -> Optional[str]:
+    """
+    Converte o texto digitado pelo usuário em uma expressão MATCH segura.
+
+    Cada palavra vira um termo de prefixo entre aspas (sem operadores FTS
+    vindos do usuário) e todos os termos precisam estar presentes.
+
+    Examples:
+        >>> build_match_query('dief processada')
+        '"dief"* "processada"*'
+
+    Returns:
+        Expressão MATCH ou None se não houver termos pesquisáveis
+    """
+    if not search:
+        return None
+
+    termos = _TERM_PATTERN.findall(search)
+    if not termos:
+        return None
+
+    return ' '.join(f'"{termo}"*' for termo in termos)
@@ -0,0 +1,233 @@
+"""
+Linha do tempo das etapas de cada job da fila.
+
+``queue_jobs`` guardava apenas o início/fim do job e o texto do erro. Agora
+cada execução registra, por etapa (as mesmas de ``medir_etapa``: navegador,
+login, menu, navegacao, formulario_ie, extracao, tvis, dividas, mensagem,
+logout):
+
+- início (ms desde o início do job) e duração;
+- resultado (``ok`` ou ``erro`` se a etapa lançou exceção);
+- URL da página ao final da etapa (sem query string);
+- bytes recebidos (``Content-Length`` das respostas da página);
+- tempo de atraso artificial (``page.wait_for_timeout``: pausas humanas e
+  esperas fixas) — o restante da duração é espera real pelo SEFAZ.
+
+A gravação é compacta: um JSON com uma lista de valores por etapa, na
+ordem de ``CAMPOS_ETAPA``, na coluna ``queue_jobs.linha_do_tempo``
+(tipicamente < 1 KB por job). ``expandir`` devolve a forma com nomes e
+``percentis_por_etapa`` agrega p50/p95 de vários jobs.
+
+O registro é ativado pelo executor do job (``with linha.ativa():``) e
+alimentado por ``medir_etapa`` (src/bot/utils/metricas.py) através de uma
+ContextVar; fora de um job ativo as etapas não são registradas.
+"""
+
+import json
+import math
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+COLUNA = 'linha_do_tempo'
+
+# Ordem dos valores de cada etapa no JSON gravado
+CAMPOS_ETAPA = ('etapa', 'inicio_ms', 'duracao_ms', 'resultado', 'url', 'bytes', 'atraso_ms')
+
+RESULTADO_OK = 'ok'
+RESULTADO_ERRO = 'erro'
+
+# Linha do tempo do job em execução no contexto atual (task do asyncio)
+_linha_atual: ContextVar[Optional['LinhaDoTempo']] = ContextVar('linha_do_tempo', default=None)
+
+
+def ensure_linha_do_tempo(conn: sqlite3.Connection) -> None:
+    """
+    Cria a coluna da linha do tempo em queue_jobs, se necessário.
+
+    Args:
+        conn: Conexão aberta com o banco (o commit fica a cargo do chamador)
+    """
+    try:
+        conn.execute(f"ALTER TABLE queue_jobs ADD COLUMN {COLUNA} TEXT")
+    except sqlite3.OperationalError:
+        pass  # Coluna já existe (ou tabela ainda não criada)
+
+
+def _sem_query(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    partes = urlsplit(url)
+    return f"{partes.scheme}://{partes.netloc}{partes.path}" if partes.netloc else partes.path
+
+
+class LinhaDoTempo:
+    """Etapas de uma execução, na ordem em que começaram"""
+
+    def __init__(self):
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+        self.etapas: List[list] = []
+        # Etapas abertas (a mais interna recebe bytes e atrasos)
+        self._abertas: List[list] = []
+        self._pagina = None
+
+    def _ms(self) -> int:
+        return int((time.perf_counter() - self._t0) * 1000)
+
+    @contextmanager
+    def ativa(self) -> Iterator['LinhaDoTempo']:
+        """Registra as etapas executadas dentro do bloco (mesma task ou filhas)"""
+        token = _linha_atual.set(self)
+        try:
+            yield self
+        finally:
+            _linha_atual.reset(token)
+
+    def abrir(self, etapa: str) -> list:
+        registro = [etapa, self._ms(), None, None, None, 0, 0]
+        self.etapas.append(registro)
+        self._abertas.append(registro)
+        return registro
+
+    def fechar(self, registro: list, resultado: str = RESULTADO_OK) -> None:
+        registro[2] = self._ms() - registro[1]
+        registro[3] = resultado
+        if self._pagina is not None:
+            try:
+                registro[4] = _sem_query(self._pagina.url)
+            except Exception:
+                pass  # Página já fechada
+        if registro in self._abertas:
+            self._abertas.remove(registro)
+
+    def registrar_bytes(self, quantidade: int) -> None:
+        if self._abertas:
+            self._abertas[-1][5] += quantidade
+
+    def registrar_atraso(self, segundos: float) -> None:
+        if self._abertas:
+            self._abertas[-1][6] += int(segundos * 1000)
+
+    def anexar_pagina(self, pagina) -> None:
+        """
+        Acompanha a página do Playwright: URL ao fim de cada etapa, bytes
+        das respostas e o tempo gasto em ``wait_for_timeout``
+        """
+        self._pagina = pagina
+
+        def ao_responder(resposta) -> None:
+            try:
+                self.registrar_bytes(int(resposta.headers.get('content-length') or 0))
+            except (TypeError, ValueError):
+                pass
+
+        pagina.on('response', ao_responder)
+
+        esperar = pagina.wait_for_timeout
+
+        async def wait_for_timeout(timeout: float) -> None:
+            inicio = time.perf_counter()
+            try:
+                return await esperar(timeout)
+            finally:
+                self.registrar_atraso(time.perf_counter() - inicio)
+
+        pagina.wait_for_timeout = wait_for_timeout
+
+    def serializar(self) -> str:
+        """JSON compacto gravado em queue_jobs.linha_do_tempo"""
+        etapas = [registro if registro[2] is not None else
+                  registro[:2] + [self._ms() - registro[1]] + registro[3:]
+                  for registro in self.etapas]
+        return json.dumps({'inicio': round(self.inicio, 3), 'etapas': etapas}, separators=(',', ':'))
+
+    def expandir(self) -> Dict[str, Any]:
+        return expandir(self.serializar())
+
+
+def linha_atual() -> Optional[LinhaDoTempo]:
+    """Linha do tempo ativa no contexto atual, se houver"""
+    return _linha_atual.get()
+
+
+def anexar_pagina(pagina) -> None:
+    """Liga a página à linha do tempo ativa (sem efeito fora de um job)"""
+    linha = _linha_atual.get()
+    if linha is not None:
+        linha.anexar_pagina(pagina)
+
+
+def expandir(texto: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Forma legível da linha do tempo gravada
+
+    Returns:
+        {"inicio": epoch, "duracao_ms", "etapas": [{etapa, inicio_ms, fim_ms,
+        duracao_ms, resultado, url, bytes, atraso_ms, espera_ms}]} ou None
+    """
+    if not texto:
+        return None
+    dados = json.loads(texto)
+    etapas = []
+    for valores in dados.get('etapas', []):
+        etapa = dict(zip(CAMPOS_ETAPA, valores))
+        etapa['fim_ms'] = etapa['inicio_ms'] + etapa['duracao_ms']
+        etapa['espera_ms'] = max(etapa['duracao_ms'] - etapa['atraso_ms'], 0)
+        etapas.append(etapa)
+    return {
+        'inicio': dados.get('inicio'),
+        'duracao_ms': max((etapa['fim_ms'] for etapa in etapas), default=0),
+        'etapas': etapas,
+    }
+
+
+def _percentil(valores: List[int], p: float) -> int:
+    """Percentil pelo método nearest-rank (valores já ordenados)"""
+    return valores[max(math.ceil(p * len(valores)) - 1, 0)]
+
+
+def percentis_por_etapa(textos: Iterable[Optional[str]]) -> List[Dict[str, Any]]:
+    """
+    p50/p95 da duração, do atraso artificial e da espera real por etapa
+
+    Args:
+        textos: Valores da coluna linha_do_tempo (None é ignorado)
+
+    Returns:
+        Uma entrada por etapa, da mais lenta (p95) para a mais rápida
+    """
+    por_etapa: Dict[str, Dict[str, list]] = {}
+    for texto in textos:
+        linha = expandir(texto)
+        if linha is None:
+            continue
+        for etapa in linha['etapas']:
+            grupo = por_etapa.setdefault(etapa['etapa'], {'duracao': [], 'atraso': [], 'espera': [], 'bytes': [], 'erros': []})
+            grupo['duracao'].append(etapa['duracao_ms'])
+            grupo['atraso'].append(etapa['atraso_ms'])
+            grupo['espera'].append(etapa['espera_ms'])
+            grupo['bytes'].append(etapa['bytes'])
+            grupo['erros'].append(etapa['resultado'] == RESULTADO_ERRO)
+
+    resultado = []
+    for nome, grupo in por_etapa.items():
+        duracao, atraso, espera = sorted(grupo['duracao']), sorted(grupo['atraso']), sorted(grupo['espera'])
+        resultado.append({
+            'etapa': nome,
+            'execucoes': len(duracao),
+            'erros': sum(grupo['erros']),
+            'p50_ms': _percentil(duracao, 0.5),
+            'p95_ms': _percentil(duracao, 0.95),
+            'max_ms': duracao[-1],
+            'atraso_p50_ms': _percentil(atraso, 0.5),
+            'atraso_p95_ms': _percentil(atraso, 0.95),
+            'espera_p50_ms': _percentil(espera, 0.5),
+            'espera_p95_ms': _percentil(espera, 0.95),
+            'bytes_medio': int(sum(grupo['bytes']) / len(grupo['bytes'])),
+        })
+    resultado.sort(key=lambda item: item['p95_ms'], reverse=True)
+    return resultado
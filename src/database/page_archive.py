@@ -0,0 +1,181 @@
+"""
+Arquivo das páginas SEFAZ capturadas pelos bots.
+
+Cada HTML é armazenado uma única vez, comprimido, em ``paginas_arquivadas``
+e identificado pelo SHA-256 do conteúdo original (páginas idênticas são
+deduplicadas). ``consultas`` e ``mensagens_sefaz`` guardam apenas o hash
+das páginas de onde seus dados foram extraídos, o que permite re-extrair
+as colunas derivadas offline (scripts/reextrair_paginas.py).
+
+A compressão usa zstd quando o pacote ``zstandard`` está instalado e zlib
+(biblioteca padrão) caso contrário; o codec fica registrado por página.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import zlib
+from typing import Dict, Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:  # Dependência opcional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE = 'paginas_arquivadas'
+
+# Colunas de ligação: tabela -> {tipo da página: coluna com o hash}
+PAGINAS_CONSULTA = {
+    'conta_corrente': 'pagina_conta_corrente_hash',
+    'tvi': 'pagina_tvi_hash',
+    'dividas': 'pagina_dividas_hash',
+}
+PAGINAS_MENSAGEM = {
+    'mensagem': 'pagina_hash',
+}
+
+CODEC_ZSTD = 'zstd'
+CODEC_ZLIB = 'zlib'
+CODEC_PADRAO = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def ensure_page_archive(conn: sqlite3.Connection) -> None:
+    """
+    Cria a tabela do arquivo e as colunas de ligação, se necessário.
+
+    Args:
+        conn: Conexão aberta com o banco (o commit fica a cargo do chamador)
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            tamanho INTEGER NOT NULL,
+            tamanho_comprimido INTEGER NOT NULL,
+            conteudo BLOB NOT NULL,
+            data_captura TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    for tabela, colunas in (('consultas', PAGINAS_CONSULTA), ('mensagens_sefaz', PAGINAS_MENSAGEM)):
+        for coluna in colunas.values():
+            try:
+                conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} TEXT")
+            except sqlite3.OperationalError:
+                pass  # Coluna já existe (ou tabela ainda não criada)
+
+
+def comprimir(dados: bytes, codec: str = CODEC_PADRAO) -> bytes:
+    """Comprime bytes com o codec informado"""
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Pacote 'zstandard' não instalado")
+        return zstandard.ZstdCompressor(level=10).compress(dados)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(dados, 9)
+    raise ValueError(f"Codec desconhecido: {codec}")
+
+
+def descomprimir(dados: bytes, codec: str) -> bytes:
+    """Descomprime bytes gravados com o codec informado"""
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Pacote 'zstandard' necessário para ler esta página")
+        return zstandard.ZstdDecompressor().decompress(dados)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(dados)
+    raise ValueError(f"Codec desconhecido: {codec}")
+
+
+def hash_pagina(html: str) -> str:
+    """SHA-256 do HTML (chave do arquivo)"""
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+def arquivar_pagina(conn: sqlite3.Connection, html: Optional[str]) -> Optional[str]:
+    """
+    Armazena o HTML no arquivo (se ainda não existir) e retorna seu hash
+
+    Args:
+        conn: Conexão aberta (o commit fica a cargo do chamador)
+        html: Conteúdo da página
+
+    Returns:
+        Hash da página ou None se não houver conteúdo
+    """
+    if not html:
+        return None
+
+    bruto = html.encode('utf-8')
+    chave = hashlib.sha256(bruto).hexdigest()
+
+    existe = conn.execute(f"SELECT 1 FROM {ARCHIVE_TABLE} WHERE hash = ?", (chave,)).fetchone()
+    if existe:
+        return chave
+
+    comprimido = comprimir(bruto)
+    conn.execute(
+        f"""INSERT OR IGNORE INTO {ARCHIVE_TABLE} (hash, codec, tamanho, tamanho_comprimido, conteudo)
+            VALUES (?, ?, ?, ?, ?)""",
+        (chave, CODEC_PADRAO, len(bruto), len(comprimido), sqlite3.Binary(comprimido))
+    )
+    logger.debug(f"Página arquivada {chave[:12]}: {len(bruto)} -> {len(comprimido)} bytes")
+    return chave
+
+
+def arquivar_paginas(conn: sqlite3.Connection, paginas: Optional[Dict[str, str]],
+                     colunas: Dict[str, str]) -> Dict[str, str]:
+    """
+    Arquiva várias páginas e devolve {coluna de ligação: hash}
+
+    Args:
+        conn: Conexão aberta (o commit fica a cargo do chamador)
+        paginas: {tipo da página: html} (ex.: {'tvi': '<html>...'})
+        colunas: Mapa tipo -> coluna (PAGINAS_CONSULTA ou PAGINAS_MENSAGEM)
+    """
+    hashes = {}
+    for tipo, html in (paginas or {}).items():
+        coluna = colunas.get(tipo)
+        if coluna:
+            chave = arquivar_pagina(conn, html)
+            if chave:
+                hashes[coluna] = chave
+    return hashes
+
+
+def carregar_pagina(conn: sqlite3.Connection, chave: Optional[str]) -> Optional[str]:
+    """Lê e descomprime uma página do arquivo (None se não existir)"""
+    if not chave:
+        return None
+
+    row = conn.execute(
+        f"SELECT codec, conteudo FROM {ARCHIVE_TABLE} WHERE hash = ?", (chave,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    return descomprimir(bytes(row[1]), row[0]).decode('utf-8')
+
+
+def carregar_paginas(conn: sqlite3.Connection, chaves: Iterable[Optional[str]]) -> Dict[str, str]:
+    """
+    Lê e descomprime várias páginas com uma única consulta
+
+    Args:
+        conn: Conexão aberta com o banco
+        chaves: Hashes das páginas (vazios e repetidos são ignorados)
+
+    Returns:
+        {hash: html} das páginas encontradas
+    """
+    unicas = list(dict.fromkeys(chave for chave in chaves if chave))
+    if not unicas:
+        return {}
+
+    marcadores = ', '.join('?' * len(unicas))
+    rows = conn.execute(
+        f"SELECT hash, codec, conteudo FROM {ARCHIVE_TABLE} WHERE hash IN ({marcadores})", unicas
+    ).fetchall()
+    return {row[0]: descomprimir(bytes(row[2]), row[1]).decode('utf-8') for row in rows}
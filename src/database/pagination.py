@@ -0,0 +1,115 @@
+"""
+Paginação por cursor (keyset) para as listagens da API.
+
+Em vez de ``LIMIT ? OFFSET ?`` (custo proporcional à página e sujeito a
+linhas "pulando" de página quando os workers inserem registros), cada
+página continua a partir da chave de ordenação do último item retornado:
+
+    WHERE (data_consulta, id) < (?, ?) ORDER BY data_consulta DESC, id DESC
+
+O cursor entregue ao cliente é opaco: a tupla (chave, id) serializada em
+JSON e codificada em base64 url-safe.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+# Header HTTP usado para devolver o cursor da próxima página
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class InvalidCursorError(ValueError):
+    """Cursor malformado ou de outra listagem"""
+    pass
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Codifica os valores da chave de ordenação em um cursor opaco
+
+    Args:
+        values: Valores das colunas de ordenação do último item (ex.: data, id)
+
+    Returns:
+        str: Cursor url-safe
+    """
+    raw = json.dumps(list(values), separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decodifica um cursor gerado por encode_cursor
+
+    Args:
+        cursor: Cursor recebido do cliente
+        size: Quantidade de valores esperada
+
+    Returns:
+        list: Valores da chave de ordenação
+
+    Raises:
+        InvalidCursorError: Se o cursor não puder ser decodificado
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursorError(f"Cursor inválido: {cursor}") from e
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError(f"Cursor inválido: {cursor}")
+
+    return values
+
+
+def keyset_condition(
+    columns: Sequence[str],
+    cursor: Optional[str],
+    descending: bool = True
+) -> Tuple[Optional[str], List[Any]]:
+    """
+    Monta a condição WHERE que posiciona a consulta após o cursor
+
+    Args:
+        columns: Expressões SQL da chave de ordenação, na mesma ordem do ORDER BY
+                 (a última deve ser o id, para desempate)
+        cursor: Cursor recebido do cliente (None = primeira página)
+        descending: True para ORDER BY ... DESC
+
+    Returns:
+        tuple: (condição SQL ou None, parâmetros)
+    """
+    if not cursor:
+        return None, []
+
+    values = decode_cursor(cursor, len(columns))
+    operador = '<' if descending else '>'
+    colunas = ', '.join(columns)
+    placeholders = ', '.join('?' for _ in columns)
+    return f"({colunas}) {operador} ({placeholders})", values
+
+
+def next_cursor(rows: Sequence[Any], limit: int, *keys: str) -> Optional[str]:
+    """
+    Gera o cursor da próxima página a partir das linhas retornadas
+
+    A consulta deve buscar ``limit + 1`` linhas: a linha a mais só indica
+    que existe próxima página (uma última página exatamente cheia não gera
+    cursor para uma página vazia) e é descartada pelo chamador.
+
+    Args:
+        rows: Linhas retornadas com LIMIT limit + 1 (sqlite3.Row ou dict)
+        limit: Tamanho de página solicitado
+        keys: Nomes das colunas da chave de ordenação no resultado
+
+    Returns:
+        Cursor da próxima página ou None se esta for a última
+    """
+    if limit <= 0 or len(rows) <= limit:
+        return None
+
+    ultima = rows[limit - 1]
+    return encode_cursor(*(ultima[key] for key in keys))
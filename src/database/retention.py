@@ -0,0 +1,405 @@
+"""
+Retenção e arquivamento dos dados antigos.
+
+O banco principal só cresce: cada execução grava uma nova consulta por
+empresa, os jobs concluídos (inclusive os gerados por recorrência) nunca
+saem de ``queue_jobs`` e as mensagens guardam o HTML completo. Aqui os
+registros antigos são movidos para bancos de arquivo anexados (``ATTACH``),
+um arquivo por ano, e o espaço liberado é devolvido ao sistema com
+``incremental_vacuum``:
+
+- consultas: mantém as últimas N de cada inscrição estadual e, além delas,
+  a última de cada mês (snapshot mensal) dos últimos M meses;
+- queue_jobs: jobs concluídos há mais de X dias;
+- mensagens_sefaz: o HTML das mensagens com mais de Y dias passa para o
+  arquivo comprimido de páginas (a mensagem continua consultável);
+- paginas_arquivadas: páginas que nenhuma linha do banco principal
+  referencia mais acompanham as linhas arquivadas.
+
+Os arquivos têm as mesmas tabelas (colunas adicionadas conforme o banco
+principal evolui), então podem ser abertos pelas ferramentas existentes
+(ex.: ``scripts/reextrair_paginas.py --db arquivo/sefaz_consulta_2024.db``).
+Cada lote é movido em uma transação própria (cópia e remoção juntas),
+para não segurar o lock de escrita do banco principal por muito tempo.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .cache import notify_write
+from .page_archive import ARCHIVE_TABLE, PAGINAS_CONSULTA, PAGINAS_MENSAGEM, arquivar_pagina
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_ALIAS = 'arquivo'
+
+# auto_vacuum = INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Páginas das políticas que ainda podem estar em uso por um bot (gravação
+# da página e da linha que a referencia não são atômicas)
+PAGINAS_CARENCIA_DIAS = 1
+
+# Espera máxima pelo lock de escrita (segundos)
+LOCK_TIMEOUT = 30
+
+
+def _env_int(nome: str, padrao: int) -> int:
+    valor = os.getenv(nome)
+    if valor is None or valor.strip() == '':
+        return padrao
+    try:
+        return int(valor)
+    except ValueError:
+        logger.warning(f"⚠️ {nome}={valor!r} inválido, usando {padrao}")
+        return padrao
+
+
+class PoliticaRetencao:
+    """
+    Parâmetros de retenção (valores <= 0 desativam a política correspondente)
+
+    Lidos do ambiente por ``do_ambiente``:
+        RETENCAO_CONSULTAS_POR_IE     últimas consultas mantidas por IE (12)
+        RETENCAO_MESES_SNAPSHOT       meses com snapshot mensal mantido (24)
+        RETENCAO_DIAS_JOBS            dias até arquivar jobs concluídos (30)
+        RETENCAO_DIAS_HTML_MENSAGENS  dias até comprimir o HTML das mensagens (90)
+        RETENCAO_DIR                  diretório dos arquivos (<pasta do banco>/arquivo)
+        RETENCAO_LOTE                 linhas movidas por transação (500)
+        RETENCAO_PAGINAS_VACUUM       páginas liberadas por passo do vacuum (1000)
+    """
+
+    def __init__(self, consultas_por_ie: int = 12, meses_snapshot: int = 24,
+                 dias_jobs: int = 30, dias_html_mensagens: int = 90,
+                 diretorio: Optional[str] = None, lote: int = 500,
+                 paginas_vacuum: int = 1000):
+        self.consultas_por_ie = consultas_por_ie
+        self.meses_snapshot = meses_snapshot
+        self.dias_jobs = dias_jobs
+        self.dias_html_mensagens = dias_html_mensagens
+        self.diretorio = diretorio
+        self.lote = max(1, lote)
+        self.paginas_vacuum = max(1, paginas_vacuum)
+
+    @classmethod
+    def do_ambiente(cls) -> 'PoliticaRetencao':
+        return cls(
+            consultas_por_ie=_env_int('RETENCAO_CONSULTAS_POR_IE', 12),
+            meses_snapshot=_env_int('RETENCAO_MESES_SNAPSHOT', 24),
+            dias_jobs=_env_int('RETENCAO_DIAS_JOBS', 30),
+            dias_html_mensagens=_env_int('RETENCAO_DIAS_HTML_MENSAGENS', 90),
+            diretorio=os.getenv('RETENCAO_DIR') or None,
+            lote=_env_int('RETENCAO_LOTE', 500),
+            paginas_vacuum=_env_int('RETENCAO_PAGINAS_VACUUM', 1000),
+        )
+
+    def diretorio_arquivo(self, db_path: str) -> str:
+        return self.diretorio or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'arquivo')
+
+    def caminho_arquivo(self, db_path: str, ano: str) -> str:
+        """Ex.: /data/arquivo/sefaz_consulta_2024.db"""
+        base = os.path.splitext(os.path.basename(db_path))[0]
+        return os.path.join(self.diretorio_arquivo(db_path), f"{base}_{ano}.db")
+
+
+def ensure_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """
+    Ativa auto_vacuum=INCREMENTAL em bancos novos (antes da primeira tabela)
+
+    Bancos existentes precisam de um VACUUM completo para mudar o modo
+    (``converter_vacuum_incremental``).
+
+    Returns:
+        True se o banco está em modo incremental
+    """
+    modo = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if modo == AUTO_VACUUM_INCREMENTAL:
+        return True
+
+    vazio = conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+    if vazio:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        return True
+    return False
+
+
+def converter_vacuum_incremental(db_path: str) -> None:
+    """Muda um banco existente para auto_vacuum=INCREMENTAL (reescreve o arquivo)"""
+    conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT)
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def _colunas(conn: sqlite3.Connection, esquema: str, tabela: str) -> List[Tuple[str, str]]:
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA {esquema}.table_info({tabela})")]
+
+
+def _garantir_tabela_arquivo(conn: sqlite3.Connection, tabela: str, chave: str) -> List[str]:
+    """
+    Cria (ou completa) a tabela no banco de arquivo com as colunas do principal
+
+    Returns:
+        Colunas copiadas
+    """
+    colunas = _colunas(conn, 'main', tabela)
+    existentes = {nome for nome, _ in _colunas(conn, ARQUIVO_ALIAS, tabela)}
+
+    if not existentes:
+        definicoes = ', '.join(
+            f"{nome} {tipo} PRIMARY KEY" if nome == chave else f"{nome} {tipo}"
+            for nome, tipo in colunas
+        )
+        conn.execute(f"CREATE TABLE {ARQUIVO_ALIAS}.{tabela} ({definicoes})")
+    else:
+        for nome, tipo in colunas:
+            if nome not in existentes:
+                conn.execute(f"ALTER TABLE {ARQUIVO_ALIAS}.{tabela} ADD COLUMN {nome} {tipo}")
+
+    return [nome for nome, _ in colunas]
+
+
+def _mover(conn: sqlite3.Connection, db_path: str, politica: PoliticaRetencao,
+           tabela: str, chave: str, chaves_por_ano: Dict[str, List]) -> int:
+    """Copia as linhas para o arquivo do ano e as remove do banco principal"""
+    movidas = 0
+    for ano, chaves in sorted(chaves_por_ano.items()):
+        caminho = politica.caminho_arquivo(db_path, ano)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        conn.execute(f"ATTACH DATABASE ? AS {ARQUIVO_ALIAS}", (caminho,))
+        try:
+            colunas = ', '.join(_garantir_tabela_arquivo(conn, tabela, chave))
+            conn.commit()
+
+            for inicio in range(0, len(chaves), politica.lote):
+                lote = chaves[inicio:inicio + politica.lote]
+                placeholders = ', '.join('?' for _ in lote)
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        f"""INSERT OR REPLACE INTO {ARQUIVO_ALIAS}.{tabela} ({colunas})
+                            SELECT {colunas} FROM main.{tabela} WHERE {chave} IN ({placeholders})""",
+                        lote
+                    )
+                    conn.execute(f"DELETE FROM main.{tabela} WHERE {chave} IN ({placeholders})", lote)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                movidas += len(lote)
+        finally:
+            conn.execute(f"DETACH DATABASE {ARQUIVO_ALIAS}")
+
+        logger.info(f"📦 {len(chaves)} linha(s) de {tabela} arquivadas em {caminho}")
+    return movidas
+
+
+def _agrupar_por_ano(rows: Iterable[Tuple]) -> Dict[str, List]:
+    grupos: Dict[str, List] = {}
+    for chave, ano in rows:
+        grupos.setdefault(ano or 'sem_data', []).append(chave)
+    return grupos
+
+
+def _chave_ie_consultas(conn: sqlite3.Connection) -> str:
+    """
+    Expressão da IE canônica das consultas, com índice para as janelas
+
+    A mesma IE é gravada em formatos diferentes ("12538398-3" e "125383983"):
+    agrupar pelo valor bruto manteria N consultas por formato.
+    """
+    colunas = {nome for nome, _ in _colunas(conn, 'main', 'consultas')}
+    expressao = "COALESCE(ie_chave, inscricao_estadual)" if 'ie_chave' in colunas else "inscricao_estadual"
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_consultas_retencao
+        ON consultas ({expressao}, data_consulta DESC, id DESC)
+    """)
+    return expressao
+
+
+def selecionar_consultas(conn: sqlite3.Connection, politica: PoliticaRetencao) -> Dict[str, List[int]]:
+    """Consultas fora das últimas N por IE e que não são snapshot mensal mantido"""
+    if politica.consultas_por_ie <= 0:
+        return {}
+
+    chave_ie = _chave_ie_consultas(conn)
+
+    if politica.meses_snapshot > 0:
+        snapshot = "(ordem_mes > 1 OR datetime(data_consulta) < datetime('now', ?))"
+        params = [politica.consultas_por_ie, f"-{politica.meses_snapshot} months"]
+    else:
+        snapshot = "1"
+        params = [politica.consultas_por_ie]
+
+    rows = conn.execute(f"""
+        SELECT id, strftime('%Y', data_consulta) FROM (
+            SELECT id, data_consulta,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY {chave_ie}
+                       ORDER BY data_consulta DESC, id DESC
+                   ) AS ordem,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY {chave_ie}, strftime('%Y-%m', data_consulta)
+                       ORDER BY data_consulta DESC, id DESC
+                   ) AS ordem_mes
+            FROM consultas
+        )
+        WHERE ordem > ? AND {snapshot}
+    """, params)
+    return _agrupar_por_ano(rows)
+
+
+def selecionar_jobs(conn: sqlite3.Connection, politica: PoliticaRetencao) -> Dict[str, List[int]]:
+    """Jobs concluídos há mais de ``dias_jobs`` dias"""
+    if politica.dias_jobs <= 0:
+        return {}
+
+    rows = conn.execute("""
+        SELECT id, strftime('%Y', COALESCE(data_conclusao, data_processamento, data_adicao))
+        FROM queue_jobs
+        WHERE status = 'completed'
+          AND datetime(COALESCE(data_conclusao, data_processamento, data_adicao)) < datetime('now', ?)
+    """, (f"-{politica.dias_jobs} days",))
+    return _agrupar_por_ano(rows)
+
+
+def selecionar_paginas(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """Páginas que nenhuma consulta ou mensagem do banco principal referencia"""
+    referencias = [
+        f"SELECT {coluna} FROM {tabela} WHERE {coluna} IS NOT NULL"
+        for tabela, colunas in (('consultas', PAGINAS_CONSULTA), ('mensagens_sefaz', PAGINAS_MENSAGEM))
+        for coluna in colunas.values()
+        if coluna in {nome for nome, _ in _colunas(conn, 'main', tabela)}
+    ]
+    filtro = f"AND hash NOT IN ({' UNION '.join(referencias)})" if referencias else ""
+
+    rows = conn.execute(f"""
+        SELECT hash, strftime('%Y', data_captura) FROM {ARCHIVE_TABLE}
+        WHERE datetime(data_captura) < datetime('now', ?)
+        {filtro}
+    """, (f"-{PAGINAS_CARENCIA_DIAS} days",))
+    return _agrupar_por_ano(rows)
+
+
+def comprimir_html_mensagens(conn: sqlite3.Connection, politica: PoliticaRetencao,
+                             dry_run: bool = False) -> int:
+    """
+    Move o HTML das mensagens antigas para o arquivo comprimido de páginas
+
+    A mensagem passa a apontar para a página (pagina_hash) e a API lê o HTML
+    de lá quando ``conteudo_html`` está vazio.
+    """
+    if politica.dias_html_mensagens <= 0:
+        return 0
+
+    sql = """
+        SELECT id FROM mensagens_sefaz
+        WHERE conteudo_html IS NOT NULL AND conteudo_html != ''
+          AND datetime(timestamp) < datetime('now', ?)
+    """
+    ids = [row[0] for row in conn.execute(sql, (f"-{politica.dias_html_mensagens} days",))]
+    if dry_run:
+        return len(ids)
+
+    for inicio in range(0, len(ids), politica.lote):
+        lote = ids[inicio:inicio + politica.lote]
+        placeholders = ', '.join('?' for _ in lote)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT id, conteudo_html, pagina_hash FROM mensagens_sefaz WHERE id IN ({placeholders})",
+                lote
+            ).fetchall()
+            for mensagem_id, html, pagina_hash in rows:
+                # O HTML guardado na linha prevalece sobre a página capturada
+                conn.execute(
+                    "UPDATE mensagens_sefaz SET pagina_hash = ?, conteudo_html = NULL WHERE id = ?",
+                    (arquivar_pagina(conn, html) or pagina_hash, mensagem_id)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    if ids:
+        logger.info(f"🗜️ HTML de {len(ids)} mensagem(ns) movido para o arquivo de páginas")
+    return len(ids)
+
+
+def vacuum_incremental(conn: sqlite3.Connection, paginas_por_passo: int) -> int:
+    """
+    Devolve as páginas livres ao sistema em passos curtos
+
+    Returns:
+        Páginas liberadas (0 se o banco não estiver em modo incremental)
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return 0
+
+    inicial = livres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while livres > 0:
+        conn.execute(f"PRAGMA incremental_vacuum({paginas_por_passo})").fetchall()
+        restantes = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if restantes >= livres:
+            break  # Nada mais a liberar (ex.: lock de outra conexão)
+        livres = restantes
+    return inicial - livres
+
+
+def aplicar_retencao(db_path: str, politica: Optional[PoliticaRetencao] = None,
+                     dry_run: bool = False) -> Dict[str, int]:
+    """
+    Aplica as políticas de retenção ao banco
+
+    Args:
+        db_path: Caminho do banco principal
+        politica: Parâmetros (padrão: lidos do ambiente)
+        dry_run: Apenas conta o que seria arquivado
+
+    Returns:
+        Quantidades por tabela, páginas liberadas e duração em segundos
+    """
+    politica = politica or PoliticaRetencao.do_ambiente()
+    inicio = time.time()
+
+    conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT)
+    conn.isolation_level = None  # transações explícitas (ATTACH não roda dentro de uma)
+    try:
+        resumo = {'mensagens_html': comprimir_html_mensagens(conn, politica, dry_run)}
+
+        selecoes = (
+            ('consultas', 'id', selecionar_consultas),
+            ('queue_jobs', 'id', selecionar_jobs),
+        )
+        for tabela, chave, selecionar in selecoes:
+            grupos = selecionar(conn, politica)
+            if dry_run:
+                resumo[tabela] = sum(len(chaves) for chaves in grupos.values())
+            else:
+                resumo[tabela] = _mover(conn, db_path, politica, tabela, chave, grupos)
+
+        # Páginas órfãs: calculadas depois de arquivar as linhas que as referenciavam
+        grupos = selecionar_paginas(conn)
+        if dry_run:
+            resumo[ARCHIVE_TABLE] = sum(len(chaves) for chaves in grupos.values())
+        else:
+            resumo[ARCHIVE_TABLE] = _mover(conn, db_path, politica, ARCHIVE_TABLE, 'hash', grupos)
+
+        resumo['paginas_liberadas'] = 0 if dry_run else vacuum_incremental(conn, politica.paginas_vacuum)
+    finally:
+        conn.close()
+
+    if not dry_run:
+        alteradas = [tabela for tabela in ('consultas', 'queue_jobs', 'mensagens_sefaz') if resumo.get(tabela)]
+        if resumo['mensagens_html']:
+            alteradas.append('mensagens_sefaz')
+        if alteradas:
+            notify_write(*set(alteradas))
+
+    resumo['duracao'] = round(time.time() - inicio, 2)
+    return resumo
@@ -0,0 +1,219 @@
+"""
+Backend de armazenamento da fila de jobs e das gravações dos bots.
+
+``Storage`` define o contrato usado por ``processar_fila`` e pelos bots;
+``SQLiteStorage`` o implementa sobre o banco em ``DB_PATH``:
+
+- ``reservar_job`` marca atomicamente o próximo job como ``running``
+  (``BEGIN IMMEDIATE`` + ``UPDATE ... RETURNING``): dois processos não
+  pegam o mesmo job;
+- ``persistir`` grava uma operação ``(conn) -> valor`` pela fila de
+  escrita (write_queue);
+- ``conectar`` devolve uma conexão ``sqlite3``.
+
+As rotas da API usam recursos exclusivos do SQLite (FTS5, PRAGMA, janelas
+sobre datas em texto) e acessam ``DB_PATH`` diretamente; um backend
+compartilhado só faz sentido depois de essas rotas passarem por
+``conectar``.
+"""
+
+import logging
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional
+
+from .cache import notify_write
+from .write_queue import persistir as persistir_sqlite
+
+logger = logging.getLogger(__name__)
+
+Operacao = Callable[[Any], Any]
+
+# Colunas devolvidas por reservar_job
+COLUNAS_JOB = (
+    'id', 'empresa_id', 'nome_empresa', 'cpf_socio', 'inscricao_estadual', 'senha',
+    'tipo_execucao', 'data_agendada', 'recorrencia', 'ativo_agendamento',
+)
+
+# Condição de job pronto para execução
+_JOB_PRONTO = """
+    qj.status = 'pending'
+    AND qj.tentativas < qj.max_tentativas
+    AND qj.ativo_agendamento = 1
+    AND (
+        qj.tipo_execucao = 'imediata'
+        OR (qj.tipo_execucao = 'agendada' AND {data_agendada} <= {agora})
+    )
+"""
+
+# Segundos desde que o job pronto mais antigo ficou disponível
+_ATRASO_FILA = """
+    SELECT {atraso}
+    FROM queue_jobs qj
+    WHERE {pronto}
+"""
+_INICIO_ESPERA = "CASE WHEN qj.tipo_execucao = 'agendada' THEN {data_agendada} ELSE qj.data_adicao END"
+
+
+class Storage(ABC):
+    """Interface comum dos backends"""
+
+    @abstractmethod
+    def conectar(self):
+        """Conexão com execute (placeholders ``?``), lastrowid e commit"""
+
+    @abstractmethod
+    async def persistir(self, operacao: Operacao, *tabelas: str) -> Any:
+        """Executa ``operacao(conn)`` em uma transação e avisa o cache das tabelas"""
+
+    @abstractmethod
+    def reservar_job(self) -> Optional[Dict[str, Any]]:
+        """Marca o próximo job pronto como running e devolve seus dados (ou None)"""
+
+    @abstractmethod
+    def criar_schema(self) -> None:
+        """Cria as tabelas, se necessário"""
+
+    @abstractmethod
+    def atraso_fila(self) -> float:
+        """Espera (segundos) do job pronto mais antigo; 0 se a fila está vazia"""
+
+    # Operações de job (SQL comum; ``conn`` vem de ``conectar`` ou da fila de escrita)
+
+    @staticmethod
+    def finalizar_job(conn, job_id: int, sucesso: bool, linha_do_tempo: Optional[str] = None) -> None:
+        """Marca o job como concluído ou falho (com a linha do tempo da execução)"""
+        if sucesso:
+            conn.execute("""
+                UPDATE queue_jobs
+                SET status = 'completed', data_processamento = datetime('now'), linha_do_tempo = ?
+                WHERE id = ?
+            """, (linha_do_tempo, job_id))
+        else:
+            conn.execute("""
+                UPDATE queue_jobs
+                SET status = 'failed', erro_detalhes = 'Falha na execução da consulta', linha_do_tempo = ?
+                WHERE id = ?
+            """, (linha_do_tempo, job_id))
+
+    @staticmethod
+    def registrar_erro_job(conn, job_id: int, erro: str, linha_do_tempo: Optional[str] = None) -> None:
+        """Devolve o job à fila ou marca como falho se esgotou as tentativas"""
+        conn.execute("""
+            UPDATE queue_jobs
+            SET status = CASE WHEN tentativas >= max_tentativas THEN 'failed' ELSE 'pending' END,
+                erro_detalhes = ?, linha_do_tempo = ?
+            WHERE id = ?
+        """, (erro, linha_do_tempo, job_id))
+
+
+def ensure_wal(conn: sqlite3.Connection) -> bool:
+    """
+    Ativa o journal WAL no banco SQLite (a configuração fica gravada no arquivo)
+
+    Com o journal padrão (rollback), um leitor com a consulta aberta (ex.:
+    exportação em streaming) impede o commit dos escritores ("database is
+    locked"); no WAL leitores e o escritor não se bloqueiam.
+
+    Returns:
+        True se o banco está em WAL
+    """
+    try:
+        modo = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    except sqlite3.OperationalError as e:
+        logger.warning(f"⚠️ Não foi possível ativar o WAL: {e}")
+        return False
+    if modo != 'wal':
+        logger.warning(f"⚠️ Banco em journal_mode={modo} (WAL indisponível); leituras longas bloqueiam gravações")
+    return modo == 'wal'
+
+
+class SQLiteStorage(Storage):
+    """Banco SQLite local (comportamento original)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    async def persistir(self, operacao: Operacao, *tabelas: str) -> Any:
+        return await persistir_sqlite(self.db_path, operacao, *tabelas)
+
+    def criar_schema(self) -> None:
+        pass  # Feito por init_database (API) e SEFAZBot.init_database
+
+    def reservar_job(self) -> Optional[Dict[str, Any]]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.isolation_level = None
+        try:
+            # BEGIN IMMEDIATE: outro processo não reserva o mesmo job entre o SELECT e o UPDATE
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(f"""
+                    UPDATE queue_jobs
+                    SET status = 'running', data_processamento = datetime('now'), tentativas = tentativas + 1
+                    WHERE id = (
+                        SELECT qj.id FROM queue_jobs qj
+                        WHERE {_JOB_PRONTO.format(data_agendada="datetime(qj.data_agendada)", agora="datetime('now')")}
+                        ORDER BY qj.prioridade DESC, qj.data_adicao ASC
+                        LIMIT 1
+                    )
+                    RETURNING id
+                """).fetchone()
+                job = _dados_job(conn, row[0]) if row else None
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        if job:
+            notify_write('queue_jobs')
+        return job
+
+    def atraso_fila(self) -> float:
+        data_agendada = "datetime(qj.data_agendada)"
+        inicio = _INICIO_ESPERA.format(data_agendada=data_agendada)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(_ATRASO_FILA.format(
+                atraso=f"(julianday('now') - julianday(MIN({inicio}))) * 86400",
+                pronto=_JOB_PRONTO.format(data_agendada=data_agendada, agora="datetime('now')")
+            )).fetchone()
+        finally:
+            conn.close()
+        return max(row[0] or 0.0, 0.0)
+
+
+def _dados_job(conn, job_id: int) -> Dict[str, Any]:
+    row = conn.execute("""
+        SELECT qj.id, qj.empresa_id, e.nome_empresa, e.cpf_socio, e.inscricao_estadual, e.senha,
+               qj.tipo_execucao, qj.data_agendada, qj.recorrencia, qj.ativo_agendamento
+        FROM queue_jobs qj
+        JOIN empresas e ON qj.empresa_id = e.id
+        WHERE qj.id = ?
+    """, (job_id,)).fetchone()
+    return dict(zip(COLUNAS_JOB, row))
+
+
+# ---------------------------------------------------------------------------
+# Seleção do backend
+# ---------------------------------------------------------------------------
+
+_storages: Dict[str, Storage] = {}
+
+
+def criar_storage(db_path: str) -> Storage:
+    """Backend do banco em ``db_path`` (uma instância por caminho)"""
+    chave = os.path.abspath(db_path)
+    if chave not in _storages:
+        _storages[chave] = SQLiteStorage(db_path)
+    return _storages[chave]
+
+
+async def persistir(db_path: str, operacao: Operacao, *tabelas: str) -> Any:
+    """Grava pelo backend configurado (fila de escrita no SQLite)"""
+    return await criar_storage(db_path).persistir(operacao, *tabelas)
@@ -0,0 +1,238 @@
+"""
+Fila de escrita (write-behind) com um único escritor para o SQLite.
+
+Os bots gravam um resultado por vez (consultas, mensagens, status dos
+jobs). Com vários workers, cada gravação em sua própria transação vira
+uma sequência de commits pequenos (um fsync cada) disputando o lock de
+escrita do banco. Aqui as gravações são enfileiradas e uma única tarefa
+as aplica em lote, dentro de uma só transação:
+
+- o lote é gravado quando atinge ``max_lote`` operações ou quando a
+  primeira operação pendente espera ``max_espera`` segundos;
+- cada operação roda em um SAVEPOINT próprio, então uma falha desfaz só
+  aquela operação e não o lote inteiro;
+- ``submit`` só retorna depois do COMMIT (confirmação de durabilidade),
+  devolvendo o valor retornado pela operação (ex.: lastrowid);
+- ``stop`` deixa de aceitar operações e grava tudo o que estiver pendente.
+
+Uma operação é uma função ``(conn) -> valor`` que executa seus comandos
+sem fazer commit. Código que também roda fora da API (bots executados
+diretamente) usa ``persistir``, que recorre a uma transação própria
+quando não há fila ativa para o banco.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import notify_write
+
+logger = logging.getLogger(__name__)
+
+Operacao = Callable[[sqlite3.Connection], Any]
+
+# Padrões de agrupamento
+MAX_LOTE_PADRAO = 100
+MAX_ESPERA_PADRAO = 0.05  # segundos
+
+# Filas ativas por caminho absoluto do banco
+_filas: Dict[str, 'WriteQueue'] = {}
+
+
+class WriteQueueClosedError(RuntimeError):
+    """Operação enviada para uma fila já encerrada"""
+    pass
+
+
+class WriteQueue:
+    """Fila assíncrona de gravações com um único escritor por banco"""
+
+    def __init__(self, db_path: str, max_lote: int = MAX_LOTE_PADRAO,
+                 max_espera: float = MAX_ESPERA_PADRAO):
+        self.db_path = db_path
+        self.max_lote = max_lote
+        self.max_espera = max_espera
+        self._fila: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._aceitando = False
+        self.lotes_gravados = 0
+        self.operacoes_gravadas = 0
+
+    @property
+    def ativa(self) -> bool:
+        return self._aceitando
+
+    async def start(self) -> None:
+        """Abre a conexão do escritor e inicia a tarefa de gravação"""
+        if self._aceitando:
+            return
+
+        # A conexão só é usada pela tarefa escritora (um lote por vez), mas
+        # cada lote roda em uma thread do executor
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.isolation_level = None  # transações controladas explicitamente
+        self._fila = asyncio.Queue()
+        self._aceitando = True
+        self._writer = asyncio.create_task(self._executar())
+        _filas[os.path.abspath(self.db_path)] = self
+        logger.info(f"✍️ Fila de escrita iniciada para {self.db_path} "
+                    f"(lote={self.max_lote}, espera={self.max_espera}s)")
+
+    async def stop(self) -> None:
+        """Para de aceitar operações e grava todas as pendentes"""
+        if not self._aceitando:
+            return
+
+        self._aceitando = False
+        _filas.pop(os.path.abspath(self.db_path), None)
+
+        await self._fila.put(None)  # sentinela: grava o que restar e encerra
+        await self._writer
+        self._conn.close()
+        self._conn = None
+        logger.info(f"✍️ Fila de escrita encerrada ({self.operacoes_gravadas} operações "
+                    f"em {self.lotes_gravados} lotes)")
+
+    async def submit(self, operacao: Operacao, *tabelas: str) -> Any:
+        """
+        Enfileira uma operação e aguarda o COMMIT do lote em que ela entrou
+
+        Args:
+            operacao: Função (conn) -> valor, sem commit
+            tabelas: Tabelas escritas (invalidam o cache após o commit)
+
+        Returns:
+            O valor retornado pela operação
+
+        Raises:
+            WriteQueueClosedError: Se a fila não estiver ativa
+            Exception: O erro levantado pela própria operação
+        """
+        if not self._aceitando:
+            raise WriteQueueClosedError(f"Fila de escrita de {self.db_path} não está ativa")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._fila.put((operacao, tabelas, future))
+        return await future
+
+    async def _executar(self) -> None:
+        """Tarefa escritora: junta operações em lotes e grava cada lote"""
+        encerrar = False
+        while not encerrar:
+            item = await self._fila.get()
+            if item is None:
+                break
+
+            lote = [item]
+            limite = time.monotonic() + self.max_espera
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                try:
+                    if restante > 0:
+                        item = await asyncio.wait_for(self._fila.get(), restante)
+                    else:
+                        item = self._fila.get_nowait()
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                if item is None:
+                    encerrar = True
+                    break
+                lote.append(item)
+
+            await self._gravar(lote)
+
+        # Operações enfileiradas depois da sentinela também são gravadas
+        restantes = []
+        while not self._fila.empty():
+            item = self._fila.get_nowait()
+            if item is not None:
+                restantes.append(item)
+        if restantes:
+            await self._gravar(restantes)
+
+    async def _gravar(self, lote: List[Tuple[Operacao, Tuple[str, ...], asyncio.Future]]) -> None:
+        """Grava um lote em uma transação e resolve os futures após o commit"""
+        try:
+            resultados = await asyncio.to_thread(self._transacao, [op for op, _, _ in lote])
+        except Exception as e:
+            # Falha no BEGIN/COMMIT: nenhuma operação do lote foi gravada
+            logger.error(f"❌ Erro ao gravar lote de {len(lote)} operações: {e}")
+            for _, _, future in lote:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        tabelas = {tabela for _, tabs, _ in lote for tabela in tabs}
+        if tabelas:
+            notify_write(*tabelas)
+
+        self.lotes_gravados += 1
+        self.operacoes_gravadas += len(lote)
+
+        for (_, _, future), (ok, valor) in zip(lote, resultados):
+            if future.done():  # chamador cancelado
+                continue
+            if ok:
+                future.set_result(valor)
+            else:
+                future.set_exception(valor)
+
+    def _transacao(self, operacoes: List[Operacao]) -> List[Tuple[bool, Any]]:
+        """Executa as operações em uma transação (roda na thread do executor)"""
+        conn = self._conn
+        resultados = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for operacao in operacoes:
+                conn.execute("SAVEPOINT operacao")
+                try:
+                    valor = operacao(conn)
+                    conn.execute("RELEASE operacao")
+                    resultados.append((True, valor))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO operacao")
+                    conn.execute("RELEASE operacao")
+                    resultados.append((False, e))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return resultados
+
+
+def fila_ativa(db_path: str) -> Optional[WriteQueue]:
+    """Retorna a fila de escrita ativa para o banco, se houver"""
+    fila = _filas.get(os.path.abspath(db_path))
+    return fila if fila is not None and fila.ativa else None
+
+
+async def persistir(db_path: str, operacao: Operacao, *tabelas: str) -> Any:
+    """
+    Grava pela fila de escrita do banco ou, sem fila ativa, diretamente
+
+    Args:
+        db_path: Caminho do banco
+        operacao: Função (conn) -> valor, sem commit
+        tabelas: Tabelas escritas (invalidam o cache)
+
+    Returns:
+        O valor retornado pela operação, após o commit
+    """
+    fila = fila_ativa(db_path)
+    if fila is not None:
+        return await fila.submit(operacao, *tabelas)
+
+    # Sem fila (bot executado fora da API): transação própria
+    conn = sqlite3.connect(db_path)
+    try:
+        valor = operacao(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    if tabelas:
+        notify_write(*tabelas)
+    return valor
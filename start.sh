@@ -35,7 +35,7 @@ print(f'✅ Banco de dados inicializado: {db_path}')
 echo "✅ Verificações completas!"
 echo "🚀 Iniciando servidor na porta 8000..."
 echo "📡 Servidor acessível em: http://0.0.0.0:8000"
-echo "🏥 Health check: http://localhost:8000/api/estatisticas"
+echo "🏥 Health check: http://localhost:8000/healthz (prontidão: /readyz)"
 echo "📊 API Docs: http://localhost:8000/docs"
 echo ""
 
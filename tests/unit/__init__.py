@@ -0,0 +1 @@
+"""Testes automatizados (sem servidor; rodam com `pytest`)."""
@@ -0,0 +1,29 @@
+"""
+Configuração dos testes.
+
+``src.api.main`` lê ``DB_PATH`` ao ser importado: os testes usam um banco
+novo em pasta temporária (nunca o banco local) e rodam na raiz do projeto,
+onde ficam os arquivos estáticos montados pela API.
+"""
+
+import os
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='sefaz_testes_'), 'api.db')
+os.environ['CACHE_HTTP_TTL'] = '0'
+os.environ.setdefault('LOG_NIVEL', 'WARNING')
+os.chdir(RAIZ)
+
+
+@pytest.fixture
+def cliente():
+    """API em processo, com o startup (init_database) executado"""
+    from fastapi.testclient import TestClient
+    from src.api.main import app
+
+    with TestClient(app) as cliente:
+        yield cliente
@@ -0,0 +1,16 @@
+"""Endpoints de leitura sem bloquear o event loop (scripts/verificar_bloqueios.py)"""
+
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_endpoints_nao_bloqueiam_o_event_loop():
+    # Processo próprio: banco populado e variáveis do monitor (lidas na importação da API)
+    processo = subprocess.run(
+        [sys.executable, os.path.join(RAIZ, 'scripts', 'verificar_bloqueios.py')],
+        cwd=RAIZ, capture_output=True, text=True
+    )
+    assert processo.returncode == 0, processo.stdout + processo.stderr
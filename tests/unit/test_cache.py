@@ -0,0 +1,37 @@
+"""Cache de consultas agregadas (src/database/cache.py)"""
+
+from src.database.cache import QueryCache
+
+
+def test_reutiliza_ate_a_proxima_escrita():
+    cache = QueryCache()
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        return len(chamadas)
+
+    assert cache.get_or_compute('total', ('empresas',), calcular) == 1
+    assert cache.get_or_compute('total', ('empresas',), calcular) == 1
+    cache.bump('empresas')
+    assert cache.get_or_compute('total', ('empresas',), calcular) == 2
+
+
+def test_limita_entradas_descartando_a_menos_usada():
+    cache = QueryCache(max_entradas=3)
+    for busca in ('a', 'b', 'c'):
+        cache.get_or_compute(('empresas_total', busca), ('empresas',), lambda: busca)
+    # 'a' usada por último: 'b' é a menos recente
+    cache.get_or_compute(('empresas_total', 'a'), ('empresas',), lambda: 'recalculado')
+    cache.get_or_compute(('empresas_total', 'd'), ('empresas',), lambda: 'd')
+
+    assert len(cache._entries) == 3
+    assert ('empresas_total', 'b') not in cache._entries
+    assert cache.get_or_compute(('empresas_total', 'a'), ('empresas',), lambda: 'recalculado') == 'a'
+
+
+def test_entrada_obsoleta_sai_do_cache():
+    cache = QueryCache(max_age=0)
+    cache.get_or_compute('x', ('empresas',), lambda: 1)
+    cache.get_or_compute('x', ('empresas',), lambda: 2)
+    assert list(cache._entries) == ['x']
@@ -0,0 +1,45 @@
+"""Validação condicional do cache HTTP (src/api/cache_http.py)"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api.cache_http import CacheHTTPMiddleware
+from src.database.cache import QueryCache
+
+
+def _cliente():
+    cache = QueryCache()
+    chamadas = []
+    app = FastAPI()
+
+    @app.get('/api/empresas')
+    def listar():
+        chamadas.append(1)
+        return {'chamadas': len(chamadas)}
+
+    app.add_middleware(CacheHTTPMiddleware, rotas={'/api/empresas': ('empresas',)}, cache=cache, ttl=0)
+    return TestClient(app), cache, chamadas
+
+
+def test_if_none_match_responde_304_ate_a_proxima_escrita():
+    cliente, cache, chamadas = _cliente()
+    etag = cliente.get('/api/empresas').headers['etag']
+
+    assert cliente.get('/api/empresas', headers={'If-None-Match': etag}).status_code == 304
+    assert len(chamadas) == 1
+
+    cache.bump('empresas')
+    resposta = cliente.get('/api/empresas', headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert resposta.json() == {'chamadas': 2}
+
+
+def test_if_modified_since_nao_esconde_escrita_no_mesmo_segundo():
+    cliente, cache, chamadas = _cliente()
+    ultima_modificacao = cliente.get('/api/empresas').headers['last-modified']
+
+    # Escrita logo após a resposta: Last-Modified (em segundos) pode não mudar
+    cache.bump('empresas')
+    resposta = cliente.get('/api/empresas', headers={'If-Modified-Since': ultima_modificacao})
+    assert resposta.status_code == 200
+    assert resposta.json() == {'chamadas': 2}
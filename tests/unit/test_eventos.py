@@ -0,0 +1,24 @@
+"""Fluxo de eventos SSE (/api/eventos)"""
+
+import json
+
+
+def test_snapshot_omite_secao_com_erro(cliente, monkeypatch):
+    import src.api.main as api
+
+    def falhar():
+        raise RuntimeError("no such column: c.status_ie")
+
+    async def assinar(inicial, ultimo_id):
+        # Só o snapshot: o fluxo real espera eventos até a desconexão
+        yield f"event: snapshot\ndata: {json.dumps(inicial)}\n\n"
+
+    monkeypatch.setattr(api, '_estatisticas', falhar)
+    monkeypatch.setattr(api.eventos, 'assinar', assinar)
+
+    resposta = cliente.get('/api/eventos')
+
+    assert resposta.status_code == 200
+    snapshot = json.loads(resposta.text.split('data: ', 1)[1])
+    assert 'estatisticas' not in snapshot
+    assert {'fila_stats', 'processando', 'progresso'} <= set(snapshot)
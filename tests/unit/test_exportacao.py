@@ -0,0 +1,33 @@
+"""Exportação em streaming (src/api/exportacao.py)"""
+
+import asyncio
+import sqlite3
+
+from src.api.exportacao import LINHAS_POR_BLOCO, exportar
+from src.database.storage import ensure_wal
+
+
+def test_gravacao_durante_exportacao(tmp_path):
+    db_path = str(tmp_path / 'e.db')
+    conn = sqlite3.connect(db_path)
+    assert ensure_wal(conn)
+    conn.execute("CREATE TABLE empresas (id INTEGER PRIMARY KEY, nome TEXT)")
+    conn.executemany("INSERT INTO empresas (nome) VALUES (?)", [(f"E{i}",) for i in range(3 * LINHAS_POR_BLOCO)])
+    conn.commit()
+    conn.close()
+
+    async def exportar_gravando():
+        gerador = exportar(db_path, "SELECT id, nome FROM empresas ORDER BY id", [], 'ndjson')
+        blocos = [await gerador.__anext__()]
+
+        # Consulta da exportação ainda aberta: o escritor não pode esperar por ela
+        escritor = sqlite3.connect(db_path, timeout=0.1)
+        escritor.execute("INSERT INTO empresas (nome) VALUES ('nova')")
+        escritor.commit()
+        escritor.close()
+
+        blocos.extend([bloco async for bloco in gerador])
+        return b''.join(blocos)
+
+    conteudo = asyncio.run(exportar_gravando())
+    assert conteudo.count(b'\n') in (3 * LINHAS_POR_BLOCO, 3 * LINHAS_POR_BLOCO + 1)
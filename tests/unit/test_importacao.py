@@ -0,0 +1,15 @@
+"""Orçamento de inicialização da API (scripts/verificar_importacao.py)"""
+
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_importacao_da_api_dentro_do_orcamento():
+    processo = subprocess.run(
+        [sys.executable, os.path.join(RAIZ, 'scripts', 'verificar_importacao.py')],
+        cwd=RAIZ, capture_output=True, text=True
+    )
+    assert processo.returncode == 0, processo.stdout + processo.stderr
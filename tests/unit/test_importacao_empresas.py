@@ -0,0 +1,74 @@
+"""Importação de empresas em blocos (src/api/importacao_empresas.py)"""
+
+import json
+import os
+import sqlite3
+
+CABECALHO = "nome_empresa;cnpj;inscricao_estadual;cpf_socio;senha;observacoes"
+
+
+def _csv(prefixo: str, inicio: int, quantidade: int) -> bytes:
+    linhas = [CABECALHO] + [
+        f"{prefixo} {i};{20000000000000 + i};{200000000 + i};12345678901;senha{i};"
+        for i in range(inicio, inicio + quantidade)
+    ]
+    return "\r\n".join(linhas).encode()
+
+
+def _eventos(resposta):
+    assert resposta.status_code == 200, resposta.text
+    return [json.loads(linha) for linha in resposta.text.splitlines()]
+
+
+def _empresas(prefixo: str) -> int:
+    conn = sqlite3.connect(os.environ['DB_PATH'])
+    try:
+        return conn.execute("SELECT COUNT(*) FROM empresas WHERE nome_empresa LIKE ?", (f"{prefixo} %",)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_bloco_desfeito_nao_entra_no_resumo(cliente):
+    conn = sqlite3.connect(os.environ['DB_PATH'])
+    conn.execute("""
+        CREATE TRIGGER falha_importacao BEFORE INSERT ON empresas
+        WHEN NEW.nome_empresa = 'Desfeita 2' BEGIN SELECT RAISE(ABORT, 'conflito'); END
+    """)
+    conn.commit()
+    try:
+        eventos = _eventos(cliente.post(
+            '/api/empresas/importar', content=_csv('Desfeita', 1, 3),
+            headers={'Content-Type': 'text/csv', 'X-Filename': 'empresas.csv'}
+        ))
+    finally:
+        conn.execute("DROP TRIGGER falha_importacao")
+        conn.commit()
+        conn.close()
+
+    assert eventos[0]['tipo'] == 'erro'
+    resumo = eventos[-1]
+    assert (resumo['total'], resumo['inseridas'], resumo['sucesso'], resumo['detalhes']) == (0, 0, 0, [])
+    assert _empresas('Desfeita') == 0
+
+
+def test_multipart_e_dry_run(cliente):
+    arquivo = _csv('Multipart', 100, 3)
+
+    resumo = _eventos(cliente.post(
+        '/api/empresas/importar', params={'dry_run': 'true'},
+        files={'arquivo': ('empresas.csv', arquivo, 'text/csv')}
+    ))[-1]
+    assert (resumo['dry_run'], resumo['total'], resumo['inseridas']) == (True, 3, 3)
+    assert _empresas('Multipart') == 0
+
+    resumo = _eventos(cliente.post(
+        '/api/empresas/importar', files={'arquivo': ('empresas.csv', arquivo, 'text/csv')}
+    ))[-1]
+    assert (resumo['total'], resumo['inseridas']) == (3, 3)
+    assert _empresas('Multipart') == 3
+
+
+def test_multipart_sem_campo_arquivo(cliente):
+    resposta = cliente.post('/api/empresas/importar', files={'outro': ('x.csv', b'a;b', 'text/csv')})
+    assert resposta.status_code == 400
+    assert 'arquivo' in resposta.json()['detail']
@@ -0,0 +1,49 @@
+"""Arquivo de páginas (src/database/page_archive.py) e gravação de mensagens do bot"""
+
+import asyncio
+import sqlite3
+
+from src.database.page_archive import arquivar_pagina, carregar_paginas, ensure_page_archive
+
+HTML_RECIBO = (
+    '<div class="conteudo">Recibo da DIEF: '
+    '<a href="/sefaznet/listIReciboDief.do?method=list&amp;id=7">abrir</a></div>'
+)
+
+
+def test_carregar_paginas_numa_consulta(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'p.db')
+    ensure_page_archive(conn)
+    a = arquivar_pagina(conn, '<html>a</html>')
+    b = arquivar_pagina(conn, '<html>b</html>')
+
+    consultas = []
+    conn.set_trace_callback(consultas.append)
+    paginas = carregar_paginas(conn, [a, None, b, a, 'inexistente'])
+
+    assert paginas == {a: '<html>a</html>', b: '<html>b</html>'}
+    assert len(consultas) == 1
+    assert carregar_paginas(conn, [None, '']) == {}
+
+
+def test_bot_arquiva_html_da_mensagem(tmp_path):
+    from src.bot.sefaz_bot import SEFAZBot
+
+    db_path = str(tmp_path / 'bot.db')
+    bot = SEFAZBot(db_path=db_path)
+    msg_id = asyncio.run(bot.salvar_mensagem_completa({
+        'inscricao_estadual': '123456789',
+        'assunto': 'DIEF',
+        'conteudo_mensagem': 'Recibo da DIEF',
+        'conteudo_html': HTML_RECIBO,
+    }))
+
+    conn = sqlite3.connect(db_path)
+    conteudo_html, pagina_hash, link_recibo = conn.execute(
+        "SELECT conteudo_html, pagina_hash, link_recibo FROM mensagens_sefaz WHERE id = ?", (msg_id,)
+    ).fetchone()
+
+    assert conteudo_html is None
+    assert carregar_paginas(conn, [pagina_hash]) == {pagina_hash: HTML_RECIBO}
+    assert link_recibo == '/sefaznet/listIReciboDief.do?method=list&id=7'
+    assert bot.verificar_mensagem_salva(msg_id)
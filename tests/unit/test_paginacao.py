@@ -0,0 +1,37 @@
+"""Paginação por chave (src/database/pagination.py) nas listagens da API"""
+
+import os
+import sqlite3
+
+from src.database.pagination import NEXT_CURSOR_HEADER, decode_cursor, next_cursor
+
+
+def test_next_cursor_usa_linha_extra():
+    linhas = [{'id': 3}, {'id': 2}, {'id': 1}]
+
+    assert next_cursor(linhas[:2], 2, 'id') is None
+    assert decode_cursor(next_cursor(linhas, 2, 'id'), 1) == [2]
+
+
+def test_ultima_pagina_cheia_sem_cursor(cliente):
+    conn = sqlite3.connect(os.environ['DB_PATH'])
+    empresa_id = conn.execute(
+        "INSERT INTO empresas (nome_empresa, cnpj, inscricao_estadual, cpf_socio, senha) VALUES (?, ?, ?, ?, ?)",
+        ('Paginação LTDA', '11222333000181', '987654321', '12345678901', 'senha')
+    ).lastrowid
+    for _ in range(4):
+        conn.execute(
+            "INSERT INTO queue_jobs (empresa_id, status, prioridade) VALUES (?, 'paginacao', 5)",
+            (empresa_id,)
+        )
+    conn.commit()
+    conn.close()
+
+    primeira = cliente.get('/api/fila', params={'status': 'paginacao', 'limit': 2})
+    assert len(primeira.json()) == 2
+    proximo = primeira.headers[NEXT_CURSOR_HEADER]
+
+    ultima = cliente.get('/api/fila', params={'status': 'paginacao', 'limit': 2, 'cursor': proximo})
+    assert len(ultima.json()) == 2
+    assert NEXT_CURSOR_HEADER not in ultima.headers
+    assert {job['id'] for job in primeira.json()}.isdisjoint(job['id'] for job in ultima.json())
@@ -0,0 +1,25 @@
+"""Retenção das consultas (src/database/retention.py)"""
+
+import sqlite3
+
+from src.database.retention import PoliticaRetencao, selecionar_consultas
+
+
+def test_consultas_agrupadas_pela_ie_canonica(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'r.db')
+    conn.execute("""
+        CREATE TABLE consultas (
+            id INTEGER PRIMARY KEY, inscricao_estadual TEXT, ie_chave TEXT, data_consulta TIMESTAMP
+        )
+    """)
+    # A mesma IE gravada em dois formatos, uma consulta por dia
+    conn.executemany(
+        "INSERT INTO consultas (inscricao_estadual, ie_chave, data_consulta) VALUES (?, '125383983', ?)",
+        [('12538398-3' if dia % 2 else '125383983', f'2020-01-{dia:02d} 10:00:00') for dia in range(1, 31)]
+    )
+
+    politica = PoliticaRetencao(consultas_por_ie=3, meses_snapshot=0)
+    arquivadas = [id_ for ids in selecionar_consultas(conn, politica).values() for id_ in ids]
+
+    assert len(arquivadas) == 27
+    assert set(range(28, 31)).isdisjoint(arquivadas)
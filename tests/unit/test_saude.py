@@ -0,0 +1,13 @@
+"""Health checks da API (/healthz e /readyz)"""
+
+
+def test_readyz_em_banco_novo(cliente):
+    assert cliente.get('/healthz').status_code == 200
+
+    resposta = cliente.get('/readyz')
+    verificacoes = resposta.json()['verificacoes']
+
+    assert verificacoes['banco']['ok']
+    assert verificacoes['fila']['ok'], verificacoes['fila']
+    assert verificacoes['fila']['atraso_segundos'] == 0
+    assert resposta.status_code == 200
@@ -0,0 +1,60 @@
+"""Backend de armazenamento da fila (src/database/storage.py)"""
+
+import pytest
+
+from src.database.storage import SQLiteStorage, Storage
+
+
+@pytest.fixture
+def backend(tmp_path):
+    from src.bot.sefaz_bot import SEFAZBot
+
+    db_path = str(tmp_path / 'fila.db')
+    SEFAZBot(db_path=db_path)  # schema de empresas/queue_jobs
+    return SQLiteStorage(db_path)
+
+
+def test_storage_exige_o_contrato_completo():
+    class SemReserva(Storage):
+        def conectar(self):
+            return None
+
+        async def persistir(self, operacao, *tabelas):
+            return None
+
+        def criar_schema(self):
+            pass
+
+        def atraso_fila(self):
+            return 0.0
+
+    with pytest.raises(TypeError):
+        SemReserva()
+
+
+def test_job_reservado_uma_unica_vez(backend):
+    conn = backend.conectar()
+    empresa_id = conn.execute(
+        "INSERT INTO empresas (nome_empresa, cnpj, inscricao_estadual, cpf_socio, senha) VALUES (?, ?, ?, ?, ?)",
+        ('Fila LTDA', '11222333000181', '123456789', '12345678901', 'senha')
+    ).lastrowid
+    job_id = conn.execute(
+        "INSERT INTO queue_jobs (empresa_id, status, prioridade, tipo_execucao, ativo_agendamento) "
+        "VALUES (?, 'pending', 5, 'imediata', 1)",
+        (empresa_id,)
+    ).lastrowid
+    conn.commit()
+    conn.close()
+
+    assert backend.atraso_fila() >= 0
+    job = backend.reservar_job()
+    assert (job['id'], job['inscricao_estadual'], job['senha']) == (job_id, '123456789', 'senha')
+    assert backend.reservar_job() is None
+    assert backend.atraso_fila() == 0
+
+    conn = backend.conectar()
+    Storage.finalizar_job(conn, job_id, True, None)
+    conn.commit()
+    status = conn.execute("SELECT status FROM queue_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    conn.close()
+    assert status == 'completed'